@@ -3,9 +3,12 @@ CREATE TABLE users
 (
     ID BIGINT UNSIGNED NOT NULL AUTO_INCREMENT,
     name_encr BLOB NULL,
+    name_key_version INT NOT NULL DEFAULT 1,  -- Version of the key name_encr is encrypted with (authentication.encryption_key_version)
+    name_bidx BINARY(32) NULL,  -- Keyed hash of the name for lookups (authentication.name_blind_index)
     hashedPassword TEXT NULL,
 
-    PRIMARY KEY (ID)
+    PRIMARY KEY (ID),
+    UNIQUE KEY idx_users_name_bidx (name_bidx)
 ) ENGINE = InnoDB;
 
 -- Create the days table
@@ -16,7 +19,8 @@ CREATE TABLE days
     month INT NOT NULL,
     day INT NOT NULL,
 
-    PRIMARY KEY (ID)
+    PRIMARY KEY (ID),
+    KEY idx_days_date (year, month, day)
 ) ENGINE = InnoDB;
 
 -- Create the meal_types table
@@ -25,7 +29,8 @@ CREATE TABLE meal_types
     ID BIGINT UNSIGNED NOT NULL AUTO_INCREMENT,
     name TEXT NOT NULL,
 
-    PRIMARY KEY (ID)
+    PRIMARY KEY (ID),
+    KEY idx_meal_types_name (name(32))
 ) ENGINE = InnoDB;
 
 -- Insert the predefined meal types (breakfast, lunch, dinner, snacks)
@@ -51,7 +56,9 @@ CREATE TABLE day_meals
     fk_user_id BIGINT UNSIGNED NOT NULL,    -- Foreign key to users
     fk_day_id BIGINT UNSIGNED NOT NULL,     -- Foreign key to days
     fk_meal_type_id BIGINT UNSIGNED NOT NULL, -- Foreign key to meal_types
-    fk_meal_id BIGINT UNSIGNED NOT NULL,    -- Foreign key to meals
+    fk_meal_id BIGINT UNSIGNED NULL,        -- Foreign key to meals (NULL if the levels are stored inline only)
+    fat_level TINYINT NULL,                 -- Inline fat level (database.inlineMealLevels), 0: Low, 1: Medium, 2: High
+    sugar_level TINYINT NULL,               -- Inline sugar level (database.inlineMealLevels), 0: Low, 1: Medium, 2: High
 
     PRIMARY KEY (fk_user_id, fk_day_id, fk_meal_type_id), -- Composite primary key
 
@@ -60,3 +67,90 @@ CREATE TABLE day_meals
     CONSTRAINT fk_meal_type FOREIGN KEY (fk_meal_type_id) REFERENCES meal_types(ID) ON DELETE CASCADE,
     CONSTRAINT fk_meal FOREIGN KEY (fk_meal_id) REFERENCES meals(ID) ON DELETE CASCADE
 ) ENGINE = InnoDB;
+
+-- Create the day_meals_v2 table (schema v2, see database.schemaVersion in config.txt)
+-- Stores the date directly in the primary key, so no days lookup is needed.
+CREATE TABLE day_meals_v2
+(
+    fk_user_id BIGINT UNSIGNED NOT NULL,    -- Foreign key to users
+    meal_date DATE NOT NULL,                -- Date of the meal
+    fk_meal_type_id BIGINT UNSIGNED NOT NULL, -- Foreign key to meal_types
+    fk_meal_id BIGINT UNSIGNED NULL,        -- Foreign key to meals (NULL if the levels are stored inline only)
+    fat_level TINYINT NULL,                 -- Inline fat level (database.inlineMealLevels), 0: Low, 1: Medium, 2: High
+    sugar_level TINYINT NULL,               -- Inline sugar level (database.inlineMealLevels), 0: Low, 1: Medium, 2: High
+
+    PRIMARY KEY (fk_user_id, meal_date, fk_meal_type_id), -- Composite primary key
+
+    CONSTRAINT fk_day_meals_v2_user FOREIGN KEY (fk_user_id) REFERENCES users(ID) ON DELETE CASCADE,
+    CONSTRAINT fk_day_meals_v2_meal_type FOREIGN KEY (fk_meal_type_id) REFERENCES meal_types(ID) ON DELETE CASCADE,
+    CONSTRAINT fk_day_meals_v2_meal FOREIGN KEY (fk_meal_id) REFERENCES meals(ID) ON DELETE CASCADE
+) ENGINE = InnoDB;
+
+-- Create the user_shards table (shard directory, only used if shards are configured)
+CREATE TABLE user_shards
+(
+    fk_user_id BIGINT UNSIGNED NOT NULL,    -- Foreign key to users
+    shard_index INT NOT NULL,               -- Index of the shard in config.txt (database.shards)
+    is_moving TINYINT NOT NULL DEFAULT 0,   -- 1 while the meal data is moved to another shard
+
+    PRIMARY KEY (fk_user_id),
+
+    CONSTRAINT fk_user_shard_user FOREIGN KEY (fk_user_id) REFERENCES users(ID) ON DELETE CASCADE
+) ENGINE = InnoDB;
+
+-- Create the meal change log tables (database.mealChangeLog, read by /v1/sync)
+-- meal_change_seqs holds the last sequence number of every user; its row is locked by every write of the user.
+CREATE TABLE meal_change_seqs
+(
+    fk_user_id BIGINT UNSIGNED NOT NULL,    -- Foreign key to users
+    last_seq BIGINT UNSIGNED NOT NULL,      -- Sequence number of the latest change
+    compacted_seq BIGINT UNSIGNED NOT NULL DEFAULT 0, -- Changes up to this sequence number may have been removed
+
+    PRIMARY KEY (fk_user_id),
+
+    CONSTRAINT fk_meal_change_seqs_user FOREIGN KEY (fk_user_id) REFERENCES users(ID) ON DELETE CASCADE
+) ENGINE = InnoDB;
+
+CREATE TABLE meal_changes
+(
+    fk_user_id BIGINT UNSIGNED NOT NULL,    -- Foreign key to users
+    seq BIGINT UNSIGNED NOT NULL,           -- Per-user sequence number of the change
+    operation ENUM('insert', 'update', 'delete') NOT NULL,
+    year SMALLINT NOT NULL,                 -- Date of the changed day meal
+    month TINYINT NOT NULL,
+    day TINYINT NOT NULL,
+    fk_meal_type_id BIGINT UNSIGNED NOT NULL, -- Meal type of the changed day meal
+    fat_level TINYINT NULL,                 -- Levels after the change (NULL for deletes)
+    sugar_level TINYINT NULL,
+    changed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    PRIMARY KEY (fk_user_id, seq),
+    KEY idx_meal_changes_day_meal (fk_user_id, year, month, day, fk_meal_type_id, seq),
+
+    CONSTRAINT fk_meal_changes_user FOREIGN KEY (fk_user_id) REFERENCES users(ID) ON DELETE CASCADE
+) ENGINE = InnoDB;
+
+-- Create the day_meals_archive table (database.archiveHorizonMonths, filled by src/tools/archiveMeals.py)
+-- Holds the day meals older than the archive horizon with their levels inline. Compressed and partitioned by year,
+-- so old years can be moved or dropped as a whole (ALTER TABLE ... EXCHANGE / DROP PARTITION).
+-- Add the partition of the next year before it starts: ALTER TABLE day_meals_archive REORGANIZE PARTITION p_future INTO (...).
+CREATE TABLE day_meals_archive
+(
+    fk_user_id BIGINT UNSIGNED NOT NULL,    -- ID of the user (no foreign key: partitioned tables cannot have any)
+    meal_date DATE NOT NULL,                -- Date of the meal
+    fk_meal_type_id BIGINT UNSIGNED NOT NULL, -- ID of the meal type
+    fat_level TINYINT NOT NULL,             -- 0: Low, 1: Medium, 2: High
+    sugar_level TINYINT NOT NULL,           -- 0: Low, 1: Medium, 2: High
+    archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    PRIMARY KEY (fk_user_id, meal_date, fk_meal_type_id)
+) ENGINE = InnoDB ROW_FORMAT = COMPRESSED KEY_BLOCK_SIZE = 8
+PARTITION BY RANGE (YEAR(meal_date))
+(
+    PARTITION p2022 VALUES LESS THAN (2023),
+    PARTITION p2023 VALUES LESS THAN (2024),
+    PARTITION p2024 VALUES LESS THAN (2025),
+    PARTITION p2025 VALUES LESS THAN (2026),
+    PARTITION p2026 VALUES LESS THAN (2027),
+    PARTITION p_future VALUES LESS THAN MAXVALUE
+);
@@ -0,0 +1,128 @@
+-- Schema of a shard holding meal data (see database.shards in config.txt).
+-- Users stay on the primary, so day_meals has no foreign key to users here.
+
+-- Create the days table
+CREATE TABLE days
+(
+    ID BIGINT UNSIGNED NOT NULL AUTO_INCREMENT,
+    year INT NOT NULL,
+    month INT NOT NULL,
+    day INT NOT NULL,
+
+    PRIMARY KEY (ID),
+    KEY idx_days_date (year, month, day)
+) ENGINE = InnoDB;
+
+-- Create the meal_types table
+CREATE TABLE meal_types
+(
+    ID BIGINT UNSIGNED NOT NULL AUTO_INCREMENT,
+    name TEXT NOT NULL,
+
+    PRIMARY KEY (ID),
+    KEY idx_meal_types_name (name(32))
+) ENGINE = InnoDB;
+
+-- Insert the predefined meal types in the same order as on the primary, so the IDs match
+INSERT INTO meal_types (name) VALUES
+('breakfast'),
+('lunch'),
+('dinner'),
+('snacks');
+
+-- Create the meals table
+CREATE TABLE meals
+(
+    ID BIGINT UNSIGNED NOT NULL AUTO_INCREMENT,
+    fat_level INT NOT NULL,  -- 0: Low, 1: Medium, 2: High
+    sugar_level INT NOT NULL, -- 0: Low, 1: Medium, 2: High
+
+    PRIMARY KEY (ID)
+) ENGINE = InnoDB;
+
+-- Create the day_meals table with composite primary key
+CREATE TABLE day_meals
+(
+    fk_user_id BIGINT UNSIGNED NOT NULL,    -- ID of the user on the primary
+    fk_day_id BIGINT UNSIGNED NOT NULL,     -- Foreign key to days
+    fk_meal_type_id BIGINT UNSIGNED NOT NULL, -- Foreign key to meal_types
+    fk_meal_id BIGINT UNSIGNED NULL,        -- Foreign key to meals (NULL if the levels are stored inline only)
+    fat_level TINYINT NULL,                 -- Inline fat level (database.inlineMealLevels), 0: Low, 1: Medium, 2: High
+    sugar_level TINYINT NULL,               -- Inline sugar level (database.inlineMealLevels), 0: Low, 1: Medium, 2: High
+
+    PRIMARY KEY (fk_user_id, fk_day_id, fk_meal_type_id), -- Composite primary key
+
+    CONSTRAINT fk_day FOREIGN KEY (fk_day_id) REFERENCES days(ID) ON DELETE CASCADE,
+    CONSTRAINT fk_meal_type FOREIGN KEY (fk_meal_type_id) REFERENCES meal_types(ID) ON DELETE CASCADE,
+    CONSTRAINT fk_meal FOREIGN KEY (fk_meal_id) REFERENCES meals(ID) ON DELETE CASCADE
+) ENGINE = InnoDB;
+
+-- Create the day_meals_v2 table (schema v2, see database.schemaVersion in config.txt)
+-- Stores the date directly in the primary key, so no days lookup is needed.
+CREATE TABLE day_meals_v2
+(
+    fk_user_id BIGINT UNSIGNED NOT NULL,    -- ID of the user on the primary
+    meal_date DATE NOT NULL,                -- Date of the meal
+    fk_meal_type_id BIGINT UNSIGNED NOT NULL, -- Foreign key to meal_types
+    fk_meal_id BIGINT UNSIGNED NULL,        -- Foreign key to meals (NULL if the levels are stored inline only)
+    fat_level TINYINT NULL,                 -- Inline fat level (database.inlineMealLevels), 0: Low, 1: Medium, 2: High
+    sugar_level TINYINT NULL,               -- Inline sugar level (database.inlineMealLevels), 0: Low, 1: Medium, 2: High
+
+    PRIMARY KEY (fk_user_id, meal_date, fk_meal_type_id), -- Composite primary key
+
+    CONSTRAINT fk_day_meals_v2_meal_type FOREIGN KEY (fk_meal_type_id) REFERENCES meal_types(ID) ON DELETE CASCADE,
+    CONSTRAINT fk_day_meals_v2_meal FOREIGN KEY (fk_meal_id) REFERENCES meals(ID) ON DELETE CASCADE
+) ENGINE = InnoDB;
+
+-- Create the meal change log tables (database.mealChangeLog, read by /v1/sync)
+-- meal_change_seqs holds the last sequence number of every user; its row is locked by every write of the user.
+CREATE TABLE meal_change_seqs
+(
+    fk_user_id BIGINT UNSIGNED NOT NULL,    -- ID of the user on the primary
+    last_seq BIGINT UNSIGNED NOT NULL,      -- Sequence number of the latest change
+    compacted_seq BIGINT UNSIGNED NOT NULL DEFAULT 0, -- Changes up to this sequence number may have been removed
+
+    PRIMARY KEY (fk_user_id)
+) ENGINE = InnoDB;
+
+CREATE TABLE meal_changes
+(
+    fk_user_id BIGINT UNSIGNED NOT NULL,    -- ID of the user on the primary
+    seq BIGINT UNSIGNED NOT NULL,           -- Per-user sequence number of the change
+    operation ENUM('insert', 'update', 'delete') NOT NULL,
+    year SMALLINT NOT NULL,                 -- Date of the changed day meal
+    month TINYINT NOT NULL,
+    day TINYINT NOT NULL,
+    fk_meal_type_id BIGINT UNSIGNED NOT NULL, -- Meal type of the changed day meal
+    fat_level TINYINT NULL,                 -- Levels after the change (NULL for deletes)
+    sugar_level TINYINT NULL,
+    changed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    PRIMARY KEY (fk_user_id, seq),
+    KEY idx_meal_changes_day_meal (fk_user_id, year, month, day, fk_meal_type_id, seq)
+) ENGINE = InnoDB;
+
+-- Create the day_meals_archive table (database.archiveHorizonMonths, filled by src/tools/archiveMeals.py)
+-- Holds the day meals older than the archive horizon with their levels inline. Compressed and partitioned by year,
+-- so old years can be moved or dropped as a whole (ALTER TABLE ... EXCHANGE / DROP PARTITION).
+-- Add the partition of the next year before it starts: ALTER TABLE day_meals_archive REORGANIZE PARTITION p_future INTO (...).
+CREATE TABLE day_meals_archive
+(
+    fk_user_id BIGINT UNSIGNED NOT NULL,    -- ID of the user on the primary
+    meal_date DATE NOT NULL,                -- Date of the meal
+    fk_meal_type_id BIGINT UNSIGNED NOT NULL, -- ID of the meal type
+    fat_level TINYINT NOT NULL,             -- 0: Low, 1: Medium, 2: High
+    sugar_level TINYINT NOT NULL,           -- 0: Low, 1: Medium, 2: High
+    archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    PRIMARY KEY (fk_user_id, meal_date, fk_meal_type_id)
+) ENGINE = InnoDB ROW_FORMAT = COMPRESSED KEY_BLOCK_SIZE = 8
+PARTITION BY RANGE (YEAR(meal_date))
+(
+    PARTITION p2022 VALUES LESS THAN (2023),
+    PARTITION p2023 VALUES LESS THAN (2024),
+    PARTITION p2024 VALUES LESS THAN (2025),
+    PARTITION p2025 VALUES LESS THAN (2026),
+    PARTITION p2026 VALUES LESS THAN (2027),
+    PARTITION p_future VALUES LESS THAN MAXVALUE
+);
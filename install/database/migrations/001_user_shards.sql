@@ -0,0 +1,12 @@
+-- Adds the shard directory to an existing primary database.
+-- Users without entry keep their meal data on shard 0.
+CREATE TABLE IF NOT EXISTS user_shards
+(
+    fk_user_id BIGINT UNSIGNED NOT NULL,    -- Foreign key to users
+    shard_index INT NOT NULL,               -- Index of the shard in config.txt (database.shards)
+    is_moving TINYINT NOT NULL DEFAULT 0,   -- 1 while the meal data is moved to another shard
+
+    PRIMARY KEY (fk_user_id),
+
+    CONSTRAINT fk_user_shard_user FOREIGN KEY (fk_user_id) REFERENCES users(ID) ON DELETE CASCADE
+) ENGINE = InnoDB;
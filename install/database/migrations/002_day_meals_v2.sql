@@ -0,0 +1,15 @@
+-- Adds the day_meals_v2 table (schema v2) to an existing primary database.
+-- Run 002_day_meals_v2_shard.sql on every shard instead.
+CREATE TABLE IF NOT EXISTS day_meals_v2
+(
+    fk_user_id BIGINT UNSIGNED NOT NULL,    -- Foreign key to users
+    meal_date DATE NOT NULL,                -- Date of the meal
+    fk_meal_type_id BIGINT UNSIGNED NOT NULL, -- Foreign key to meal_types
+    fk_meal_id BIGINT UNSIGNED NOT NULL,    -- Foreign key to meals
+
+    PRIMARY KEY (fk_user_id, meal_date, fk_meal_type_id), -- Composite primary key
+
+    CONSTRAINT fk_day_meals_v2_user FOREIGN KEY (fk_user_id) REFERENCES users(ID) ON DELETE CASCADE,
+    CONSTRAINT fk_day_meals_v2_meal_type FOREIGN KEY (fk_meal_type_id) REFERENCES meal_types(ID) ON DELETE CASCADE,
+    CONSTRAINT fk_day_meals_v2_meal FOREIGN KEY (fk_meal_id) REFERENCES meals(ID) ON DELETE CASCADE
+) ENGINE = InnoDB;
@@ -0,0 +1,18 @@
+-- Adds the inline meal level columns (database.inlineMealLevels) to an existing primary database or shard.
+-- Adding the columns is instant; allowing NULL meal IDs rebuilds the table in place without blocking reads or writes.
+ALTER TABLE day_meals
+    ADD COLUMN fat_level TINYINT NULL,      -- Inline fat level, 0: Low, 1: Medium, 2: High
+    ADD COLUMN sugar_level TINYINT NULL,    -- Inline sugar level, 0: Low, 1: Medium, 2: High
+    ALGORITHM = INSTANT;
+ALTER TABLE day_meals
+    MODIFY fk_meal_id BIGINT UNSIGNED NULL, -- NULL if the levels are stored inline only
+    ALGORITHM = INPLACE, LOCK = NONE;
+
+-- Only if day_meals_v2 exists (see 002_day_meals_v2.sql).
+ALTER TABLE day_meals_v2
+    ADD COLUMN fat_level TINYINT NULL,
+    ADD COLUMN sugar_level TINYINT NULL,
+    ALGORITHM = INSTANT;
+ALTER TABLE day_meals_v2
+    MODIFY fk_meal_id BIGINT UNSIGNED NULL,
+    ALGORITHM = INPLACE, LOCK = NONE;
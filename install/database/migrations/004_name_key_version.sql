@@ -0,0 +1,5 @@
+-- Adds the key version of the encrypted user names (authentication.encryption_key_version) to an existing primary database.
+-- Existing names were encrypted with the only key so far, version 1. Adding the column is instant.
+ALTER TABLE users
+    ADD COLUMN name_key_version INT NOT NULL DEFAULT 1,
+    ALGORITHM = INSTANT;
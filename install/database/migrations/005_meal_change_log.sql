@@ -0,0 +1,28 @@
+-- Adds the meal change log tables (database.mealChangeLog) to an existing primary database or shard.
+-- Creating the tables does not touch existing ones; enable database.mealChangeLog afterwards.
+-- Changes are only recorded from then on, so clients start with a full read and sync from sequence number 0.
+CREATE TABLE meal_change_seqs
+(
+    fk_user_id BIGINT UNSIGNED NOT NULL,    -- ID of the user
+    last_seq BIGINT UNSIGNED NOT NULL,      -- Sequence number of the latest change
+    compacted_seq BIGINT UNSIGNED NOT NULL DEFAULT 0, -- Changes up to this sequence number may have been removed
+
+    PRIMARY KEY (fk_user_id)
+) ENGINE = InnoDB;
+
+CREATE TABLE meal_changes
+(
+    fk_user_id BIGINT UNSIGNED NOT NULL,    -- ID of the user
+    seq BIGINT UNSIGNED NOT NULL,           -- Per-user sequence number of the change
+    operation ENUM('insert', 'update', 'delete') NOT NULL,
+    year SMALLINT NOT NULL,                 -- Date of the changed day meal
+    month TINYINT NOT NULL,
+    day TINYINT NOT NULL,
+    fk_meal_type_id BIGINT UNSIGNED NOT NULL, -- Meal type of the changed day meal
+    fat_level TINYINT NULL,                 -- Levels after the change (NULL for deletes)
+    sugar_level TINYINT NULL,
+    changed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    PRIMARY KEY (fk_user_id, seq),
+    KEY idx_meal_changes_day_meal (fk_user_id, year, month, day, fk_meal_type_id, seq)
+) ENGINE = InnoDB;
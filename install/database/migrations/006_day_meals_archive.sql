@@ -0,0 +1,23 @@
+-- Adds the day meal archive (database.archiveHorizonMonths) to an existing primary database or shard.
+-- Creating the table does not touch existing ones; set database.archiveHorizonMonths and run src/tools/archiveMeals.py afterwards.
+-- Partitions p2022 ... cover the years before 2022 as well; split p2022 first if older years should be separate.
+CREATE TABLE day_meals_archive
+(
+    fk_user_id BIGINT UNSIGNED NOT NULL,    -- ID of the user
+    meal_date DATE NOT NULL,                -- Date of the meal
+    fk_meal_type_id BIGINT UNSIGNED NOT NULL, -- ID of the meal type
+    fat_level TINYINT NOT NULL,             -- 0: Low, 1: Medium, 2: High
+    sugar_level TINYINT NOT NULL,           -- 0: Low, 1: Medium, 2: High
+    archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    PRIMARY KEY (fk_user_id, meal_date, fk_meal_type_id)
+) ENGINE = InnoDB ROW_FORMAT = COMPRESSED KEY_BLOCK_SIZE = 8
+PARTITION BY RANGE (YEAR(meal_date))
+(
+    PARTITION p2022 VALUES LESS THAN (2023),
+    PARTITION p2023 VALUES LESS THAN (2024),
+    PARTITION p2024 VALUES LESS THAN (2025),
+    PARTITION p2025 VALUES LESS THAN (2026),
+    PARTITION p2026 VALUES LESS THAN (2027),
+    PARTITION p_future VALUES LESS THAN MAXVALUE
+);
@@ -0,0 +1,23 @@
+-- Optional: partitions day_meals_v2 (schema v2) by year, so queries of recent days only touch recent partitions and old
+-- years can be archived or dropped as a whole. Run it on the primary (without shards) or on every shard.
+-- Only for database.schemaVersion "v2": the API then never uses day_meals anymore.
+-- Partitioned tables cannot have foreign keys, so they are dropped first. The API and the tools delete day meals and
+-- their meals explicitly, so no cascade is needed; meal types are never deleted.
+-- Repartitioning copies the table; run it in a maintenance window or with an online schema change tool for large tables.
+ALTER TABLE day_meals_v2
+    DROP FOREIGN KEY fk_day_meals_v2_meal_type,
+    DROP FOREIGN KEY fk_day_meals_v2_meal;
+-- Only on the primary (the shard layout has no foreign key to users).
+ALTER TABLE day_meals_v2
+    DROP FOREIGN KEY fk_day_meals_v2_user;
+
+ALTER TABLE day_meals_v2
+PARTITION BY RANGE (YEAR(meal_date))
+(
+    PARTITION p2022 VALUES LESS THAN (2023),
+    PARTITION p2023 VALUES LESS THAN (2024),
+    PARTITION p2024 VALUES LESS THAN (2025),
+    PARTITION p2025 VALUES LESS THAN (2026),
+    PARTITION p2026 VALUES LESS THAN (2027),
+    PARTITION p_future VALUES LESS THAN MAXVALUE
+);
@@ -0,0 +1,10 @@
+-- Adds the lookup indexes checked by src/tools/queryPlanCheck.py to an existing primary database.
+-- The indexes are built online. Run 008_query_indexes_shard.sql on every shard.
+-- The days index is not unique, as concurrent writers may already have created the same day twice.
+ALTER TABLE days
+    ADD INDEX idx_days_date (year, month, day),
+    ALGORITHM = INPLACE, LOCK = NONE;
+
+ALTER TABLE meal_types
+    ADD INDEX idx_meal_types_name (name(32)),
+    ALGORITHM = INPLACE, LOCK = NONE;
@@ -0,0 +1,9 @@
+-- Adds the lookup indexes checked by src/tools/queryPlanCheck.py to an existing shard.
+-- The indexes are built online. The days index is not unique, as concurrent writers may already have created the same day twice.
+ALTER TABLE days
+    ADD INDEX idx_days_date (year, month, day),
+    ALGORITHM = INPLACE, LOCK = NONE;
+
+ALTER TABLE meal_types
+    ADD INDEX idx_meal_types_name (name(32)),
+    ALGORITHM = INPLACE, LOCK = NONE;
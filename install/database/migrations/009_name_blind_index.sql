@@ -0,0 +1,11 @@
+-- Adds the user name blind index (authentication.name_blind_index) to an existing primary database.
+-- Adding the column is instant, the index is built online.
+-- Keyed hash of the user name, filled for new users once authentication.name_blind_index is "dual" or "on" and for
+-- existing users by src/tools/backfillNameBlindIndex.py. NULL values do not collide in the unique index.
+ALTER TABLE users
+    ADD COLUMN name_bidx BINARY(32) NULL,
+    ALGORITHM = INSTANT;
+
+ALTER TABLE users
+    ADD UNIQUE INDEX idx_users_name_bidx (name_bidx),
+    ALGORITHM = INPLACE, LOCK = NONE;
@@ -1,654 +1,1742 @@
-# Copyright (C) 2024 Patrick Michiels
-# All rights reserved.
-# This source code is licensed under the Evaluation License Agreement and
-# may not be used, modified, or distributed without explicit permission from the author.
-# This code is provided for evaluation purposes only.
-
-"""
-FastAPI-based module for handling meal tracking API endpoints.
-
-This module provides the core functionality for managing user authentication, registration, 
-and meal tracking operations such as adding, editing, and deleting meals. It uses Pydantic models 
-to validate incoming requests and interacts with a MySQL database using custom repositories.
-
-Module includes:
-    - Authentication (token validation)
-    - User registration and login
-    - Meal operations (add, edit, delete, and retrieve meals)
-    - Fetching available meal types
-
-Dependencies:
-    - FastAPI
-    - Pydantic
-    - Custom imports (databaseWrapper, logger, models like MealItem and GetMealsItem)
-
-Usage example:
-
-    # Import the module
-    from src.utils.databaseWrapper import DatabaseWrapper
-    from src.utils.logger import Logger
-
-    # Initialize components
-    db_wrapper = DatabaseWrapper()
-    logger = Logger()
-
-    # Run the FastAPI app
-    uvicorn.run(app, host="0.0.0.0", port=8000)
-"""
-
-# Public imports.
-from fastapi import FastAPI, Response
-from starlette.middleware import Middleware
-from starlette.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-import json
-import os
-import sys
-
-# Insert path to allow importing own classes and repositories.
-sys.path.insert(1, os.path.join(os.path.dirname(__file__), "src", "utils"))
-sys.path.insert(1, os.path.join(os.path.dirname(__file__), "src", "models"))
-
-# Custom imports for database, logger, and models
-from src.utils.databaseWrapper import DatabaseWrapper
-from src.utils.logger import Logger
-from src.models.authenticationItem import AuthenticationItem
-from src.models.credentialsItem import CredentialsItem
-from src.models.getMealsItem import GetMealsItem
-from src.models.mealItem import MealItem
-from src.models.deleteMealItem import DeleteMealItem
-
-# Configuration setup
-config_file_path = os.path.join(os.path.dirname(__file__), "config.txt")
-with open(config_file_path, 'r') as config_file:
-    config_array = json.load(config_file)
-
-# Initialize database wrapper and logger
-db_wrapper = DatabaseWrapper()
-logger = Logger()
-
-# Instantiate Fast api with Middleware to allow CORS (Options) Requests.
-# Web-Apps in browsers often/ usually send CORS requests as "preflight" to other requests.
-app = FastAPI(middleware=[
-    Middleware(CORSMiddleware, allow_origins=["*"], allow_credentials=True, allow_methods=["*"], allow_headers=["*"])
-])
-
-# Models
-
-class AuthenticationItemPydantic(BaseModel):
-    """
-    Represents authentication data for validation.
-
-    Json model of a valid AuthenticationItem to send to the API:
-    {
-        "token": "<your_actual_token_here>"
-    }
-    """
-    token: str
-
-
-class CredentialsItemPydantic(BaseModel):
-    """
-    Represents credentials for a user.
-
-    Json model of a valid CredentialsItem to send to the API:
-    {
-        "token": "<your_actual_token_here>",
-        "userName": "<your_actual_username_here>",
-        "hashedPassword": "<your_actual_hashed_password_here>"
-    }
-    """
-    token: str
-    userName: str
-    hashedPassword: str
-
-
-class MealItemPydantic(BaseModel):
-    """
-    Represents a meal entry for a specific day and meal type.
-
-    Json model of a valid MealItem to send to the API:
-    {
-        "credentials": {
-            "token": "<your_actual_token_here>",
-            "userName": "<your_actual_username_here>",
-            "hashedPassword": "<your_actual_hashed_password_here>"
-        },
-        "year": 2024,
-        "month": 10,
-        "day": 12,
-        "mealType": "Lunch",
-        "fat_level": 1,
-        "sugar_level": 2
-    }
-    """
-    credentials: CredentialsItemPydantic
-    year: int
-    month: int
-    day: int
-    mealType: str
-    fat_level: int  # 0: Low, 1: Medium, 2: High
-    sugar_level: int  # 0: Low, 1: Medium, 2: High
-
-
-class DeleteMealItemPydantic(BaseModel):
-    """
-    Represents data required to delete a meal.
-
-    Json model of a valid DeleteMealItem to send to the API:
-    {
-        "credentials": {
-            "token": "<your_actual_token_here>",
-            "userName": "<your_actual_username_here>",
-            "hashedPassword": "<your_actual_hashed_password_here>"
-        },
-        "year": 2024,
-        "month": 10,
-        "day": 12,
-        "mealType": "Dinner"
-    }
-    """
-    credentials: CredentialsItemPydantic
-    year: int
-    month: int
-    day: int
-    mealType: str
-
-
-class GetMealsItemPydantic(BaseModel):
-    """
-    Represents the details for fetching meals for a user on a specific day.
-
-    Json model of a valid GetMealsItem to send to the API:
-    {
-        "credentials": {
-            "token": "<your_actual_token_here>",
-            "userName": "<your_actual_username_here>",
-            "hashedPassword": "<your_actual_hashed_password_here>"
-        },
-        "year": 2024,
-        "month": 10,
-        "day": 12
-    }
-    """
-    credentials: CredentialsItemPydantic
-    year: int
-    month: int
-    day: int
-
-
-
-
-# Endpoints.
-@app.get("/")
-async def root_get():
-    """
-    GET / endpoint.
-    Returns a simple message with the project repository URL.
-    Logs the request and sends a 200 OK status with a message.
-    """
-    logger.logInformation("/root_get: 200: called")
-    return {"message": "https://github.com/Sokrates1989/docker_meal_tracker_demo_api_python"}
-
-
-@app.post("/")
-async def root_post():
-    """
-    POST / endpoint.
-    Returns a simple message with the project repository URL.
-    Logs the request and sends a 200 OK status with a message.
-    """
-    logger.logInformation("/root_post: 200: called")
-    return {"message": "https://github.com/Sokrates1989/docker_meal_tracker_demo_api_python"}
-
-
-@app.post("/v1/token")
-async def token(authentication_item: AuthenticationItemPydantic, response: Response):
-    """
-    POST /v1/token endpoint.
-    Validates the provided token and returns a response.
-    """
-    auth_item = convert_pydantic_to_authentication_item(authentication_item)
-    if auth_item.token == config_array["authentication"]["token"]:
-        logger.logInformation(f"/v1/token: 200: valid token: {auth_item}")
-        return {"message": "valid token"}
-    else:
-        response.status_code = 401
-        logger.logWarning(f"/v1/token: 401: invalid token: {auth_item}")
-        return {"message": "invalid token"}
-
-
-@app.post("/v1/register")
-async def register(credentials_item: CredentialsItemPydantic, response: Response):
-    """
-    POST /v1/register endpoint.
-    Registers a new user if token validation passes.
-    """
-    credentials = convert_pydantic_to_credentials_item(credentials_item)
-    if credentials.token == config_array["authentication"]["token"]:
-        create_user_result = db_wrapper.getUserRepo().createNewUser_fromCredentialsItem(credentials)
-        if create_user_result is None:
-            response.status_code = 406
-            logger.logWarning(f"/v1/register: 406: user already exists: {credentials}")
-            return {"message": "user already exists"}
-        elif create_user_result is False:
-            response.status_code = 401
-            logger.logWarning(f"/v1/register: 401: invalid token: {credentials}")
-            return {"message": "invalid token"}
-        else:
-            response.status_code = 200
-            logger.logInformation(f"/v1/register: 200: successfully registered user: {credentials}")
-            return create_user_result
-    else:
-        response.status_code = 401
-        logger.logWarning(f"/v1/register: 401: invalid token: {credentials}")
-        return {"message": "invalid token"}
-
-
-@app.post("/v1/login")
-async def login(credentials_item: CredentialsItemPydantic, response: Response):
-    """
-    POST /v1/login endpoint.
-    Verifies user login credentials.
-    """
-    return login_local(credentials_item, response)
-
-
-
-
-def login_local(credentials_item: CredentialsItemPydantic, response: Response, attempted_update=False):
-    """Handles local login logic."""
-    credentials = convert_pydantic_to_credentials_item(credentials_item)
-    if credentials.token == config_array["authentication"]["token"]:
-        login_result = db_wrapper.getUserRepo().isUserPasswordCorrect(credentials)
-        if login_result is None:
-            if credentials.userName == "" or attempted_update:
-                response.status_code = 406
-                logger.logWarning(f"/v1/login: 406: user does not exist: {credentials}")
-                return {"message": "user does not exist"}
-            else:
-                db_wrapper.updateOwnClassVars()
-                return login_local(credentials_item, response, True)
-        elif login_result is False:
-            response.status_code = 401
-            logger.logWarning(f"/v1/login: 401: invalid token: {credentials}")
-            return {"message": "invalid token"}
-        elif login_result == "invalid password":
-            response.status_code = 401
-            logger.logWarning(f"/v1/login: 401: invalid password: {credentials}")
-            return {"message": "invalid password"}
-        else:
-            user = db_wrapper.getUserRepo().getUserByCredentialsItem(credentials)
-            if user is None:
-                response.status_code = 406
-                logger.logWarning(f"/v1/login: 406: user does not exist: {credentials}")
-                return {"message": "user does not exist"}
-            response.status_code = 200
-            logger.logInformation(f"/v1/login: 200: successfully logged user in: {credentials}")
-            return user
-    else:
-        response.status_code = 401
-        logger.logWarning(f"/v1/login: 401: invalid token: {credentials}")
-        return {"message": "invalid token"}
-
-
-@app.post("/v1/addMeal")
-async def add_meal(meal_item: MealItemPydantic, response: Response):
-    """
-    POST /v1/addMeal endpoint.
-    Adds a new meal entry.
-    """
-    meal = convert_pydantic_to_meal_item(meal_item)
-
-    # Validate token
-    if meal.credentialsItem.token != config_array["authentication"]["token"]:
-        response.status_code = 401
-        logger.logWarning(f"/v1/addMeal: 401: invalid token: {meal.credentialsItem}")
-        return {"message": "invalid token"}
-
-    # Verify user login
-    login_result = db_wrapper.getUserRepo().isUserPasswordCorrect(meal.credentialsItem)
-    if login_result is True:
-        user = db_wrapper.getUserRepo().getUserByCredentialsItem(meal.credentialsItem)
-        if user is None:
-            response.status_code = 406
-            logger.logWarning(f"/v1/addMeal: 406: user does not exist: {meal.credentialsItem}")
-            return {"message": "user does not exist"}
-
-        user_id = user["ID"]
-        day_repo = db_wrapper.getDayRepo()
-        day = day_repo.getDayByDate(meal.year, meal.month, meal.day)
-        if day is None:
-            day = day_repo.createNewDay(meal.year, meal.month, meal.day)
-        day_id = day["ID"]
-
-        meal_type_repo = db_wrapper.getMealTypeRepo()
-        meal_type_id = meal_type_repo.getMealTypeIDByName(meal.mealType.lower())
-        if meal_type_id is None:
-            response.status_code = 400
-            logger.logWarning(f"/v1/addMeal: 400: invalid meal type: {meal.mealType}")
-            return {"message": "invalid meal type"}
-
-        meal_repo = db_wrapper.getMealRepo()
-        new_meal = meal_repo.createNewMeal(meal.fat_level, meal.sugar_level)
-        meal_id = new_meal["ID"]
-
-        day_meal_repo = db_wrapper.getDayMealRepo()
-        day_meal = day_meal_repo.createNewDayMeal(user_id, day_id, meal_type_id, meal_id)
-        if day_meal is None:
-            response.status_code = 400
-            logger.logWarning(f"/v1/addMeal: 400: could not create day meal")
-            return {"message": "Meal already exists. To edit meal use /v1/editMeal"}
-
-        response.status_code = 200
-        logger.logInformation("/v1/addMeal: 200: successfully added meal")
-        return {"message": "successfully added meal"}
-
-    elif login_result is False:
-        response.status_code = 401
-        logger.logWarning(f"/v1/addMeal: 401: invalid token: {meal.credentialsItem}")
-        return {"message": "invalid token"}
-    elif login_result == "invalid password":
-        response.status_code = 401
-        logger.logWarning(f"/v1/addMeal: 401: invalid password: {meal.credentialsItem}")
-        return {"message": "invalid password"}
-    else:
-        response.status_code = 500
-        logger.logError("/v1/addMeal: 500: unhandled return from login method")
-        return {"message": "unhandled return from login method"}
-
-
-@app.post("/v1/editMeal")
-async def edit_meal(meal_item: MealItemPydantic, response: Response):
-    """
-    POST /v1/editMeal endpoint.
-    Edits an existing meal entry.
-    """
-    meal = convert_pydantic_to_meal_item(meal_item)
-
-    # Validate token
-    if meal.credentialsItem.token != config_array["authentication"]["token"]:
-        response.status_code = 401
-        logger.logWarning(f"/v1/editMeal: 401: invalid token: {meal.credentialsItem}")
-        return {"message": "invalid token"}
-
-    # Verify user login
-    login_result = db_wrapper.getUserRepo().isUserPasswordCorrect(meal.credentialsItem)
-    if login_result is True:
-        user = db_wrapper.getUserRepo().getUserByCredentialsItem(meal.credentialsItem)
-        if user is None:
-            response.status_code = 406
-            logger.logWarning(f"/v1/editMeal: 406: user does not exist: {meal.credentialsItem}")
-            return {"message": "user does not exist"}
-
-        user_id = user["ID"]
-        day_repo = db_wrapper.getDayRepo()
-        day = day_repo.getDayByDate(meal.year, meal.month, meal.day)
-        if day is None:
-            response.status_code = 404
-            logger.logWarning("/v1/editMeal: 404: day not found")
-            return {"message": "day not found"}
-        day_id = day["ID"]
-
-        meal_type_repo = db_wrapper.getMealTypeRepo()
-        meal_type_id = meal_type_repo.getMealTypeIDByName(meal.mealType.lower())
-        if meal_type_id is None:
-            response.status_code = 400
-            logger.logWarning(f"/v1/editMeal: 400: invalid meal type: {meal.mealType}")
-            return {"message": "invalid meal type"}
-
-        day_meal_repo = db_wrapper.getDayMealRepo()
-        existing_day_meal = day_meal_repo.getDayMeal(user_id, day_id, meal_type_id)
-        if existing_day_meal is None:
-            response.status_code = 404
-            logger.logWarning("/v1/editMeal: 404: meal not found for the specified day")
-            return {"message": "meal not found for the specified day"}
-
-        meal_id = existing_day_meal["fk_meal_id"]
-        meal_repo = db_wrapper.getMealRepo()
-        update_result = meal_repo.updateMeal(meal_id, meal.fat_level, meal.sugar_level)
-        if update_result is True:
-            response.status_code = 200
-            logger.logInformation("/v1/editMeal: 200: successfully edited meal")
-            return {"message": "successfully edited meal"}
-        else:
-            response.status_code = 500
-            logger.logError("/v1/editMeal: 500: failed to update meal")
-            return {"message": "failed to update meal"}
-
-    elif login_result is False:
-        response.status_code = 401
-        logger.logWarning(f"/v1/editMeal: 401: invalid token: {meal.credentialsItem}")
-        return {"message": "invalid token"}
-    elif login_result == "invalid password":
-        response.status_code = 401
-        logger.logWarning(f"/v1/editMeal: 401: invalid password: {meal.credentialsItem}")
-        return {"message": "invalid password"}
-    else:
-        response.status_code = 500
-        logger.logError("/v1/editMeal: 500: unhandled return from login method")
-        return {"message": "unhandled return from login method"}
-
-
-@app.post("/v1/deleteMeal")
-async def delete_meal(delete_meal_item: DeleteMealItemPydantic, response: Response):
-    """
-    POST /v1/deleteMeal endpoint.
-    Deletes a meal entry.
-    """
-    delete_meal = convert_pydantic_to_delete_meal_item(delete_meal_item)
-
-    # Validate token
-    if delete_meal.credentialsItem.token != config_array["authentication"]["token"]:
-        response.status_code = 401
-        logger.logWarning(f"/v1/deleteMeal: 401: invalid token: {delete_meal.credentialsItem}")
-        return {"message": "invalid token"}
-
-    # Verify user login
-    login_result = db_wrapper.getUserRepo().isUserPasswordCorrect(delete_meal.credentialsItem)
-    if login_result is True:
-        user = db_wrapper.getUserRepo().getUserByCredentialsItem(delete_meal.credentialsItem)
-        if user is None:
-            response.status_code = 406
-            logger.logWarning(f"/v1/deleteMeal: 406: user does not exist: {delete_meal.credentialsItem}")
-            return {"message": "user does not exist"}
-
-        user_id = user["ID"]
-        day_repo = db_wrapper.getDayRepo()
-        day = day_repo.getDayByDate(delete_meal.year, delete_meal.month, delete_meal.day)
-        if day is None:
-            response.status_code = 404
-            logger.logWarning("/v1/deleteMeal: 404: day not found")
-            return {"message": "day not found"}
-        day_id = day["ID"]
-
-        meal_type_repo = db_wrapper.getMealTypeRepo()
-        meal_type_id = meal_type_repo.getMealTypeIDByName(delete_meal.mealType.lower())
-        if meal_type_id is None:
-            response.status_code = 400
-            logger.logWarning(f"/v1/deleteMeal: 400: invalid meal type: {delete_meal.mealType}")
-            return {"message": "invalid meal type"}
-
-        day_meal_repo = db_wrapper.getDayMealRepo()
-        existing_day_meal = day_meal_repo.getDayMeal(user_id, day_id, meal_type_id)
-        if existing_day_meal is None:
-            response.status_code = 404
-            logger.logWarning("/v1/deleteMeal: 404: meal not found for the specified day")
-            return {"message": "meal not found for the specified day"}
-
-        meal_id = existing_day_meal["fk_meal_id"]
-        delete_result = db_wrapper.getMealRepo().deleteMeal(user_id, day_id, meal_type_id, meal_id)
-        if delete_result is True:
-            response.status_code = 200
-            logger.logInformation("/v1/deleteMeal: 200: successfully deleted meal and day_meal entry")
-            return {"message": "successfully deleted meal"}
-        elif delete_result is False:
-            response.status_code = 404
-            logger.logWarning("/v1/deleteMeal: 404: meal or day_meal entry not found")
-            return {"message": "meal or day_meal entry not found"}
-        else:
-            response.status_code = 500
-            logger.logError("/v1/deleteMeal: 500: unknown error occurred during deletion")
-            return {"message": "unknown error occurred"}
-
-    elif login_result is False:
-        response.status_code = 401
-        logger.logWarning(f"/v1/deleteMeal: 401: invalid token: {delete_meal.credentialsItem}")
-        return {"message": "invalid token"}
-    elif login_result == "invalid password":
-        response.status_code = 401
-        logger.logWarning(f"/v1/deleteMeal: 401: invalid password: {delete_meal.credentialsItem}")
-        return {"message": "invalid password"}
-    else:
-        response.status_code = 500
-        logger.logError("/v1/deleteMeal: 500: unhandled return from login method")
-        return {"message": "unhandled return from login method"}
-
-
-@app.post("/v1/getMeals")
-async def get_meals(get_meals_item: GetMealsItemPydantic, response: Response):
-    """
-    POST /v1/getMeals endpoint.
-    Fetches the meal entries for a user on a specific day.
-    """
-    get_meals = convert_pydantic_to_get_meals_item(get_meals_item)
-
-    # Validate token
-    if get_meals.credentialsItem.token != config_array["authentication"]["token"]:
-        response.status_code = 401
-        logger.logWarning(f"/v1/getMeals: 401: invalid token: {get_meals.credentialsItem}")
-        return {"message": "invalid token"}
-
-    # Verify user login
-    login_result = db_wrapper.getUserRepo().isUserPasswordCorrect(get_meals.credentialsItem)
-    if login_result is True:
-        user = db_wrapper.getUserRepo().getUserByCredentialsItem(get_meals.credentialsItem)
-        if user is None:
-            response.status_code = 406
-            logger.logWarning(f"/v1/getMeals: 406: user does not exist: {get_meals.credentialsItem}")
-            return {"message": "user does not exist"}
-
-        user_id = user["ID"]
-        day_repo = db_wrapper.getDayRepo()
-        day = day_repo.getDayByDate(get_meals.year, get_meals.month, get_meals.day)
-        if day is None:
-            # No day exists, meaning no meals exist for that day
-            response.status_code = 200
-            logger.logInformation("/v1/getMeals: 200: empty meal list (no day found)")
-            return {"meals": []}
-        day_id = day["ID"]
-
-        day_meal_repo = db_wrapper.getDayMealRepo()
-        day_meals = day_meal_repo.getDayMealsByUserIDAndDayID(user_id, day_id)
-        meal_list = []
-        meal_type_repo = db_wrapper.getMealTypeRepo()
-        meal_repo = db_wrapper.getMealRepo()
-
-        for day_meal in day_meals:
-            meal_type_id = day_meal["fk_meal_type_id"]
-            meal_id = day_meal["fk_meal_id"]
-
-            meal_type_name = meal_type_repo.getMealTypeNameByID(meal_type_id)
-            if meal_type_name is None:
-                continue
-
-            meal = meal_repo.getMealByID(meal_id)
-            if meal is None:
-                continue
-
-            meal_info = {
-                "year": get_meals.year,
-                "month": get_meals.month,
-                "day": get_meals.day,
-                "mealType": meal_type_name,
-                "fat_level": meal["fat_level"],
-                "sugar_level": meal["sugar_level"],
-            }
-            meal_list.append(meal_info)
-
-        response.status_code = 200
-        logger.logInformation("/v1/getMeals: 200: successfully retrieved meals")
-        return {"meals": meal_list}
-
-
-@app.post("/v1/getMealTypes")
-async def get_meal_types(credentials: CredentialsItemPydantic, response: Response):
-    """
-    POST /v1/getMealTypes endpoint.
-    Fetches all available meal types.
-    """
-    try:
-        # Validate token
-        if credentials.token != config_array["authentication"]["token"]:
-            response.status_code = 401
-            logger.logWarning("/v1/getMealTypes: 401: invalid token")
-            return {"message": "invalid token"}
-
-        # Fetch meal types
-        meal_types = db_wrapper.getMealTypeRepo().getAllMealTypes()
-        if meal_types is None:
-            response.status_code = 500
-            logger.logError("/v1/getMealTypes: 500: error fetching meal types")
-            return {"message": "error fetching meal types"}
-
-        response.status_code = 200
-        logger.logInformation("/v1/getMealTypes: 200: successfully fetched meal types")
-        return {"mealTypes": meal_types}
-
-    except Exception as e:
-        response.status_code = 500
-        logger.logError(f"/v1/getMealTypes: 500: unhandled exception: {str(e)}")
-        return {"message": "unhandled exception"}
-
-
-
-# Helper functions for converting Pydantic models to internal models
-def convert_pydantic_to_authentication_item(auth_pydantic: AuthenticationItemPydantic):
-    """Converts a Pydantic AuthenticationItem model to the internal AuthenticationItem."""
-    return AuthenticationItem(auth_pydantic.token)
-
-
-def convert_pydantic_to_credentials_item(credentials_pydantic: CredentialsItemPydantic):
-    """Converts a Pydantic CredentialsItem model to the internal CredentialsItem."""
-    return CredentialsItem(
-        credentials_pydantic.token,
-        credentials_pydantic.userName,
-        credentials_pydantic.hashedPassword
-    )
-
-
-def convert_pydantic_to_meal_item(meal_pydantic: MealItemPydantic):
-    """Converts a Pydantic MealItem model to the internal MealItem."""
-    credentials_item = convert_pydantic_to_credentials_item(meal_pydantic.credentials)
-    return MealItem(
-        credentials_item,
-        meal_pydantic.year,
-        meal_pydantic.month,
-        meal_pydantic.day,
-        meal_pydantic.mealType,
-        meal_pydantic.fat_level,
-        meal_pydantic.sugar_level
-    )
-
-
-def convert_pydantic_to_delete_meal_item(delete_meal_pydantic: DeleteMealItemPydantic):
-    """Converts a Pydantic DeleteMealItem model to the internal DeleteMealItem."""
-    credentials_item = convert_pydantic_to_credentials_item(delete_meal_pydantic.credentials)
-    return DeleteMealItem(
-        credentials_item,
-        delete_meal_pydantic.year,
-        delete_meal_pydantic.month,
-        delete_meal_pydantic.day,
-        delete_meal_pydantic.mealType
-    )
-
-
-def convert_pydantic_to_get_meals_item(get_meals_pydantic: GetMealsItemPydantic):
-    """Converts a Pydantic GetMealsItem model to the internal GetMealsItem."""
-    credentials_item = convert_pydantic_to_credentials_item(get_meals_pydantic.credentials)
-    return GetMealsItem(
-        credentials_item,
-        get_meals_pydantic.year,
-        get_meals_pydantic.month,
-        get_meals_pydantic.day
-    )
+# Copyright (C) 2024 Patrick Michiels
+# All rights reserved.
+# This source code is licensed under the Evaluation License Agreement and
+# may not be used, modified, or distributed without explicit permission from the author.
+# This code is provided for evaluation purposes only.
+
+"""
+FastAPI-based module for handling meal tracking API endpoints.
+
+This module provides the core functionality for managing user authentication, registration, 
+and meal tracking operations such as adding, editing, and deleting meals. It uses Pydantic models 
+to validate incoming requests and interacts with a MySQL database using custom repositories.
+
+Module includes:
+    - Authentication (token validation)
+    - User registration and login
+    - Meal operations (add, edit, delete, and retrieve meals)
+    - Fetching available meal types
+
+Dependencies:
+    - FastAPI
+    - Pydantic
+    - Custom imports (databaseWrapper, logger, models like MealItem and GetMealsItem)
+
+Usage example:
+
+    # Run the FastAPI app; the database wrapper and logger are created per worker process by lifespan()
+    uvicorn.run(app, host="0.0.0.0", port=8000)
+
+    # Or with several worker processes (from a shell)
+    uvicorn main_api_startpoint:app --host 0.0.0.0 --port 8000 --workers 4
+"""
+
+# Measure the cold start of this worker from the first import on (see the startup report logged once it is ready).
+import time
+from src.utils.startupTimer import StartupTimer
+startup_timer = StartupTimer()
+
+# Public imports.
+from fastapi import FastAPI, Response, Header
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from pydantic import BaseModel
+from contextlib import asynccontextmanager
+import asyncio
+import base64
+import calendar
+import datetime
+import hmac
+import json
+import multiprocessing
+import os
+
+# Custom imports for database, logger, and models
+from src.utils.configLoader import loadConfig
+from src.utils.databaseWrapper import DatabaseWrapper
+from src.utils.logger import Logger
+from src.utils.versionTracker import VersionTracker
+from src.utils.rateLimiter import RateLimiter, RateLimitMiddleware
+from src.utils.singleFlight import SingleFlight
+from src.utils.passwordHasher import PasswordHasher, PasswordHasherBusyError
+from src.utils.readinessGate import ReadinessGate, ReadinessGateMiddleware
+from src.utils.readinessProbe import ReadinessProbe
+from src.utils.inFlightTracker import InFlightTracker, InFlightMiddleware
+from src.utils.samplingProfiler import SamplingProfiler, ProfilingMiddleware
+from src.utils.tracing import Tracer, TracingMiddleware, span
+from src.utils.sharedCache import SharedCache
+from src.utils.changeBroker import ChangeBroker, ChangeBrokerLimitError
+from src.utils.idempotencyStore import IdempotencyStore, IdempotencyKeyConflictError
+from src.utils.repositories.dayMealRepo import DayMealRepo
+from src.models.authenticationItem import AuthenticationItem
+from src.models.credentialsItem import CredentialsItem
+from src.models.getMealsItem import GetMealsItem
+from src.models.mealItem import MealItem
+from src.models.deleteMealItem import DeleteMealItem
+
+startup_timer.record("import", time.perf_counter() - startup_timer.startedAt)
+
+# Configuration setup
+with startup_timer.measure("config"):
+    config_array = loadConfig()
+startup_config = config_array.get("startup", {})
+startup_timer.budgetSeconds = startup_config.get("budgetSeconds", 2.0)
+
+# Per-worker resources, created by lifespan() once the worker process is running and closed on its shutdown,
+# so no database connection is opened at import time or shared between forked worker processes.
+db_wrapper = None
+logger = None
+
+# Versions per user/day and for the meal types, used to answer conditional reads (If-None-Match) with 304.
+version_tracker = VersionTracker(config_array.get("etag", {}).get("maxTrackedEntries", 100000))
+MEAL_TYPES_VERSION_KEY = ("mealTypes",)
+# The versions live in process memory, so meal reads only answer 304 with a single worker (see lifespan()).
+conditional_meal_reads = True
+
+# Coalesces identical concurrent meal reads into one in-flight query chain (see getStatistics() for the counters).
+meal_reads_single_flight = SingleFlight()
+
+# Verified users and meal lists per user/day shared by all nodes, invalidated on writes (None if disabled).
+shared_cache = SharedCache.fromConfig(config_array)
+
+# Fan-out of meal changes to the open /v1/mealEvents streams of the user.
+meal_events_config = config_array.get("mealEvents", {})
+change_broker = ChangeBroker.fromConfig(config_array)
+
+# Responses of add/edit/delete requests by Idempotency-Key, replayed for retries (None if disabled).
+idempotency_store = IdempotencyStore.fromConfig(config_array)
+
+# Per-user and per-token budgets (None if rate limiting is disabled).
+rate_limiter = RateLimiter.fromConfig(config_array)
+
+# Durable journal of add/edit writes flushed to the database in batches (None if write-behind is disabled).
+# Created per worker by lifespan(); every worker process writes its own journal file.
+write_behind_config = config_array.get("writeBehind", {})
+write_behind_buffer = None
+
+# Server-side KDF hashing of the client's hashedPassword, run in a bounded process pool (started on first use).
+password_hasher = PasswordHasher.fromConfig(config_array)
+
+# The database is connected in the background after startup; until then only the open paths are served.
+readiness_gate = ReadinessGate(startup_config.get("readinessRetrySeconds", 1.0))
+READINESS_OPEN_PATHS = {"/", "/docs", "/openapi.json", "/v1/token", "/healthz", "/readyz"}
+
+# Requests in flight, drained on shutdown before the resources are closed. The health checks stay open while draining.
+shutdown_config = config_array.get("shutdown", {})
+in_flight_tracker = InFlightTracker()
+DRAINING_OPEN_PATHS = {"/healthz", "/readyz"}
+
+# Answers /readyz; the checks run at most once per health.readyCacheSeconds.
+health_config = config_array.get("health", {})
+readiness_probe = ReadinessProbe(
+    {"database": lambda: ping_database()},
+    lambda: collect_readiness_diagnostics(),
+    health_config.get("readyCacheSeconds", 1.0),
+    health_config.get("databaseTimeoutSeconds", 1.0)
+)
+
+# On-demand stack sampling, started by the admin profiler endpoints; idle (no thread running) otherwise.
+profiler_config = config_array.get("profiler", {})
+sampling_profiler = SamplingProfiler(profiler_config.get("maxDistinctStacks", 10000), profiler_config.get("maxSeconds", 600))
+
+# Spans per request, repository call and SQL statement, appended as OTLP/JSON lines (None if tracing is disabled).
+tracer = Tracer.fromConfig(config_array, os.path.join(os.path.dirname(__file__), "traces", "spans.jsonl"))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Creates the per-worker resources on startup and closes them on shutdown.
+
+    Every worker process (uvicorn --workers, gunicorn with uvicorn workers) runs its own lifespan after it started,
+    so each worker opens its own database connections and journal. The database is connected in the background
+    (see readiness_gate), so the worker starts serving without waiting for it.
+    """
+    global db_wrapper, logger, write_behind_buffer, conditional_meal_reads
+    with startup_timer.measure("logger"):
+        logger = Logger()
+    with startup_timer.measure("database"):
+        db_wrapper = DatabaseWrapper(connect=False)
+    if is_multi_worker():
+        # A write on another worker neither bumps this worker's ETag versions nor pins its read sessions.
+        conditional_meal_reads = False
+        db_wrapper.readSessions = False
+        logger.logInformation(f"lifespan: worker {os.getpid()}: several workers, meal ETags and read sessions are off")
+    if write_behind_config.get("enabled", False) and is_multi_worker():
+        # Pending writes are only visible to the worker that took them, so other workers would serve stale reads.
+        logger.logWarning("write-behind: disabled, as it needs a single worker per container (API_WORKERS=1)")
+    elif write_behind_config.get("enabled", False):
+        # Imported only when enabled, so workers without write-behind do not pay for it.
+        from src.utils.writeBehindBuffer import WriteBehindBuffer
+        write_behind_buffer = WriteBehindBuffer(
+            db_wrapper,
+            logger,
+            write_behind_config.get("journalDirectory", os.path.join(os.path.dirname(__file__), "journal")),
+            write_behind_config.get("flushIntervalSeconds", 1.0),
+            write_behind_config.get("maxBatchSize", 200)
+        )
+        # Starts flushing buffered writes (including the ones replayed from crashed journals).
+        with startup_timer.measure("writeBehind"):
+            write_behind_buffer.start()
+    if shared_cache is not None:
+        # Every worker receives the invalidations of all nodes on its own subscription.
+        shared_cache.start()
+    change_broker.start()
+    readiness_gate.start(db_wrapper.checkReachable, report_startup)
+    logger.logInformation(f"lifespan: worker {os.getpid()} started")
+
+    try:
+        yield
+    finally:
+        readiness_gate.stop()
+        sampling_profiler.stop()
+
+        # End the open event streams, so they do not hold up draining.
+        change_broker.close()
+
+        # Reject new requests and let the running ones finish, up to the deadline.
+        in_flight_tracker.beginDraining()
+        shutdown_report = await in_flight_tracker.waitUntilIdle(shutdown_config.get("drainTimeoutSeconds", 10.0))
+
+        # Flush all buffered writes before the connections are closed.
+        shutdown_report["writeBehindPending"] = 0
+        if write_behind_buffer is not None:
+            still_pending = write_behind_buffer.stop()
+            shutdown_report["writeBehindPending"] = still_pending
+            if still_pending:
+                logger.logWarning(f"write-behind: {still_pending} writes still pending, they are replayed on next start")
+        password_hasher.close()
+        if rate_limiter is not None:
+            rate_limiter.close()
+        if shared_cache is not None:
+            shared_cache.close()
+        if tracer is not None and not tracer.close(shutdown_config.get("logFlushTimeoutSeconds", 5.0)):
+            logger.logWarning(f"lifespan: worker {os.getpid()}: not all traces could be written before exiting")
+        shutdown_report["closedConnections"] = sum(target["openConnections"] for target in db_wrapper.getStatistics()["targets"].values())
+        db_wrapper.close()
+
+        if shutdown_report["aborted"] or shutdown_report["writeBehindPending"]:
+            logger.logWarning(f"lifespan: worker {os.getpid()} stopped: {shutdown_report}")
+        else:
+            logger.logInformation(f"lifespan: worker {os.getpid()} stopped: {shutdown_report}")
+        if not logger.flush(shutdown_config.get("logFlushTimeoutSeconds", 5.0)):
+            print(f"lifespan: worker {os.getpid()}: {logger.getBacklog()} log entries could not be written before exiting")
+
+
+# Instantiate Fast api with Middleware to allow CORS (Options) Requests.
+# Web-Apps in browsers often/ usually send CORS requests as "preflight" to other requests.
+# Requests exceeding their rate limit are rejected with 429 before they reach the database.
+app = FastAPI(lifespan=lifespan, middleware=[
+    Middleware(InFlightMiddleware, inFlightTracker=in_flight_tracker, openPaths=DRAINING_OPEN_PATHS),
+    *([Middleware(TracingMiddleware, tracer=tracer)] if tracer is not None else []),
+    Middleware(CORSMiddleware, allow_origins=["*"], allow_credentials=True, allow_methods=["*"], allow_headers=["*"]),
+    Middleware(ReadinessGateMiddleware, readinessGate=readiness_gate, openPaths=READINESS_OPEN_PATHS),
+    Middleware(RateLimitMiddleware, rateLimiter=rate_limiter, getLogger=lambda: logger),
+    Middleware(ProfilingMiddleware, profiler=sampling_profiler)
+])
+
+
+# Models
+
+class AuthenticationItemPydantic(BaseModel):
+    """
+    Represents authentication data for validation.
+
+    Json model of a valid AuthenticationItem to send to the API:
+    {
+        "token": "<your_actual_token_here>"
+    }
+    """
+    token: str
+
+
+class CredentialsItemPydantic(BaseModel):
+    """
+    Represents credentials for a user.
+
+    Json model of a valid CredentialsItem to send to the API:
+    {
+        "token": "<your_actual_token_here>",
+        "userName": "<your_actual_username_here>",
+        "hashedPassword": "<your_actual_hashed_password_here>"
+    }
+    """
+    token: str
+    userName: str
+    hashedPassword: str
+
+
+class MealItemPydantic(BaseModel):
+    """
+    Represents a meal entry for a specific day and meal type.
+
+    Json model of a valid MealItem to send to the API:
+    {
+        "credentials": {
+            "token": "<your_actual_token_here>",
+            "userName": "<your_actual_username_here>",
+            "hashedPassword": "<your_actual_hashed_password_here>"
+        },
+        "year": 2024,
+        "month": 10,
+        "day": 12,
+        "mealType": "Lunch",
+        "fat_level": 1,
+        "sugar_level": 2
+    }
+    """
+    credentials: CredentialsItemPydantic
+    year: int
+    month: int
+    day: int
+    mealType: str
+    fat_level: int  # 0: Low, 1: Medium, 2: High
+    sugar_level: int  # 0: Low, 1: Medium, 2: High
+
+
+class DeleteMealItemPydantic(BaseModel):
+    """
+    Represents data required to delete a meal.
+
+    Json model of a valid DeleteMealItem to send to the API:
+    {
+        "credentials": {
+            "token": "<your_actual_token_here>",
+            "userName": "<your_actual_username_here>",
+            "hashedPassword": "<your_actual_hashed_password_here>"
+        },
+        "year": 2024,
+        "month": 10,
+        "day": 12,
+        "mealType": "Dinner"
+    }
+    """
+    credentials: CredentialsItemPydantic
+    year: int
+    month: int
+    day: int
+    mealType: str
+
+
+class GetMealsItemPydantic(BaseModel):
+    """
+    Represents the details for fetching meals for a user on a specific day.
+
+    Json model of a valid GetMealsItem to send to the API:
+    {
+        "credentials": {
+            "token": "<your_actual_token_here>",
+            "userName": "<your_actual_username_here>",
+            "hashedPassword": "<your_actual_hashed_password_here>"
+        },
+        "year": 2024,
+        "month": 10,
+        "day": 12
+    }
+    """
+    credentials: CredentialsItemPydantic
+    year: int
+    month: int
+    day: int
+
+
+class GetMonthOverviewItemPydantic(BaseModel):
+    """
+    Represents the details for fetching the meal overview of a user for a month or a year.
+
+    Json model of a valid GetMonthOverviewItem to send to the API:
+    {
+        "credentials": {
+            "token": "<your_actual_token_here>",
+            "userName": "<your_actual_username_here>",
+            "hashedPassword": "<your_actual_hashed_password_here>"
+        },
+        "year": 2024,
+        "month": 10,
+        "includeLevels": true
+    }
+    """
+    credentials: CredentialsItemPydantic
+    year: int
+    month: int = 0  # 0: the whole year
+    includeLevels: bool = False
+
+
+class AdminListUsersItemPydantic(BaseModel):
+    """
+    Represents one page request of the admin user listing.
+
+    Json model of a valid AdminListUsersItem to send to the API:
+    {
+        "token": "<your_actual_admin_token_here>",
+        "afterID": 0,
+        "pageSize": 1000
+    }
+    """
+    token: str
+    afterID: int = 0  # nextAfterID of the previous page, 0 for the first page
+    pageSize: int = 0  # 0: adminListing.pageSize of the config
+
+
+class AdminProfilerStartItemPydantic(BaseModel):
+    """
+    Represents the start of a profiling session.
+
+    Json model of a valid AdminProfilerStartItem to send to the API:
+    {
+        "token": "<your_actual_admin_token_here>",
+        "mode": "requests",
+        "seconds": 60,
+        "fraction": 0.1,
+        "pathPrefix": "/v1/getMeals",
+        "intervalMs": 0
+    }
+    """
+    token: str
+    mode: str = "requests"  # "requests": only while selected requests run, "window": continuously
+    seconds: float = 60
+    fraction: float = 1.0  # share of the matching requests profiled in "requests" mode
+    pathPrefix: str = ""
+    intervalMs: float = 0  # 0: profiler.intervalMs of the config
+
+
+class AdminTokenItemPydantic(BaseModel):
+    """
+    Represents an admin request without parameters.
+
+    Json model of a valid AdminTokenItem to send to the API:
+    {
+        "token": "<your_actual_admin_token_here>"
+    }
+    """
+    token: str
+
+
+
+
+# Endpoints.
+@app.get("/")
+async def root_get():
+    """
+    GET / endpoint.
+    Returns a simple message with the project repository URL.
+    Logs the request and sends a 200 OK status with a message.
+    """
+    logger.logInformation("/root_get: 200: called")
+    return {"message": "https://github.com/Sokrates1989/docker_meal_tracker_demo_api_python"}
+
+
+@app.post("/")
+async def root_post():
+    """
+    POST / endpoint.
+    Returns a simple message with the project repository URL.
+    Logs the request and sends a 200 OK status with a message.
+    """
+    logger.logInformation("/root_post: 200: called")
+    return {"message": "https://github.com/Sokrates1989/docker_meal_tracker_demo_api_python"}
+
+
+@app.get("/healthz")
+async def healthz():
+    """
+    GET /healthz endpoint.
+    Liveness probe: answers 200 as long as the worker can serve requests. Does no I/O and does not log.
+    """
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz(response: Response):
+    """
+    GET /readyz endpoint.
+    Readiness probe: pings the database with a timeout and reports connection, hashing pool, log writer and cache
+    diagnostics. The result is cached for health.readyCacheSeconds, so probe storms add no database load.
+    Answers 503 while the worker is not ready or shutting down.
+    """
+    if in_flight_tracker.draining:
+        response.status_code = 503
+        return {"status": "draining", "inFlight": in_flight_tracker.getInFlightCount()}
+    ready, body = await readiness_probe.check()
+    response.status_code = 200 if ready else 503
+    return body
+
+
+@app.post("/v1/token")
+async def token(authentication_item: AuthenticationItemPydantic, response: Response):
+    """
+    POST /v1/token endpoint.
+    Validates the provided token and returns a response.
+    """
+    auth_item = convert_pydantic_to_authentication_item(authentication_item)
+    if auth_item.token == config_array["authentication"]["token"]:
+        logger.logInformation(f"/v1/token: 200: valid token: {auth_item}")
+        return {"message": "valid token"}
+    else:
+        response.status_code = 401
+        logger.logWarning(f"/v1/token: 401: invalid token: {auth_item}")
+        return {"message": "invalid token"}
+
+
+@app.post("/v1/register")
+async def register(credentials_item: CredentialsItemPydantic, response: Response):
+    """
+    POST /v1/register endpoint.
+    Registers a new user if token validation passes.
+    """
+    credentials = convert_pydantic_to_credentials_item(credentials_item)
+    if credentials.token == config_array["authentication"]["token"]:
+        # Route reads of this write request to the primary.
+        db_wrapper.beginReadSession(credentials.userName)
+        db_wrapper.pinReadsToPrimary()
+        try:
+            hashed_password = await password_hasher.hashPassword(credentials.hashedPassword)
+        except PasswordHasherBusyError:
+            return reject_busy_password_hashing("/v1/register", response)
+        create_user_result = db_wrapper.getUserRepo().createNewUser(credentials.userName, hashed_password)
+        if create_user_result is None:
+            response.status_code = 406
+            logger.logWarning(f"/v1/register: 406: user already exists: {credentials}")
+            return {"message": "user already exists"}
+        elif create_user_result is False:
+            response.status_code = 401
+            logger.logWarning(f"/v1/register: 401: invalid token: {credentials}")
+            return {"message": "invalid token"}
+        else:
+            response.status_code = 200
+            logger.logInformation(f"/v1/register: 200: successfully registered user: {credentials}")
+            return hide_stored_password_hash(create_user_result, credentials)
+    else:
+        response.status_code = 401
+        logger.logWarning(f"/v1/register: 401: invalid token: {credentials}")
+        return {"message": "invalid token"}
+
+
+@app.post("/v1/deleteUser")
+async def delete_user(credentials_item: CredentialsItemPydantic, response: Response):
+    """
+    POST /v1/deleteUser endpoint.
+    Deletes the user and all its meals.
+
+    The user is locked out first, then its data is deleted in small batches (purge.batchSize rows per transaction,
+    purge.pauseSeconds apart) in a worker thread, so large accounts never hold locks other users wait for.
+    If the purge fails, sending the request again is not possible anymore; run `src.tools.purgeUser` to finish it.
+    """
+    credentials = convert_pydantic_to_credentials_item(credentials_item)
+
+    # Validate token
+    if credentials.token != config_array["authentication"]["token"]:
+        response.status_code = 401
+        logger.logWarning(f"/v1/deleteUser: 401: invalid token: {credentials}")
+        return {"message": "invalid token"}
+
+    # Route reads of this write request to the primary.
+    db_wrapper.beginReadSession(credentials.userName)
+    db_wrapper.pinReadsToPrimary()
+
+    # Verify user login
+    login_result = await verify_user_credentials(credentials)
+    if login_result is True:
+        user_id = db_wrapper.getUserRepo().getUserIDByCredentialsItem(credentials)
+        if user_id is None:
+            response.status_code = 406
+            logger.logWarning(f"/v1/deleteUser: 406: user does not exist: {credentials}")
+            return {"message": "user does not exist"}
+
+        if db_wrapper.useShardOfUser(user_id)["is_moving"]:
+            response.status_code = 503
+            response.headers["Retry-After"] = "5"
+            logger.logWarning(f"/v1/deleteUser: 503: meal data of user is being moved: {credentials}")
+            return {"message": "meal data is being moved, retry shortly"}
+
+        # Buffered writes must reach the database before it, so none outlives the purge.
+        if write_behind_buffer is not None:
+            write_behind_buffer.flushAll()
+
+        purge_config = config_array.get("purge", {})
+        report = await asyncio.to_thread(
+            db_wrapper.getUserRepo().purgeUser, user_id, purge_config.get("batchSize", 500), purge_config.get("pauseSeconds", 0.05)
+        )
+        if shared_cache is not None:
+            shared_cache.invalidate(f"user:{get_cache_digest(credentials.userName)}")
+        # ETags issued for the deleted meals must not match a re-registered user of the same name.
+        version_tracker.evictKeysWithPrefix(get_meals_version_prefix(credentials.userName))
+        if report is None:
+            response.status_code = 500
+            logger.logError(f"/v1/deleteUser: 500: purge of user {user_id} incomplete, finish it with src.tools.purgeUser")
+            return {"message": "user is locked out, deleting its data did not complete"}
+
+        response.status_code = 200
+        logger.logInformation(f"/v1/deleteUser: 200: successfully deleted user {user_id} with {report['dayMeals']} day meals")
+        return {"message": "successfully deleted user"}
+
+    elif login_result is False:
+        response.status_code = 401
+        logger.logWarning(f"/v1/deleteUser: 401: invalid token: {credentials}")
+        return {"message": "invalid token"}
+    elif login_result == "invalid password":
+        response.status_code = 401
+        logger.logWarning(f"/v1/deleteUser: 401: invalid password: {credentials}")
+        return {"message": "invalid password"}
+    elif login_result == "busy":
+        return reject_busy_password_hashing("/v1/deleteUser", response)
+    elif login_result is None:
+        response.status_code = 406
+        logger.logWarning(f"/v1/deleteUser: 406: user does not exist: {credentials}")
+        return {"message": "user does not exist"}
+    else:
+        response.status_code = 500
+        logger.logError("/v1/deleteUser: 500: unhandled return from login method")
+        return {"message": "unhandled return from login method"}
+
+
+@app.post("/v1/login")
+async def login(credentials_item: CredentialsItemPydantic, response: Response):
+    """
+    POST /v1/login endpoint.
+    Verifies user login credentials.
+    """
+    return await login_local(credentials_item, response)
+
+
+
+
+async def login_local(credentials_item: CredentialsItemPydantic, response: Response, attempted_update=False):
+    """Handles local login logic."""
+    credentials = convert_pydantic_to_credentials_item(credentials_item)
+    if credentials.token == config_array["authentication"]["token"]:
+        db_wrapper.beginReadSession(credentials.userName)
+        login_result = await verify_user_credentials(credentials)
+        if login_result is None:
+            if credentials.userName == "" or attempted_update:
+                response.status_code = 406
+                logger.logWarning(f"/v1/login: 406: user does not exist: {credentials}")
+                return {"message": "user does not exist"}
+            else:
+                db_wrapper.updateOwnClassVars()
+                return await login_local(credentials_item, response, True)
+        elif login_result is False:
+            response.status_code = 401
+            logger.logWarning(f"/v1/login: 401: invalid token: {credentials}")
+            return {"message": "invalid token"}
+        elif login_result == "invalid password":
+            response.status_code = 401
+            logger.logWarning(f"/v1/login: 401: invalid password: {credentials}")
+            return {"message": "invalid password"}
+        elif login_result == "busy":
+            return reject_busy_password_hashing("/v1/login", response)
+        else:
+            user = db_wrapper.getUserRepo().getUserByCredentialsItem(credentials)
+            if user is None:
+                response.status_code = 406
+                logger.logWarning(f"/v1/login: 406: user does not exist: {credentials}")
+                return {"message": "user does not exist"}
+            response.status_code = 200
+            logger.logInformation(f"/v1/login: 200: successfully logged user in: {credentials}")
+            return hide_stored_password_hash(user, credentials)
+    else:
+        response.status_code = 401
+        logger.logWarning(f"/v1/login: 401: invalid token: {credentials}")
+        return {"message": "invalid token"}
+
+
+@app.post("/v1/addMeal")
+async def add_meal(meal_item: MealItemPydantic, response: Response, idempotency_key: str = Header(None)):
+    """
+    POST /v1/addMeal endpoint.
+    Adds a new meal entry.
+
+    Retries sent with the same `Idempotency-Key` header get the response of the first request without running again.
+    """
+    return await run_idempotently("/v1/addMeal", idempotency_key, meal_item, meal_item.credentials, response, add_meal_local)
+
+
+async def add_meal_local(meal_item: MealItemPydantic, response: Response):
+    """Handles adding a meal."""
+    meal = convert_pydantic_to_meal_item(meal_item)
+
+    # Validate token
+    if meal.credentialsItem.token != config_array["authentication"]["token"]:
+        response.status_code = 401
+        logger.logWarning(f"/v1/addMeal: 401: invalid token: {meal.credentialsItem}")
+        return {"message": "invalid token"}
+
+    # Route reads of this write request to the primary.
+    db_wrapper.beginReadSession(meal.credentialsItem.userName)
+    db_wrapper.pinReadsToPrimary()
+
+    # Verify user login
+    login_result = await verify_user_credentials(meal.credentialsItem)
+    if login_result is True:
+        user = db_wrapper.getUserRepo().getUserByCredentialsItem(meal.credentialsItem)
+        if user is None:
+            response.status_code = 406
+            logger.logWarning(f"/v1/addMeal: 406: user does not exist: {meal.credentialsItem}")
+            return {"message": "user does not exist"}
+
+        user_id = user["ID"]
+
+        # Select the shard holding the user's meals, rejecting writes while they are moved to another shard.
+        if db_wrapper.useShardOfUser(user_id)["is_moving"]:
+            response.status_code = 503
+            response.headers["Retry-After"] = "5"
+            logger.logWarning(f"/v1/addMeal: 503: meal data of user is being moved: {meal.credentialsItem}")
+            return {"message": "meal data is being moved, retry shortly"}
+
+        if not is_valid_date(meal.year, meal.month, meal.day):
+            response.status_code = 400
+            logger.logWarning(f"/v1/addMeal: 400: invalid date: {meal.year}-{meal.month}-{meal.day}")
+            return {"message": "invalid date"}
+
+        if write_behind_buffer is not None:
+            return buffer_meal_write("/v1/addMeal", "add", user_id, meal, response)
+
+        meal_type_repo = db_wrapper.getMealTypeRepo()
+        meal_type_id = meal_type_repo.getMealTypeIDByName(meal.mealType.lower())
+        if meal_type_id is None:
+            response.status_code = 400
+            logger.logWarning(f"/v1/addMeal: 400: invalid meal type: {meal.mealType}")
+            return {"message": "invalid meal type"}
+
+        day_meal_repo = db_wrapper.getDayMealRepo()
+        day_meal = day_meal_repo.createNewDayMealByDate(user_id, meal.year, meal.month, meal.day, meal_type_id, meal.fat_level, meal.sugar_level)
+        if day_meal is None:
+            response.status_code = 400
+            logger.logWarning(f"/v1/addMeal: 400: could not create day meal")
+            return {"message": "Meal already exists. To edit meal use /v1/editMeal"}
+
+        record_meals_changed(meal.credentialsItem.userName, user_id, meal.year, meal.month, meal.day, "add", meal.mealType)
+        response.status_code = 200
+        logger.logInformation("/v1/addMeal: 200: successfully added meal")
+        return {"message": "successfully added meal"}
+
+    elif login_result is False:
+        response.status_code = 401
+        logger.logWarning(f"/v1/addMeal: 401: invalid token: {meal.credentialsItem}")
+        return {"message": "invalid token"}
+    elif login_result == "invalid password":
+        response.status_code = 401
+        logger.logWarning(f"/v1/addMeal: 401: invalid password: {meal.credentialsItem}")
+        return {"message": "invalid password"}
+    elif login_result == "busy":
+        return reject_busy_password_hashing("/v1/addMeal", response)
+    else:
+        response.status_code = 500
+        logger.logError("/v1/addMeal: 500: unhandled return from login method")
+        return {"message": "unhandled return from login method"}
+
+
+@app.post("/v1/editMeal")
+async def edit_meal(meal_item: MealItemPydantic, response: Response, idempotency_key: str = Header(None)):
+    """
+    POST /v1/editMeal endpoint.
+    Edits an existing meal entry.
+
+    Retries sent with the same `Idempotency-Key` header get the response of the first request without running again.
+    """
+    return await run_idempotently("/v1/editMeal", idempotency_key, meal_item, meal_item.credentials, response, edit_meal_local)
+
+
+async def edit_meal_local(meal_item: MealItemPydantic, response: Response):
+    """Handles editing a meal."""
+    meal = convert_pydantic_to_meal_item(meal_item)
+
+    # Validate token
+    if meal.credentialsItem.token != config_array["authentication"]["token"]:
+        response.status_code = 401
+        logger.logWarning(f"/v1/editMeal: 401: invalid token: {meal.credentialsItem}")
+        return {"message": "invalid token"}
+
+    # Route reads of this write request to the primary.
+    db_wrapper.beginReadSession(meal.credentialsItem.userName)
+    db_wrapper.pinReadsToPrimary()
+
+    # Verify user login
+    login_result = await verify_user_credentials(meal.credentialsItem)
+    if login_result is True:
+        user = db_wrapper.getUserRepo().getUserByCredentialsItem(meal.credentialsItem)
+        if user is None:
+            response.status_code = 406
+            logger.logWarning(f"/v1/editMeal: 406: user does not exist: {meal.credentialsItem}")
+            return {"message": "user does not exist"}
+
+        user_id = user["ID"]
+
+        # Select the shard holding the user's meals, rejecting writes while they are moved to another shard.
+        if db_wrapper.useShardOfUser(user_id)["is_moving"]:
+            response.status_code = 503
+            response.headers["Retry-After"] = "5"
+            logger.logWarning(f"/v1/editMeal: 503: meal data of user is being moved: {meal.credentialsItem}")
+            return {"message": "meal data is being moved, retry shortly"}
+
+        if write_behind_buffer is not None:
+            return buffer_meal_write("/v1/editMeal", "edit", user_id, meal, response)
+
+        meal_type_repo = db_wrapper.getMealTypeRepo()
+        meal_type_id = meal_type_repo.getMealTypeIDByName(meal.mealType.lower())
+        if meal_type_id is None:
+            response.status_code = 400
+            logger.logWarning(f"/v1/editMeal: 400: invalid meal type: {meal.mealType}")
+            return {"message": "invalid meal type"}
+
+        day_meal_repo = db_wrapper.getDayMealRepo()
+        existing_day_meal = day_meal_repo.getDayMealByDate(user_id, meal.year, meal.month, meal.day, meal_type_id)
+        if existing_day_meal is None:
+            response.status_code = 404
+            logger.logWarning("/v1/editMeal: 404: meal not found for the specified day")
+            return {"message": "meal not found for the specified day"}
+
+        meal_id = existing_day_meal["fk_meal_id"]
+        update_result = day_meal_repo.updateDayMealLevelsByDate(user_id, meal.year, meal.month, meal.day, meal_type_id, meal_id, meal.fat_level, meal.sugar_level)
+        if update_result is True:
+            record_meals_changed(meal.credentialsItem.userName, user_id, meal.year, meal.month, meal.day, "edit", meal.mealType)
+            response.status_code = 200
+            logger.logInformation("/v1/editMeal: 200: successfully edited meal")
+            return {"message": "successfully edited meal"}
+        else:
+            response.status_code = 500
+            logger.logError("/v1/editMeal: 500: failed to update meal")
+            return {"message": "failed to update meal"}
+
+    elif login_result is False:
+        response.status_code = 401
+        logger.logWarning(f"/v1/editMeal: 401: invalid token: {meal.credentialsItem}")
+        return {"message": "invalid token"}
+    elif login_result == "invalid password":
+        response.status_code = 401
+        logger.logWarning(f"/v1/editMeal: 401: invalid password: {meal.credentialsItem}")
+        return {"message": "invalid password"}
+    elif login_result == "busy":
+        return reject_busy_password_hashing("/v1/editMeal", response)
+    else:
+        response.status_code = 500
+        logger.logError("/v1/editMeal: 500: unhandled return from login method")
+        return {"message": "unhandled return from login method"}
+
+
+@app.post("/v1/deleteMeal")
+async def delete_meal(delete_meal_item: DeleteMealItemPydantic, response: Response, idempotency_key: str = Header(None)):
+    """
+    POST /v1/deleteMeal endpoint.
+    Deletes a meal entry.
+
+    Retries sent with the same `Idempotency-Key` header get the response of the first request without running again.
+    """
+    return await run_idempotently("/v1/deleteMeal", idempotency_key, delete_meal_item, delete_meal_item.credentials, response, delete_meal_local)
+
+
+async def delete_meal_local(delete_meal_item: DeleteMealItemPydantic, response: Response):
+    """Handles deleting a meal."""
+    delete_meal = convert_pydantic_to_delete_meal_item(delete_meal_item)
+
+    # Validate token
+    if delete_meal.credentialsItem.token != config_array["authentication"]["token"]:
+        response.status_code = 401
+        logger.logWarning(f"/v1/deleteMeal: 401: invalid token: {delete_meal.credentialsItem}")
+        return {"message": "invalid token"}
+
+    # Route reads of this write request to the primary.
+    db_wrapper.beginReadSession(delete_meal.credentialsItem.userName)
+    db_wrapper.pinReadsToPrimary()
+
+    # Verify user login
+    login_result = await verify_user_credentials(delete_meal.credentialsItem)
+    if login_result is True:
+        user = db_wrapper.getUserRepo().getUserByCredentialsItem(delete_meal.credentialsItem)
+        if user is None:
+            response.status_code = 406
+            logger.logWarning(f"/v1/deleteMeal: 406: user does not exist: {delete_meal.credentialsItem}")
+            return {"message": "user does not exist"}
+
+        user_id = user["ID"]
+
+        # Select the shard holding the user's meals, rejecting writes while they are moved to another shard.
+        if db_wrapper.useShardOfUser(user_id)["is_moving"]:
+            response.status_code = 503
+            response.headers["Retry-After"] = "5"
+            logger.logWarning(f"/v1/deleteMeal: 503: meal data of user is being moved: {delete_meal.credentialsItem}")
+            return {"message": "meal data is being moved, retry shortly"}
+
+        # Buffered writes of that day have to reach the database before deleting.
+        if write_behind_buffer is not None and write_behind_buffer.hasPendingMeal(user_id, delete_meal.year, delete_meal.month, delete_meal.day):
+            write_behind_buffer.flushAll()
+            if write_behind_buffer.hasPendingMeal(user_id, delete_meal.year, delete_meal.month, delete_meal.day):
+                response.status_code = 503
+                response.headers["Retry-After"] = "5"
+                logger.logError("/v1/deleteMeal: 503: could not flush buffered writes")
+                return {"message": "buffered writes could not be stored yet, retry shortly"}
+            db_wrapper.useShardOfUser(user_id)
+
+        meal_type_repo = db_wrapper.getMealTypeRepo()
+        meal_type_id = meal_type_repo.getMealTypeIDByName(delete_meal.mealType.lower())
+        if meal_type_id is None:
+            response.status_code = 400
+            logger.logWarning(f"/v1/deleteMeal: 400: invalid meal type: {delete_meal.mealType}")
+            return {"message": "invalid meal type"}
+
+        day_meal_repo = db_wrapper.getDayMealRepo()
+        existing_day_meal = day_meal_repo.getDayMealByDate(user_id, delete_meal.year, delete_meal.month, delete_meal.day, meal_type_id)
+        if existing_day_meal is None:
+            response.status_code = 404
+            logger.logWarning("/v1/deleteMeal: 404: meal not found for the specified day")
+            return {"message": "meal not found for the specified day"}
+
+        meal_id = existing_day_meal["fk_meal_id"]
+        delete_result = db_wrapper.getMealRepo().deleteMealByDate(user_id, delete_meal.year, delete_meal.month, delete_meal.day, meal_type_id, meal_id)
+        if delete_result is True:
+            record_meals_changed(delete_meal.credentialsItem.userName, user_id, delete_meal.year, delete_meal.month, delete_meal.day, "delete", delete_meal.mealType)
+            response.status_code = 200
+            logger.logInformation("/v1/deleteMeal: 200: successfully deleted meal and day_meal entry")
+            return {"message": "successfully deleted meal"}
+        elif delete_result is False:
+            response.status_code = 404
+            logger.logWarning("/v1/deleteMeal: 404: meal or day_meal entry not found")
+            return {"message": "meal or day_meal entry not found"}
+        else:
+            response.status_code = 500
+            logger.logError("/v1/deleteMeal: 500: unknown error occurred during deletion")
+            return {"message": "unknown error occurred"}
+
+    elif login_result is False:
+        response.status_code = 401
+        logger.logWarning(f"/v1/deleteMeal: 401: invalid token: {delete_meal.credentialsItem}")
+        return {"message": "invalid token"}
+    elif login_result == "invalid password":
+        response.status_code = 401
+        logger.logWarning(f"/v1/deleteMeal: 401: invalid password: {delete_meal.credentialsItem}")
+        return {"message": "invalid password"}
+    elif login_result == "busy":
+        return reject_busy_password_hashing("/v1/deleteMeal", response)
+    else:
+        response.status_code = 500
+        logger.logError("/v1/deleteMeal: 500: unhandled return from login method")
+        return {"message": "unhandled return from login method"}
+
+
+@app.post("/v1/getMeals")
+async def get_meals(get_meals_item: GetMealsItemPydantic, response: Response, if_none_match: str = Header(None)):
+    """
+    POST /v1/getMeals endpoint.
+    Fetches the meal entries for a user on a specific day.
+
+    Every response carries an ETag bound to the user/day version and the passed credentials. Sending it back in an
+    `If-None-Match` header is answered with 304 after checking only that version, skipping auth and meal queries.
+    With several workers the versions are not shared, so no ETag is issued.
+    """
+    get_meals = convert_pydantic_to_get_meals_item(get_meals_item)
+
+    # Validate token
+    if get_meals.credentialsItem.token != config_array["authentication"]["token"]:
+        response.status_code = 401
+        logger.logWarning(f"/v1/getMeals: 401: invalid token: {get_meals.credentialsItem}")
+        return {"message": "invalid token"}
+
+    # Answer unchanged polls without touching the database.
+    # The ETag is bound to the credentials it was issued for, which were verified back then.
+    version_key = get_meals_version_key(get_meals.credentialsItem.userName, get_meals.year, get_meals.month, get_meals.day)
+    fingerprint = get_credentials_fingerprint(get_meals.credentialsItem)
+    if conditional_meal_reads and version_tracker.isETagCurrent(version_key, fingerprint, if_none_match):
+        return Response(status_code=304, headers={"ETag": version_tracker.buildETag(version_key, fingerprint)})
+
+    # Build the ETag before querying, so a write racing this read results in a fresh response on the next poll.
+    etag = version_tracker.buildETag(version_key, fingerprint) if conditional_meal_reads else None
+
+    # Identical concurrent requests (retries, several devices of a user) share one run of the query chain.
+    db_wrapper.beginReadSession(get_meals.credentialsItem.userName)
+    read_key = ("getMeals", fingerprint, get_meals.year, get_meals.month, get_meals.day)
+    status_code, result = await meal_reads_single_flight.do(read_key, read_meals_of_day, get_meals)
+    response.status_code = status_code
+    if status_code == 200 and etag is not None:
+        response.headers["ETag"] = etag
+    elif status_code == 503:
+        response.headers["Retry-After"] = "1"
+    return result
+
+
+def read_meals_of_day(get_meals: GetMealsItem) -> tuple:
+    """
+    Verifies the credentials and reads the meals of a user on a specific day.
+
+    Runs in a worker thread through the single-flight layer, so it must not touch the response.
+
+    Returns:
+        tuple: The status code and the response body.
+    """
+    # Verify user login (served from the shared cache for credentials verified before)
+    login_result, user_id = get_verified_user_id(get_meals.credentialsItem)
+    if login_result is True:
+        if user_id is None:
+            logger.logWarning(f"/v1/getMeals: 406: user does not exist: {get_meals.credentialsItem}")
+            return 406, {"message": "user does not exist"}
+
+        meals_cache_key = get_meals_cache_key(get_meals.credentialsItem.userName, user_id, get_meals.year, get_meals.month, get_meals.day)
+        if shared_cache is not None:
+            cached_meals = shared_cache.get(meals_cache_key)
+            if cached_meals is not None:
+                logger.logInformation("/v1/getMeals: 200: successfully retrieved meals (cached)")
+                return 200, {"meals": cached_meals}
+
+        with span("shardResolution"):
+            db_wrapper.useShardOfUser(user_id)
+        with span("dayResolution"):
+            day_meal_repo = db_wrapper.getDayMealRepo()
+            day_meals = day_meal_repo.getDayMealsByUserIDAndDate(user_id, get_meals.year, get_meals.month, get_meals.day)
+        meal_list = []
+
+        # The levels come with the day meals, so no query per meal is needed.
+        with span("mealTypeResolution", dayMeals=len(day_meals)):
+            meal_type_repo = db_wrapper.getMealTypeRepo()
+            for day_meal in day_meals:
+                meal_type_id = day_meal["fk_meal_type_id"]
+
+                meal_type_name = meal_type_repo.getMealTypeNameByID(meal_type_id)
+                if meal_type_name is None:
+                    continue
+
+                meal_info = {
+                    "year": get_meals.year,
+                    "month": get_meals.month,
+                    "day": get_meals.day,
+                    "mealType": meal_type_name,
+                    "fat_level": day_meal["fat_level"],
+                    "sugar_level": day_meal["sugar_level"],
+                }
+                meal_list.append(meal_info)
+
+        # Cached with the pending writes merged in, so the entry stays correct once they are flushed.
+        meal_list = merge_pending_meals(meal_list, user_id, get_meals)
+        if shared_cache is not None:
+            shared_cache.set(meals_cache_key, meal_list)
+        logger.logInformation("/v1/getMeals: 200: successfully retrieved meals")
+        return 200, {"meals": meal_list}
+
+    elif login_result is False:
+        logger.logWarning(f"/v1/getMeals: 401: invalid token: {get_meals.credentialsItem}")
+        return 401, {"message": "invalid token"}
+    elif login_result == "invalid password":
+        logger.logWarning(f"/v1/getMeals: 401: invalid password: {get_meals.credentialsItem}")
+        return 401, {"message": "invalid password"}
+    elif login_result == "busy":
+        logger.logWarning("/v1/getMeals: 503: password hashing queue is full")
+        return 503, {"message": "server busy, retry shortly"}
+    elif login_result is None:
+        logger.logWarning(f"/v1/getMeals: 406: user does not exist: {get_meals.credentialsItem}")
+        return 406, {"message": "user does not exist"}
+    else:
+        logger.logError("/v1/getMeals: 500: unhandled return from login method")
+        return 500, {"message": "unhandled return from login method"}
+
+
+@app.post("/v1/getMonthOverview")
+async def get_month_overview(overview_item: GetMonthOverviewItemPydantic, response: Response):
+    """
+    POST /v1/getMonthOverview endpoint.
+    Returns which meal types a user logged on every day of a month, or of a year with month 0, for calendar views.
+
+    The days are packed into base64 strings, so a whole year fits in a few hundred bytes. `mealTypeMasks` holds
+    `mealTypeMaskBytes` bytes per day (little endian), starting with the first day of the period; bit i is set if the
+    meal type `mealTypes[i]` was logged (meal types with IDs above 64 are left out). With `includeLevels`, `levels` holds half a byte per day (the first day in the
+    high half of the first byte): the highest fat level + 1 in its upper two bits and the highest sugar level + 1 in
+    its lower two bits, 0 for days without meals.
+    """
+    credentials_item = convert_pydantic_to_credentials_item(overview_item.credentials)
+
+    # Validate token
+    if credentials_item.token != config_array["authentication"]["token"]:
+        response.status_code = 401
+        logger.logWarning(f"/v1/getMonthOverview: 401: invalid token: {credentials_item}")
+        return {"message": "invalid token"}
+
+    if not 1 <= overview_item.year <= 9999 or not 0 <= overview_item.month <= 12:
+        response.status_code = 400
+        logger.logWarning(f"/v1/getMonthOverview: 400: invalid period: {overview_item.year}-{overview_item.month}")
+        return {"message": "year must be between 1 and 9999, month between 1 and 12 (0 for the whole year)"}
+
+    # Verify user login (served from the shared cache for credentials verified before)
+    db_wrapper.beginReadSession(credentials_item.userName)
+    login_result, user_id = await asyncio.to_thread(get_verified_user_id, credentials_item)
+    if login_result is True:
+        if user_id is None:
+            response.status_code = 406
+            logger.logWarning(f"/v1/getMonthOverview: 406: user does not exist: {credentials_item}")
+            return {"message": "user does not exist"}
+
+        # The overview is aggregated by the database, so buffered writes of the user are flushed first.
+        if write_behind_buffer is not None and write_behind_buffer.hasPendingMealsOfUser(user_id):
+            write_behind_buffer.flushAll()
+
+        db_wrapper.useShardOfUser(user_id)
+        day_overview = db_wrapper.getDayMealRepo().getDayOverview(user_id, overview_item.year, overview_item.month or None)
+        meal_types = db_wrapper.getMealTypeRepo().getAllMealTypes()
+        if day_overview is None or meal_types is None:
+            response.status_code = 500
+            logger.logError("/v1/getMonthOverview: 500: error fetching the meal overview")
+            return {"message": "error fetching the meal overview"}
+
+        if any(meal_type["ID"] > DayMealRepo.OVERVIEW_MAX_MEAL_TYPE_ID for meal_type in meal_types):
+            logger.logWarning(f"/v1/getMonthOverview: meal types with IDs above {DayMealRepo.OVERVIEW_MAX_MEAL_TYPE_ID} are left out of the masks")
+
+        response.status_code = 200
+        logger.logInformation(f"/v1/getMonthOverview: 200: returned {len(day_overview)} days with meals")
+        return pack_month_overview(overview_item.year, overview_item.month, day_overview, meal_types, overview_item.includeLevels)
+
+    elif login_result is False:
+        response.status_code = 401
+        logger.logWarning(f"/v1/getMonthOverview: 401: invalid token: {credentials_item}")
+        return {"message": "invalid token"}
+    elif login_result == "invalid password":
+        response.status_code = 401
+        logger.logWarning(f"/v1/getMonthOverview: 401: invalid password: {credentials_item}")
+        return {"message": "invalid password"}
+    elif login_result == "busy":
+        return reject_busy_password_hashing("/v1/getMonthOverview", response)
+    elif login_result is None:
+        response.status_code = 406
+        logger.logWarning(f"/v1/getMonthOverview: 406: user does not exist: {credentials_item}")
+        return {"message": "user does not exist"}
+    else:
+        response.status_code = 500
+        logger.logError("/v1/getMonthOverview: 500: unhandled return from login method")
+        return {"message": "unhandled return from login method"}
+
+
+@app.post("/v1/getMealTypes")
+async def get_meal_types(credentials: CredentialsItemPydantic, response: Response, if_none_match: str = Header(None)):
+    """
+    POST /v1/getMealTypes endpoint.
+    Fetches all available meal types.
+
+    Meal types are only changed directly in the database, so their ETag stays valid until the API is restarted.
+    """
+    try:
+        # Validate token
+        if credentials.token != config_array["authentication"]["token"]:
+            response.status_code = 401
+            logger.logWarning("/v1/getMealTypes: 401: invalid token")
+            return {"message": "invalid token"}
+
+        # Answer unchanged polls without touching the database.
+        if version_tracker.isETagCurrent(MEAL_TYPES_VERSION_KEY, credentials.token, if_none_match):
+            return Response(status_code=304, headers={"ETag": version_tracker.buildETag(MEAL_TYPES_VERSION_KEY, credentials.token)})
+        etag = version_tracker.buildETag(MEAL_TYPES_VERSION_KEY, credentials.token)
+
+        # Fetch meal types, sharing one query between identical concurrent requests
+        meal_types = await meal_reads_single_flight.do(MEAL_TYPES_VERSION_KEY, db_wrapper.getMealTypeRepo().getAllMealTypes)
+        if meal_types is None:
+            response.status_code = 500
+            logger.logError("/v1/getMealTypes: 500: error fetching meal types")
+            return {"message": "error fetching meal types"}
+
+        response.status_code = 200
+        response.headers["ETag"] = etag
+        logger.logInformation("/v1/getMealTypes: 200: successfully fetched meal types")
+        return {"mealTypes": meal_types}
+
+    except Exception as e:
+        response.status_code = 500
+        logger.logError(f"/v1/getMealTypes: 500: unhandled exception: {str(e)}")
+        return {"message": "unhandled exception"}
+
+
+@app.post("/v1/mealEvents")
+async def meal_events(credentials: CredentialsItemPydantic, response: Response):
+    """
+    POST /v1/mealEvents endpoint.
+    Streams the meal changes of the user as Server-Sent Events (text/event-stream), so clients do not need to poll.
+
+    Every add, edit or delete of the user's meals, on any device, sends a `mealChanged` event with the operation, the
+    date and the meal type. A `resync` event means events were dropped because the client did not keep up; the client
+    should then re-read the days it shows. Comment lines are sent as heartbeat while nothing changes.
+    """
+    credentials_item = convert_pydantic_to_credentials_item(credentials)
+
+    # Validate token
+    if credentials_item.token != config_array["authentication"]["token"]:
+        response.status_code = 401
+        logger.logWarning(f"/v1/mealEvents: 401: invalid token: {credentials_item}")
+        return {"message": "invalid token"}
+
+    # Verify user login
+    login_result = await verify_user_credentials(credentials_item)
+    if login_result is True:
+        try:
+            subscription = change_broker.subscribe(get_cache_digest(credentials_item.userName))
+        except ChangeBrokerLimitError as e:
+            response.status_code = 503
+            response.headers["Retry-After"] = "30"
+            logger.logWarning(f"/v1/mealEvents: 503: connection limit reached: {str(e)}")
+            return {"message": f"too many open event streams: {str(e)}"}
+
+        logger.logInformation("/v1/mealEvents: 200: stream opened")
+        return StreamingResponse(
+            stream_meal_events(subscription),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+
+    elif login_result is False:
+        response.status_code = 401
+        logger.logWarning(f"/v1/mealEvents: 401: invalid token: {credentials_item}")
+        return {"message": "invalid token"}
+    elif login_result == "invalid password":
+        response.status_code = 401
+        logger.logWarning(f"/v1/mealEvents: 401: invalid password: {credentials_item}")
+        return {"message": "invalid password"}
+    elif login_result == "busy":
+        return reject_busy_password_hashing("/v1/mealEvents", response)
+    elif login_result is None:
+        response.status_code = 406
+        logger.logWarning(f"/v1/mealEvents: 406: user does not exist: {credentials_item}")
+        return {"message": "user does not exist"}
+    else:
+        response.status_code = 500
+        logger.logError("/v1/mealEvents: 500: unhandled return from login method")
+        return {"message": "unhandled return from login method"}
+
+
+@app.post("/v1/sync")
+async def sync_meals(credentials: CredentialsItemPydantic, response: Response, since: int = 0, limit: int = 0):
+    """
+    POST /v1/sync?since=<seq>&limit=<n> endpoint.
+    Returns the inserts, updates and deletes of the user's meals after the sequence number `since` (database.mealChangeLog).
+
+    Pass the returned nextSince as since to get the next page while hasMore is true, and keep it for the next sync.
+    410 means changes after `since` were compacted away; the client then re-reads its data and syncs from lastSeq on.
+    Writes buffered in write-behind mode appear once they are flushed.
+    """
+    credentials_item = convert_pydantic_to_credentials_item(credentials)
+
+    # Validate token
+    if credentials_item.token != config_array["authentication"]["token"]:
+        response.status_code = 401
+        logger.logWarning(f"/v1/sync: 401: invalid token: {credentials_item}")
+        return {"message": "invalid token"}
+
+    if not db_wrapper.mealChangeLog:
+        response.status_code = 404
+        logger.logWarning("/v1/sync: 404: meal change log is disabled")
+        return {"message": "delta sync is not enabled"}
+
+    sync_config = config_array.get("sync", {})
+    max_page_size = sync_config.get("maxPageSize", 5000)
+    page_size = limit or sync_config.get("pageSize", 500)
+    if page_size < 1 or page_size > max_page_size or since < 0:
+        response.status_code = 400
+        logger.logWarning(f"/v1/sync: 400: invalid page: since {since}, limit {page_size}")
+        return {"message": f"limit must be between 1 and {max_page_size}, since must not be negative"}
+
+    # Verify user login (served from the shared cache for credentials verified before)
+    db_wrapper.beginReadSession(credentials_item.userName)
+    login_result, user_id = await asyncio.to_thread(get_verified_user_id, credentials_item)
+    if login_result is True:
+        if user_id is None:
+            response.status_code = 406
+            logger.logWarning(f"/v1/sync: 406: user does not exist: {credentials_item}")
+            return {"message": "user does not exist"}
+
+        db_wrapper.useShardOfUser(user_id)
+        page = db_wrapper.getMealChangeRepo().getChangesSince(user_id, since, page_size)
+        if page is None:
+            response.status_code = 500
+            logger.logError("/v1/sync: 500: error fetching meal changes")
+            return {"message": "error fetching meal changes"}
+
+        if since < page["compactedSeq"]:
+            response.status_code = 410
+            logger.logWarning(f"/v1/sync: 410: changes after {since} were compacted (up to {page['compactedSeq']})")
+            return {"message": "changes were compacted, re-read all meals and sync from lastSeq", "lastSeq": page["lastSeq"]}
+
+        meal_type_repo = db_wrapper.getMealTypeRepo()
+        changes = [
+            {
+                "seq": change["seq"],
+                "operation": change["operation"],
+                "year": change["year"],
+                "month": change["month"],
+                "day": change["day"],
+                "mealType": meal_type_repo.getMealTypeNameByID(change["fk_meal_type_id"]),
+                "fat_level": change["fat_level"],
+                "sugar_level": change["sugar_level"],
+            }
+            for change in page["changes"]
+        ]
+
+        response.status_code = 200
+        logger.logInformation(f"/v1/sync: 200: returned {len(changes)} changes after {since}")
+        return {
+            "changes": changes,
+            "nextSince": changes[-1]["seq"] if changes else since,
+            "hasMore": page["hasMore"],
+            "lastSeq": page["lastSeq"],
+        }
+
+    elif login_result is False:
+        response.status_code = 401
+        logger.logWarning(f"/v1/sync: 401: invalid token: {credentials_item}")
+        return {"message": "invalid token"}
+    elif login_result == "invalid password":
+        response.status_code = 401
+        logger.logWarning(f"/v1/sync: 401: invalid password: {credentials_item}")
+        return {"message": "invalid password"}
+    elif login_result == "busy":
+        return reject_busy_password_hashing("/v1/sync", response)
+    elif login_result is None:
+        response.status_code = 406
+        logger.logWarning(f"/v1/sync: 406: user does not exist: {credentials_item}")
+        return {"message": "user does not exist"}
+    else:
+        response.status_code = 500
+        logger.logError("/v1/sync: 500: unhandled return from login method")
+        return {"message": "unhandled return from login method"}
+
+
+@app.post("/v1/admin/listUsers")
+async def admin_list_users(list_users_item: AdminListUsersItemPydantic, response: Response):
+    """
+    POST /v1/admin/listUsers endpoint.
+    Lists the user IDs page by page (keyset pagination by ID), authorized by the admin token.
+
+    Pass the returned nextAfterID as afterID to get the next page; it is null after the last page.
+    """
+    if not is_valid_admin_token(list_users_item.token):
+        response.status_code = 401
+        logger.logWarning("/v1/admin/listUsers: 401: invalid admin token")
+        return {"message": "invalid token"}
+
+    listing_config = config_array.get("adminListing", {})
+    max_page_size = listing_config.get("maxPageSize", 10000)
+    page_size = list_users_item.pageSize or listing_config.get("pageSize", 1000)
+    if page_size < 1 or page_size > max_page_size or list_users_item.afterID < 0:
+        response.status_code = 400
+        logger.logWarning(f"/v1/admin/listUsers: 400: invalid page: afterID {list_users_item.afterID}, pageSize {page_size}")
+        return {"message": f"pageSize must be between 1 and {max_page_size}, afterID must not be negative"}
+
+    user_ids = db_wrapper.getUserRepo().getUserIDsPage(list_users_item.afterID, page_size)
+    if user_ids is None:
+        response.status_code = 500
+        logger.logError("/v1/admin/listUsers: 500: error fetching user IDs")
+        return {"message": "error fetching user IDs"}
+
+    response.status_code = 200
+    logger.logInformation(f"/v1/admin/listUsers: 200: listed {len(user_ids)} users after ID {list_users_item.afterID}")
+    return {"userIDs": user_ids, "nextAfterID": user_ids[-1] if len(user_ids) == page_size else None}
+
+
+@app.post("/v1/admin/profiler/start")
+async def admin_start_profiler(profiler_start_item: AdminProfilerStartItemPydantic, response: Response):
+    """
+    POST /v1/admin/profiler/start endpoint.
+    Starts sampling the stacks of this worker, either during a fraction of the requests or for a time window.
+
+    Only the worker receiving the request is profiled; with several workers, start a session per worker or run one.
+    """
+    if not is_valid_admin_token(profiler_start_item.token):
+        response.status_code = 401
+        logger.logWarning("/v1/admin/profiler/start: 401: invalid admin token")
+        return {"message": "invalid token"}
+
+    interval_ms = profiler_start_item.intervalMs or profiler_config.get("intervalMs", 5)
+    try:
+        status = sampling_profiler.start(
+            profiler_start_item.mode,
+            profiler_start_item.seconds,
+            profiler_start_item.fraction,
+            profiler_start_item.pathPrefix,
+            interval_ms / 1000
+        )
+    except ValueError as e:
+        response.status_code = 400
+        logger.logWarning(f"/v1/admin/profiler/start: 400: {str(e)}")
+        return {"message": str(e)}
+
+    response.status_code = 200
+    logger.logInformation(f"/v1/admin/profiler/start: 200: started profiling: {status}")
+    return status
+
+
+@app.post("/v1/admin/profiler/stop")
+async def admin_stop_profiler(token_item: AdminTokenItemPydantic, response: Response):
+    """
+    POST /v1/admin/profiler/stop endpoint.
+    Stops the running profiling session early and returns its status; the samples stay available.
+    """
+    if not is_valid_admin_token(token_item.token):
+        response.status_code = 401
+        logger.logWarning("/v1/admin/profiler/stop: 401: invalid admin token")
+        return {"message": "invalid token"}
+
+    status = await asyncio.to_thread(sampling_profiler.stop)
+    response.status_code = 200
+    logger.logInformation(f"/v1/admin/profiler/stop: 200: stopped profiling: {status}")
+    return status
+
+
+@app.post("/v1/admin/profiler/stacks")
+async def admin_get_profiler_stacks(token_item: AdminTokenItemPydantic, response: Response):
+    """
+    POST /v1/admin/profiler/stacks endpoint.
+    Returns the samples of the current or last profiling session as collapsed stacks (text/plain),
+    ready for flamegraph.pl or speedscope.
+    """
+    if not is_valid_admin_token(token_item.token):
+        response.status_code = 401
+        logger.logWarning("/v1/admin/profiler/stacks: 401: invalid admin token")
+        return {"message": "invalid token"}
+
+    status = sampling_profiler.getStatus()
+    logger.logInformation(f"/v1/admin/profiler/stacks: 200: exported {status['distinctStacks']} stacks of {status['samples']} samples")
+    return PlainTextResponse(sampling_profiler.getCollapsedStacks())
+
+
+
+# Helper functions for the write-behind mode
+def buffer_meal_write(endpoint: str, operation: str, user_id: int, meal: MealItem, response: Response) -> dict:
+    """
+    Validates an add/edit write against the database and the pending writes, then journals it for a batched flush.
+
+    Returns:
+        dict: The response body.
+    """
+    meal_type_name = meal.mealType.lower()
+    meal_type_id = db_wrapper.getMealTypeRepo().getMealTypeIDByName(meal_type_name)
+    if meal_type_id is None:
+        response.status_code = 400
+        logger.logWarning(f"{endpoint}: 400: invalid meal type: {meal.mealType}")
+        return {"message": "invalid meal type"}
+
+    meal_exists = (
+        write_behind_buffer.hasPendingMeal(user_id, meal.year, meal.month, meal.day, meal_type_id)
+        or db_wrapper.getDayMealRepo().getDayMealByDate(user_id, meal.year, meal.month, meal.day, meal_type_id) is not None
+    )
+
+    if operation == "add" and meal_exists:
+        response.status_code = 400
+        logger.logWarning(f"{endpoint}: 400: could not create day meal")
+        return {"message": "Meal already exists. To edit meal use /v1/editMeal"}
+    if operation == "edit" and not meal_exists:
+        response.status_code = 404
+        logger.logWarning(f"{endpoint}: 404: meal not found for the specified day")
+        return {"message": "meal not found for the specified day"}
+
+    write_behind_buffer.enqueue(operation, user_id, meal.year, meal.month, meal.day, meal_type_id, meal_type_name, meal.fat_level, meal.sugar_level)
+    record_meals_changed(meal.credentialsItem.userName, user_id, meal.year, meal.month, meal.day, operation, meal.mealType)
+    response.status_code = 200
+    if operation == "add":
+        logger.logInformation(f"{endpoint}: 200: successfully added meal (buffered)")
+        return {"message": "successfully added meal"}
+    logger.logInformation(f"{endpoint}: 200: successfully edited meal (buffered)")
+    return {"message": "successfully edited meal"}
+
+
+def merge_pending_meals(meal_list: list, user_id: int, get_meals: GetMealsItem) -> list:
+    """Returns the meals read from the database overlaid with the buffered writes not flushed yet."""
+    if write_behind_buffer is None:
+        return meal_list
+    pending_meals = write_behind_buffer.getPendingMeals(user_id, get_meals.year, get_meals.month, get_meals.day)
+    if not pending_meals:
+        return meal_list
+
+    merged_meals = [meal for meal in meal_list if meal["mealType"] not in pending_meals]
+    for meal_type_name, pending_meal in pending_meals.items():
+        merged_meals.append({
+            "year": get_meals.year,
+            "month": get_meals.month,
+            "day": get_meals.day,
+            "mealType": meal_type_name,
+            "fat_level": pending_meal["fat_level"],
+            "sugar_level": pending_meal["sugar_level"],
+        })
+    return merged_meals
+
+
+# Helper functions for the month overview
+def pack_month_overview(year: int, month: int, day_overview: list, meal_types: list, include_levels: bool) -> dict:
+    """Packs the meal type masks (and highest levels) of every day of a month, or of a year for month 0, into base64 strings."""
+    first_day = datetime.date(year, month or 1, 1)
+    last_day = datetime.date(year, month or 12, calendar.monthrange(year, month or 12)[1])
+    day_count = (last_day - first_day).days + 1
+
+    # Bit i of a mask stands for the meal type with ID i + 1; the masks hold IDs up to 64 only.
+    packable_meal_types = [meal_type for meal_type in meal_types if 1 <= meal_type["ID"] <= DayMealRepo.OVERVIEW_MAX_MEAL_TYPE_ID]
+    meal_type_names = [None] * max((meal_type["ID"] for meal_type in packable_meal_types), default=0)
+    for meal_type in packable_meal_types:
+        meal_type_names[meal_type["ID"] - 1] = meal_type["name"]
+    mask_bytes = max(1, (len(meal_type_names) + 7) // 8)
+
+    masks = bytearray(day_count * mask_bytes)
+    levels = bytearray((day_count + 1) // 2)
+    for day in day_overview:
+        index = (datetime.date(day["year"], day["month"], day["day"]) - first_day).days
+        mask = day["mealTypeMask"] & ((1 << (8 * mask_bytes)) - 1)
+        masks[index * mask_bytes:(index + 1) * mask_bytes] = mask.to_bytes(mask_bytes, "little")
+        level_bits = (clamp_overview_level(day["maxFatLevel"]) + 1) << 2 | (clamp_overview_level(day["maxSugarLevel"]) + 1)
+        levels[index // 2] |= level_bits << 4 if index % 2 == 0 else level_bits
+
+    overview = {
+        "year": year,
+        "month": month,
+        "firstDay": first_day.isoformat(),
+        "days": day_count,
+        "mealTypes": meal_type_names,
+        "mealTypeMaskBytes": mask_bytes,
+        "mealTypeMasks": base64.b64encode(masks).decode(),
+    }
+    if include_levels:
+        overview["levels"] = base64.b64encode(levels).decode()
+    return overview
+
+
+def clamp_overview_level(level: int or None) -> int:
+    """Returns a level within -1 (no level) and 2, so it fits the two bits of the packed levels once incremented."""
+    return -1 if level is None else min(max(level, -1), 2)
+
+
+# Helper functions for validating requests
+def is_valid_date(year: int, month: int, day: int) -> bool:
+    """Returns whether a date exists in the calendar (only such dates can be stored in schema v2)."""
+    try:
+        datetime.date(year, month, day)
+        return True
+    except ValueError:
+        return False
+
+
+# Helper functions for the startup
+def is_multi_worker() -> bool:
+    """Returns whether this process is one of several workers (API_WORKERS or WEB_CONCURRENCY, else a uvicorn worker process)."""
+    for variable in ("API_WORKERS", "WEB_CONCURRENCY"):
+        if os.environ.get(variable, "").strip().isdigit():
+            return int(os.environ[variable]) > 1
+    return multiprocessing.parent_process() is not None
+
+
+def report_startup(database_connect_seconds: float) -> None:
+    """Logs the startup timing report once the database is connected, warning if it exceeded the budget."""
+    startup_timer.record("databaseConnect", database_connect_seconds)
+    startup_timer.markReady()
+    report = startup_timer.getReport()
+    if report["overBudget"]:
+        logger.logWarning(f"startup: worker {os.getpid()} ready after {report['totalSeconds']}s, over the budget of {report['budgetSeconds']}s: {report}")
+    else:
+        logger.logInformation(f"startup: worker {os.getpid()} ready after {report['totalSeconds']}s: {report}")
+
+
+# Helper functions for the health checks
+def ping_database() -> None:
+    """Pings the primary from the calling worker thread; raises if the database is not connected or reachable."""
+    if not readiness_gate.isReady():
+        raise RuntimeError(f"database not connected yet: {readiness_gate.lastError}")
+    db_wrapper.primary.dbConnection.ping(reconnect=False)
+
+
+def collect_readiness_diagnostics() -> dict:
+    """Returns the load and warmth of the worker's resources, gathered without any I/O."""
+    diagnostics = {
+        "database": db_wrapper.getStatistics() if db_wrapper is not None else None,
+        "passwordHashing": password_hasher.getStatistics(),
+        "mealReads": meal_reads_single_flight.getStatistics(),
+        "logger": {"backlog": logger.getBacklog() if logger is not None else 0},
+        "caches": {
+            "etagVersions": version_tracker.getEntryCount(),
+            "etagMaxEntries": version_tracker.maxEntries,
+            "shared": shared_cache.getStatistics() if shared_cache is not None else None,
+        },
+        "mealEvents": change_broker.getStatistics(),
+        "idempotency": idempotency_store.getStatistics() if idempotency_store is not None else None,
+        "startup": {**startup_timer.getReport(), "readinessGate": readiness_gate.getStatus()},
+    }
+    if write_behind_buffer is not None:
+        diagnostics["writeBehind"] = {"pending": write_behind_buffer.getPendingCount()}
+    return diagnostics
+
+
+# Helper functions for the admin endpoints
+def is_valid_admin_token(token: str) -> bool:
+    """Checks the token against authentication.admin_token; admin endpoints are disabled while it is empty."""
+    admin_token = config_array["authentication"].get("admin_token", "")
+    return bool(admin_token) and hmac.compare_digest(token.encode(), admin_token.encode())
+
+
+# Helper functions for password hashing
+def check_user_credentials(credentials_item: CredentialsItem) -> bool or str or None:
+    """Verifies credentials against the server-side hash, blocking the calling worker thread; "busy" if the hashing queue is full."""
+    try:
+        with span("auth"):
+            return db_wrapper.getUserRepo().isUserPasswordCorrect(credentials_item, password_hasher)
+    except PasswordHasherBusyError:
+        return "busy"
+
+
+async def verify_user_credentials(credentials_item: CredentialsItem) -> bool or str or None:
+    """Verifies credentials in a worker thread, so the event loop keeps serving while the hash is computed."""
+    return await asyncio.to_thread(check_user_credentials, credentials_item)
+
+
+def reject_busy_password_hashing(endpoint: str, response: Response) -> dict:
+    """Answers 503 because the password hashing queue is full."""
+    response.status_code = 503
+    response.headers["Retry-After"] = "1"
+    logger.logWarning(f"{endpoint}: 503: password hashing queue is full")
+    return {"message": "server busy, retry shortly"}
+
+
+def hide_stored_password_hash(user: dict, credentials_item: CredentialsItem) -> dict:
+    """Returns the user with the hashedPassword sent by the client instead of the stored server-side hash."""
+    return {**user, "hashedPassword": credentials_item.hashedPassword}
+
+
+# Helper functions for idempotency keys
+async def run_idempotently(endpoint: str, idempotency_key: str, request_item: BaseModel, credentials: CredentialsItemPydantic, response: Response, handler) -> dict:
+    """Runs a mutating endpoint handler once per Idempotency-Key of the user, replaying its response for retries and concurrent duplicates."""
+    if idempotency_store is None or idempotency_key is None:
+        return await handler(request_item, response)
+    if not idempotency_store.isValidKey(idempotency_key):
+        response.status_code = 400
+        logger.logWarning(f"{endpoint}: 400: invalid idempotency key")
+        return {"message": f"Idempotency-Key must have 1 to {idempotency_store.maxKeyLength} characters"}
+
+    async def run_handler() -> tuple:
+        handler_response = Response()
+        del handler_response.headers["content-length"]
+        body = await handler(request_item, handler_response)
+        return handler_response.status_code, dict(handler_response.headers), body
+
+    credentials_digest = get_cache_digest(get_credentials_fingerprint(convert_pydantic_to_credentials_item(credentials)))
+    request_digest = get_cache_digest(json.dumps(request_item.dict(), sort_keys=True))
+    try:
+        status_code, headers, body, replayed = await idempotency_store.execute((endpoint, credentials_digest, idempotency_key), request_digest, run_handler)
+    except IdempotencyKeyConflictError as e:
+        response.status_code = 422
+        logger.logWarning(f"{endpoint}: 422: {str(e)}")
+        return {"message": str(e)}
+
+    response.status_code = status_code
+    response.headers.update(headers)
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+        logger.logInformation(f"{endpoint}: {status_code}: replayed response of idempotency key")
+    return body
+
+
+# Helper functions for the shared cache
+def get_verified_user_id(credentials_item: CredentialsItem) -> tuple:
+    """Verifies credentials, served from the shared cache if they were verified before; returns the login result and the user ID."""
+    user_cache_key = f"user:{get_cache_digest(credentials_item.userName)}"
+    credentials_digest = get_cache_digest(get_credentials_fingerprint(credentials_item))
+    if shared_cache is not None:
+        cached_user = shared_cache.get(user_cache_key)
+        if cached_user is not None and hmac.compare_digest(cached_user["credentialsDigest"], credentials_digest):
+            return True, cached_user["ID"]
+
+    login_result = check_user_credentials(credentials_item)
+    if login_result is not True:
+        return login_result, None
+    user_id = db_wrapper.getUserRepo().getUserIDByCredentialsItem(credentials_item)
+    if user_id is not None and shared_cache is not None:
+        shared_cache.set(user_cache_key, {"ID": user_id, "credentialsDigest": credentials_digest})
+    return True, user_id
+
+
+def get_meals_cache_key(user_name: str, user_id: int, year: int, month: int, day: int) -> str:
+    """Returns the shared cache key of the meals of a user on a specific day; a re-registered name never hits the entries of a deleted user."""
+    return f"meals:{get_cache_digest(user_name)}:{user_id}:{year}-{month}-{day}"
+
+
+def get_cache_digest(value: str) -> str:
+    """Returns a keyed digest of a value, so neither user names nor credentials are stored in the shared cache in clear."""
+    return hmac.new(config_array["authentication"]["encryption_key"].encode(), value.encode(), "sha256").hexdigest()
+
+
+def record_meals_changed(user_name: str, user_id: int, year: int, month: int, day: int, operation: str, meal_type: str) -> None:
+    """Invalidates the ETags and the cached meals of a user on a specific day after a write and notifies the user's meal event streams."""
+    version_tracker.bumpVersion(get_meals_version_key(user_name, year, month, day))
+    if shared_cache is not None:
+        shared_cache.invalidate(get_meals_cache_key(user_name, user_id, year, month, day))
+    change_broker.publish(get_cache_digest(user_name), {"type": "mealChanged", "operation": operation, "year": year, "month": month, "day": day, "mealType": meal_type.lower()})
+
+
+# Helper functions for the meal event streams
+async def stream_meal_events(subscription):
+    """Yields the events of a subscription in the Server-Sent Events format until the client or the broker closes it."""
+    heartbeat_seconds = meal_events_config.get("heartbeatSeconds", 15)
+    try:
+        yield f"retry: {meal_events_config.get('retryMilliseconds', 3000)}\n\n"
+        while not subscription.closed:
+            event = await subscription.next(heartbeat_seconds)
+            if subscription.closed:
+                break
+            if event is None:
+                yield ": keepalive\n\n"
+            else:
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+    finally:
+        change_broker.unsubscribe(subscription)
+
+
+# Helper functions for conditional reads
+def get_meals_version_key(user_name: str, year: int, month: int, day: int) -> tuple:
+    """Returns the version tracker key of the meals of a user on a specific day."""
+    return (*get_meals_version_prefix(user_name), year, month, day)
+
+
+def get_meals_version_prefix(user_name: str) -> tuple:
+    """Returns the leading elements of the version tracker keys of all meals of a user."""
+    return ("meals", user_name)
+
+
+def get_credentials_fingerprint(credentials_item: CredentialsItem) -> str:
+    """Returns the value ETags of user specific reads are bound to, so they only match for the same credentials."""
+    return f"{credentials_item.token}|{credentials_item.userName}|{credentials_item.hashedPassword}"
+
+
+# Helper functions for converting Pydantic models to internal models
+def convert_pydantic_to_authentication_item(auth_pydantic: AuthenticationItemPydantic):
+    """Converts a Pydantic AuthenticationItem model to the internal AuthenticationItem."""
+    return AuthenticationItem(auth_pydantic.token)
+
+
+def convert_pydantic_to_credentials_item(credentials_pydantic: CredentialsItemPydantic):
+    """Converts a Pydantic CredentialsItem model to the internal CredentialsItem."""
+    return CredentialsItem(
+        credentials_pydantic.token,
+        credentials_pydantic.userName,
+        credentials_pydantic.hashedPassword
+    )
+
+
+def convert_pydantic_to_meal_item(meal_pydantic: MealItemPydantic):
+    """Converts a Pydantic MealItem model to the internal MealItem."""
+    credentials_item = convert_pydantic_to_credentials_item(meal_pydantic.credentials)
+    return MealItem(
+        credentials_item,
+        meal_pydantic.year,
+        meal_pydantic.month,
+        meal_pydantic.day,
+        meal_pydantic.mealType,
+        meal_pydantic.fat_level,
+        meal_pydantic.sugar_level
+    )
+
+
+def convert_pydantic_to_delete_meal_item(delete_meal_pydantic: DeleteMealItemPydantic):
+    """Converts a Pydantic DeleteMealItem model to the internal DeleteMealItem."""
+    credentials_item = convert_pydantic_to_credentials_item(delete_meal_pydantic.credentials)
+    return DeleteMealItem(
+        credentials_item,
+        delete_meal_pydantic.year,
+        delete_meal_pydantic.month,
+        delete_meal_pydantic.day,
+        delete_meal_pydantic.mealType
+    )
+
+
+def convert_pydantic_to_get_meals_item(get_meals_pydantic: GetMealsItemPydantic):
+    """Converts a Pydantic GetMealsItem model to the internal GetMealsItem."""
+    credentials_item = convert_pydantic_to_credentials_item(get_meals_pydantic.credentials)
+    return GetMealsItem(
+        credentials_item,
+        get_meals_pydantic.year,
+        get_meals_pydantic.month,
+        get_meals_pydantic.day
+    )
@@ -0,0 +1,210 @@
+# Copyright (C) 2024 Patrick Michiels
+# All rights reserved.
+# This source code is licensed under the Evaluation License Agreement and
+# may not be used, modified, or distributed without explicit permission from the author.
+# This code is provided for evaluation purposes only.
+
+"""
+Archival job moving the day meals older than the archive horizon (`database.archiveHorizonMonths`) out of the
+tables the API reads and writes all the time, into the compressed `day_meals_archive` table (partitioned by year).
+
+The job runs while the API keeps serving requests (e.g. monthly from cron). It walks the day meals of the primary, or
+of every shard, in keyset paginated chunks. Every chunk is moved in one short transaction: the day meals are locked,
+copied to the archive with their levels inline, and deleted together with their meals. So every day meal is always
+either in the regular tables or in the archive, and the job can be interrupted and rerun at any time.
+
+`/v1/getMeals` reads days before the horizon from both places, so archived meals stay visible (through a slower
+query). Day meals added to an archived day later take precedence over the archived ones; the next run archives them.
+Rows with impossible dates (schema v1, e.g. February 31st) cannot be stored in the archive and are left in place.
+
+Usage example:
+
+    # Archive everything older than database.archiveHorizonMonths
+    python -m src.tools.archiveMeals --chunk-size 1000
+"""
+
+import argparse
+import datetime
+import time
+
+from src.utils.databaseWrapper import DatabaseWrapper
+
+
+class MealArchiver:
+    """
+    Moves the day meals before the archive horizon into `day_meals_archive` in chunks.
+
+    Attributes:
+        dbWrapper (DatabaseWrapper): The database wrapper holding the primary and shard connections.
+        chunkSize (int): The number of day meals moved per transaction.
+        pauseSeconds (float): Seconds to pause between two chunks, leaving room for the API's own queries.
+    """
+
+    def __init__(self, dbWrapper: DatabaseWrapper, chunkSize: int = 1000, pauseSeconds: float = 0.05):
+        """
+        Initializes the MealArchiver.
+
+        Args:
+            dbWrapper (DatabaseWrapper): The database wrapper holding the primary and shard connections.
+            chunkSize (int, optional): The number of day meals moved per transaction. Defaults to 1000.
+            pauseSeconds (float, optional): Seconds to pause between two chunks. Defaults to 0.05.
+        """
+        self.dbWrapper = dbWrapper
+        self.chunkSize = chunkSize
+        self.pauseSeconds = pauseSeconds
+
+    def archive(self) -> list:
+        """
+        Archives the day meals before the horizon on the primary, or on every shard.
+
+        Raises:
+            ValueError: If archiving is disabled (`database.archiveHorizonMonths` is not set).
+
+        Returns:
+            list: One report per database containing the horizon and the number of archived and skipped day meals.
+        """
+        horizon = self.dbWrapper.getArchiveHorizonDate()
+        if horizon is None:
+            raise ValueError("Set database.archiveHorizonMonths (and restart the API) before archiving")
+
+        targets = self.dbWrapper.shards if self.dbWrapper.isShardingEnabled() else [self.dbWrapper.primary]
+        return [self.archiveTarget(target, horizon) for target in targets]
+
+    def archiveTarget(self, target, horizon) -> dict:
+        """
+        Archives the day meals before the horizon on one database.
+
+        Args:
+            target (ConnectionTarget): The database (primary or shard).
+            horizon (datetime.date): The first day that is not archived.
+
+        Returns:
+            dict: A report containing the database, the horizon and the number of archived and skipped day meals.
+        """
+        connection = target.dbConnection
+        cursor = connection.cursor(buffered=True)
+        report = {"target": target.name, "horizon": str(horizon), "archived": 0, "skipped": 0}
+        lastKey = (0, 0, 0) if self.dbWrapper.schemaVersion != "v2" else (0, "0001-01-01", 0)
+
+        while True:
+            rows = self.__selectChunk(cursor, horizon, lastKey)
+            if not rows:
+                connection.commit()
+                break
+            lastKey = rows[-1][0]
+
+            archived = [row for row in rows if row[1] is not None]
+            report["skipped"] += len(rows) - len(archived)
+            if archived:
+                cursor.executemany("""
+                    INSERT INTO day_meals_archive (fk_user_id, meal_date, fk_meal_type_id, fat_level, sugar_level)
+                    VALUES (%s, %s, %s, %s, %s)
+                    ON DUPLICATE KEY UPDATE fat_level = VALUES(fat_level), sugar_level = VALUES(sugar_level)
+                """, [(key[0], mealDate, key[2], fatLevel, sugarLevel) for key, mealDate, mealID, fatLevel, sugarLevel in archived])
+                self.__deleteChunk(cursor, archived)
+            connection.commit()
+
+            report["archived"] += len(archived)
+            print(f"Archive {target.name}: archived {report['archived']}, skipped {report['skipped']} (last key {lastKey})")
+            time.sleep(self.pauseSeconds)
+
+        return report
+
+    def __selectChunk(self, cursor, horizon, lastKey: tuple) -> list:
+        """
+        Private helper selecting and locking the next chunk of day meals before the horizon in the read layout.
+
+        Args:
+            cursor: The cursor of the database.
+            horizon (datetime.date): The first day that is not archived.
+            lastKey (tuple): The primary key of the last day meal of the previous chunk.
+
+        Returns:
+            list: Tuples of the primary key, the date (None if it does not exist), the meal ID and the levels.
+        """
+        if self.dbWrapper.inlineMealLevels == "on":
+            levelColumns, mealsJoin = "dm.fat_level, dm.sugar_level", ""
+        else:
+            levelColumns, mealsJoin = "m.fat_level, m.sugar_level", "JOIN meals m ON m.ID = dm.fk_meal_id"
+
+        if self.dbWrapper.schemaVersion == "v2":
+            cursor.execute(f"""
+                SELECT dm.fk_user_id, dm.meal_date, dm.fk_meal_type_id, dm.fk_meal_id, {levelColumns}
+                FROM day_meals_v2 dm
+                {mealsJoin}
+                WHERE (dm.fk_user_id, dm.meal_date, dm.fk_meal_type_id) > (%s, %s, %s) AND dm.meal_date < %s
+                ORDER BY dm.fk_user_id, dm.meal_date, dm.fk_meal_type_id
+                LIMIT %s
+                FOR UPDATE OF dm
+            """, lastKey + (horizon, self.chunkSize))
+            return [((userID, mealDate, mealTypeID), mealDate, mealID, fatLevel, sugarLevel) for userID, mealDate, mealTypeID, mealID, fatLevel, sugarLevel in cursor.fetchall()]
+
+        cursor.execute(f"""
+            SELECT dm.fk_user_id, dm.fk_day_id, dm.fk_meal_type_id, dm.fk_meal_id, d.year, d.month, d.day, {levelColumns}
+            FROM day_meals dm
+            JOIN days d ON d.ID = dm.fk_day_id
+            {mealsJoin}
+            WHERE (dm.fk_user_id, dm.fk_day_id, dm.fk_meal_type_id) > (%s, %s, %s)
+                AND (d.year < %s OR (d.year = %s AND d.month < %s))
+            ORDER BY dm.fk_user_id, dm.fk_day_id, dm.fk_meal_type_id
+            LIMIT %s
+            FOR UPDATE OF dm
+        """, lastKey + (horizon.year, horizon.year, horizon.month, self.chunkSize))
+        return [
+            ((userID, dayID, mealTypeID), self.__getMealDate(year, month, day), mealID, fatLevel, sugarLevel)
+            for userID, dayID, mealTypeID, mealID, year, month, day, fatLevel, sugarLevel in cursor.fetchall()
+        ]
+
+    def __deleteChunk(self, cursor, rows: list) -> None:
+        """
+        Private helper deleting archived day meals from every layout the API writes, and their meals.
+
+        Args:
+            cursor: The cursor of the database.
+            rows (list): The archived rows as returned by `__selectChunk()`.
+        """
+        if self.dbWrapper.schemaVersion in ("v1", "dual"):
+            cursor.executemany(
+                "DELETE FROM day_meals WHERE fk_user_id=%s AND fk_day_id=%s AND fk_meal_type_id=%s",
+                [key for key, _, _, _, _ in rows]
+            )
+        if self.dbWrapper.schemaVersion in ("dual", "v2"):
+            cursor.executemany(
+                "DELETE FROM day_meals_v2 WHERE fk_user_id=%s AND meal_date=%s AND fk_meal_type_id=%s",
+                [(key[0], mealDate, key[2]) for key, mealDate, _, _, _ in rows]
+            )
+        mealIDs = [mealID for _, _, mealID, _, _ in rows if mealID is not None]
+        if mealIDs:
+            cursor.execute(f"DELETE FROM meals WHERE ID IN ({', '.join(['%s'] * len(mealIDs))})", mealIDs)
+
+    def __getMealDate(self, year: int, month: int, day: int):
+        """
+        Private helper converting a day of the days table to a date.
+
+        Returns:
+            datetime.date or None: The date, or None if it does not exist in the calendar.
+        """
+        try:
+            return datetime.date(year, month, day)
+        except ValueError:
+            return None
+
+
+def main():
+    """
+    Parses the command line arguments and archives the old day meals.
+    """
+    parser = argparse.ArgumentParser(description="Moves the day meals older than the archive horizon into the archive.")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Day meals moved per transaction")
+    parser.add_argument("--pause-seconds", type=float, default=0.05, help="Pause between two chunks")
+    args = parser.parse_args()
+
+    db_wrapper = DatabaseWrapper()
+    if db_wrapper.getArchiveHorizonDate() is None:
+        parser.error("database.archiveHorizonMonths is not set")
+    for report in MealArchiver(db_wrapper, args.chunk_size, args.pause_seconds).archive():
+        print(f"Archive: done: {report}")
+
+
+if __name__ == "__main__":
+    main()
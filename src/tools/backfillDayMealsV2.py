@@ -0,0 +1,155 @@
+# Copyright (C) 2024 Patrick Michiels
+# All rights reserved.
+# This source code is licensed under the Evaluation License Agreement and
+# may not be used, modified, or distributed without explicit permission from the author.
+# This code is provided for evaluation purposes only.
+
+"""
+Online backfill copying the day meals of schema v1 (`day_meals` + `days`) into `day_meals_v2`.
+
+The migration to schema v2 runs while the API keeps serving requests:
+1. Create `day_meals_v2` (`install/database/migrations/002_day_meals_v2*.sql`) on the primary and every shard.
+2. Set `database.schemaVersion` to "dual" and restart the API, so every new write goes to both layouts.
+3. Run this tool. It copies the existing rows in small keyset paginated chunks, each in its own short transaction,
+   so no long locks are held. Rows already present in `day_meals_v2` are skipped, so the tool can simply be rerun.
+4. Set `database.schemaVersion` to "v2" and restart the API. The `days` and `day_meals` tables are not used anymore.
+
+Inline meal levels (`database.inlineMealLevels` other than "off") are copied along.
+
+Rows of schema v1 with a date that does not exist in the calendar (e.g. February 31st) cannot be stored in a `DATE`
+column; they are skipped and counted in the report.
+
+Usage example:
+
+    # Backfill the primary (or every shard if sharding is enabled)
+    python -m src.tools.backfillDayMealsV2 --chunk-size 1000 --pause-seconds 0.05
+"""
+
+import argparse
+import datetime
+import time
+
+from src.utils.databaseWrapper import DatabaseWrapper
+
+
+class DayMealsV2Backfiller:
+    """
+    Copies the day meals of schema v1 into `day_meals_v2` in chunks.
+
+    Attributes:
+        dbWrapper (DatabaseWrapper): The database wrapper holding the primary and shard connections.
+        chunkSize (int): The number of day meals copied per transaction.
+        pauseSeconds (float): Seconds to pause between two chunks, leaving room for the API's own queries.
+    """
+
+    def __init__(self, dbWrapper: DatabaseWrapper, chunkSize: int = 1000, pauseSeconds: float = 0.05):
+        """
+        Initializes the DayMealsV2Backfiller.
+
+        Args:
+            dbWrapper (DatabaseWrapper): The database wrapper holding the primary and shard connections.
+            chunkSize (int, optional): The number of day meals copied per transaction. Defaults to 1000.
+            pauseSeconds (float, optional): Seconds to pause between two chunks. Defaults to 0.05.
+        """
+        self.dbWrapper = dbWrapper
+        self.chunkSize = chunkSize
+        self.pauseSeconds = pauseSeconds
+
+    def backfill(self) -> list:
+        """
+        Backfills the primary, or every shard if sharding is enabled.
+
+        Raises:
+            ValueError: If the API does not write both layouts yet (`database.schemaVersion` is not "dual").
+
+        Returns:
+            list: One report per database containing its name and the number of copied and skipped rows
+                  as well as the row counts of both layouts afterwards.
+        """
+        if self.dbWrapper.schemaVersion != "dual":
+            raise ValueError("Set database.schemaVersion to \"dual\" (and restart the API) before backfilling")
+
+        targets = self.dbWrapper.shards if self.dbWrapper.isShardingEnabled() else [self.dbWrapper.primary]
+        return [self.backfillTarget(target) for target in targets]
+
+    def backfillTarget(self, target) -> dict:
+        """
+        Copies all day meals of one database into `day_meals_v2`.
+
+        Args:
+            target (ConnectionTarget): The database (primary or shard) to backfill.
+
+        Returns:
+            dict: A report containing the name of the database, the number of copied and skipped rows
+                  and the row counts of both layouts afterwards.
+        """
+        connection = target.dbConnection
+        cursor = connection.cursor(buffered=True)
+        report = {"target": target.name, "copied": 0, "skipped": 0}
+        lastKey = (0, 0, 0)
+        copyLevels = self.dbWrapper.inlineMealLevels != "off"
+        selectLevelColumns = ", dm.fat_level, dm.sugar_level" if copyLevels else ""
+        insertLevelColumns, insertLevelPlaceholders = (", fat_level, sugar_level", ", %s, %s") if copyLevels else ("", "")
+
+        while True:
+            query = f"""
+                SELECT dm.fk_user_id, dm.fk_day_id, dm.fk_meal_type_id, dm.fk_meal_id, d.year, d.month, d.day{selectLevelColumns}
+                FROM day_meals dm
+                JOIN days d ON d.ID = dm.fk_day_id
+                WHERE (dm.fk_user_id, dm.fk_day_id, dm.fk_meal_type_id) > (%s, %s, %s)
+                ORDER BY dm.fk_user_id, dm.fk_day_id, dm.fk_meal_type_id
+                LIMIT %s
+            """
+            cursor.execute(query, (*lastKey, self.chunkSize))
+            rows = cursor.fetchall()
+            if not rows:
+                connection.commit()
+                break
+
+            values = []
+            for userID, dayID, mealTypeID, mealID, year, month, day, *levels in rows:
+                try:
+                    values.append((userID, datetime.date(year, month, day), mealTypeID, mealID, *levels))
+                except ValueError:
+                    report["skipped"] += 1
+
+            # Rows written by the API in the meantime (or by an earlier run) are ignored. So are rows whose meal was
+            # deleted after the select, as their foreign key to meals fails.
+            if values:
+                cursor.executemany(f"""
+                    INSERT IGNORE INTO day_meals_v2 (fk_user_id, meal_date, fk_meal_type_id, fk_meal_id{insertLevelColumns})
+                    VALUES (%s, %s, %s, %s{insertLevelPlaceholders})
+                """, values)
+                report["copied"] += max(cursor.rowcount, 0)
+            connection.commit()
+
+            lastKey = rows[-1][:3]
+            print(f"Backfill {target.name}: copied {report['copied']}, skipped {report['skipped']} (last key {lastKey})")
+            time.sleep(self.pauseSeconds)
+
+        cursor.execute("SELECT COUNT(*) FROM day_meals")
+        report["v1Rows"] = cursor.fetchone()[0]
+        cursor.execute("SELECT COUNT(*) FROM day_meals_v2")
+        report["v2Rows"] = cursor.fetchone()[0]
+        connection.commit()
+        return report
+
+
+def main():
+    """
+    Parses the command line arguments and backfills `day_meals_v2`.
+    """
+    parser = argparse.ArgumentParser(description="Copies the day meals of schema v1 into day_meals_v2.")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Day meals copied per transaction")
+    parser.add_argument("--pause-seconds", type=float, default=0.05, help="Pause between two chunks")
+    args = parser.parse_args()
+
+    db_wrapper = DatabaseWrapper()
+    if db_wrapper.schemaVersion != "dual":
+        parser.error("database.schemaVersion must be \"dual\" while backfilling")
+    for report in DayMealsV2Backfiller(db_wrapper, args.chunk_size, args.pause_seconds).backfill():
+        print(f"Backfill: done: {report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# Copyright (C) 2024 Patrick Michiels
+# All rights reserved.
+# This source code is licensed under the Evaluation License Agreement and
+# may not be used, modified, or distributed without explicit permission from the author.
+# This code is provided for evaluation purposes only.
+
+"""
+Online backfill of the user name blind index (`users.name_bidx`, see `authentication.name_blind_index`).
+
+The blind index lets the API find a user through an index instead of decrypting every user name. It is switched on
+while the API keeps serving requests:
+1. Add the column and index (`install/database/migrations/009_name_blind_index.sql`) to the primary.
+2. Set `authentication.name_blind_index_key` and `authentication.name_blind_index` to "dual" and restart the API.
+   New users get a blind index; users without one are still found by decrypting their names.
+3. Run this tool. It walks the users in keyset paginated batches by ID, each in its own short transaction, and
+   fills the blind index of those that have none. It only touches users without one, so it can be rerun any time.
+4. Once the report shows no remaining users, set `authentication.name_blind_index` to "on" and restart the API.
+
+Usage example:
+
+    # Fill the blind index of all users
+    python -m src.tools.backfillNameBlindIndex --batch-size 1000
+"""
+
+import argparse
+import time
+
+from src.utils.databaseWrapper import DatabaseWrapper
+
+
+def main():
+    """
+    Parses the command line arguments and fills the blind index of all users.
+    """
+    parser = argparse.ArgumentParser(description="Fills the blind index of the user names in batches.")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Users per transaction")
+    parser.add_argument("--pause-seconds", type=float, default=0.05, help="Pause between two batches")
+    args = parser.parse_args()
+    if args.batch_size < 1:
+        parser.error("--batch-size must be at least 1")
+
+    db_wrapper = DatabaseWrapper()
+    if db_wrapper.nameBlindIndex == "off":
+        parser.error("authentication.name_blind_index is off")
+
+    user_repo = db_wrapper.getUserRepo()
+    last_id, updated = 0, 0
+    while last_id is not None:
+        result = user_repo.backfillNameBlindIndex(last_id, args.batch_size)
+        if result is None:
+            raise SystemExit(f"Name blind index backfill: failed after ID {last_id}, run again to continue")
+        last_id = result["lastID"]
+        updated += result["updated"]
+        print(f"Name blind index backfill: updated {updated} (last ID {last_id})")
+        time.sleep(args.pause_seconds)
+
+    db_wrapper.dbCursor.execute("SELECT COUNT(*) FROM users WHERE name_bidx IS NULL")
+    report = {"updated": updated, "remaining": db_wrapper.dbCursor.fetchone()[0]}
+    db_wrapper.dbConnection.commit()
+    print(f"Name blind index backfill: done: {report}")
+
+
+if __name__ == "__main__":
+    main()
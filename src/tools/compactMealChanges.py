@@ -0,0 +1,104 @@
+# Copyright (C) 2024 Patrick Michiels
+# All rights reserved.
+# This source code is licensed under the Evaluation License Agreement and
+# may not be used, modified, or distributed without explicit permission from the author.
+# This code is provided for evaluation purposes only.
+
+"""
+Compaction of the meal change log (`database.mealChangeLog`) read by `/v1/sync`.
+
+For every user, the tool removes
+1. the changes superseded by a newer change of the same day meal, which a syncing client never needs, and
+2. the changes older than the retention period (`sync.retentionDays`). Clients that did not sync within that period
+   receive 410 from `/v1/sync` and re-read their data.
+
+Every user is compacted in its own short transaction on the shard holding its meals, so the tool can run while the
+API keeps serving requests (e.g. nightly from cron). Users being moved between shards are skipped.
+
+Usage example:
+
+    # Compact the change log of every user with the configured retention
+    python -m src.tools.compactMealChanges
+
+    # Keep only the last 7 days
+    python -m src.tools.compactMealChanges --retention-days 7
+"""
+
+import argparse
+import time
+
+from src.utils.configLoader import loadConfig
+from src.utils.databaseWrapper import DatabaseWrapper
+
+
+class MealChangeCompactor:
+    """
+    Compacts the meal change log of all users.
+
+    Attributes:
+        dbWrapper (DatabaseWrapper): The database wrapper holding the primary and shard connections.
+        retentionDays (int): Changes older than this are removed.
+        pauseSeconds (float): Seconds to pause between two users, leaving room for the API's own queries.
+    """
+
+    def __init__(self, dbWrapper: DatabaseWrapper, retentionDays: int, pauseSeconds: float = 0.01):
+        """
+        Initializes the MealChangeCompactor.
+
+        Args:
+            dbWrapper (DatabaseWrapper): The database wrapper holding the primary and shard connections.
+            retentionDays (int): Changes older than this are removed.
+            pauseSeconds (float, optional): Seconds to pause between two users. Defaults to 0.01.
+        """
+        self.dbWrapper = dbWrapper
+        self.retentionDays = retentionDays
+        self.pauseSeconds = pauseSeconds
+
+    def compactAll(self) -> dict:
+        """
+        Compacts the change log of every user.
+
+        Returns:
+            dict: The number of compacted, skipped and failed users and of removed superseded and expired changes.
+        """
+        report = {"users": 0, "skipped": 0, "failed": 0, "superseded": 0, "expired": 0}
+        for userID in self.dbWrapper.getUserRepo().iterateUserIDs():
+            if self.dbWrapper.useShardOfUser(userID)["is_moving"]:
+                report["skipped"] += 1
+                continue
+
+            result = self.dbWrapper.getMealChangeRepo().compactChanges(userID, self.retentionDays)
+            if result is None:
+                report["failed"] += 1
+                print(f"Meal change compaction: failed for user {userID}")
+                continue
+            report["users"] += 1
+            report["superseded"] += result["superseded"]
+            report["expired"] += result["expired"]
+            if report["users"] % 1000 == 0:
+                print(f"Meal change compaction: {report}")
+            time.sleep(self.pauseSeconds)
+        return report
+
+
+def main():
+    """
+    Parses the command line arguments and compacts the meal change log.
+    """
+    sync_config = loadConfig().get("sync", {})
+    parser = argparse.ArgumentParser(description="Removes superseded and expired entries of the meal change log.")
+    parser.add_argument("--retention-days", type=int, default=int(sync_config.get("retentionDays", 30)), help="Changes older than this are removed")
+    parser.add_argument("--pause-seconds", type=float, default=0.01, help="Pause between two users")
+    args = parser.parse_args()
+
+    db_wrapper = DatabaseWrapper()
+    if not db_wrapper.mealChangeLog:
+        parser.error("database.mealChangeLog is disabled")
+    if args.retention_days < 1:
+        parser.error("--retention-days must be at least 1")
+    report = MealChangeCompactor(db_wrapper, args.retention_days, args.pause_seconds).compactAll()
+    print(f"Meal change compaction: done: {report}")
+
+
+if __name__ == "__main__":
+    main()
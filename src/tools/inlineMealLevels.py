@@ -0,0 +1,189 @@
+# Copyright (C) 2024 Patrick Michiels
+# All rights reserved.
+# This source code is licensed under the Evaluation License Agreement and
+# may not be used, modified, or distributed without explicit permission from the author.
+# This code is provided for evaluation purposes only.
+
+"""
+Resumable migration copying the fat and sugar levels of the existing day meals from `meals` into the day meal rows.
+
+The migration runs while the API keeps serving requests:
+1. Add the inline columns (`install/database/migrations/003_inline_meal_levels.sql`) on the primary and every shard.
+2. Set `database.inlineMealLevels` to "dual" and restart the API, so every write stores the levels in both places.
+3. Run this tool. It walks every day meal table of the configured schema version in keyset paginated chunks, each
+   updated in its own short transaction. The last finished key of every table is stored in a checkpoint file, so an
+   interrupted run continues where it stopped. Rows that already have inline levels are left untouched.
+4. Set `database.inlineMealLevels` to "on" and restart the API. New day meals no longer get a `meals` row and reads
+   no longer join `meals`.
+
+Usage example:
+
+    # Migrate the primary (or every shard if sharding is enabled)
+    python -m src.tools.inlineMealLevels --checkpoint inline_meal_levels_checkpoint.json --chunk-size 1000
+"""
+
+import argparse
+import json
+import os
+import time
+
+from src.utils.databaseWrapper import DatabaseWrapper
+
+
+class MealLevelInliner:
+    """
+    Copies the levels of the existing day meals from `meals` into the inline columns in chunks.
+
+    Attributes:
+        dbWrapper (DatabaseWrapper): The database wrapper holding the primary and shard connections.
+        checkpointPath (str): The JSON file holding the progress per database and table.
+        chunkSize (int): The number of day meals updated per transaction.
+        pauseSeconds (float): Seconds to pause between two chunks, leaving room for the API's own queries.
+    """
+
+    # Primary key columns and the key to start before, per day meal table.
+    TABLE_KEYS = {
+        "day_meals": (("fk_user_id", "fk_day_id", "fk_meal_type_id"), [0, 0, 0]),
+        "day_meals_v2": (("fk_user_id", "meal_date", "fk_meal_type_id"), [0, "1000-01-01", 0]),
+    }
+
+    def __init__(self, dbWrapper: DatabaseWrapper, checkpointPath: str, chunkSize: int = 1000, pauseSeconds: float = 0.05):
+        """
+        Initializes the MealLevelInliner.
+
+        Args:
+            dbWrapper (DatabaseWrapper): The database wrapper holding the primary and shard connections.
+            checkpointPath (str): The JSON file holding the progress per database and table.
+            chunkSize (int, optional): The number of day meals updated per transaction. Defaults to 1000.
+            pauseSeconds (float, optional): Seconds to pause between two chunks. Defaults to 0.05.
+        """
+        self.dbWrapper = dbWrapper
+        self.checkpointPath = checkpointPath
+        self.chunkSize = chunkSize
+        self.pauseSeconds = pauseSeconds
+
+    def migrate(self) -> list:
+        """
+        Migrates every day meal table of the configured schema version on the primary, or on every shard.
+
+        Raises:
+            ValueError: If the API does not write both places yet (`database.inlineMealLevels` is not "dual").
+
+        Returns:
+            list: One report per database and table containing the number of updated rows and the number of rows
+                  still lacking inline levels afterwards (0 once the migration is complete).
+        """
+        if self.dbWrapper.inlineMealLevels != "dual":
+            raise ValueError("Set database.inlineMealLevels to \"dual\" (and restart the API) before migrating")
+
+        tables = []
+        if self.dbWrapper.schemaVersion in ("v1", "dual"):
+            tables.append("day_meals")
+        if self.dbWrapper.schemaVersion in ("dual", "v2"):
+            tables.append("day_meals_v2")
+
+        targets = self.dbWrapper.shards if self.dbWrapper.isShardingEnabled() else [self.dbWrapper.primary]
+        checkpoint = self.__loadCheckpoint()
+        return [self.migrateTable(target, table, checkpoint) for target in targets for table in tables]
+
+    def migrateTable(self, target, table: str, checkpoint: dict) -> dict:
+        """
+        Copies the levels into the inline columns of one table, continuing after the checkpointed key.
+
+        Args:
+            target (ConnectionTarget): The database (primary or shard) to migrate.
+            table (str): The day meal table ("day_meals" or "day_meals_v2").
+            checkpoint (dict): The progress of all databases and tables, updated and saved after every chunk.
+
+        Returns:
+            dict: A report containing the database, the table, the number of updated rows and the remaining rows.
+        """
+        keyColumns, startKey = self.TABLE_KEYS[table]
+        keys = ", ".join(f"dm.{column}" for column in keyColumns)
+        placeholders = ", ".join(["%s"] * len(keyColumns))
+        progress = checkpoint.setdefault(f"{target.name}/{table}", {"lastKey": startKey, "updated": 0, "done": False})
+
+        connection = target.dbConnection
+        cursor = connection.cursor(buffered=True)
+        while not progress["done"]:
+            # The upper key of the chunk, so the update touches a bounded key range.
+            cursor.execute(
+                f"SELECT {keys} FROM {table} dm WHERE ({keys}) > ({placeholders}) ORDER BY {keys} LIMIT 1 OFFSET %s",
+                (*progress["lastKey"], self.chunkSize - 1)
+            )
+            upperKey = cursor.fetchone()
+
+            query = f"""
+                UPDATE {table} dm
+                JOIN meals m ON m.ID = dm.fk_meal_id
+                SET dm.fat_level = m.fat_level, dm.sugar_level = m.sugar_level
+                WHERE ({keys}) > ({placeholders}) AND dm.fat_level IS NULL
+            """
+            values = tuple(progress["lastKey"])
+            if upperKey is not None:
+                query += f" AND ({keys}) <= ({placeholders})"
+                values += tuple(upperKey)
+            cursor.execute(query, values)
+            progress["updated"] += max(cursor.rowcount, 0)
+            connection.commit()
+
+            # Rows created after the last chunk was selected already carry inline levels (dual writes).
+            if upperKey is None:
+                progress["done"] = True
+            else:
+                progress["lastKey"] = [str(value) if not isinstance(value, int) else value for value in upperKey]
+            self.__saveCheckpoint(checkpoint)
+            print(f"Inline levels {target.name}/{table}: updated {progress['updated']} (last key {progress['lastKey']})")
+            time.sleep(self.pauseSeconds)
+
+        cursor.execute(f"SELECT COUNT(*) FROM {table} WHERE fat_level IS NULL AND fk_meal_id IS NOT NULL")
+        remaining = cursor.fetchone()[0]
+        connection.commit()
+        return {"target": target.name, "table": table, "updated": progress["updated"], "remaining": remaining}
+
+    def __loadCheckpoint(self) -> dict:
+        """
+        Private helper loading the progress of an earlier run.
+
+        Returns:
+            dict: The progress per database and table, empty if there was no earlier run.
+        """
+        if not os.path.exists(self.checkpointPath):
+            return {}
+        with open(self.checkpointPath) as checkpointFile:
+            return json.load(checkpointFile)
+
+    def __saveCheckpoint(self, checkpoint: dict) -> None:
+        """
+        Private helper atomically replacing the checkpoint file.
+
+        Args:
+            checkpoint (dict): The progress per database and table.
+        """
+        temporaryPath = self.checkpointPath + ".tmp"
+        with open(temporaryPath, "w") as checkpointFile:
+            json.dump(checkpoint, checkpointFile)
+            checkpointFile.flush()
+            os.fsync(checkpointFile.fileno())
+        os.replace(temporaryPath, self.checkpointPath)
+
+
+def main():
+    """
+    Parses the command line arguments and migrates the meal levels.
+    """
+    parser = argparse.ArgumentParser(description="Copies the meal levels from meals into the day meal rows.")
+    parser.add_argument("--checkpoint", default="inline_meal_levels_checkpoint.json", help="File storing the progress")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Day meals updated per transaction")
+    parser.add_argument("--pause-seconds", type=float, default=0.05, help="Pause between two chunks")
+    args = parser.parse_args()
+
+    db_wrapper = DatabaseWrapper()
+    if db_wrapper.inlineMealLevels != "dual":
+        parser.error("database.inlineMealLevels must be \"dual\" while migrating")
+    for report in MealLevelInliner(db_wrapper, args.checkpoint, args.chunk_size, args.pause_seconds).migrate():
+        print(f"Inline levels: done: {report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+# Copyright (C) 2024 Patrick Michiels
+# All rights reserved.
+# This source code is licensed under the Evaluation License Agreement and
+# may not be used, modified, or distributed without explicit permission from the author.
+# This code is provided for evaluation purposes only.
+
+"""
+Deletes a user and all its meal data while the API keeps running (see `UserRepo.purgeUser()`).
+
+The user is locked out first, then its day meals, meals and meal changes are deleted in small batches with a pause
+in between, so the purge never holds locks that other users' requests would wait for. The user row is deleted last.
+If the tool is interrupted, run it again for the same user; it continues with the rows that are left.
+
+Usage example:
+
+    # Purge user 42
+    python -m src.tools.purgeUser --user-id 42
+
+    # Gentler on a busy database
+    python -m src.tools.purgeUser --user-id 42 --batch-size 200 --pause-seconds 0.2
+"""
+
+import argparse
+
+from src.utils.databaseWrapper import DatabaseWrapper
+
+
+def main():
+    """
+    Parses the command line arguments and purges one user.
+    """
+    parser = argparse.ArgumentParser(description="Deletes a user and all its meal data in small batches.")
+    parser.add_argument("--user-id", type=int, required=True, help="ID of the user to purge")
+    parser.add_argument("--batch-size", type=int, default=500, help="Rows deleted per transaction")
+    parser.add_argument("--pause-seconds", type=float, default=0.05, help="Pause between two batches")
+    args = parser.parse_args()
+    if args.batch_size < 1:
+        parser.error("--batch-size must be at least 1")
+
+    db_wrapper = DatabaseWrapper()
+    report = db_wrapper.getUserRepo().purgeUser(
+        args.user_id, args.batch_size, args.pause_seconds, lambda progress: print(f"Purge: {progress}")
+    )
+    if report is None:
+        raise SystemExit(f"Purge: failed for user {args.user_id} (or its meal data is being moved), run again to continue")
+    print(f"Purge: done: {report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,509 @@
+# Copyright (C) 2024 Patrick Michiels
+# All rights reserved.
+# This source code is licensed under the Evaluation License Agreement and
+# may not be used, modified, or distributed without explicit permission from the author.
+# This code is provided for evaluation purposes only.
+
+"""
+Query plan regression check for the SQL statements of the repositories (`src/utils/repositories`).
+
+The check runs a scenario calling every repository method against a local database (never production: it writes
+a test user and, if asked to, seeds data). Every statement the repositories execute is first run with `EXPLAIN` and
+the same parameters, so the plans are those of the real queries. A statement fails if its plan reads more than
+`--max-rows` estimated rows of a table with a full table scan (access type ALL) or a filesort.
+
+The plans depend on the size of the tables, so seed a realistically sized database first (`--seed-users`,
+`--seed-days`). Seeding only runs on an empty users table and refreshes the table statistics afterwards. The
+report lists the access type, the key and the estimated rows of every table of every statement, followed by the
+failures and the repository functions containing SQL that the scenario did not reach (e.g. those of a disabled
+feature such as `database.mealChangeLog`). The exit code is 1 if any statement failed.
+
+Scans the current configuration cannot avoid are reported as known instead of failing: without the blind index in
+"on" mode (`authentication.name_blind_index`), finding a user by name decrypts every name. The same check runs as a
+pytest test (`tests/test_queryPlan.py`) when a local database is configured.
+
+Usage example:
+
+    # Seed 2000 users with 30 days of meals each, then check every statement
+    python -m src.tools.queryPlanCheck --seed-users 2000 --seed-days 30
+
+    # Check again on the seeded database with a stricter threshold
+    python -m src.tools.queryPlanCheck --max-rows 100
+"""
+
+import argparse
+import ast
+import datetime
+import os
+import traceback
+import uuid
+
+from src.utils.databaseWrapper import DatabaseWrapper
+
+REPOSITORIES_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "utils", "repositories")
+
+
+class QueryPlanRecorder:
+    """
+    Collects the plans of the statements executed while recording, one entry per distinct statement.
+
+    Attributes:
+        maxRows (int): Full table scans and filesorts estimated to read more rows than this fail.
+        knownScans (dict): Per repository function and table the reason why its full scans are expected.
+        recording (bool): Whether executed statements are explained.
+        plans (dict): Per normalized statement the calling repository function, the plan rows and an error, if any.
+        reached (set): The repository functions that executed any statement while recording.
+    """
+
+    def __init__(self, maxRows: int):
+        """
+        Initializes the QueryPlanRecorder without plans.
+
+        Args:
+            maxRows (int): Full table scans and filesorts estimated to read more rows than this fail.
+        """
+        self.maxRows = maxRows
+        self.knownScans = {}
+        self.recording = False
+        self.plans = {}
+        self.reached = set()
+
+    def explain(self, cursor, query: str, params) -> None:
+        """
+        Runs `EXPLAIN` for a statement on the cursor about to execute it, keeping the plan reading the most rows.
+
+        Plain inserts (without a select) have no plan worth checking and are skipped. Errors are recorded instead of
+        raised, as the repositories would swallow them and retry.
+
+        Args:
+            cursor: The buffered cursor executing the statement.
+            query (str): The statement.
+            params: The parameters of the statement.
+        """
+        if not self.recording:
+            return
+        caller = self.__getRepositoryCaller()
+        self.reached.add(caller)
+
+        statement = " ".join(query.split())
+        keyword = statement.split(" ", 1)[0].upper()
+        if keyword not in ("SELECT", "UPDATE", "DELETE", "INSERT", "REPLACE"):
+            return
+        if keyword in ("INSERT", "REPLACE") and " SELECT " not in statement.upper():
+            return
+
+        try:
+            cursor.execute(f"EXPLAIN {query}", params)
+            columns = cursor.column_names
+            rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+            error = None
+        except Exception as e:
+            rows, error = [], str(e)
+
+        previous = self.plans.get(statement)
+        if previous is None or self.__getEstimatedRows(rows) > self.__getEstimatedRows(previous["rows"]):
+            self.plans[statement] = {"caller": caller, "rows": rows, "error": error}
+
+    def getFailures(self) -> list:
+        """
+        Returns the statements whose plan fails the check, leaving out the known scans.
+
+        Returns:
+            list: Tuples of the statement, its entry in `plans` and the reason.
+        """
+        return [(statement, plan, reason) for statement, plan, reason, knownReason in self.__getViolations() if knownReason is None]
+
+    def getKnownScans(self) -> list:
+        """
+        Returns the statements whose plan would fail the check, but whose scans are known to be expected.
+
+        Returns:
+            list: Tuples of the statement, its entry in `plans` and the reason it is expected.
+        """
+        return [(statement, plan, knownReason) for statement, plan, reason, knownReason in self.__getViolations() if knownReason is not None]
+
+    def __getViolations(self) -> list:
+        """
+        Private helper checking the plans of all statements.
+
+        Returns:
+            list: Tuples of the statement, its entry in `plans`, the reason and the reason it is expected (or None).
+        """
+        failures = []
+        for statement, plan in self.plans.items():
+            if plan["error"] is not None:
+                failures.append((statement, plan, f"EXPLAIN failed: {plan['error']}", None))
+                continue
+            for row in plan["rows"]:
+                estimatedRows = row.get("rows") or 0
+                extra = row.get("Extra") or ""
+                knownReason = self.knownScans.get((plan["caller"], row.get("table")))
+                if row.get("type") == "ALL" and estimatedRows > self.maxRows:
+                    failures.append((statement, plan, f"full table scan of {row.get('table')} ({estimatedRows} rows)", knownReason))
+                elif "Using filesort" in extra and estimatedRows > self.maxRows:
+                    failures.append((statement, plan, f"filesort on {row.get('table')} ({estimatedRows} rows)", None))
+        return failures
+
+    def __getRepositoryCaller(self) -> str:
+        """
+        Private helper naming the innermost repository function on the call stack.
+
+        Returns:
+            str: The file and function (e.g. "userRepo.py:getUserByName"), or "?" outside the repositories.
+        """
+        for frame in reversed(traceback.extract_stack()):
+            if os.path.dirname(os.path.abspath(frame.filename)) == REPOSITORIES_DIRECTORY:
+                return f"{os.path.basename(frame.filename)}:{frame.name}"
+        return "?"
+
+    def __getEstimatedRows(self, rows: list) -> int:
+        """
+        Private helper summing the estimated rows of a plan.
+
+        Returns:
+            int: The estimated rows read over all tables of the plan.
+        """
+        return sum(row.get("rows") or 0 for row in rows)
+
+
+class ExplainingCursor:
+    """
+    Wraps a database cursor, explaining every statement with the recorder before executing it.
+
+    Everything but `execute()` and `executemany()` is passed through to the wrapped cursor.
+    """
+
+    def __init__(self, cursor, recorder: QueryPlanRecorder):
+        """
+        Initializes the ExplainingCursor.
+
+        Args:
+            cursor: The buffered cursor to wrap.
+            recorder (QueryPlanRecorder): The recorder collecting the plans.
+        """
+        self.cursor = cursor
+        self.recorder = recorder
+
+    def execute(self, query, params=None, *args, **kwargs):
+        """
+        Explains and executes a statement.
+        """
+        self.recorder.explain(self.cursor, query, params)
+        return self.cursor.execute(query, params, *args, **kwargs)
+
+    def executemany(self, query, seqParams, *args, **kwargs):
+        """
+        Explains a statement with its first parameters and executes it for all of them.
+        """
+        seqParams = list(seqParams)
+        if seqParams:
+            self.recorder.explain(self.cursor, query, seqParams[0])
+        return self.cursor.executemany(query, seqParams, *args, **kwargs)
+
+    def __getattr__(self, name):
+        """
+        Passes every other attribute (e.g. `fetchone()`, `rowcount`, `lastrowid`) through to the wrapped cursor.
+        """
+        return getattr(self.cursor, name)
+
+
+class ExplainingDatabaseWrapper(DatabaseWrapper):
+    """
+    Database wrapper handing out explaining cursors to the repositories.
+
+    Statements on dedicated connections (`UserRepo.iterateUserIDs()`) are not explained.
+
+    Attributes:
+        recorder (QueryPlanRecorder): The recorder collecting the plans.
+    """
+
+    def __init__(self, recorder: QueryPlanRecorder):
+        """
+        Initializes the ExplainingDatabaseWrapper and connects to the database.
+
+        Args:
+            recorder (QueryPlanRecorder): The recorder collecting the plans.
+        """
+        self.recorder = recorder
+        super().__init__()
+
+    @property
+    def dbCursor(self):
+        """
+        Explaining cursor of the primary.
+        """
+        return self.__wrap(self.primary.dbCursor)
+
+    def getReadCursor(self):
+        """
+        Returns the explaining cursor reads should be executed on.
+        """
+        return self.__wrap(super().getReadCursor())
+
+    def getShardCursor(self):
+        """
+        Returns the explaining cursor of the shard selected for the current request.
+        """
+        return self.__wrap(super().getShardCursor())
+
+    def getShardReadCursor(self):
+        """
+        Returns the explaining cursor meal data reads should be executed on.
+        """
+        return self.__wrap(super().getShardReadCursor())
+
+    def __wrap(self, cursor) -> ExplainingCursor:
+        """
+        Private helper wrapping a cursor unless it already is an explaining one.
+        """
+        return cursor if isinstance(cursor, ExplainingCursor) else ExplainingCursor(cursor, self.recorder)
+
+
+def seedDatabase(dbWrapper: DatabaseWrapper, users: int, days: int) -> bool:
+    """
+    Seeds users with a meal of every meal type on each of their last days, unless there are users already.
+
+    Args:
+        dbWrapper (DatabaseWrapper): The database wrapper (not recording).
+        users (int): The number of users to create.
+        days (int): The number of days with meals per user, counting back from today.
+
+    Returns:
+        bool: True if the database was seeded, False if it already had users.
+    """
+    dbWrapper.dbCursor.execute("SELECT COUNT(*) FROM users")
+    existingUsers = dbWrapper.dbCursor.fetchone()[0]
+    dbWrapper.dbConnection.commit()
+    if existingUsers > 0:
+        return False
+
+    mealTypeIDs = [mealType["ID"] for mealType in dbWrapper.getMealTypeRepo().getAllMealTypes()]
+    dates = [datetime.date.today() - datetime.timedelta(days=offset) for offset in range(days)]
+    for index in range(users):
+        user = dbWrapper.getUserRepo().createNewUser(f"queryplan-seed-{index}", "seeded, never verifies")
+        dbWrapper.useShardOfUser(user["ID"])
+        dbWrapper.getDayMealRepo().upsertDayMeals([
+            {
+                "userID": user["ID"], "year": date.year, "month": date.month, "day": date.day, "mealTypeID": mealTypeID,
+                "fat_level": (index + date.day) % 3, "sugar_level": (index + mealTypeID) % 3
+            }
+            for date in dates
+            for mealTypeID in mealTypeIDs
+        ])
+        if (index + 1) % 100 == 0:
+            print(f"Query plan check: seeded {index + 1} of {users} users")
+
+    # Refresh the statistics, so the estimates match the seeded data.
+    for target in (dbWrapper.shards if dbWrapper.isShardingEnabled() else []) + [dbWrapper.primary]:
+        cursor = target.dbConnection.cursor(buffered=True)
+        cursor.execute("SHOW TABLES")
+        for (table,) in cursor.fetchall():
+            cursor.execute(f"ANALYZE TABLE `{table}`")
+            cursor.fetchall()
+        target.dbConnection.commit()
+    return True
+
+
+def getKnownScans(dbWrapper: DatabaseWrapper) -> dict:
+    """
+    Lists the full scans the configuration of the database wrapper cannot avoid.
+
+    Args:
+        dbWrapper (DatabaseWrapper): The database wrapper.
+
+    Returns:
+        dict: Per repository function and table the reason why its full scans are expected.
+    """
+    knownScans = {}
+    if dbWrapper.nameBlindIndex != "on":
+        knownScans[("userRepo.py:getUserByName", "users")] = (
+            f"names are decrypted and compared with authentication.name_blind_index {dbWrapper.nameBlindIndex!r} "
+            "(switch it to 'on' after the backfill)"
+        )
+    return knownScans
+
+
+def runScenario(dbWrapper: DatabaseWrapper) -> None:
+    """
+    Calls every repository method with a fresh test user, which is purged again at the end.
+
+    Args:
+        dbWrapper (DatabaseWrapper): The database wrapper recording the plans.
+    """
+    userRepo = dbWrapper.getUserRepo()
+    user = userRepo.createNewUser(f"queryplan-{uuid.uuid4().hex}", "test user, never verifies")
+    if user is None:
+        raise RuntimeError("Could not create the test user")
+    userID = user["ID"]
+    userRepo.getUserByID(userID)
+    userRepo.getUserByName(user["name"])
+    userRepo.getUserByName(f"queryplan-unknown-{uuid.uuid4().hex}")
+    userRepo.getUserIDsPage(0, 100)
+    userRepo.getAllUserIDs()
+    userRepo.updateHashedPassword(userID, user["hashedPassword"], "test user, still never verifies")
+    if dbWrapper.nameBlindIndex != "off":
+        userRepo.backfillNameBlindIndex(userID - 1, 1)
+
+    if dbWrapper.isShardingEnabled():
+        dbWrapper.getShardDirectoryRepo().getShardEntry(userID)
+    dbWrapper.useShardOfUser(userID)
+
+    mealTypeRepo = dbWrapper.getMealTypeRepo()
+    mealTypeID = mealTypeRepo.getMealTypeIDByName("breakfast")
+    otherMealTypeID = mealTypeRepo.getMealTypeIDByName("lunch")
+    mealTypeRepo.getMealTypeNameByID(mealTypeID)
+    mealTypeRepo.getAllMealTypes()
+
+    today = datetime.date.today()
+    dayMealRepo = dbWrapper.getDayMealRepo()
+    dayMealRepo.createNewDayMealByDate(userID, today.year, today.month, today.day, mealTypeID, 1, 1)
+    dayMeal = dayMealRepo.getDayMealByDate(userID, today.year, today.month, today.day, mealTypeID)
+    dayMealRepo.updateDayMealLevelsByDate(userID, today.year, today.month, today.day, mealTypeID, dayMeal["fk_meal_id"], 2, 0)
+    dayMealRepo.upsertDayMeals([
+        {"userID": userID, "year": today.year, "month": today.month, "day": today.day, "mealTypeID": mealTypeID, "fat_level": 0, "sugar_level": 2},
+        {"userID": userID, "year": today.year, "month": today.month, "day": today.day, "mealTypeID": otherMealTypeID, "fat_level": 1, "sugar_level": 1},
+    ])
+    dayMealRepo.getDayMealsByUserIDAndDate(userID, today.year, today.month, today.day)
+    dayMealRepo.getDayOverview(userID, today.year, today.month)
+    dayMealRepo.getDayOverview(userID, today.year)
+    horizon = dbWrapper.getArchiveHorizonDate()
+    if horizon is not None:
+        archived = horizon - datetime.timedelta(days=1)
+        dayMealRepo.getDayMealsByUserIDAndDate(userID, archived.year, archived.month, archived.day)
+
+    mealRepo = dbWrapper.getMealRepo()
+    if dayMeal["fk_meal_id"] is not None:
+        mealRepo.getMealByID(dayMeal["fk_meal_id"])
+        mealRepo.updateMeal(dayMeal["fk_meal_id"], 2, 2)
+    mealRepo.deleteMealByDate(userID, today.year, today.month, today.day, mealTypeID, dayMeal["fk_meal_id"])
+
+    # The layout of schema v1, addressing days by ID.
+    if dbWrapper.schemaVersion != "v2":
+        dayRepo = dbWrapper.getDayRepo()
+        dayID = dayRepo.getDayIDForWrite(today.year, today.month, today.day)
+        dbWrapper.getShardConnection().commit()
+        dayRepo.getDayByID(dayID)
+        dayRepo.getDayByDate(today.year, today.month, today.day)
+        yesterday = today - datetime.timedelta(days=1)
+        if dayRepo.getDayByDate(yesterday.year, yesterday.month, yesterday.day) is None:
+            dayRepo.createNewDay(yesterday.year, yesterday.month, yesterday.day)
+        meal = mealRepo.createNewMeal(1, 1)
+        if meal is not None:
+            dayMealRepo.createNewDayMeal(userID, dayID, mealTypeID, meal["ID"])
+            dayMealRepo.getDayMeal(userID, dayID, mealTypeID)
+            dayMealRepo.getDayMealsByUserIDAndDayID(userID, dayID)
+            mealRepo.deleteMeal(userID, dayID, mealTypeID, meal["ID"])
+
+    if dbWrapper.mealChangeLog:
+        mealChangeRepo = dbWrapper.getMealChangeRepo()
+        mealChangeRepo.getChangesSince(userID, 0, 100)
+        mealChangeRepo.compactChanges(userID, 30)
+
+    userRepo.purgeUser(userID, 500, 0)
+
+
+def findRepositoryFunctionsWithSQL() -> list:
+    """
+    Lists the repository functions that execute SQL, by parsing the repository sources.
+
+    Returns:
+        list: The functions as "file:function" (e.g. "userRepo.py:getUserByName").
+    """
+    functions = []
+    for fileName in sorted(os.listdir(REPOSITORIES_DIRECTORY)):
+        if not fileName.endswith(".py"):
+            continue
+        with open(os.path.join(REPOSITORIES_DIRECTORY, fileName)) as sourceFile:
+            tree = ast.parse(sourceFile.read())
+        for node in ast.walk(tree):
+            if not isinstance(node, ast.FunctionDef):
+                continue
+            executes = any(
+                isinstance(call, ast.Call) and isinstance(call.func, ast.Attribute) and call.func.attr in ("execute", "executemany")
+                for call in ast.walk(node)
+            )
+            if executes:
+                functions.append(f"{fileName}:{node.name}")
+    return functions
+
+
+def printReport(recorder: QueryPlanRecorder) -> list:
+    """
+    Prints the access type, key and estimated rows of every table of every statement, the failures and the repository
+    functions that were not reached.
+
+    Args:
+        recorder (QueryPlanRecorder): The recorder holding the plans.
+
+    Returns:
+        list: The failures as returned by `QueryPlanRecorder.getFailures()`.
+    """
+    print(f"{'Function':<48} {'Table':<20} {'Type':<8} {'Key':<28} {'Rows':>9}  Extra")
+    for statement, plan in sorted(recorder.plans.items(), key=lambda item: item[1]["caller"]):
+        if plan["error"] is not None:
+            print(f"{plan['caller']:<48} {'-':<20} {'ERROR':<8} {'-':<28} {'-':>9}  {plan['error']}")
+        for row in plan["rows"]:
+            print(
+                f"{plan['caller']:<48} {str(row.get('table')):<20} {str(row.get('type')):<8} {str(row.get('key')):<28} "
+                f"{str(row.get('rows')):>9}  {row.get('Extra') or ''}"
+            )
+
+    failures = recorder.getFailures()
+    print(f"\n{len(recorder.plans)} statements checked, {len(failures)} failed (threshold: {recorder.maxRows} rows)")
+    for statement, plan, reason in failures:
+        print(f"FAIL {plan['caller']}: {reason}\n     {statement}")
+    for statement, plan, reason in recorder.getKnownScans():
+        print(f"KNOWN {plan['caller']}: {reason}\n     {statement}")
+
+    notReached = [function for function in findRepositoryFunctionsWithSQL() if function not in recorder.reached]
+    if notReached:
+        print(f"\nNot reached by the scenario (check their plans manually or enable their feature): {', '.join(notReached)}")
+    return failures
+
+
+def checkQueryPlans(maxRows: int, seedUsers: int = 0, seedDays: int = 30) -> QueryPlanRecorder:
+    """
+    Connects to the configured database, seeds it if asked to and records the plans of the scenario.
+
+    Args:
+        maxRows (int): Full table scans and filesorts estimated to read more rows than this fail.
+        seedUsers (int, optional): Users to seed into an empty database first. Defaults to 0.
+        seedDays (int, optional): Days with meals per seeded user. Defaults to 30.
+
+    Returns:
+        QueryPlanRecorder: The recorder holding the plans.
+
+    Raises:
+        mysql.connector.Error: If the database cannot be reached.
+    """
+    recorder = QueryPlanRecorder(maxRows)
+    db_wrapper = ExplainingDatabaseWrapper(recorder)
+    recorder.knownScans = getKnownScans(db_wrapper)
+    if seedUsers > 0 and not seedDatabase(db_wrapper, seedUsers, seedDays):
+        print("Query plan check: the database has users already, not seeding")
+
+    recorder.recording = True
+    runScenario(db_wrapper)
+    recorder.recording = False
+    return recorder
+
+
+def main():
+    """
+    Parses the command line arguments, seeds the database if asked to, runs the scenario and prints the report.
+    """
+    parser = argparse.ArgumentParser(description="Explains every repository statement and fails on full scans and filesorts of large tables.")
+    parser.add_argument("--max-rows", type=int, default=1000, help="Estimated rows above which full table scans and filesorts fail")
+    parser.add_argument("--seed-users", type=int, default=0, help="Users to seed into an empty database first")
+    parser.add_argument("--seed-days", type=int, default=30, help="Days with meals per seeded user")
+    args = parser.parse_args()
+    if args.max_rows < 0 or args.seed_users < 0 or args.seed_days < 1:
+        parser.error("--max-rows and --seed-users must not be negative, --seed-days must be at least 1")
+
+    recorder = checkQueryPlans(args.max_rows, args.seed_users, args.seed_days)
+    if printReport(recorder):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
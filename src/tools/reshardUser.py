@@ -0,0 +1,455 @@
+# Copyright (C) 2024 Patrick Michiels
+# All rights reserved.
+# This source code is licensed under the Evaluation License Agreement and
+# may not be used, modified, or distributed without explicit permission from the author.
+# This code is provided for evaluation purposes only.
+
+"""
+Resharding tool moving the meal data of a user from one shard to another while the API keeps running.
+
+The move is done in four steps:
+1. The user is flagged as moving in the shard directory. The tool waits until every API node has seen the flag
+   (`database.shardDirectoryCacheSeconds`); from then on writes of that user are answered with 503, reads still
+   go to the source shard.
+2. The meal data is copied to the target shard in chunks. Copying is idempotent, so an aborted move can be rerun.
+3. The directory is switched to the target shard and the moving flag is cleared. The tool waits again until every
+   node reads from the target shard.
+4. The meal data is removed from the source shard in chunks.
+
+Only the moved user is affected, all other users keep reading and writing normally.
+
+The day meals are copied in the layout of the configured schema version (`database.schemaVersion` "v1" or "v2").
+The levels are copied in the configured inline level mode (`database.inlineMealLevels` "off" or "on").
+Users cannot be moved while the schema v2 backfill or the inline level migration is running ("dual").
+
+Usage example:
+
+    # Move user 42 to shard 1
+    python -m src.tools.reshardUser --user-id 42 --target-shard 1
+
+    # Move user 42 to the shard its ID hashes to (e.g. after adding shards)
+    python -m src.tools.reshardUser --user-id 42 --to-hash-shard
+"""
+
+import argparse
+import time
+
+from src.utils.databaseWrapper import DatabaseWrapper
+
+
+class UserResharder:
+    """
+    Moves the meal data of single users between shards.
+
+    Attributes:
+        dbWrapper (DatabaseWrapper): The database wrapper holding the shard connections and the shard directory.
+        chunkSize (int): The number of day meals copied or deleted per transaction.
+    """
+
+    def __init__(self, dbWrapper: DatabaseWrapper, chunkSize: int = 500):
+        """
+        Initializes the UserResharder.
+
+        Args:
+            dbWrapper (DatabaseWrapper): The database wrapper holding the shard connections and the shard directory.
+            chunkSize (int, optional): The number of day meals copied or deleted per transaction. Defaults to 500.
+        """
+        self.dbWrapper = dbWrapper
+        self.chunkSize = chunkSize
+
+    def moveUser(self, userID: int, targetShardIndex: int) -> dict:
+        """
+        Moves the meal data of a user to another shard.
+
+        Args:
+            userID (int): The ID of the user.
+            targetShardIndex (int): The index of the shard to move the meal data to.
+
+        Raises:
+            ValueError: If sharding is disabled, the target shard does not exist or the schema is being migrated.
+
+        Returns:
+            dict: A report containing the source and target shard and the number of copied and deleted day meals.
+        """
+        if not self.dbWrapper.isShardingEnabled():
+            raise ValueError("Sharding is disabled (no database.shards configured)")
+        if targetShardIndex < 0 or targetShardIndex >= len(self.dbWrapper.shards):
+            raise ValueError(f"Shard {targetShardIndex} does not exist")
+        if self.dbWrapper.schemaVersion == "dual":
+            raise ValueError("Users cannot be moved while the schema v2 backfill is running (database.schemaVersion \"dual\")")
+        if self.dbWrapper.inlineMealLevels == "dual":
+            raise ValueError("Users cannot be moved while the meal levels are inlined (database.inlineMealLevels \"dual\")")
+
+        directoryRepo = self.dbWrapper.getShardDirectoryRepo()
+        sourceShardIndex = self.dbWrapper.getShardEntryOfUser(userID, useCache=False)["shard_index"]
+        report = {"userID": userID, "sourceShard": sourceShardIndex, "targetShard": targetShardIndex, "copied": 0, "deleted": 0}
+        if sourceShardIndex == targetShardIndex:
+            directoryRepo.createShardEntry(userID, sourceShardIndex)
+            return report
+
+        source = self.dbWrapper.shards[sourceShardIndex]
+        target = self.dbWrapper.shards[targetShardIndex]
+        propagationDelay = self.dbWrapper.shardDirectoryCacheSeconds + 1
+
+        # Block writes of the user on every node before copying.
+        directoryRepo.setMoving(userID, sourceShardIndex, True)
+        time.sleep(propagationDelay)
+        try:
+            if self.dbWrapper.schemaVersion == "v2":
+                report["copied"] = self.__copyMealDataV2(userID, source, target)
+            else:
+                report["copied"] = self.__copyMealData(userID, source, target)
+            if self.dbWrapper.archiveHorizonMonths > 0:
+                self.__copyArchivedDayMeals(userID, source, target)
+            if self.dbWrapper.mealChangeLog:
+                self.__copyMealChanges(userID, source, target)
+        except Exception:
+            directoryRepo.setMoving(userID, sourceShardIndex, False)
+            raise
+
+        # Switch the user to the target shard and wait until no node reads from the source anymore.
+        directoryRepo.setMoving(userID, targetShardIndex, False)
+        time.sleep(propagationDelay)
+        if self.dbWrapper.schemaVersion == "v2":
+            report["deleted"] = self.__deleteMealDataV2(userID, source)
+        else:
+            report["deleted"] = self.__deleteMealData(userID, source)
+        if self.dbWrapper.archiveHorizonMonths > 0:
+            self.__deleteInChunks("day_meals_archive", userID, source)
+        if self.dbWrapper.mealChangeLog:
+            self.__deleteInChunks("meal_changes", userID, source)
+            self.__deleteInChunks("meal_change_seqs", userID, source)
+        return report
+
+    def __copyMealData(self, userID: int, source, target) -> int:
+        """
+        Private helper copying all day meals of a user to the target shard in chunks (keyset paginated).
+
+        Args:
+            userID (int): The ID of the user.
+            source (ConnectionTarget): The shard to copy from.
+            target (ConnectionTarget): The shard to copy to.
+
+        Returns:
+            int: The number of copied day meals.
+        """
+        sourceCursor = source.dbConnection.cursor(buffered=True)
+        targetCursor = target.dbConnection.cursor(buffered=True)
+        targetDayIDs = {}
+        lastKey = (0, 0)
+        copied = 0
+        levelColumns, mealsJoin = self.__getLevelColumnsAndJoin()
+
+        while True:
+            query = f"""
+                SELECT dm.fk_day_id, dm.fk_meal_type_id, d.year, d.month, d.day, {levelColumns}
+                FROM day_meals dm
+                JOIN days d ON d.ID = dm.fk_day_id
+                {mealsJoin}
+                WHERE dm.fk_user_id = %s AND (dm.fk_day_id, dm.fk_meal_type_id) > (%s, %s)
+                ORDER BY dm.fk_day_id, dm.fk_meal_type_id
+                LIMIT %s
+            """
+            sourceCursor.execute(query, (userID, lastKey[0], lastKey[1], self.chunkSize))
+            rows = sourceCursor.fetchall()
+            if not rows:
+                break
+
+            for dayID, mealTypeID, year, month, day, fatLevel, sugarLevel in rows:
+                targetDayID = targetDayIDs.get((year, month, day))
+                if targetDayID is None:
+                    targetDayID = self.__getOrCreateDayID(targetCursor, year, month, day)
+                    targetDayIDs[(year, month, day)] = targetDayID
+
+                self.__writeDayMeal(targetCursor, "day_meals", ("fk_user_id", "fk_day_id", "fk_meal_type_id"), (userID, targetDayID, mealTypeID), fatLevel, sugarLevel)
+                lastKey = (dayID, mealTypeID)
+
+            target.dbConnection.commit()
+            copied += len(rows)
+            print(f"Resharding: copied {copied} day meals of user {userID}")
+
+        return copied
+
+    def __copyMealDataV2(self, userID: int, source, target) -> int:
+        """
+        Private helper copying all day meals of a user in schema v2 (`day_meals_v2`) to the target shard in chunks.
+
+        Args:
+            userID (int): The ID of the user.
+            source (ConnectionTarget): The shard to copy from.
+            target (ConnectionTarget): The shard to copy to.
+
+        Returns:
+            int: The number of copied day meals.
+        """
+        sourceCursor = source.dbConnection.cursor(buffered=True)
+        targetCursor = target.dbConnection.cursor(buffered=True)
+        lastKey = ("0001-01-01", 0)
+        copied = 0
+        levelColumns, mealsJoin = self.__getLevelColumnsAndJoin()
+
+        while True:
+            query = f"""
+                SELECT dm.meal_date, dm.fk_meal_type_id, {levelColumns}
+                FROM day_meals_v2 dm
+                {mealsJoin}
+                WHERE dm.fk_user_id = %s AND (dm.meal_date, dm.fk_meal_type_id) > (%s, %s)
+                ORDER BY dm.meal_date, dm.fk_meal_type_id
+                LIMIT %s
+            """
+            sourceCursor.execute(query, (userID, lastKey[0], lastKey[1], self.chunkSize))
+            rows = sourceCursor.fetchall()
+            if not rows:
+                break
+
+            for mealDate, mealTypeID, fatLevel, sugarLevel in rows:
+                self.__writeDayMeal(targetCursor, "day_meals_v2", ("fk_user_id", "meal_date", "fk_meal_type_id"), (userID, mealDate, mealTypeID), fatLevel, sugarLevel)
+                lastKey = (mealDate, mealTypeID)
+
+            target.dbConnection.commit()
+            copied += len(rows)
+            print(f"Resharding: copied {copied} day meals of user {userID}")
+
+        return copied
+
+    def __copyMealChanges(self, userID: int, source, target) -> None:
+        """
+        Private helper copying the meal change log of a user to the target shard in chunks, so clients keep syncing
+        with the same sequence numbers after the move.
+
+        Args:
+            userID (int): The ID of the user.
+            source (ConnectionTarget): The shard to copy from.
+            target (ConnectionTarget): The shard to copy to.
+        """
+        sourceCursor = source.dbConnection.cursor(buffered=True)
+        targetCursor = target.dbConnection.cursor(buffered=True)
+        sourceCursor.execute("SELECT last_seq, compacted_seq FROM meal_change_seqs WHERE fk_user_id=%s", (userID,))
+        seqs = sourceCursor.fetchone()
+        if seqs is None:
+            return
+
+        lastSeq = 0
+        columns = "seq, operation, year, month, day, fk_meal_type_id, fat_level, sugar_level, changed_at"
+        while True:
+            sourceCursor.execute(
+                f"SELECT {columns} FROM meal_changes WHERE fk_user_id=%s AND seq > %s ORDER BY seq LIMIT %s",
+                (userID, lastSeq, self.chunkSize)
+            )
+            rows = sourceCursor.fetchall()
+            if not rows:
+                break
+            targetCursor.executemany(
+                f"INSERT IGNORE INTO meal_changes (fk_user_id, {columns}) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
+                [(userID,) + tuple(row) for row in rows]
+            )
+            target.dbConnection.commit()
+            lastSeq = rows[-1][0]
+
+        targetCursor.execute("""
+            INSERT INTO meal_change_seqs (fk_user_id, last_seq, compacted_seq) VALUES (%s, %s, %s)
+            ON DUPLICATE KEY UPDATE last_seq = VALUES(last_seq), compacted_seq = VALUES(compacted_seq)
+        """, (userID, seqs[0], seqs[1]))
+        target.dbConnection.commit()
+
+    def __copyArchivedDayMeals(self, userID: int, source, target) -> None:
+        """
+        Private helper copying the archived day meals of a user to the target shard in chunks (keyset paginated).
+
+        Args:
+            userID (int): The ID of the user.
+            source (ConnectionTarget): The shard to copy from.
+            target (ConnectionTarget): The shard to copy to.
+        """
+        sourceCursor = source.dbConnection.cursor(buffered=True)
+        targetCursor = target.dbConnection.cursor(buffered=True)
+        lastKey = ("0001-01-01", 0)
+        while True:
+            sourceCursor.execute("""
+                SELECT meal_date, fk_meal_type_id, fat_level, sugar_level, archived_at FROM day_meals_archive
+                WHERE fk_user_id = %s AND (meal_date, fk_meal_type_id) > (%s, %s)
+                ORDER BY meal_date, fk_meal_type_id
+                LIMIT %s
+            """, (userID, lastKey[0], lastKey[1], self.chunkSize))
+            rows = sourceCursor.fetchall()
+            if not rows:
+                break
+            targetCursor.executemany("""
+                INSERT INTO day_meals_archive (fk_user_id, meal_date, fk_meal_type_id, fat_level, sugar_level, archived_at)
+                VALUES (%s, %s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE fat_level = VALUES(fat_level), sugar_level = VALUES(sugar_level)
+            """, [(userID,) + tuple(row) for row in rows])
+            target.dbConnection.commit()
+            lastKey = (rows[-1][0], rows[-1][1])
+
+    def __getLevelColumnsAndJoin(self) -> tuple:
+        """
+        Private helper returning the columns holding the levels of a day meal (alias dm) and the join they need.
+
+        Returns:
+            tuple: The level columns and the join clause (empty if the levels are stored inline).
+        """
+        if self.dbWrapper.inlineMealLevels == "on":
+            return "dm.fat_level, dm.sugar_level", ""
+        return "m.fat_level, m.sugar_level", "JOIN meals m ON m.ID = dm.fk_meal_id"
+
+    def __writeDayMeal(self, cursor, table: str, keyColumns: tuple, keyValues: tuple, fatLevel: int, sugarLevel: int) -> None:
+        """
+        Private helper creating a day meal on the target shard, or updating it if an aborted run already copied it.
+
+        Args:
+            cursor: The cursor of the target shard.
+            table (str): The day meal table ("day_meals" or "day_meals_v2").
+            keyColumns (tuple): The primary key columns of the table.
+            keyValues (tuple): The primary key values of the day meal.
+            fatLevel (int): The fat level of the meal.
+            sugarLevel (int): The sugar level of the meal.
+        """
+        inline = self.dbWrapper.inlineMealLevels == "on"
+        where = " AND ".join(f"{column}=%s" for column in keyColumns)
+        cursor.execute(f"SELECT fk_meal_id FROM {table} WHERE {where}", keyValues)
+        existing = cursor.fetchone()
+        if existing:
+            if inline:
+                cursor.execute(f"UPDATE {table} SET fat_level=%s, sugar_level=%s WHERE {where}", (fatLevel, sugarLevel) + keyValues)
+            else:
+                cursor.execute("UPDATE meals SET fat_level=%s, sugar_level=%s WHERE ID=%s", (fatLevel, sugarLevel, existing[0]))
+            return
+
+        mealID = None
+        if not inline:
+            cursor.execute("INSERT INTO meals (fat_level, sugar_level) VALUES (%s, %s)", (fatLevel, sugarLevel))
+            mealID = cursor.lastrowid
+        columns = keyColumns + ("fk_meal_id",) + (("fat_level", "sugar_level") if inline else ())
+        values = keyValues + (mealID,) + ((fatLevel, sugarLevel) if inline else ())
+        cursor.execute(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})", values)
+
+    def __getOrCreateDayID(self, cursor, year: int, month: int, day: int) -> int:
+        """
+        Private helper returning the ID of a day on a shard, creating the day if needed.
+
+        Args:
+            cursor: The cursor of the shard.
+            year (int): The year of the day.
+            month (int): The month of the day.
+            day (int): The day of the month.
+
+        Returns:
+            int: The ID of the day on the shard.
+        """
+        cursor.execute("SELECT ID FROM days WHERE year=%s AND month=%s AND day=%s", (year, month, day))
+        existing = cursor.fetchone()
+        if existing:
+            return existing[0]
+        cursor.execute("INSERT INTO days (year, month, day) VALUES (%s, %s, %s)", (year, month, day))
+        return cursor.lastrowid
+
+    def __deleteMealData(self, userID: int, source) -> int:
+        """
+        Private helper deleting all day meals (and their meals) of a user from a shard in chunks.
+
+        Args:
+            userID (int): The ID of the user.
+            source (ConnectionTarget): The shard to delete from.
+
+        Returns:
+            int: The number of deleted day meals.
+        """
+        cursor = source.dbConnection.cursor(buffered=True)
+        deleted = 0
+        while True:
+            cursor.execute(
+                "SELECT fk_day_id, fk_meal_type_id, fk_meal_id FROM day_meals WHERE fk_user_id=%s LIMIT %s",
+                (userID, self.chunkSize)
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                break
+
+            cursor.executemany(
+                "DELETE FROM day_meals WHERE fk_user_id=%s AND fk_day_id=%s AND fk_meal_type_id=%s",
+                [(userID, dayID, mealTypeID) for dayID, mealTypeID, _ in rows]
+            )
+            mealIDs = [mealID for _, _, mealID in rows if mealID is not None]
+            if mealIDs:
+                cursor.execute(f"DELETE FROM meals WHERE ID IN ({', '.join(['%s'] * len(mealIDs))})", mealIDs)
+            source.dbConnection.commit()
+            deleted += len(rows)
+            print(f"Resharding: deleted {deleted} day meals of user {userID} from the source shard")
+
+        return deleted
+
+    def __deleteMealDataV2(self, userID: int, source) -> int:
+        """
+        Private helper deleting all day meals of a user in schema v2 (and their meals) from a shard in chunks.
+
+        Args:
+            userID (int): The ID of the user.
+            source (ConnectionTarget): The shard to delete from.
+
+        Returns:
+            int: The number of deleted day meals.
+        """
+        cursor = source.dbConnection.cursor(buffered=True)
+        deleted = 0
+        while True:
+            cursor.execute(
+                "SELECT meal_date, fk_meal_type_id, fk_meal_id FROM day_meals_v2 WHERE fk_user_id=%s LIMIT %s",
+                (userID, self.chunkSize)
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                break
+
+            cursor.executemany(
+                "DELETE FROM day_meals_v2 WHERE fk_user_id=%s AND meal_date=%s AND fk_meal_type_id=%s",
+                [(userID, mealDate, mealTypeID) for mealDate, mealTypeID, _ in rows]
+            )
+            mealIDs = [mealID for _, _, mealID in rows if mealID is not None]
+            if mealIDs:
+                cursor.execute(f"DELETE FROM meals WHERE ID IN ({', '.join(['%s'] * len(mealIDs))})", mealIDs)
+            source.dbConnection.commit()
+            deleted += len(rows)
+            print(f"Resharding: deleted {deleted} day meals of user {userID} from the source shard")
+
+        return deleted
+
+    def __deleteInChunks(self, table: str, userID: int, source) -> None:
+        """
+        Private helper deleting the rows of a user from a table without dependent rows in chunks.
+
+        Args:
+            table (str): The table ("day_meals_archive", "meal_changes" or "meal_change_seqs").
+            userID (int): The ID of the user.
+            source (ConnectionTarget): The shard to delete from.
+        """
+        cursor = source.dbConnection.cursor(buffered=True)
+        while True:
+            cursor.execute(f"DELETE FROM {table} WHERE fk_user_id=%s LIMIT %s", (userID, self.chunkSize))
+            source.dbConnection.commit()
+            if cursor.rowcount < self.chunkSize:
+                break
+
+
+def main():
+    """
+    Parses the command line arguments and moves the meal data of one user.
+    """
+    parser = argparse.ArgumentParser(description="Moves the meal data of a user to another shard.")
+    parser.add_argument("--user-id", type=int, required=True, help="ID of the user to move")
+    target_group = parser.add_mutually_exclusive_group(required=True)
+    target_group.add_argument("--target-shard", type=int, help="Index of the shard to move the user to")
+    target_group.add_argument("--to-hash-shard", action="store_true", help="Move the user to the shard its ID hashes to")
+    parser.add_argument("--chunk-size", type=int, default=500, help="Day meals copied or deleted per transaction")
+    args = parser.parse_args()
+
+    db_wrapper = DatabaseWrapper()
+    if not db_wrapper.isShardingEnabled():
+        parser.error("sharding is disabled (no database.shards configured)")
+    target_shard = db_wrapper.getStableShardIndex(args.user_id) if args.to_hash_shard else args.target_shard
+    report = UserResharder(db_wrapper, args.chunk_size).moveUser(args.user_id, target_shard)
+    print(f"Resharding: done: {report}")
+
+
+if __name__ == "__main__":
+    main()
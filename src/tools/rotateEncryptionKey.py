@@ -0,0 +1,172 @@
+# Copyright (C) 2024 Patrick Michiels
+# All rights reserved.
+# This source code is licensed under the Evaluation License Agreement and
+# may not be used, modified, or distributed without explicit permission from the author.
+# This code is provided for evaluation purposes only.
+
+"""
+Resumable online rotation re-encrypting the user names (`users.name_encr`) with the current encryption key.
+
+The rotation runs while the API keeps serving requests:
+1. Add the key version column (`install/database/migrations/004_name_key_version.sql`) to the primary.
+2. Move the old key to `authentication.previous_encryption_keys` (e.g. {"1": "<old key>"}), set the new key as
+   `authentication.encryption_key`, raise `authentication.encryption_key_version` and restart the API. New users are
+   encrypted with the new key; every name is decrypted with the key of its version.
+3. Run this tool. It walks the users in keyset paginated batches by ID, re-encrypting each batch in its own short
+   transaction, so only the rows of one batch are locked at a time. The last finished ID is stored in a checkpoint
+   file, so an interrupted run continues where it stopped. Names already encrypted with the current key are skipped.
+4. Once the report shows no remaining rows, remove the old key from `authentication.previous_encryption_keys` and
+   restart the API.
+
+Usage example:
+
+    # Re-encrypt all user names with the current key
+    python -m src.tools.rotateEncryptionKey --checkpoint encryption_key_rotation_checkpoint.json --batch-size 1000
+"""
+
+import argparse
+import json
+import os
+import time
+
+from src.utils.databaseWrapper import DatabaseWrapper
+
+
+class EncryptionKeyRotator:
+    """
+    Re-encrypts the user names with the current encryption key in batches.
+
+    Attributes:
+        dbWrapper (DatabaseWrapper): The database wrapper holding the primary connection and the keys.
+        checkpointPath (str): The JSON file holding the progress of the rotation.
+        batchSize (int): The number of users re-encrypted per transaction.
+        pauseSeconds (float): Seconds to pause between two batches, leaving room for the API's own queries.
+    """
+
+    def __init__(self, dbWrapper: DatabaseWrapper, checkpointPath: str, batchSize: int = 1000, pauseSeconds: float = 0.05):
+        """
+        Initializes the EncryptionKeyRotator.
+
+        Args:
+            dbWrapper (DatabaseWrapper): The database wrapper holding the primary connection and the keys.
+            checkpointPath (str): The JSON file holding the progress of the rotation.
+            batchSize (int, optional): The number of users re-encrypted per transaction. Defaults to 1000.
+            pauseSeconds (float, optional): Seconds to pause between two batches. Defaults to 0.05.
+        """
+        self.dbWrapper = dbWrapper
+        self.checkpointPath = checkpointPath
+        self.batchSize = batchSize
+        self.pauseSeconds = pauseSeconds
+
+    def rotate(self) -> dict:
+        """
+        Re-encrypts every user name not yet encrypted with the current key, continuing after the checkpointed ID.
+
+        Raises:
+            ValueError: If no previous key is configured, so there is nothing to rotate from.
+
+        Returns:
+            dict: A report containing the key version, the number of re-encrypted rows, the rows still encrypted with
+                  a previous key and the rows encrypted with a key version that is not configured (both 0 once done).
+        """
+        currentVersion = self.dbWrapper.encryptionKeyVersion
+        previousKeys = {version: key for version, key in self.dbWrapper.encryptionKeys.items() if version != currentVersion}
+        if not previousKeys:
+            raise ValueError("Configure the old key in authentication.previous_encryption_keys (and restart the API) before rotating")
+
+        checkpoint = self.__loadCheckpoint()
+        progress = checkpoint.get(str(currentVersion), {"lastID": 0, "reencrypted": 0, "done": False})
+        checkpoint[str(currentVersion)] = progress
+
+        # Decrypt with the key of each row's version. Rows of unknown versions are never touched, as they would be
+        # "re-encrypted" from NULL.
+        cases = " ".join(["WHEN %s THEN %s"] * len(previousKeys))
+        caseValues = tuple(value for version, key in previousKeys.items() for value in (version, str(key)))
+        versionPlaceholders = ", ".join(["%s"] * len(previousKeys))
+
+        connection = self.dbWrapper.dbConnection
+        cursor = connection.cursor(buffered=True)
+        while not progress["done"]:
+            # The upper ID of the batch, so the update locks a bounded range of the primary key.
+            cursor.execute("SELECT ID FROM users WHERE ID > %s ORDER BY ID LIMIT 1 OFFSET %s", (progress["lastID"], self.batchSize - 1))
+            upperID = cursor.fetchone()
+
+            query = f"""
+                UPDATE users
+                SET name_encr = AES_ENCRYPT(AES_DECRYPT(name_encr, CASE name_key_version {cases} END), %s),
+                    name_key_version = %s
+                WHERE ID > %s AND name_key_version IN ({versionPlaceholders})
+            """
+            values = (*caseValues, str(self.dbWrapper.encryptionKey), currentVersion, progress["lastID"], *previousKeys)
+            if upperID is not None:
+                query += " AND ID <= %s"
+                values += (upperID[0],)
+            cursor.execute(query, values)
+            progress["reencrypted"] += max(cursor.rowcount, 0)
+            connection.commit()
+
+            # Users registered after the last batch was selected are already encrypted with the current key.
+            if upperID is None:
+                progress["done"] = True
+            else:
+                progress["lastID"] = upperID[0]
+            self.__saveCheckpoint(checkpoint)
+            print(f"Key rotation to version {currentVersion}: re-encrypted {progress['reencrypted']} (last ID {progress['lastID']})")
+            time.sleep(self.pauseSeconds)
+
+        cursor.execute(f"SELECT COUNT(*) FROM users WHERE name_key_version IN ({versionPlaceholders})", tuple(previousKeys))
+        remaining = cursor.fetchone()[0]
+        cursor.execute(
+            f"SELECT COUNT(*) FROM users WHERE name_key_version NOT IN ({versionPlaceholders}, %s)",
+            (*previousKeys, currentVersion)
+        )
+        unknownVersion = cursor.fetchone()[0]
+        connection.commit()
+        return {"keyVersion": currentVersion, "reencrypted": progress["reencrypted"], "remaining": remaining, "unknownVersion": unknownVersion}
+
+    def __loadCheckpoint(self) -> dict:
+        """
+        Private helper loading the progress of an earlier run.
+
+        Returns:
+            dict: The progress per target key version, empty if there was no earlier run.
+        """
+        if not os.path.exists(self.checkpointPath):
+            return {}
+        with open(self.checkpointPath) as checkpointFile:
+            return json.load(checkpointFile)
+
+    def __saveCheckpoint(self, checkpoint: dict) -> None:
+        """
+        Private helper atomically replacing the checkpoint file.
+
+        Args:
+            checkpoint (dict): The progress per target key version.
+        """
+        temporaryPath = self.checkpointPath + ".tmp"
+        with open(temporaryPath, "w") as checkpointFile:
+            json.dump(checkpoint, checkpointFile)
+            checkpointFile.flush()
+            os.fsync(checkpointFile.fileno())
+        os.replace(temporaryPath, self.checkpointPath)
+
+
+def main():
+    """
+    Parses the command line arguments and re-encrypts the user names.
+    """
+    parser = argparse.ArgumentParser(description="Re-encrypts the user names with the current encryption key.")
+    parser.add_argument("--checkpoint", default="encryption_key_rotation_checkpoint.json", help="File storing the progress")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Users re-encrypted per transaction")
+    parser.add_argument("--pause-seconds", type=float, default=0.05, help="Pause between two batches")
+    args = parser.parse_args()
+
+    db_wrapper = DatabaseWrapper()
+    if len(db_wrapper.encryptionKeys) < 2:
+        parser.error("authentication.previous_encryption_keys must hold the old key while rotating")
+    report = EncryptionKeyRotator(db_wrapper, args.checkpoint, args.batch_size, args.pause_seconds).rotate()
+    print(f"Key rotation: done: {report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,357 @@
+# Copyright (C) 2024 Patrick Michiels
+# All rights reserved.
+# This source code is licensed under the Evaluation License Agreement and
+# may not be used, modified, or distributed without explicit permission from the author.
+# This code is provided for evaluation purposes only.
+
+"""
+Fan-out of meal change events to the live subscriptions of a user (e.g. Server-Sent Events streams).
+
+Writes publish an event under the key of the user; every open subscription of that key receives it. Subscriptions
+are cheap while idle: a small object waiting on an `asyncio.Event`, its queue is only filled while events arrive.
+
+Backpressure: a subscription queues at most `maxQueuedEvents` events. A subscriber that does not keep up does not
+slow down the publishers; further events are dropped and the subscriber receives a single `resync` event instead,
+telling the client to re-read its data.
+
+Limits: at most `maxConnections` subscriptions per worker and `maxConnectionsPerKey` per user are accepted;
+`subscribe()` raises `ChangeBrokerLimitError` beyond them.
+
+The broker is swappable:
+    - InMemoryChangeBroker: Delivers the events published in this worker process.
+    - RedisChangeBroker: Publishes over the pub/sub of a shared Redis-protocol server, so the subscriptions on every
+      worker and node receive the events of writes served anywhere.
+
+Usage example:
+
+    # Create the broker from the config
+    change_broker = ChangeBroker.fromConfig(config_array)
+    change_broker.start()
+
+    # In the stream of a user
+    subscription = change_broker.subscribe(user_key)
+    event = await subscription.next(15.0)  # None after 15 seconds without event
+
+    # After a write
+    change_broker.publish(user_key, {"operation": "add", "year": 2024, "month": 10, "day": 12, "mealType": "lunch"})
+"""
+
+import asyncio
+import json
+import threading
+from collections import deque
+
+from src.utils.respClient import RespClient
+
+
+class ChangeBrokerLimitError(Exception):
+    """
+    Raised if a subscription would exceed the connection limits.
+    """
+
+
+class Subscription:
+    """
+    The events of one key delivered to one subscriber.
+
+    Attributes:
+        key (str): The key subscribed to.
+        closed (bool): Whether the subscription was closed (by the broker shutting down or by unsubscribing).
+    """
+
+    RESYNC_EVENT = {"type": "resync"}
+
+    __slots__ = ("key", "closed", "__maxQueuedEvents", "__events", "__overflowed", "__wakeUp")
+
+    def __init__(self, key: str, maxQueuedEvents: int):
+        """
+        Initializes the Subscription; must be created on the event loop thread.
+
+        Args:
+            key (str): The key subscribed to.
+            maxQueuedEvents (int): The maximum number of queued events.
+        """
+        self.key = key
+        self.closed = False
+        self.__maxQueuedEvents = maxQueuedEvents
+        self.__events = deque()
+        self.__overflowed = False
+        self.__wakeUp = asyncio.Event()
+
+    def push(self, event: dict) -> None:
+        """
+        Queues an event, or marks the subscription as overflowed if its queue is full. Event loop thread only.
+
+        Args:
+            event (dict): The event.
+        """
+        if len(self.__events) >= self.__maxQueuedEvents:
+            self.__overflowed = True
+        else:
+            self.__events.append(event)
+        self.__wakeUp.set()
+
+    def close(self) -> None:
+        """
+        Closes the subscription, waking up a waiting `next()`. Event loop thread only.
+        """
+        self.closed = True
+        self.__wakeUp.set()
+
+    async def next(self, timeoutSeconds: float) -> dict or None:
+        """
+        Waits for the next event.
+
+        Args:
+            timeoutSeconds (float): The maximum number of seconds to wait.
+
+        Returns:
+            dict or None: The next event (`RESYNC_EVENT` after an overflow), None on timeout or once closed.
+        """
+        if not self.__events and not self.__overflowed and not self.closed:
+            self.__wakeUp.clear()
+            try:
+                await asyncio.wait_for(self.__wakeUp.wait(), timeoutSeconds)
+            except asyncio.TimeoutError:
+                return None
+
+        if self.__overflowed:
+            self.__overflowed = False
+            self.__events.clear()
+            return self.RESYNC_EVENT
+        if self.__events:
+            return self.__events.popleft()
+        return None
+
+
+class ChangeBroker:
+    """
+    Base class of the brokers, delivering the events of this worker process to its subscriptions.
+
+    Attributes:
+        maxConnections (int): The maximum number of subscriptions.
+        maxConnectionsPerKey (int): The maximum number of subscriptions per key.
+        maxQueuedEvents (int): The maximum number of queued events per subscription.
+    """
+
+    def __init__(self, maxConnections: int = 10000, maxConnectionsPerKey: int = 5, maxQueuedEvents: int = 100):
+        """
+        Initializes the ChangeBroker without subscriptions.
+
+        Args:
+            maxConnections (int, optional): The maximum number of subscriptions. Defaults to 10000.
+            maxConnectionsPerKey (int, optional): The maximum number of subscriptions per key. Defaults to 5.
+            maxQueuedEvents (int, optional): The maximum number of queued events per subscription. Defaults to 100.
+        """
+        self.maxConnections = maxConnections
+        self.maxConnectionsPerKey = maxConnectionsPerKey
+        self.maxQueuedEvents = maxQueuedEvents
+        self.__subscriptions = {}
+        self.__count = 0
+        self.__delivered = 0
+        self.__loop = None
+
+    @classmethod
+    def fromConfig(cls, configArray: dict):
+        """
+        Creates the broker configured in the `mealEvents` section of the config.
+
+        Args:
+            configArray (dict): The parsed `config.txt`.
+
+        Returns:
+            ChangeBroker: An InMemoryChangeBroker or a RedisChangeBroker.
+        """
+        eventsConfig = configArray.get("mealEvents", {})
+        limits = (eventsConfig.get("maxConnections", 10000), eventsConfig.get("maxConnectionsPerUser", 5), eventsConfig.get("maxQueuedEvents", 100))
+        if eventsConfig.get("broker", "memory") == "redis":
+            redisConfig = configArray["redis"]
+            clientArgs = (redisConfig["host"], redisConfig.get("port", 6379), redisConfig.get("password"), redisConfig.get("db", 0))
+            return RedisChangeBroker(RespClient(*clientArgs), RespClient(*clientArgs), *limits)
+        return InMemoryChangeBroker(*limits)
+
+    def start(self) -> None:
+        """
+        Starts receiving the events of other processes (if the broker shares them).
+        """
+
+    def subscribe(self, key: str) -> Subscription:
+        """
+        Opens a subscription to the events of a key. Event loop thread only.
+
+        Args:
+            key (str): The key (e.g. a digest of the user name).
+
+        Raises:
+            ChangeBrokerLimitError: If the connection limits are reached.
+
+        Returns:
+            Subscription: The new subscription; pass it to `unsubscribe()` once the subscriber is gone.
+        """
+        self.__loop = asyncio.get_running_loop()
+        subscriptionsOfKey = self.__subscriptions.get(key, ())
+        if self.__count >= self.maxConnections:
+            raise ChangeBrokerLimitError(f"at most {self.maxConnections} connections")
+        if len(subscriptionsOfKey) >= self.maxConnectionsPerKey:
+            raise ChangeBrokerLimitError(f"at most {self.maxConnectionsPerKey} connections per user")
+
+        subscription = Subscription(key, self.maxQueuedEvents)
+        self.__subscriptions.setdefault(key, set()).add(subscription)
+        self.__count += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """
+        Closes a subscription and releases its slot. Event loop thread only.
+
+        Args:
+            subscription (Subscription): The subscription returned by `subscribe()`.
+        """
+        subscription.close()
+        subscriptionsOfKey = self.__subscriptions.get(subscription.key)
+        if subscriptionsOfKey is not None and subscription in subscriptionsOfKey:
+            subscriptionsOfKey.discard(subscription)
+            self.__count -= 1
+            if not subscriptionsOfKey:
+                del self.__subscriptions[subscription.key]
+
+    def publish(self, key: str, event: dict) -> None:
+        """
+        Publishes an event to the subscriptions of a key.
+
+        Args:
+            key (str): The key.
+            event (dict): The JSON serializable event.
+        """
+        self.deliver(key, event)
+
+    def deliver(self, key: str, event: dict) -> None:
+        """
+        Delivers an event to the subscriptions of a key in this process. May be called from any thread.
+
+        Args:
+            key (str): The key.
+            event (dict): The event.
+        """
+        if key not in self.__subscriptions or self.__loop is None:
+            return
+        try:
+            onLoopThread = asyncio.get_running_loop() is self.__loop
+        except RuntimeError:
+            onLoopThread = False
+        if onLoopThread:
+            self.__deliverOnLoop(key, event)
+        else:
+            self.__loop.call_soon_threadsafe(self.__deliverOnLoop, key, event)
+
+    def close(self) -> None:
+        """
+        Closes all subscriptions (e.g. on shutdown, so open streams end). Event loop thread only.
+        """
+        for subscriptionsOfKey in list(self.__subscriptions.values()):
+            for subscription in list(subscriptionsOfKey):
+                subscription.close()
+
+    def getStatistics(self) -> dict:
+        """
+        Returns the number of subscriptions and delivered events.
+
+        Returns:
+            dict: The open connections, the users with connections and the delivered events.
+        """
+        return {"connections": self.__count, "users": len(self.__subscriptions), "delivered": self.__delivered}
+
+    def __deliverOnLoop(self, key: str, event: dict) -> None:
+        """
+        Private helper pushing an event to the subscriptions of a key on the event loop thread.
+        """
+        for subscription in self.__subscriptions.get(key, ()):
+            subscription.push(event)
+            self.__delivered += 1
+
+
+class InMemoryChangeBroker(ChangeBroker):
+    """
+    Broker delivering the events published in this worker process only.
+    """
+
+
+class RedisChangeBroker(ChangeBroker):
+    """
+    Broker publishing the events over the pub/sub of a shared Redis-protocol server.
+
+    Every worker subscribes to the channel and delivers the received events to its own subscriptions, so a write
+    served by any worker or node reaches all streams of the user. If the server is unreachable, events are delivered
+    to the subscriptions of this worker only.
+
+    Attributes:
+        client (RespClient): The client publishing the events.
+        subscriber (RespClient): A dedicated client receiving the events.
+        channel (str): The pub/sub channel.
+        reconnectSeconds (float): Seconds to wait before subscribing again after the subscription failed.
+    """
+
+    def __init__(self, client: RespClient, subscriber: RespClient, maxConnections: int = 10000, maxConnectionsPerKey: int = 5, maxQueuedEvents: int = 100, channel: str = "meal_tracker:meal_events", reconnectSeconds: float = 1.0):
+        """
+        Initializes the RedisChangeBroker; call `start()` to receive the published events.
+
+        Args:
+            client (RespClient): The client publishing the events.
+            subscriber (RespClient): A dedicated client receiving the events.
+            maxConnections (int, optional): The maximum number of subscriptions. Defaults to 10000.
+            maxConnectionsPerKey (int, optional): The maximum number of subscriptions per key. Defaults to 5.
+            maxQueuedEvents (int, optional): The maximum number of queued events per subscription. Defaults to 100.
+            channel (str, optional): The pub/sub channel. Defaults to "meal_tracker:meal_events".
+            reconnectSeconds (float, optional): Seconds to wait before subscribing again. Defaults to 1.0.
+        """
+        super().__init__(maxConnections, maxConnectionsPerKey, maxQueuedEvents)
+        self.client = client
+        self.subscriber = subscriber
+        self.channel = channel
+        self.reconnectSeconds = reconnectSeconds
+        self.__stop = threading.Event()
+
+    def start(self) -> None:
+        """
+        Starts receiving the published events in a background thread.
+        """
+        self.__stop.clear()
+        threading.Thread(target=self.__listen, name="meal-events-subscriber", daemon=True).start()
+
+    def publish(self, key: str, event: dict) -> None:
+        """
+        Publishes an event to the subscriptions of a key on all workers and nodes.
+
+        Args:
+            key (str): The key.
+            event (dict): The JSON serializable event.
+        """
+        try:
+            self.client.execute("PUBLISH", self.channel, json.dumps({"key": key, "event": event}, separators=(",", ":")))
+        except Exception as e:
+            print(f"Meal events: shared broker unavailable, delivering locally: {e}")
+            self.deliver(key, event)
+
+    def close(self) -> None:
+        """
+        Stops receiving events, closes the connections and all subscriptions.
+        """
+        self.__stop.set()
+        self.subscriber.close()
+        self.client.close()
+        super().close()
+
+    def __listen(self) -> None:
+        """
+        Private helper run by the subscriber thread, delivering the received events until the broker is closed.
+        """
+        while not self.__stop.is_set():
+            try:
+                self.subscriber.subscribe(self.channel)
+                while not self.__stop.is_set():
+                    message = json.loads(self.subscriber.readMessage()[1])
+                    self.deliver(message["key"], message["event"])
+            except Exception as e:
+                if not self.__stop.is_set():
+                    print(f"Meal events: subscription lost, resubscribing: {e}")
+                    self.__stop.wait(self.reconnectSeconds)
@@ -0,0 +1,49 @@
+# Copyright (C) 2024 Patrick Michiels
+# All rights reserved.
+# This source code is licensed under the Evaluation License Agreement and
+# may not be used, modified, or distributed without explicit permission from the author.
+# This code is provided for evaluation purposes only.
+
+"""
+Loads `config.txt` once per process.
+
+The API, the database wrapper and the logger all need the configuration. Parsing it once and sharing the result keeps
+startup fast; `reload=True` reads the file again, e.g. to pick up changed database credentials after a connection
+error.
+
+Usage example:
+
+    # Get the (cached) configuration
+    config_array = loadConfig()
+
+    # Re-read the file
+    config_array = loadConfig(reload=True)
+"""
+
+import json
+import os
+import threading
+
+CONFIG_FILE_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "config.txt")
+
+_cachedConfig = None
+_lock = threading.Lock()
+
+
+def loadConfig(reload: bool = False) -> dict:
+    """
+    Returns the parsed `config.txt`, reading the file only on first use or when asked to.
+
+    Args:
+        reload (bool, optional): Whether to read the file again instead of returning the cached configuration.
+                                 Defaults to False.
+
+    Returns:
+        dict: The parsed configuration. Callers must not modify it, as it is shared.
+    """
+    global _cachedConfig
+    with _lock:
+        if _cachedConfig is None or reload:
+            with open(CONFIG_FILE_PATH) as config_file:
+                _cachedConfig = json.load(config_file)
+        return _cachedConfig
@@ -0,0 +1,229 @@
+# Copyright (C) 2024 Patrick Michiels
+# All rights reserved.
+# This source code is licensed under the Evaluation License Agreement and
+# may not be used, modified, or distributed without explicit permission from the author.
+# This code is provided for evaluation purposes only.
+
+"""
+ConnectionTarget module wrapping one database server (primary, replica or shard).
+
+A `ConnectionTarget` owns the connections and buffered cursors to one database server and keeps track of its health.
+Unhealthy targets are skipped for reads until the health check interval has passed, after which a reconnect is attempted.
+
+Every thread gets its own connection (opened lazily on first use), so repository calls running in worker threads
+(e.g. coalesced reads) never share a connection with the event loop thread. Connections of threads that have exited
+are closed whenever another thread connects.
+
+Usage example:
+
+    # Create and connect a target
+    replica = ConnectionTarget("replica0", {"host": "10.5.0.2", "user": "...", "password": "...", "database": "...", "port": "3306"})
+    replica.connect()
+
+    # Use it only while it is healthy
+    if replica.isHealthy():
+        replica.dbCursor.execute("SELECT 1")
+"""
+
+import threading
+import time
+
+from src.utils.tracing import traceCursor
+
+
+class ConnectionTarget:
+    """
+    Connection and health state of one database server.
+
+    Attributes:
+        name (str): A human readable name of the target (e.g. "primary", "replica0").
+        settings (dict): The connection settings (host, user, password, database, port).
+        healthCheckIntervalSeconds (float): Seconds between two health checks of the target.
+        dbConnection: MySQL database connection object of the calling thread (connected lazily).
+        dbCursor: Buffered MySQL database cursor of the calling thread (connected lazily).
+        healthy (bool): Whether the last connect or health check succeeded.
+    """
+
+    def __init__(self, name: str, settings: dict, healthCheckIntervalSeconds: float = 5):
+        """
+        Initializes the ConnectionTarget without connecting.
+
+        Args:
+            name (str): A human readable name of the target.
+            settings (dict): The connection settings (host, user, password, database, port).
+            healthCheckIntervalSeconds (float, optional): Seconds between two health checks. Defaults to 5.
+        """
+        self.name = name
+        self.settings = settings
+        self.healthCheckIntervalSeconds = healthCheckIntervalSeconds
+        self.healthy = False
+        self.lastHealthCheck = 0.0
+        self.__connectionsByThread = {}
+        self.__lock = threading.Lock()
+
+    @property
+    def dbConnection(self):
+        """
+        MySQL database connection object of the calling thread, connecting on first use.
+        """
+        return self.__getConnectionAndCursor()[0]
+
+    @property
+    def dbCursor(self):
+        """
+        Buffered MySQL database cursor of the calling thread, connecting on first use.
+
+        Within a trace, the cursor records a span per SQL statement (see `src.utils.tracing`).
+        """
+        return traceCursor(self.__getConnectionAndCursor()[1], self.name)
+
+    def connect(self) -> None:
+        """
+        (Re-)Establishes the connection and cursor of the calling thread to the database server.
+
+        Raises:
+            mysql.connector.Error: If the connection cannot be established.
+        """
+        self.lastHealthCheck = time.monotonic()
+        try:
+            dbConnection = self.openDedicatedConnection()
+            dbCursor = dbConnection.cursor(buffered=True)  # Buffered to fix unread result error.
+            with self.__lock:
+                self.__connectionsByThread[threading.get_ident()] = (dbConnection, dbCursor)
+            self.healthy = True
+        except Exception:
+            self.healthy = False
+            raise
+        self.__closeConnectionsOfExitedThreads()
+
+    def openDedicatedConnection(self):
+        """
+        Opens a new connection to the database server that is not shared with any thread.
+
+        Used for unbuffered (streaming) reads, which block their connection until the result is consumed.
+        The caller must close the connection.
+
+        Raises:
+            mysql.connector.Error: If the connection cannot be established.
+
+        Returns:
+            MySQL database connection object.
+        """
+        # Imported on first connect, so importing the API does not pay for the driver before it can serve.
+        import mysql.connector
+        return mysql.connector.connect(
+            host=self.settings["host"],
+            user=self.settings["user"],
+            password=self.settings["password"],
+            database=self.settings["database"],
+            port=self.settings["port"]
+        )
+
+    def close(self) -> None:
+        """
+        Closes the connections of all threads. The next use of the target connects again.
+        """
+        with self.__lock:
+            connectionsAndCursors = list(self.__connectionsByThread.values())
+            self.__connectionsByThread.clear()
+        for dbConnection, dbCursor in connectionsAndCursors:
+            self.__closeConnection(dbConnection)
+        self.healthy = False
+
+    def closeThreadConnection(self) -> None:
+        """
+        Closes the connection of the calling thread (if any), e.g. before a short-lived thread exits.
+        """
+        with self.__lock:
+            connectionAndCursor = self.__connectionsByThread.pop(threading.get_ident(), None)
+        if connectionAndCursor is not None:
+            self.__closeConnection(connectionAndCursor[0])
+
+    def getOpenConnectionCount(self) -> int:
+        """
+        Returns the number of threads holding a connection to the database server.
+
+        Returns:
+            int: The number of open connections.
+        """
+        return len(self.__connectionsByThread)
+
+    def __getConnectionAndCursor(self) -> tuple:
+        """
+        Private helper returning the connection and cursor of the calling thread, connecting on first use.
+
+        Raises:
+            mysql.connector.Error: If the connection cannot be established.
+
+        Returns:
+            tuple: The connection and the buffered cursor.
+        """
+        connectionAndCursor = self.__connectionsByThread.get(threading.get_ident())
+        if connectionAndCursor is None:
+            self.connect()
+            connectionAndCursor = self.__connectionsByThread[threading.get_ident()]
+        return connectionAndCursor
+
+    def __closeConnectionsOfExitedThreads(self) -> None:
+        """
+        Private helper closing the connections of threads that have exited (e.g. replaced executor threads).
+        """
+        liveThreadIDs = {thread.ident for thread in threading.enumerate()}
+        with self.__lock:
+            exitedThreadIDs = [threadID for threadID in self.__connectionsByThread if threadID not in liveThreadIDs]
+            connectionsAndCursors = [self.__connectionsByThread.pop(threadID) for threadID in exitedThreadIDs]
+        for dbConnection, dbCursor in connectionsAndCursors:
+            self.__closeConnection(dbConnection)
+
+    def __closeConnection(self, dbConnection) -> None:
+        """
+        Private helper closing a connection, reporting (not raising) failures.
+
+        Args:
+            dbConnection: The MySQL database connection object to close.
+        """
+        try:
+            dbConnection.close()
+        except Exception as e:
+            print(f"Database: could not close connection to {self.name}: {e}")
+
+    def tryConnect(self) -> bool:
+        """
+        (Re-)Establishes the connection without raising on failure.
+
+        Returns:
+            bool: True if the connection could be established, False otherwise.
+        """
+        try:
+            self.connect()
+        except Exception as e:
+            print(f"Database: could not connect to {self.name}: {e}")
+        return self.healthy
+
+    def markUnhealthy(self) -> None:
+        """
+        Marks the target as unhealthy, so it is skipped until the next health check.
+        """
+        self.healthy = False
+        self.lastHealthCheck = time.monotonic()
+
+    def isHealthy(self) -> bool:
+        """
+        Returns whether the target can be used, running a health check if the check interval has passed.
+
+        Healthy targets are pinged, unhealthy ones are reconnected.
+
+        Returns:
+            bool: True if the target is healthy, False otherwise.
+        """
+        if time.monotonic() - self.lastHealthCheck < self.healthCheckIntervalSeconds:
+            return self.healthy
+
+        self.lastHealthCheck = time.monotonic()
+        if not self.healthy or threading.get_ident() not in self.__connectionsByThread:
+            return self.tryConnect()
+        try:
+            self.dbConnection.ping(reconnect=False)
+        except Exception:
+            self.markUnhealthy()
+        return self.healthy
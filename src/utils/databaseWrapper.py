@@ -11,12 +11,51 @@ This module provides the `DatabaseWrapper` class, which is responsible for all i
 methods for accessing different repositories (e.g., users, meals, days) and performs operations such as connecting to the
 database and validating tokens.
 
+Read/write splitting:
+    Besides the primary configured in `config.txt` (`database`), a list of read replicas can be configured
+    (`database.replicas`). Repository reads use `getReadCursor()`, which balances them round robin over the healthy
+    replicas and falls back to the primary. Writes always go to the primary. After a write (`recordWrite()`), reads of
+    the same request and of the same read session (see `beginReadSession()`) go to the primary for
+    `database.readYourWritesSeconds`, so users always see their own writes despite replication lag.
+
+Sharding:
+    The meal data (days, meals, day_meals) can be spread over several shards (`database.shards`), while users and the
+    shard directory (`user_shards`) stay on the primary. New users are assigned to a shard by a stable hash of their
+    ID, users without directory entry live on shard 0. Endpoints select the shard of the current user with
+    `useShardOfUser()`, after which the day and meal repositories transparently use `getShardCursor()` /
+    `getShardReadCursor()`. `src/tools/reshardUser.py` moves a user between shards.
+
+Schema versions:
+    `database.schemaVersion` selects the layout of the day meals. "v1" stores them in `day_meals` referencing the
+    `days` table, "v2" stores them in `day_meals_v2` with a native `DATE` column in the primary key, so no day lookup
+    is needed. "dual" reads v1 and writes both layouts while `src/tools/backfillDayMealsV2.py` copies the existing
+    rows; switch to "v2" once the backfill is done.
+
+Inline meal levels:
+    `database.inlineMealLevels` selects where the fat and sugar levels of a day meal are stored. "off" keeps them in
+    the `meals` table only, "on" stores them as TINYINT columns of the day meal row itself (no `meals` row, no join).
+    "dual" writes both while `src/tools/inlineMealLevels.py` copies the levels of the existing rows; switch to "on"
+    once the migration is done.
+
+Meal change log:
+    With `database.mealChangeLog` enabled, every meal write also records a change with the next per-user sequence
+    number in `meal_changes` on the shard of the user, in the transaction of the write. `/v1/sync` returns the changes
+    after a sequence number; `src/tools/compactMealChanges.py` removes superseded and expired changes.
+
+Archive:
+    With `database.archiveHorizonMonths` set, `src/tools/archiveMeals.py` moves the day meals older than that many
+    months into `day_meals_archive` (compressed, partitioned by year). Reads of such days also query the archive.
+
 Repositories:
     - UserRepo: Handles user-related operations.
     - DayRepo: Handles day-related operations.
     - MealRepo: Handles meal-related operations.
     - MealTypeRepo: Handles meal type-related operations.
     - DayMealRepo: Handles day-meal-related operations.
+    - ShardDirectoryRepo: Handles the shard directory (which shard holds the meal data of a user).
+    - MealChangeRepo: Handles the meal change log.
+    Within a traced request, the repositories and cursors are wrapped to record a span per call and per SQL statement
+    (see `src.utils.tracing`).
 
 Usage example:
 
@@ -34,16 +73,15 @@ Usage example:
     is_valid = db_wrapper.isTokenValid("someToken")
 """
 
-import mysql.connector
-import json
+import contextvars
+import datetime
+import hashlib
+import hmac
+import itertools
 import time
-import os
-import sys
 
-# Insert path to allow importing own classes and repositories.
-sys.path.insert(1, os.path.join(os.path.dirname(__file__), "..", "utils"))
-sys.path.insert(1, os.path.join(os.path.dirname(__file__), "..", "models"))
-sys.path.insert(1, os.path.join(os.path.dirname(__file__), "repositories"))
+# Configuration shared with the API and the logger (parsed once per process).
+from src.utils.configLoader import loadConfig
 
 # Repositories containing logical parts.
 from src.utils.repositories.userRepo import UserRepo
@@ -51,10 +89,26 @@ from src.utils.repositories.dayRepo import DayRepo
 from src.utils.repositories.mealRepo import MealRepo
 from src.utils.repositories.mealTypeRepo import MealTypeRepo
 from src.utils.repositories.dayMealRepo import DayMealRepo
+from src.utils.repositories.shardDirectoryRepo import ShardDirectoryRepo
+from src.utils.repositories.mealChangeRepo import MealChangeRepo
+
+# Connection and health state of a single database server.
+from src.utils.connectionTarget import ConnectionTarget
+
+# Spans per repository call within a traced request.
+from src.utils.tracing import traceRepository
 
 # CredentialsItem from own models to use location independent.
 from src.models.credentialsItem import CredentialsItem
 
+# Read-your-writes state of the current request (each request runs in its own context).
+_readSessionKey = contextvars.ContextVar("readSessionKey", default=None)
+_pinnedToPrimaryUntil = contextvars.ContextVar("pinnedToPrimaryUntil", default=0.0)
+_lastReadTarget = contextvars.ContextVar("lastReadTarget", default=None)
+
+# Shard holding the meal data of the user of the current request.
+_currentShard = contextvars.ContextVar("currentShard", default=None)
+
 
 class DatabaseWrapper:
     """
@@ -65,55 +119,238 @@ class DatabaseWrapper:
     and managing encryption keys.
 
     Attributes:
-        dbConnection: MySQL database connection object.
-        dbCursor: MySQL database cursor used to execute SQL queries.
+        primary (ConnectionTarget): The primary database server, receiving all writes.
+        replicas (list): The read replicas (ConnectionTarget) reads are balanced over.
+        shards (list): The shards (ConnectionTarget) holding the meal data, empty if sharding is disabled.
+        shardDirectoryCacheSeconds (float): Seconds a shard directory entry is cached.
+        dbConnection: MySQL database connection object of the primary.
+        dbCursor: MySQL database cursor of the primary used to execute SQL queries.
         validToken: The predefined token used for authentication.
         encryptionKey: The encryption key used for user data encryption.
+        encryptionKeyVersion (int): The version of `encryptionKey`, stored with every encrypted user name.
+        encryptionKeys (dict): Every known key by version, the current one and those still needed while rotating.
+        nameBlindIndex (str): Whether user names are looked up by their blind index ("off", "dual" or "on").
+        nameBlindIndexKey (str): The key of the blind index, separate from the encryption key.
+        readYourWritesSeconds (float): Seconds reads stick to the primary after a write.
+        readSessions (bool): Whether reads of later requests of a read session stick to the primary after a write.
+            The last writes are kept in process memory, so they are switched off when several workers serve the API.
+        schemaVersion (str): The layout of the day meals ("v1", "dual" or "v2").
+        inlineMealLevels (str): Where the meal levels are stored ("off", "dual" or "on").
+        mealChangeLog (bool): Whether meal writes record changes for delta sync.
+        archiveHorizonMonths (int): Day meals older than this many months are archived (0 if archiving is disabled).
     """
 
-    def __init__(self):
+    SCHEMA_VERSIONS = ("v1", "dual", "v2")
+    INLINE_MEAL_LEVEL_MODES = ("off", "dual", "on")
+    NAME_BLIND_INDEX_MODES = ("off", "dual", "on")
+
+    def __init__(self, connect: bool = True):
         """
         Initializes the DatabaseWrapper by establishing a connection to the database
         and setting the database cursor, token, and encryption key from the configuration file.
+
+        Args:
+            connect (bool, optional): Whether to connect right away. Without connecting, the connections are opened
+                lazily on first use (after `checkReachable()`), so the API can start serving (e.g. health checks)
+                before the database is reachable. Defaults to True.
         """
         # Get database credentials from the config file.
-        config_file_path_and_name = os.path.join(os.path.dirname(__file__), "..", "..", "config.txt")
-        with open(config_file_path_and_name) as config_file:
-            config_array = json.load(config_file)
-
-        # Establish the database connection.
-        self.dbConnection = mysql.connector.connect(
-            host=config_array["database"]["host"],
-            user=config_array["database"]["user"],
-            password=config_array["database"]["password"],
-            database=config_array["database"]["database"],
-            port=config_array["database"]["port"]
-        )
-        self.dbCursor = self.dbConnection.cursor(buffered=True)  # Buffered to fix unread result error.
+        config_array = loadConfig()
+
+        database_config = config_array["database"]
+        health_check_interval = float(database_config.get("replicaHealthCheckIntervalSeconds", 5))
+        self.readYourWritesSeconds = float(database_config.get("readYourWritesSeconds", 5))
+        self.schemaVersion = database_config.get("schemaVersion", "v1")
+        if self.schemaVersion not in self.SCHEMA_VERSIONS:
+            raise ValueError(f"Unknown database.schemaVersion {self.schemaVersion!r}, expected one of {self.SCHEMA_VERSIONS}")
+        self.inlineMealLevels = database_config.get("inlineMealLevels", "off")
+        if self.inlineMealLevels not in self.INLINE_MEAL_LEVEL_MODES:
+            raise ValueError(f"Unknown database.inlineMealLevels {self.inlineMealLevels!r}, expected one of {self.INLINE_MEAL_LEVEL_MODES}")
+        self.mealChangeLog = bool(database_config.get("mealChangeLog", False))
+        self.archiveHorizonMonths = int(database_config.get("archiveHorizonMonths", 0))
+
+        # The primary receives all writes.
+        self.primary = ConnectionTarget("primary", database_config, health_check_interval)
+
+        # The read replicas inherit every setting they do not override from the primary.
+        self.replicas = []
+        for index, replica_config in enumerate(database_config.get("replicas", [])):
+            replica = ConnectionTarget(f"replica{index}", {**database_config, **replica_config}, health_check_interval)
+            self.replicas.append(replica)
+        self.__replicaRoundRobin = itertools.count()
+        self.__lastWriteBySessionKey = {}
+        self.readSessions = True
+
+        # The shards inherit every setting they do not override from the primary as well.
+        self.shards = []
+        for index, shard_config in enumerate(database_config.get("shards", [])):
+            shard = ConnectionTarget(f"shard{index}", {**database_config, **shard_config}, health_check_interval)
+            self.shards.append(shard)
+        self.shardDirectoryCacheSeconds = float(database_config.get("shardDirectoryCacheSeconds", 5))
+        self.__shardDirectoryCache = {}
+
         self.validToken = config_array["authentication"]["token"]
         self.encryptionKey = config_array["authentication"]["encryption_key"]
+        self.encryptionKeyVersion = int(config_array["authentication"].get("encryption_key_version", 1))
+        self.encryptionKeys = {int(version): key for version, key in config_array["authentication"].get("previous_encryption_keys", {}).items()}
+        self.encryptionKeys[self.encryptionKeyVersion] = self.encryptionKey
+        self.nameBlindIndex = config_array["authentication"].get("name_blind_index", "off")
+        if self.nameBlindIndex not in self.NAME_BLIND_INDEX_MODES:
+            raise ValueError(f"Unknown authentication.name_blind_index {self.nameBlindIndex!r}, expected one of {self.NAME_BLIND_INDEX_MODES}")
+        self.nameBlindIndexKey = config_array["authentication"].get("name_blind_index_key", "")
+        if self.nameBlindIndex != "off" and not self.nameBlindIndexKey:
+            raise ValueError("authentication.name_blind_index requires authentication.name_blind_index_key")
+
+        if connect:
+            self.connectAll()
+
+    def connectAll(self) -> None:
+        """
+        Connects the calling thread to the primary, the replicas and the shards.
+
+        Replicas and shards that are down are retried by their health checks.
+
+        Raises:
+            mysql.connector.Error: If the primary cannot be reached.
+        """
+        self.primary.connect()
+        for target in [*self.replicas, *self.shards]:
+            target.tryConnect()
+
+    def checkReachable(self) -> None:
+        """
+        Checks from the calling thread that the primary can be reached, then closes the thread's connections again.
+
+        Used as the warm-up of the readiness gate: its thread exits afterwards, and the threads serving requests
+        open their own connections on first use. Replicas and shards that are down are retried by their health checks.
+
+        Raises:
+            mysql.connector.Error: If the primary cannot be reached.
+        """
+        try:
+            self.connectAll()
+        finally:
+            for target in [self.primary, *self.replicas, *self.shards]:
+                target.closeThreadConnection()
+
+    @property
+    def dbConnection(self):
+        """
+        MySQL database connection object of the primary.
+        """
+        return self.primary.dbConnection
+
+    @property
+    def dbCursor(self):
+        """
+        MySQL database cursor of the primary.
+        """
+        return self.primary.dbCursor
 
     def updateOwnClassVars(self):
         """
         Updates class variables like the database connection and cursor by reloading
         credentials from the configuration file.
+
+        If the last read of the current request went to a replica, that replica is marked unhealthy instead,
+        so the retry of the failed read goes to another replica or the primary.
         """
-        config_file_path_and_name = os.path.join(os.path.dirname(__file__), "..", "..", "config.txt")
-        with open(config_file_path_and_name) as config_file:
-            config_array = json.load(config_file)
+        last_read_target = _lastReadTarget.get()
+        if last_read_target is not None and last_read_target is not self.primary:
+            last_read_target.markUnhealthy()
+            _lastReadTarget.set(None)
+            print(f"Database: Marked {last_read_target.name} unhealthy")
+            return
+
+        config_array = loadConfig(reload=True)
 
         # Re-establish the database connection.
-        self.dbConnection = mysql.connector.connect(
-            host=config_array["database"]["host"],
-            user=config_array["database"]["user"],
-            password=config_array["database"]["password"],
-            database=config_array["database"]["database"],
-            port=config_array["database"]["port"]
-        )
-        self.dbCursor = self.dbConnection.cursor(buffered=True)
+        self.primary.settings = config_array["database"]
+        self.primary.connect()
+
+        # The failed statement may have run on the shard of the current user.
+        current_shard = _currentShard.get()
+        if current_shard is not None:
+            current_shard.tryConnect()
 
         print("Database: Updated own class vars")
 
+    def beginReadSession(self, sessionKey: str) -> None:
+        """
+        Binds the current request to a read session (e.g. the user name), so reads of later requests of the same
+        session also go to the primary shortly after one of them wrote. Does nothing while `readSessions` is off.
+
+        Args:
+            sessionKey (str): The key identifying the read session.
+        """
+        if self.readSessions:
+            _readSessionKey.set(sessionKey)
+
+    def pinReadsToPrimary(self) -> None:
+        """
+        Routes all remaining reads of the current request to the primary.
+
+        Used by write requests, whose existence checks must not be answered by a lagging replica.
+        """
+        _pinnedToPrimaryUntil.set(float("inf"))
+
+    def recordWrite(self) -> None:
+        """
+        Records that the current request wrote to the primary, so its following reads (and those of its read session)
+        are routed to the primary for `readYourWritesSeconds`.
+        """
+        pinned_until = time.monotonic() + self.readYourWritesSeconds
+        _pinnedToPrimaryUntil.set(max(_pinnedToPrimaryUntil.get(), pinned_until))
+
+        session_key = _readSessionKey.get()
+        if session_key is not None:
+            self.__lastWriteBySessionKey[session_key] = pinned_until
+            if len(self.__lastWriteBySessionKey) > 10000:
+                now = time.monotonic()
+                self.__lastWriteBySessionKey = {key: until for key, until in self.__lastWriteBySessionKey.items() if until > now}
+
+    def getReadCursor(self):
+        """
+        Returns the cursor reads should be executed on.
+
+        Reads go to the next healthy replica (round robin), or to the primary if no replica is configured or healthy,
+        or if the current request or read session wrote recently.
+
+        Returns:
+            MySQL database cursor to execute the read on.
+        """
+        return self.getReadTarget().dbCursor
+
+    def getReadTarget(self) -> ConnectionTarget:
+        """
+        Returns the database server reads should be executed on (see `getReadCursor()`).
+
+        Returns:
+            ConnectionTarget: The next healthy replica, or the primary.
+        """
+        target = self.primary
+        if self.replicas and not self.__mustReadFromPrimary():
+            for _ in range(len(self.replicas)):
+                replica = self.replicas[next(self.__replicaRoundRobin) % len(self.replicas)]
+                if replica.isHealthy():
+                    target = replica
+                    break
+        _lastReadTarget.set(target)
+        return target
+
+    def __mustReadFromPrimary(self) -> bool:
+        """
+        Private helper checking whether reads of the current request have to go to the primary to see recent writes.
+
+        Returns:
+            bool: True if the current request or its read session wrote within `readYourWritesSeconds`.
+        """
+        now = time.monotonic()
+        if _pinnedToPrimaryUntil.get() > now:
+            return True
+        session_key = _readSessionKey.get()
+        return session_key is not None and self.__lastWriteBySessionKey.get(session_key, 0.0) > now
+
     def getUserRepo(self) -> UserRepo:
         """
         Returns an instance of the UserRepo class.
@@ -121,7 +358,7 @@ class DatabaseWrapper:
         Returns:
             UserRepo: An instance of the UserRepo class.
         """
-        return UserRepo(self)
+        return traceRepository(UserRepo(self))
 
     def getDayRepo(self) -> DayRepo:
         """
@@ -130,7 +367,7 @@ class DatabaseWrapper:
         Returns:
             DayRepo: An instance of the DayRepo class.
         """
-        return DayRepo(self)
+        return traceRepository(DayRepo(self))
 
     def getMealRepo(self) -> MealRepo:
         """
@@ -139,7 +376,7 @@ class DatabaseWrapper:
         Returns:
             MealRepo: An instance of the MealRepo class.
         """
-        return MealRepo(self)
+        return traceRepository(MealRepo(self))
 
     def getMealTypeRepo(self) -> MealTypeRepo:
         """
@@ -148,7 +385,7 @@ class DatabaseWrapper:
         Returns:
             MealTypeRepo: An instance of the MealTypeRepo class.
         """
-        return MealTypeRepo(self)
+        return traceRepository(MealTypeRepo(self))
 
     def getDayMealRepo(self) -> DayMealRepo:
         """
@@ -157,7 +394,166 @@ class DatabaseWrapper:
         Returns:
             DayMealRepo: An instance of the DayMealRepo class.
         """
-        return DayMealRepo(self)
+        return traceRepository(DayMealRepo(self))
+
+    def getShardDirectoryRepo(self) -> ShardDirectoryRepo:
+        """
+        Returns an instance of the ShardDirectoryRepo class.
+
+        Returns:
+            ShardDirectoryRepo: An instance of the ShardDirectoryRepo class.
+        """
+        return traceRepository(ShardDirectoryRepo(self))
+
+    def getMealChangeRepo(self) -> MealChangeRepo:
+        """
+        Returns an instance of the MealChangeRepo class.
+
+        Returns:
+            MealChangeRepo: An instance of the MealChangeRepo class.
+        """
+        return traceRepository(MealChangeRepo(self))
+
+    def getArchiveHorizonDate(self) -> datetime.date or None:
+        """
+        Returns the first day that is never archived: the first day of the month `archiveHorizonMonths` months ago.
+
+        Returns:
+            datetime.date or None: The horizon, or None if archiving is disabled.
+        """
+        if self.archiveHorizonMonths <= 0:
+            return None
+        today = datetime.date.today()
+        monthIndex = today.year * 12 + today.month - 1 - self.archiveHorizonMonths
+        return datetime.date(monthIndex // 12, monthIndex % 12 + 1, 1)
+
+    def isShardingEnabled(self) -> bool:
+        """
+        Returns whether the meal data is spread over several shards.
+
+        Returns:
+            bool: True if shards are configured, False if all data is stored on the primary.
+        """
+        return len(self.shards) > 0
+
+    def getStableShardIndex(self, userID: int) -> int:
+        """
+        Returns the shard a new user is assigned to, derived from a stable hash of the user ID.
+
+        Args:
+            userID (int): The ID of the user.
+
+        Returns:
+            int: The index of the shard.
+        """
+        return int(hashlib.sha256(str(userID).encode()).hexdigest(), 16) % len(self.shards)
+
+    def assignShardOfNewUser(self, userID: int) -> None:
+        """
+        Records the shard of a newly created user in the shard directory. Does nothing if sharding is disabled.
+
+        Args:
+            userID (int): The ID of the new user.
+        """
+        if self.isShardingEnabled():
+            self.getShardDirectoryRepo().createShardEntry(userID, self.getStableShardIndex(userID))
+
+    def getShardEntryOfUser(self, userID: int, useCache: bool = True) -> dict:
+        """
+        Returns the shard directory entry of a user. Users without entry live on shard 0.
+
+        Args:
+            userID (int): The ID of the user.
+            useCache (bool, optional): Whether a cached entry younger than `shardDirectoryCacheSeconds` may be used.
+                                       Defaults to True.
+
+        Returns:
+            dict: A dictionary containing the shard index and moving state of the user.
+        """
+        cached = self.__shardDirectoryCache.get(userID)
+        if useCache and cached is not None and cached[1] > time.monotonic():
+            return cached[0]
+
+        entry = self.getShardDirectoryRepo().getShardEntry(userID)
+        if entry is None:
+            entry = {'fk_user_id': userID, 'shard_index': 0, 'is_moving': False}
+        if len(self.__shardDirectoryCache) > 100000:
+            self.__shardDirectoryCache.clear()
+        self.__shardDirectoryCache[userID] = (entry, time.monotonic() + self.shardDirectoryCacheSeconds)
+        return entry
+
+    def useShardOfUser(self, userID: int) -> dict:
+        """
+        Selects the shard of a user for the remaining repository calls of the current request.
+
+        Args:
+            userID (int): The ID of the user.
+
+        Returns:
+            dict: The shard directory entry of the user. Callers must not write while `is_moving` is True.
+                  Without sharding the entry has no shard index and is never moving.
+        """
+        if not self.isShardingEnabled():
+            return {'fk_user_id': userID, 'shard_index': None, 'is_moving': False}
+        entry = self.getShardEntryOfUser(userID)
+        _currentShard.set(self.shards[entry["shard_index"]])
+        return entry
+
+    def getShardConnection(self):
+        """
+        Returns the connection of the shard selected for the current request, or of the primary without sharding.
+
+        Raises:
+            RuntimeError: If sharding is enabled but no shard was selected with `useShardOfUser()`.
+
+        Returns:
+            MySQL database connection object to write the meal data with.
+        """
+        return self.__getCurrentShardTarget().dbConnection
+
+    def getShardCursor(self):
+        """
+        Returns the cursor of the shard selected for the current request, or of the primary without sharding.
+
+        Raises:
+            RuntimeError: If sharding is enabled but no shard was selected with `useShardOfUser()`.
+
+        Returns:
+            MySQL database cursor to write the meal data with.
+        """
+        return self.__getCurrentShardTarget().dbCursor
+
+    def getShardReadCursor(self):
+        """
+        Returns the cursor meal data reads should be executed on: the selected shard, or `getReadCursor()` without
+        sharding.
+
+        Raises:
+            RuntimeError: If sharding is enabled but no shard was selected with `useShardOfUser()`.
+
+        Returns:
+            MySQL database cursor to read the meal data with.
+        """
+        if not self.isShardingEnabled():
+            return self.getReadCursor()
+        return self.__getCurrentShardTarget().dbCursor
+
+    def __getCurrentShardTarget(self) -> ConnectionTarget:
+        """
+        Private helper returning the shard selected for the current request, or the primary without sharding.
+
+        Raises:
+            RuntimeError: If sharding is enabled but no shard was selected with `useShardOfUser()`.
+
+        Returns:
+            ConnectionTarget: The target holding the meal data of the current user.
+        """
+        if not self.isShardingEnabled():
+            return self.primary
+        current_shard = _currentShard.get()
+        if current_shard is None:
+            raise RuntimeError("Sharding is enabled but no shard was selected for the current request")
+        return current_shard
 
     def isTokenValid(self, token: str) -> bool:
         """
@@ -170,4 +566,52 @@ class DatabaseWrapper:
             bool: True if the token is valid, False otherwise.
         """
         return token == self.validToken
+
+    def close(self) -> None:
+        """
+        Closes all connections to the primary, the replicas and the shards.
+        """
+        for target in [self.primary, *self.replicas, *self.shards]:
+            target.close()
+
+    def getStatistics(self) -> dict:
+        """
+        Returns the connection state of all database servers, gathered without any I/O.
+
+        Returns:
+            dict: Per server whether it is healthy and how many threads hold a connection to it, and the number of
+                  cached shard directory entries.
+        """
+        return {
+            "targets": {
+                target.name: {"healthy": target.healthy, "openConnections": target.getOpenConnectionCount()}
+                for target in [self.primary, *self.replicas, *self.shards]
+            },
+            "shardDirectoryCacheEntries": len(self.__shardDirectoryCache),
+        }
+
+    def usesEncryptionKeyVersions(self) -> bool:
+        """
+        Returns whether user names are encrypted with versioned keys.
+
+        Without key rotation (only the key version 1 is configured) the `name_key_version` column is not needed,
+        so installations that did not add it keep working.
+
+        Returns:
+            bool: True if more than one key or a key version other than 1 is configured, False otherwise.
+        """
+        return list(self.encryptionKeys) != [1]
+
+    def getNameBlindIndex(self, name: str) -> bytes:
+        """
+        Returns the blind index of a user name: a keyed hash (HMAC-SHA256) that can be indexed and looked up, unlike
+        the encrypted name, without revealing the name to anyone who does not have the key.
+
+        Args:
+            name (str): The name of the user.
+
+        Returns:
+            bytes: The 32 byte blind index stored in `users.name_bidx`.
+        """
+        return hmac.new(str(self.nameBlindIndexKey).encode(), name.encode(), hashlib.sha256).digest()
     
\ No newline at end of file
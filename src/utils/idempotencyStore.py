@@ -0,0 +1,204 @@
+# Copyright (C) 2024 Patrick Michiels
+# All rights reserved.
+# This source code is licensed under the Evaluation License Agreement and
+# may not be used, modified, or distributed without explicit permission from the author.
+# This code is provided for evaluation purposes only.
+
+"""
+Replay of the responses of mutating requests sent with an `Idempotency-Key` header.
+
+A client retrying a write (e.g. after a timeout on a flaky mobile network) sends the same key again. The first
+request with a key runs; its response is stored for `ttlSeconds` and every repetition within that time gets the
+stored response without running the request again. Repetitions arriving while the first request still runs wait for
+it and share its response, so concurrent duplicates run only once.
+
+Keys are scoped by the caller (e.g. endpoint and a digest of the credentials), so one user can never receive the
+response stored for another. Reusing a key for a different request raises `IdempotencyKeyConflictError`.
+
+Only final responses are stored: a server error (5xx) or an exception is not, so the client's next retry runs again.
+The store holds at most `maxEntries` responses, dropping the oldest beyond that. It lives in the worker process.
+
+Usage example:
+
+    # Create the store from the config (None if disabled)
+    idempotency_store = IdempotencyStore.fromConfig(config_array)
+
+    # Run a write once per key
+    status_code, headers, body, replayed = await idempotency_store.execute(
+        ("/v1/addMeal", credentials_digest, idempotency_key), request_digest, run_add_meal
+    )
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+
+
+class IdempotencyKeyConflictError(Exception):
+    """
+    Raised if an idempotency key is reused for a different request.
+    """
+
+
+class IdempotencyStore:
+    """
+    Stores the responses of requests by idempotency key and coalesces concurrent duplicates.
+
+    Must only be used from the event loop thread.
+
+    Attributes:
+        maxEntries (int): The maximum number of stored responses.
+        ttlSeconds (float): Seconds a response is replayed for.
+        maxKeyLength (int): The maximum length of an idempotency key.
+        executions (int): The number of requests that ran.
+        replayed (int): The number of requests answered with a stored response.
+        coalesced (int): The number of requests that shared the response of a duplicate in flight.
+        clock (callable): Returns the current time in seconds the TTL is measured with.
+    """
+
+    def __init__(self, maxEntries: int = 10000, ttlSeconds: float = 86400.0, maxKeyLength: int = 255, clock=time.monotonic):
+        """
+        Initializes the IdempotencyStore without stored responses.
+
+        Args:
+            maxEntries (int, optional): The maximum number of stored responses. Defaults to 10000.
+            ttlSeconds (float, optional): Seconds a response is replayed for. Defaults to 86400 (one day).
+            maxKeyLength (int, optional): The maximum length of an idempotency key. Defaults to 255.
+            clock (callable, optional): Returns the current time in seconds. Defaults to time.monotonic.
+        """
+        self.maxEntries = maxEntries
+        self.ttlSeconds = ttlSeconds
+        self.maxKeyLength = maxKeyLength
+        self.executions = 0
+        self.replayed = 0
+        self.coalesced = 0
+        self.clock = clock
+        self.__entries = OrderedDict()
+        self.__inFlight = {}
+
+    @classmethod
+    def fromConfig(cls, configArray: dict):
+        """
+        Creates the store configured in the `idempotency` section of the config.
+
+        Args:
+            configArray (dict): The parsed `config.txt`.
+
+        Returns:
+            IdempotencyStore or None: The store, or None if idempotency keys are disabled.
+        """
+        idempotencyConfig = configArray.get("idempotency", {})
+        if not idempotencyConfig.get("enabled", False):
+            return None
+        return cls(
+            idempotencyConfig.get("maxEntries", 10000),
+            idempotencyConfig.get("ttlSeconds", 86400),
+            idempotencyConfig.get("maxKeyLength", 255)
+        )
+
+    def isValidKey(self, key: str) -> bool:
+        """
+        Checks whether an idempotency key can be stored.
+
+        Args:
+            key (str): The value of the `Idempotency-Key` header.
+
+        Returns:
+            bool: True if the key is neither empty nor longer than `maxKeyLength`, False otherwise.
+        """
+        return 0 < len(key) <= self.maxKeyLength
+
+    async def execute(self, key: tuple, requestDigest: str, function) -> tuple:
+        """
+        Runs a request once per key, or returns the response stored or in flight for the key.
+
+        Args:
+            key (tuple): The scoped key (e.g. endpoint, credentials digest and idempotency key).
+            requestDigest (str): A digest of the request body, detecting a key reused for a different request.
+            function: The coroutine function running the request, returning status code, headers and body.
+
+        Raises:
+            IdempotencyKeyConflictError: If the key was used for a different request.
+            Exception: Whatever the function raised, for the request that ran it and all duplicates that joined.
+
+        Returns:
+            tuple: The status code, headers and body of the response, and whether it is a stored or shared one.
+        """
+        entry = self.__getEntry(key)
+        if entry is not None:
+            if entry[0] != requestDigest:
+                raise IdempotencyKeyConflictError("the idempotency key was used for a different request")
+            self.replayed += 1
+            return entry[2] + (True,)
+
+        inFlight = self.__inFlight.get(key)
+        if inFlight is not None:
+            if inFlight[0] != requestDigest:
+                raise IdempotencyKeyConflictError("the idempotency key is in use by a different request")
+            self.coalesced += 1
+            return await asyncio.shield(inFlight[1]) + (True,)
+
+        self.executions += 1
+        running = asyncio.ensure_future(function())
+        self.__inFlight[key] = (requestDigest, running)
+        running.add_done_callback(lambda finished: self.__onFinished(key, requestDigest, finished))
+        # Shielded, so a cancelled caller (e.g. client disconnect) does not cancel the write shared with duplicates.
+        return await asyncio.shield(running) + (False,)
+
+    def getStatistics(self) -> dict:
+        """
+        Returns the counters of the store.
+
+        Returns:
+            dict: The number of executions, replayed and coalesced requests, stored responses and requests in flight.
+        """
+        return {
+            "executions": self.executions,
+            "replayed": self.replayed,
+            "coalesced": self.coalesced,
+            "entries": len(self.__entries),
+            "inFlight": len(self.__inFlight),
+        }
+
+    def __getEntry(self, key: tuple) -> tuple or None:
+        """
+        Private helper returning the stored response of a key, dropping it if it expired.
+
+        Args:
+            key (tuple): The scoped key.
+
+        Returns:
+            tuple or None: The request digest, expiry time and response, or None if there is none.
+        """
+        entry = self.__entries.get(key)
+        if entry is not None and entry[1] <= self.clock():
+            del self.__entries[key]
+            return None
+        return entry
+
+    def __onFinished(self, key: tuple, requestDigest: str, finished: asyncio.Future) -> None:
+        """
+        Private helper storing the response of a finished request unless it failed, and dropping expired entries.
+
+        Args:
+            key (tuple): The scoped key.
+            requestDigest (str): The digest of the request.
+            finished (asyncio.Future): The finished request.
+        """
+        if self.__inFlight.get(key, (None, None))[1] is finished:
+            del self.__inFlight[key]
+        if finished.cancelled() or finished.exception() is not None:
+            return
+        response = finished.result()
+        if response[0] >= 500:
+            return
+
+        now = self.clock()
+        self.__entries[key] = (requestDigest, now + self.ttlSeconds, response)
+        self.__entries.move_to_end(key)
+        # Entries share one TTL, so the oldest ones expire first.
+        while self.__entries:
+            oldestKey, oldestEntry = next(iter(self.__entries.items()))
+            if len(self.__entries) <= self.maxEntries and oldestEntry[1] > now:
+                break
+            del self.__entries[oldestKey]
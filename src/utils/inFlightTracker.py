@@ -0,0 +1,174 @@
+# Copyright (C) 2024 Patrick Michiels
+# All rights reserved.
+# This source code is licensed under the Evaluation License Agreement and
+# may not be used, modified, or distributed without explicit permission from the author.
+# This code is provided for evaluation purposes only.
+
+"""
+Tracking of in-flight requests, so a worker can drain them before it shuts down.
+
+`InFlightMiddleware` registers every HTTP request with the `InFlightTracker` while it runs. On shutdown the worker
+calls `beginDraining()`: from then on new requests are answered with `503` and `Connection: close` (so clients retry
+on another instance), and `waitUntilIdle()` waits for the requests still running, up to a deadline. The returned
+report lists how many requests were drained and which ones were still running (aborted) at the deadline.
+
+Usage example:
+
+    # Track requests, keeping the health checks open while draining
+    in_flight_tracker = InFlightTracker()
+    app = FastAPI(middleware=[Middleware(InFlightMiddleware, inFlightTracker=in_flight_tracker, openPaths={"/healthz"})])
+
+    # On shutdown
+    in_flight_tracker.beginDraining()
+    report = await in_flight_tracker.waitUntilIdle(10.0)
+"""
+
+import asyncio
+import itertools
+import json
+import time
+
+
+class InFlightTracker:
+    """
+    Counts the requests currently being served and supports draining them.
+
+    Attributes:
+        draining (bool): Whether new requests are rejected because the worker shuts down.
+        rejectedWhileDraining (int): The number of requests rejected while draining.
+    """
+
+    def __init__(self):
+        """
+        Initializes the InFlightTracker (not draining, nothing in flight).
+        """
+        self.draining = False
+        self.rejectedWhileDraining = 0
+        self.__requests = {}
+        self.__ids = itertools.count()
+        self.__finishedWhileDraining = 0
+        self.__idle = None
+
+    def begin(self, method: str, path: str) -> int:
+        """
+        Registers a request that started.
+
+        Args:
+            method (str): The HTTP method of the request.
+            path (str): The path of the request.
+
+        Returns:
+            int: The ID to pass to `finish()`.
+        """
+        requestID = next(self.__ids)
+        self.__requests[requestID] = (method, path, time.monotonic())
+        return requestID
+
+    def finish(self, requestID: int) -> None:
+        """
+        Registers that a request finished (successfully or not).
+
+        Args:
+            requestID (int): The ID returned by `begin()`.
+        """
+        self.__requests.pop(requestID, None)
+        if self.draining:
+            self.__finishedWhileDraining += 1
+            if not self.__requests and self.__idle is not None:
+                self.__idle.set()
+
+    def getInFlightCount(self) -> int:
+        """
+        Returns the number of requests currently being served.
+
+        Returns:
+            int: The number of in-flight requests.
+        """
+        return len(self.__requests)
+
+    def beginDraining(self) -> None:
+        """
+        Starts rejecting new requests; the running ones are served to completion.
+        """
+        self.draining = True
+        self.__idle = asyncio.Event()
+        if not self.__requests:
+            self.__idle.set()
+
+    async def waitUntilIdle(self, timeoutSeconds: float) -> dict:
+        """
+        Waits until all in-flight requests finished, or the deadline passed.
+
+        Must be called after `beginDraining()` on the event loop serving the requests.
+
+        Args:
+            timeoutSeconds (float): The maximum number of seconds to wait.
+
+        Returns:
+            dict: The number of drained requests, the requests still running at the deadline (method, path and
+                  seconds running), the number of requests rejected meanwhile and the seconds waited.
+        """
+        startedAt = time.monotonic()
+        try:
+            await asyncio.wait_for(self.__idle.wait(), timeoutSeconds)
+        except asyncio.TimeoutError:
+            pass
+
+        now = time.monotonic()
+        return {
+            "drained": self.__finishedWhileDraining,
+            "aborted": [
+                {"method": method, "path": path, "runningSeconds": round(now - requestStartedAt, 3)}
+                for method, path, requestStartedAt in list(self.__requests.values())
+            ],
+            "rejected": self.rejectedWhileDraining,
+            "waitedSeconds": round(now - startedAt, 3),
+        }
+
+
+class InFlightMiddleware:
+    """
+    ASGI middleware tracking every HTTP request and rejecting new ones while the worker drains.
+
+    Attributes:
+        app: The wrapped ASGI application.
+        inFlightTracker (InFlightTracker): The tracker to register requests with.
+        openPaths (set): The paths still served while draining (e.g. health checks), without being tracked.
+    """
+
+    def __init__(self, app, inFlightTracker: InFlightTracker, openPaths: set = frozenset()):
+        """
+        Initializes the InFlightMiddleware.
+
+        Args:
+            app: The wrapped ASGI application.
+            inFlightTracker (InFlightTracker): The tracker to register requests with.
+            openPaths (set, optional): The paths served while draining, without being tracked. Defaults to none.
+        """
+        self.app = app
+        self.inFlightTracker = inFlightTracker
+        self.openPaths = set(openPaths)
+
+    async def __call__(self, scope, receive, send):
+        """
+        Serves and tracks HTTP requests, or rejects them with 503 while draining.
+        """
+        if scope["type"] != "http" or scope["path"] in self.openPaths:
+            await self.app(scope, receive, send)
+            return
+
+        if self.inFlightTracker.draining:
+            self.inFlightTracker.rejectedWhileDraining += 1
+            await send({
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [(b"content-type", b"application/json"), (b"connection", b"close"), (b"retry-after", b"1")],
+            })
+            await send({"type": "http.response.body", "body": json.dumps({"message": "shutting down, retry on another instance"}).encode()})
+            return
+
+        requestID = self.inFlightTracker.begin(scope["method"], scope["path"])
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.inFlightTracker.finish(requestID)
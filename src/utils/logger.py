@@ -16,11 +16,18 @@ Logs are saved in the following structure:
 
 Log entries are timestamped and categorized as INFO, WARNING, or ERROR.
 
+By default every entry is appended to its files before the log call returns. With `logger.backgroundWriter` enabled
+in `config.txt`, entries are queued and appended by a background thread instead, so request handlers never wait for
+the disk. The queue holds up to `logger.maxBacklog` entries; beyond that, log calls write synchronously again rather
+than dropping entries. Call `flush()` before the process exits.
+
 Functions:
     - logError: Logs an error message to all error and log files.
     - logWarning: Logs a warning message to all error and log files.
     - logInformation: Logs an information message to log files.
     - updateDayBasedLogFilePaths: Updates file paths for day-based log files.
+    - getBacklog: Returns the number of entries waiting for the background writer.
+    - flush: Waits until the background writer appended all queued entries.
 
 Usage example:
 
@@ -34,9 +41,12 @@ Usage example:
 """
 
 import os
-import json
-import fileUtils
-import dateStringUtils
+import queue
+import threading
+import time
+from src.utils import fileUtils
+from src.utils import dateStringUtils
+from src.utils.configLoader import loadConfig
 
 
 class Logger:
@@ -55,14 +65,13 @@ class Logger:
 
     def __init__(self, logScope: str = None):
         """
-        Initializes the Logger class, sets up log paths, and creates necessary log files.
+        Initializes the Logger class and sets up log paths. The log files are created on the first log entry,
+        so creating a logger does no file I/O.
 
         Args:
             logScope (str, optional): The scope of the logger (e.g., "api"). Defaults to the value in the config.
         """
-        config_file_pathAndName = os.path.join(os.path.dirname(__file__), "..", "..", "config.txt")
-        with open(config_file_pathAndName) as config_file:
-            config_array = json.load(config_file)
+        config_array = loadConfig()
 
         # Determine log scope (default or custom)
         if logScope is None or logScope.lower() == str(config_array["logger"]["default_logScope"]).lower():
@@ -75,29 +84,43 @@ class Logger:
             self.logtext_warning = "UNKNOWN_WARNING"
             self.logtext_error = "UNKNOWN_ERROR"
 
-        # Set up log paths and create global log files
+        # Set up log paths
         self.logPath = os.path.join(config_array["installPath"], "logs")
         self.globalErrorLogFile = os.path.join(self.logPath, "errorlog.txt")
         self.globalLogFile = os.path.join(self.logPath, "log.txt")
-        fileUtils.createFileIfNotExists(self.globalErrorLogFile)
-        fileUtils.createFileIfNotExists(self.globalLogFile)
 
-        # Set up day-based log paths
+        # Set up day-based log paths (the files of the current day are created by updateDayBasedLogFilePaths())
         self.dayLogPath = os.path.join(self.logPath, "dayBased")
-        self.updateDayBasedLogFilePaths()
+        self.dayBasedErrorLogFile = None
+        self.dayBasedLogFile = None
+        self.__currentDateString = None
+
+        # Queue of the background writer (None if entries are written synchronously), started with the first entry.
+        self.__queue = None
+        self.__writerThread = None
+        self.__writerLock = threading.Lock()
+        if config_array["logger"].get("backgroundWriter", False):
+            self.__queue = queue.Queue(maxsize=config_array["logger"].get("maxBacklog", 10000))
 
     def updateDayBasedLogFilePaths(self) -> None:
         """
         Updates the file paths for the current day-based log and error log files.
         This method is called before logging to ensure logs are written to the correct day-based files.
+        The files are only checked (and created) when the day changed, including the global files on the first call.
         """
         dateStringForLogFileName = dateStringUtils.getDateStringForLogFileName()
+        if dateStringForLogFileName == self.__currentDateString:
+            return
+        if self.__currentDateString is None:
+            fileUtils.createFileIfNotExists(self.globalErrorLogFile)
+            fileUtils.createFileIfNotExists(self.globalLogFile)
         dayBasedErrorLogFileName = f"{dateStringForLogFileName}_errorlog.txt"
         dayBasedLogFileName = f"{dateStringForLogFileName}_log.txt"
         self.dayBasedErrorLogFile = os.path.join(self.dayLogPath, dayBasedErrorLogFileName)
         self.dayBasedLogFile = os.path.join(self.dayLogPath, dayBasedLogFileName)
         fileUtils.createFileIfNotExists(self.dayBasedErrorLogFile)
         fileUtils.createFileIfNotExists(self.dayBasedLogFile)
+        self.__currentDateString = dateStringForLogFileName
 
     def logError(self, errorToLog: str) -> None:
         """
@@ -139,6 +162,36 @@ class Logger:
         self.__log(self.globalLogFile, fullLogText)
         self.__log(self.dayBasedLogFile, fullLogText)
 
+    def getBacklog(self) -> int:
+        """
+        Returns the number of entries waiting for the background writer.
+
+        Returns:
+            int: The number of queued file appends, always 0 if entries are written synchronously.
+        """
+        return 0 if self.__queue is None else self.__queue.qsize()
+
+    def flush(self, timeoutSeconds: float = 5.0) -> bool:
+        """
+        Waits until the background writer appended all queued entries.
+
+        Args:
+            timeoutSeconds (float, optional): The maximum number of seconds to wait. Defaults to 5.0.
+
+        Returns:
+            bool: True if all entries were written, False if the timeout elapsed first.
+        """
+        if self.__queue is None:
+            return True
+        deadline = time.monotonic() + timeoutSeconds
+        with self.__queue.all_tasks_done:
+            while self.__queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.__queue.all_tasks_done.wait(remaining)
+        return True
+
     def __log(self, file: str, fullLogText: str) -> None:
         """
         Private helper function to append a log entry to a specified file.
@@ -147,5 +200,47 @@ class Logger:
             file (str): The file path to write the log entry to.
             fullLogText (str): The full log entry string.
         """
+        if self.__queue is not None:
+            self.__startWriterThread()
+            try:
+                self.__queue.put_nowait((file, fullLogText))
+                return
+            except queue.Full:
+                pass
         with open(file, 'a+') as f:
             f.write(fullLogText)
+
+    def __startWriterThread(self) -> None:
+        """
+        Private helper starting the background writer on first use.
+        """
+        if self.__writerThread is not None:
+            return
+        with self.__writerLock:
+            if self.__writerThread is None:
+                self.__writerThread = threading.Thread(target=self.__writeQueuedEntries, name="logger-writer", daemon=True)
+                self.__writerThread.start()
+
+    def __writeQueuedEntries(self) -> None:
+        """
+        Private helper run by the background writer, appending the queued entries with one open per file and batch.
+        """
+        while True:
+            batch = [self.__queue.get()]
+            while len(batch) < 1000:
+                try:
+                    batch.append(self.__queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            textsByFile = {}
+            for file, fullLogText in batch:
+                textsByFile.setdefault(file, []).append(fullLogText)
+            for file, texts in textsByFile.items():
+                try:
+                    with open(file, 'a+') as f:
+                        f.write("".join(texts))
+                except Exception as e:
+                    print(f"Logger: could not write to {file}: {e}")
+            for _ in batch:
+                self.__queue.task_done()
@@ -0,0 +1,338 @@
+# Copyright (C) 2024 Patrick Michiels
+# All rights reserved.
+# This source code is licensed under the Evaluation License Agreement and
+# may not be used, modified, or distributed without explicit permission from the author.
+# This code is provided for evaluation purposes only.
+
+"""
+Server-side password hashing with the memory-hard scrypt KDF.
+
+The `hashedPassword` sent by clients is hashed again on the server with a random per-user salt before it is stored,
+so a leaked users table does not contain values that can be replayed to the API. Stored hashes are self-describing
+("scrypt$<n>$<r>$<p>$<salt>$<hash>"), so the cost parameters can be raised later: hashes with other parameters (and
+legacy values stored as sent by the client) are reported as needing an upgrade, which `UserRepo` does at next login.
+
+Hashing is CPU and memory bound, so it runs in a bounded process pool instead of the event loop or a thread. At most
+`maxWorkers` hashes run at once and at most `maxQueued` more wait; further requests fail fast with
+`PasswordHasherBusyError` instead of piling up, so a login burst cannot exhaust the memory of the node.
+
+Every authenticated request verifies the password, so successful verifications are remembered for
+`verifiedCacheSeconds`: repeated requests with the same credentials skip scrypt until then. The cache is keyed by an
+HMAC (with a random per-process key) of the password and the stored hash, so it holds nothing that can be replayed,
+and it misses as soon as the stored hash changes (new password, upgrade, deleted user).
+
+Usage example:
+
+    # Create the hasher from the config
+    password_hasher = PasswordHasher.fromConfig(config_array)
+
+    # Hash on register, verify on login (blocking variants for worker threads)
+    stored_hash = await password_hasher.hashPassword(credentials.hashedPassword)
+    matches, needs_upgrade = password_hasher.verifyPasswordBlocking(credentials.hashedPassword, stored_hash)
+
+    # Stop the worker processes on shutdown
+    password_hasher.close()
+"""
+
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class PasswordHasherBusyError(Exception):
+    """
+    Raised when the hashing queue is full; the request should be retried later (503).
+    """
+
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    """
+    Derives the scrypt hash of a password. Module level, so it can be run in the worker processes.
+
+    Args:
+        password (str): The password to hash.
+        salt (bytes): The per-user salt.
+        n (int): The CPU/memory cost parameter (power of 2).
+        r (int): The block size parameter.
+        p (int): The parallelization parameter.
+
+    Returns:
+        bytes: The 32 byte hash.
+    """
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=256 * n * r * p, dklen=32)
+
+
+class PasswordHasher:
+    """
+    Hashes and verifies passwords with scrypt in a bounded process pool.
+
+    Thread safe; every method is available as coroutine (for the event loop) and as blocking variant
+    (for worker threads).
+
+    Attributes:
+        maxWorkers (int): The number of worker processes.
+        maxQueued (int): The number of hashes that may wait for a free worker.
+        n (int): The scrypt CPU/memory cost parameter of new hashes.
+        r (int): The scrypt block size parameter of new hashes.
+        p (int): The scrypt parallelization parameter of new hashes.
+        rejected (int): The number of hashes rejected because the queue was full.
+        verifiedCacheSeconds (float): How long a successful verification is remembered; 0 disables the cache.
+        verifiedCacheMaxEntries (int): The maximum number of remembered verifications.
+        verifiedCacheHits (int): The number of verifications answered without hashing.
+    """
+
+    PREFIX = "scrypt"
+
+    def __init__(self, maxWorkers: int = 2, maxQueued: int = 64, n: int = 2 ** 14, r: int = 8, p: int = 1, verifiedCacheSeconds: float = 60.0, verifiedCacheMaxEntries: int = 10000):
+        """
+        Initializes the PasswordHasher. The worker processes are started on first use.
+
+        Args:
+            maxWorkers (int, optional): The number of worker processes. Defaults to 2.
+            maxQueued (int, optional): The number of hashes that may wait for a free worker. Defaults to 64.
+            n (int, optional): The scrypt CPU/memory cost parameter. Defaults to 2 ** 14 (16 MiB with r=8).
+            r (int, optional): The scrypt block size parameter. Defaults to 8.
+            p (int, optional): The scrypt parallelization parameter. Defaults to 1.
+            verifiedCacheSeconds (float, optional): How long a successful verification is remembered. Defaults to 60.
+            verifiedCacheMaxEntries (int, optional): The maximum number of remembered verifications. Defaults to 10000.
+        """
+        self.maxWorkers = maxWorkers
+        self.maxQueued = maxQueued
+        self.n = n
+        self.r = r
+        self.p = p
+        self.rejected = 0
+        self.verifiedCacheSeconds = verifiedCacheSeconds
+        self.verifiedCacheMaxEntries = verifiedCacheMaxEntries
+        self.verifiedCacheHits = 0
+        self.__verified = OrderedDict()
+        self.__verifiedKey = os.urandom(32)
+        self.__executor = None
+        self.__pending = 0
+        self.__lock = threading.Lock()
+
+    @classmethod
+    def fromConfig(cls, configArray: dict):
+        """
+        Creates the PasswordHasher configured in the `passwordHashing` section of the config.
+
+        Args:
+            configArray (dict): The parsed `config.txt`.
+
+        Returns:
+            PasswordHasher: The password hasher.
+        """
+        hashingConfig = configArray.get("passwordHashing", {})
+        return cls(
+            hashingConfig.get("maxWorkers", 2),
+            hashingConfig.get("maxQueued", 64),
+            hashingConfig.get("scryptN", 2 ** 14),
+            hashingConfig.get("scryptR", 8),
+            hashingConfig.get("scryptP", 1),
+            hashingConfig.get("verifiedCacheSeconds", 60.0),
+            hashingConfig.get("verifiedCacheMaxEntries", 10000)
+        )
+
+    async def hashPassword(self, password: str) -> str:
+        """
+        Hashes a password with a new random salt and the current parameters.
+
+        Args:
+            password (str): The password (as sent by the client) to hash.
+
+        Raises:
+            PasswordHasherBusyError: If the hashing queue is full.
+
+        Returns:
+            str: The self-describing hash to store.
+        """
+        salt = os.urandom(16)
+        derived = await asyncio.wrap_future(self.__submit(password, salt, self.n, self.r, self.p))
+        return self.__encode(salt, self.n, self.r, self.p, derived)
+
+    def hashPasswordBlocking(self, password: str) -> str:
+        """
+        Blocking variant of `hashPassword()` for worker threads.
+
+        Args:
+            password (str): The password (as sent by the client) to hash.
+
+        Raises:
+            PasswordHasherBusyError: If the hashing queue is full.
+
+        Returns:
+            str: The self-describing hash to store.
+        """
+        salt = os.urandom(16)
+        derived = self.__submit(password, salt, self.n, self.r, self.p).result()
+        return self.__encode(salt, self.n, self.r, self.p, derived)
+
+    def verifyPasswordBlocking(self, password: str, storedHash: str or None) -> tuple:
+        """
+        Verifies a password against a stored hash, blocking the calling (worker) thread.
+
+        Legacy values (stored as sent by the client) are compared directly and always need an upgrade. A successful
+        verification of the same password and stored hash within `verifiedCacheSeconds` is answered without hashing.
+
+        Args:
+            password (str): The password (as sent by the client) to verify.
+            storedHash (str or None): The stored hash.
+
+        Raises:
+            PasswordHasherBusyError: If the hashing queue is full.
+
+        Returns:
+            tuple: Whether the password matches, and whether the stored hash should be replaced by a current one.
+        """
+        if storedHash is None:
+            return False, False
+        parsed = self.__decode(storedHash)
+        if parsed is None:
+            return hmac.compare_digest(storedHash.encode(), password.encode()), True
+
+        cacheKey = hmac.new(self.__verifiedKey, f"{password}\0{storedHash}".encode(), "sha256").digest()
+        if self.__isVerified(cacheKey):
+            return True, False
+
+        salt, n, r, p, expected = parsed
+        derived = self.__submit(password, salt, n, r, p).result()
+        matches = hmac.compare_digest(derived, expected)
+        needsUpgrade = matches and (n, r, p) != (self.n, self.r, self.p)
+        if matches and not needsUpgrade:
+            self.__rememberVerified(cacheKey)
+        return matches, needsUpgrade
+
+    def getStatistics(self) -> dict:
+        """
+        Returns the load of the hashing pool.
+
+        Returns:
+            dict: The number of running or queued hashes, the limits, the number of rejected hashes and the
+                  remembered verifications.
+        """
+        with self.__lock:
+            return {
+                "pending": self.__pending,
+                "maxWorkers": self.maxWorkers,
+                "maxQueued": self.maxQueued,
+                "rejected": self.rejected,
+                "verifiedCacheEntries": len(self.__verified),
+                "verifiedCacheHits": self.verifiedCacheHits,
+            }
+
+    def close(self) -> None:
+        """
+        Stops the worker processes. The next hash starts them again.
+        """
+        with self.__lock:
+            executor, self.__executor = self.__executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def __submit(self, password: str, salt: bytes, n: int, r: int, p: int):
+        """
+        Private helper queueing a hash in the process pool, unless the queue is full.
+
+        Raises:
+            PasswordHasherBusyError: If `maxWorkers + maxQueued` hashes are already running or queued.
+
+        Returns:
+            concurrent.futures.Future: The future of the derived hash.
+        """
+        with self.__lock:
+            if self.__pending >= self.maxWorkers + self.maxQueued:
+                self.rejected += 1
+                raise PasswordHasherBusyError("password hashing queue is full")
+            self.__pending += 1
+            if self.__executor is None:
+                # Imported on first use, so importing the API does not pay for the process pool machinery.
+                import multiprocessing
+                from concurrent.futures import ProcessPoolExecutor
+
+                # Spawned (not forked) workers, so they do not inherit the threads and database sockets of the API.
+                self.__executor = ProcessPoolExecutor(self.maxWorkers, mp_context=multiprocessing.get_context("spawn"))
+            executor = self.__executor
+
+        try:
+            future = executor.submit(_scrypt, password, salt, n, r, p)
+        except Exception:
+            self.__release()
+            raise
+        future.add_done_callback(lambda finished: self.__release())
+        return future
+
+    def __isVerified(self, cacheKey: bytes) -> bool:
+        """
+        Private helper checking whether a verification is remembered, dropping it if it expired.
+
+        Args:
+            cacheKey (bytes): The keyed digest of the password and the stored hash.
+
+        Returns:
+            bool: True if the password was verified against the stored hash within `verifiedCacheSeconds`.
+        """
+        with self.__lock:
+            expiresAt = self.__verified.get(cacheKey)
+            if expiresAt is None:
+                return False
+            if expiresAt <= time.monotonic():
+                del self.__verified[cacheKey]
+                return False
+            self.verifiedCacheHits += 1
+            return True
+
+    def __rememberVerified(self, cacheKey: bytes) -> None:
+        """
+        Private helper remembering a successful verification, dropping the oldest ones beyond the limit.
+
+        Args:
+            cacheKey (bytes): The keyed digest of the password and the stored hash.
+        """
+        if self.verifiedCacheSeconds <= 0:
+            return
+        with self.__lock:
+            self.__verified[cacheKey] = time.monotonic() + self.verifiedCacheSeconds
+            self.__verified.move_to_end(cacheKey)
+            while len(self.__verified) > self.verifiedCacheMaxEntries:
+                self.__verified.popitem(last=False)
+
+    def __release(self) -> None:
+        """
+        Private helper freeing the queue slot of a finished hash.
+        """
+        with self.__lock:
+            self.__pending -= 1
+
+    def __encode(self, salt: bytes, n: int, r: int, p: int, derived: bytes) -> str:
+        """
+        Private helper encoding a hash with its parameters and salt.
+
+        Returns:
+            str: The self-describing hash ("scrypt$<n>$<r>$<p>$<salt>$<hash>").
+        """
+        encodedSalt = base64.b64encode(salt).decode()
+        encodedHash = base64.b64encode(derived).decode()
+        return f"{self.PREFIX}${n}${r}${p}${encodedSalt}${encodedHash}"
+
+    def __decode(self, storedHash: str) -> tuple or None:
+        """
+        Private helper parsing a self-describing hash.
+
+        Args:
+            storedHash (str): The stored hash.
+
+        Returns:
+            tuple or None: The salt, n, r, p and derived hash, or None for legacy values.
+        """
+        parts = storedHash.split("$")
+        if len(parts) != 6 or parts[0] != self.PREFIX:
+            return None
+        try:
+            return base64.b64decode(parts[4]), int(parts[1]), int(parts[2]), int(parts[3]), base64.b64decode(parts[5])
+        except ValueError:
+            return None
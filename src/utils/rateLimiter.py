@@ -0,0 +1,400 @@
+# Copyright (C) 2024 Patrick Michiels
+# All rights reserved.
+# This source code is licensed under the Evaluation License Agreement and
+# may not be used, modified, or distributed without explicit permission from the author.
+# This code is provided for evaluation purposes only.
+
+"""
+Token bucket rate limiting keyed by user credentials and API token.
+
+Every route has a budget per user and per API token (`rateLimiting.routes` in `config.txt`, with a `default`
+entry for routes without own budget). A budget is a token bucket with a `capacity` (burst size) that is refilled with
+`refillPerSecond` tokens. Each request takes one token out of the bucket of its user and of its API token; requests
+finding an empty bucket are answered with `429 Too Many Requests` and a `Retry-After` header before they reach the
+endpoint, so they never touch the database.
+
+The user bucket is keyed by a digest of the user name together with the password sent with it, so only a client
+knowing the password can use up a user's budget; requests without both only count against their API token.
+
+The buckets live in a store:
+    - InMemoryRateLimitStore: Buckets in process memory, for a single node.
+    - RedisRateLimitStore: Buckets in a shared Redis-protocol server, so all nodes share the budgets. Its blocking
+      calls run in a worker thread, and after a failure it lets requests pass without asking the server for a while.
+Other shared stores can be plugged in by subclassing `RateLimitStore`.
+
+Usage example:
+
+    # Create the limiter from the config and add the middleware
+    rate_limiter = RateLimiter.fromConfig(config_array)
+    app = FastAPI(middleware=[Middleware(RateLimitMiddleware, rateLimiter=rate_limiter, getLogger=lambda: logger)])
+"""
+
+import asyncio
+import hashlib
+import json
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+from src.utils.respClient import RespClient
+
+
+class RateLimitStore(ABC):
+    """
+    Base class of the stores holding the token buckets.
+
+    Attributes:
+        isBlocking (bool): Whether `consume` does blocking I/O, so it must not run on the event loop.
+    """
+
+    isBlocking = False
+
+    @abstractmethod
+    def consume(self, key: str, capacity: float, refillPerSecond: float) -> float:
+        """
+        Takes one token out of the bucket of a key.
+
+        Args:
+            key (str): The key of the bucket.
+            capacity (float): The maximum number of tokens in the bucket.
+            refillPerSecond (float): The number of tokens added per second.
+
+        Returns:
+            float: 0 if a token was taken, otherwise the number of seconds until the next token is available.
+        """
+
+    def close(self) -> None:
+        """
+        Releases the resources of the store (e.g. connections). Stores without such resources do nothing.
+        """
+
+
+class InMemoryRateLimitStore(RateLimitStore):
+    """
+    Store keeping the token buckets in process memory.
+
+    Attributes:
+        maxKeys (int): The maximum number of buckets kept; the least recently used ones are dropped beyond that.
+    """
+
+    def __init__(self, maxKeys: int = 100000):
+        """
+        Initializes the InMemoryRateLimitStore.
+
+        Args:
+            maxKeys (int, optional): The maximum number of buckets kept. Defaults to 100000.
+        """
+        self.maxKeys = maxKeys
+        self.__buckets = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def consume(self, key: str, capacity: float, refillPerSecond: float) -> float:
+        """
+        Takes one token out of the bucket of a key.
+
+        Args:
+            key (str): The key of the bucket.
+            capacity (float): The maximum number of tokens in the bucket.
+            refillPerSecond (float): The number of tokens added per second.
+
+        Returns:
+            float: 0 if a token was taken, otherwise the number of seconds until the next token is available.
+        """
+        now = time.monotonic()
+        with self.__lock:
+            tokens, lastRefill = self.__buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - lastRefill) * refillPerSecond)
+
+            retryAfter = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                retryAfter = (1 - tokens) / refillPerSecond
+
+            self.__buckets[key] = (tokens, now)
+            self.__buckets.move_to_end(key)
+            # A dropped bucket starts full again, which only ever grants more than the exact budget.
+            while len(self.__buckets) > self.maxKeys:
+                self.__buckets.popitem(last=False)
+            return retryAfter
+
+
+class RedisRateLimitStore(RateLimitStore):
+    """
+    Store keeping the token buckets in a shared Redis-protocol server, so the budgets hold across all nodes.
+
+    The bucket is updated atomically by a Lua script using the server clock. If the server cannot be reached,
+    requests are allowed (fail open), as rate limiting must never take the API down. After a failure the server is
+    not asked again for `failureCooldownSeconds`, so an outage does not add a connect timeout to every request.
+
+    Attributes:
+        client (RespClient): The client connected to the shared server.
+        keyPrefix (str): The prefix of all bucket keys.
+        failureCooldownSeconds (float): The seconds requests are allowed without asking the server after a failure.
+    """
+
+    isBlocking = True
+
+    TOKEN_BUCKET_SCRIPT = """
+        local capacity = tonumber(ARGV[1])
+        local refill = tonumber(ARGV[2])
+        local now = redis.call('TIME')
+        now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+        local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+        local tokens = tonumber(bucket[1]) or capacity
+        local ts = tonumber(bucket[2]) or now
+        tokens = math.min(capacity, tokens + (now - ts) * refill)
+        local retry = 0
+        if tokens >= 1 then tokens = tokens - 1 else retry = (1 - tokens) / refill end
+        redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+        redis.call('EXPIRE', KEYS[1], math.ceil(capacity / refill) + 1)
+        return tostring(retry)
+    """
+
+    def __init__(self, client: RespClient, keyPrefix: str = "meal_tracker:rate_limit:", failureCooldownSeconds: float = 5.0):
+        """
+        Initializes the RedisRateLimitStore.
+
+        Args:
+            client (RespClient): The client connected to the shared server.
+            keyPrefix (str, optional): The prefix of all bucket keys. Defaults to "meal_tracker:rate_limit:".
+            failureCooldownSeconds (float, optional): The seconds the server is skipped after a failure. Defaults to 5.
+        """
+        self.client = client
+        self.keyPrefix = keyPrefix
+        self.failureCooldownSeconds = failureCooldownSeconds
+        self.__skipUntil = 0.0
+
+    def close(self) -> None:
+        """
+        Closes the connection to the shared server.
+        """
+        self.client.close()
+
+    def consume(self, key: str, capacity: float, refillPerSecond: float) -> float:
+        """
+        Takes one token out of the shared bucket of a key.
+
+        Args:
+            key (str): The key of the bucket.
+            capacity (float): The maximum number of tokens in the bucket.
+            refillPerSecond (float): The number of tokens added per second.
+
+        Returns:
+            float: 0 if a token was taken (or the server is unreachable), otherwise the seconds until the next token.
+        """
+        if time.monotonic() < self.__skipUntil:
+            return 0.0
+        try:
+            reply = self.client.execute("EVAL", self.TOKEN_BUCKET_SCRIPT, 1, self.keyPrefix + key, capacity, refillPerSecond)
+            return float(reply)
+        except Exception as e:
+            self.__skipUntil = time.monotonic() + self.failureCooldownSeconds
+            print(f"Rate limiting: shared store unavailable, allowing requests for {self.failureCooldownSeconds}s: {e}")
+            return 0.0
+
+
+class RateLimiter:
+    """
+    Applies the configured per-route budgets to user names and API tokens.
+
+    Attributes:
+        store (RateLimitStore): The store holding the token buckets.
+        routeBudgets (dict): The budgets per route path ("default" for all other routes). Each budget may contain a
+                             "user" and a "token" bucket definition with "capacity" and "refillPerSecond", both
+                             greater than 0.
+    """
+
+    def __init__(self, store: RateLimitStore, routeBudgets: dict):
+        """
+        Initializes the RateLimiter.
+
+        Args:
+            store (RateLimitStore): The store holding the token buckets.
+            routeBudgets (dict): The budgets per route path.
+
+        Raises:
+            ValueError: If a bucket definition has no positive capacity or refillPerSecond.
+        """
+        for path, budget in routeBudgets.items():
+            for bucketName, bucket in budget.items():
+                try:
+                    valid = float(bucket["capacity"]) > 0 and float(bucket["refillPerSecond"]) > 0
+                except (KeyError, TypeError, ValueError):
+                    valid = False
+                if not valid:
+                    raise ValueError(f"rateLimiting.routes.{path}.{bucketName}: capacity and refillPerSecond must be greater than 0")
+        self.store = store
+        self.routeBudgets = routeBudgets
+
+    @classmethod
+    def fromConfig(cls, configArray: dict):
+        """
+        Creates the RateLimiter configured in the `rateLimiting` section of the config.
+
+        Args:
+            configArray (dict): The parsed `config.txt`.
+
+        Raises:
+            ValueError: If a bucket definition has no positive capacity or refillPerSecond.
+
+        Returns:
+            RateLimiter or None: The rate limiter, or None if rate limiting is disabled.
+        """
+        rateLimitConfig = configArray.get("rateLimiting", {})
+        if not rateLimitConfig.get("enabled", False):
+            return None
+
+        if rateLimitConfig.get("store", "memory") == "redis":
+            redisConfig = configArray["redis"]
+            client = RespClient(redisConfig["host"], redisConfig.get("port", 6379), redisConfig.get("password"), redisConfig.get("db", 0))
+            store = RedisRateLimitStore(client)
+        else:
+            store = InMemoryRateLimitStore(rateLimitConfig.get("maxKeys", 100000))
+        return cls(store, rateLimitConfig.get("routes", {}))
+
+    def close(self) -> None:
+        """
+        Releases the resources of the store.
+        """
+        self.store.close()
+
+    def check(self, path: str, userName: str or None, token: str or None, password: str or None = None) -> float:
+        """
+        Takes one token out of the buckets of the user and the API token for a route.
+
+        The user bucket is keyed by the user name together with the password, so a client that does not know the
+        password cannot use up the budget of the user. Requests without both only count against the API token.
+
+        Args:
+            path (str): The path of the route.
+            userName (str or None): The user name of the request, if any.
+            token (str or None): The API token of the request, if any.
+            password (str or None, optional): The (client-side hashed) password of the request, if any.
+
+        Returns:
+            float: 0 if the request is allowed, otherwise the number of seconds the client should wait.
+        """
+        budget = self.routeBudgets.get(path, self.routeBudgets.get("default"))
+        if not budget:
+            return 0.0
+
+        # Only digests are kept, so the store never holds a secret itself.
+        retryAfter = 0.0
+        if userName and password and "user" in budget:
+            userDigest = hashlib.sha256(f"{userName}\0{password}".encode()).hexdigest()[:32]
+            retryAfter = self.__consume(f"{path}|user|{userDigest}", budget["user"])
+        if retryAfter == 0.0 and token and "token" in budget:
+            tokenDigest = hashlib.sha256(token.encode()).hexdigest()[:32]
+            retryAfter = self.__consume(f"{path}|token|{tokenDigest}", budget["token"])
+        return retryAfter
+
+    def __consume(self, key: str, bucket: dict) -> float:
+        """
+        Private helper taking one token out of a bucket.
+
+        Args:
+            key (str): The key of the bucket.
+            bucket (dict): The bucket definition with "capacity" and "refillPerSecond".
+
+        Returns:
+            float: 0 if a token was taken, otherwise the seconds until the next token is available.
+        """
+        return self.store.consume(key, float(bucket["capacity"]), float(bucket["refillPerSecond"]))
+
+
+class RateLimitMiddleware:
+    """
+    ASGI middleware rejecting requests that exceed their budget with 429 before they reach an endpoint.
+
+    The user name, password and API token are read from the JSON body (top level or nested in "credentials"). The
+    body is replayed unchanged to the endpoint. Stores doing blocking I/O are asked from a worker thread.
+
+    Attributes:
+        app: The wrapped ASGI application.
+        rateLimiter (RateLimiter): The rate limiter to check requests with, or None to disable limiting.
+        getLogger: Returns the logger to record rejected requests with, or None. Called per rejection, so the logger
+                   may be created after the application (e.g. per worker in the lifespan).
+    """
+
+    def __init__(self, app, rateLimiter: RateLimiter = None, getLogger=None):
+        """
+        Initializes the RateLimitMiddleware.
+
+        Args:
+            app: The wrapped ASGI application.
+            rateLimiter (RateLimiter, optional): The rate limiter, or None to disable limiting. Defaults to None.
+            getLogger (callable, optional): Returns the logger to record rejected requests with. Defaults to None.
+        """
+        self.app = app
+        self.rateLimiter = rateLimiter
+        self.getLogger = getLogger if getLogger is not None else lambda: None
+
+    async def __call__(self, scope, receive, send):
+        """
+        Checks the budget of HTTP POST requests and passes allowed requests on to the wrapped application.
+        """
+        if self.rateLimiter is None or scope["type"] != "http" or scope["method"] != "POST":
+            await self.app(scope, receive, send)
+            return
+
+        # Read the whole body, so it can be inspected and replayed.
+        bodyParts = []
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                break
+            bodyParts.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        body = b"".join(bodyParts)
+
+        userName, token, password = self.__getCredentials(body)
+        if self.rateLimiter.store.isBlocking:
+            retryAfter = await asyncio.to_thread(self.rateLimiter.check, scope["path"], userName, token, password)
+        else:
+            retryAfter = self.rateLimiter.check(scope["path"], userName, token, password)
+        if retryAfter > 0:
+            logger = self.getLogger()
+            if logger is not None:
+                logger.logWarning(f"{scope['path']}: 429: rate limit exceeded: userName: {userName}")
+            await send({
+                "type": "http.response.start",
+                "status": 429,
+                "headers": [(b"content-type", b"application/json"), (b"retry-after", str(math.ceil(retryAfter)).encode())],
+            })
+            await send({"type": "http.response.body", "body": json.dumps({"message": "rate limit exceeded"}).encode()})
+            return
+
+        bodyReplayed = False
+
+        async def replayReceive():
+            nonlocal bodyReplayed
+            if not bodyReplayed:
+                bodyReplayed = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        await self.app(scope, replayReceive, send)
+
+    def __getCredentials(self, body: bytes) -> tuple:
+        """
+        Private helper extracting the user name, API token and password from a JSON request body.
+
+        Args:
+            body (bytes): The raw request body.
+
+        Returns:
+            tuple: The user name, token and password, each None if not present.
+        """
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return None, None, None
+        if not isinstance(payload, dict):
+            return None, None, None
+        credentials = payload.get("credentials") if isinstance(payload.get("credentials"), dict) else payload
+        values = (credentials.get("userName"), credentials.get("token"), credentials.get("hashedPassword"))
+        return tuple(value if isinstance(value, str) else None for value in values)
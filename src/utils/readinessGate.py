@@ -0,0 +1,164 @@
+# Copyright (C) 2024 Patrick Michiels
+# All rights reserved.
+# This source code is licensed under the Evaluation License Agreement and
+# may not be used, modified, or distributed without explicit permission from the author.
+# This code is provided for evaluation purposes only.
+
+"""
+Readiness gate deferring slow startup work (e.g. connecting the database) until after the API started serving.
+
+A worker that connects to the database before it serves cannot answer health checks while the database is slow or
+down, and every autoscaled or rolling-updated instance pays for the connect before it is even started. Instead, the
+gate runs the warm-up in a background thread, retrying until it succeeds. Meanwhile `ReadinessGateMiddleware` answers
+requests that need the warm-up with `503` and a `Retry-After` header, while paths that do not need it are served.
+
+Usage example:
+
+    # Gate all routes but the open ones on the database connect
+    readiness_gate = ReadinessGate()
+    app = FastAPI(middleware=[Middleware(ReadinessGateMiddleware, readinessGate=readiness_gate, openPaths={"/"})])
+
+    # Start the warm-up on startup
+    readiness_gate.start(db_wrapper.checkReachable)
+"""
+
+import json
+import threading
+import time
+
+
+class ReadinessGate:
+    """
+    Runs a warm-up in the background and tracks whether it succeeded.
+
+    Attributes:
+        retrySeconds (float): Seconds to wait before retrying a failed warm-up.
+        attempts (int): The number of warm-up attempts so far.
+        lastError (str or None): The error of the last failed attempt.
+        readySeconds (float or None): Seconds the warm-up took until it succeeded, None while not ready.
+    """
+
+    def __init__(self, retrySeconds: float = 1.0):
+        """
+        Initializes the ReadinessGate (not ready).
+
+        Args:
+            retrySeconds (float, optional): Seconds to wait before retrying a failed warm-up. Defaults to 1.0.
+        """
+        self.retrySeconds = retrySeconds
+        self.attempts = 0
+        self.lastError = None
+        self.readySeconds = None
+        self.__ready = threading.Event()
+        self.__stopped = threading.Event()
+        self.__thread = None
+
+    def start(self, warmUp, onReady=None) -> None:
+        """
+        Starts running the warm-up in a background thread until it succeeds.
+
+        Args:
+            warmUp (callable): The warm-up to run, raising on failure.
+            onReady (callable, optional): Called with the seconds the warm-up took once it succeeded.
+        """
+        self.__ready.clear()
+        self.__stopped.clear()
+        self.__thread = threading.Thread(target=self.__run, args=(warmUp, onReady), name="readiness-gate", daemon=True)
+        self.__thread.start()
+
+    def stop(self) -> None:
+        """
+        Stops retrying the warm-up (e.g. on shutdown).
+        """
+        self.__stopped.set()
+
+    def isReady(self) -> bool:
+        """
+        Returns whether the warm-up succeeded.
+
+        Returns:
+            bool: True once the warm-up succeeded, False before.
+        """
+        return self.__ready.is_set()
+
+    def wait(self, timeoutSeconds: float = None) -> bool:
+        """
+        Blocks until the warm-up succeeded or the timeout elapsed.
+
+        Args:
+            timeoutSeconds (float, optional): The maximum number of seconds to wait. Defaults to waiting forever.
+
+        Returns:
+            bool: True if the warm-up succeeded, False if the timeout elapsed.
+        """
+        return self.__ready.wait(timeoutSeconds)
+
+    def getStatus(self) -> dict:
+        """
+        Returns the state of the warm-up.
+
+        Returns:
+            dict: Whether the gate is ready, the number of attempts, the last error and the warm-up duration.
+        """
+        return {"ready": self.isReady(), "attempts": self.attempts, "lastError": self.lastError, "readySeconds": self.readySeconds}
+
+    def __run(self, warmUp, onReady) -> None:
+        """
+        Private helper running the warm-up until it succeeds or the gate is stopped.
+        """
+        startedAt = time.perf_counter()
+        while not self.__stopped.is_set():
+            self.attempts += 1
+            try:
+                warmUp()
+            except Exception as e:
+                self.lastError = str(e)
+                print(f"ReadinessGate: warm-up attempt {self.attempts} failed: {e}")
+                self.__stopped.wait(self.retrySeconds)
+                continue
+
+            self.lastError = None
+            self.readySeconds = time.perf_counter() - startedAt
+            self.__ready.set()
+            if onReady is not None:
+                onReady(self.readySeconds)
+            return
+
+
+class ReadinessGateMiddleware:
+    """
+    ASGI middleware answering requests with 503 until the readiness gate is ready, except on open paths.
+
+    Attributes:
+        app: The wrapped ASGI application.
+        readinessGate (ReadinessGate): The gate to check.
+        openPaths (set): The paths served before the gate is ready (e.g. health checks).
+    """
+
+    def __init__(self, app, readinessGate: ReadinessGate, openPaths: set = frozenset()):
+        """
+        Initializes the ReadinessGateMiddleware.
+
+        Args:
+            app: The wrapped ASGI application.
+            readinessGate (ReadinessGate): The gate to check.
+            openPaths (set, optional): The paths served before the gate is ready. Defaults to none.
+        """
+        self.app = app
+        self.readinessGate = readinessGate
+        self.openPaths = set(openPaths)
+
+    async def __call__(self, scope, receive, send):
+        """
+        Passes requests on to the wrapped application once the gate is ready, or if they target an open path.
+        """
+        if scope["type"] != "http" or self.readinessGate.isReady() or scope["path"] in self.openPaths:
+            await self.app(scope, receive, send)
+            return
+
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [(b"content-type", b"application/json"), (b"retry-after", str(max(1, round(self.readinessGate.retrySeconds))).encode())],
+        })
+        await send({"type": "http.response.body", "body": json.dumps({"message": "starting up, retry shortly"}).encode()})
@@ -0,0 +1,119 @@
+# Copyright (C) 2024 Patrick Michiels
+# All rights reserved.
+# This source code is licensed under the Evaluation License Agreement and
+# may not be used, modified, or distributed without explicit permission from the author.
+# This code is provided for evaluation purposes only.
+
+"""
+Readiness probe running dependency checks with a timeout and caching the result briefly.
+
+Load balancers and orchestrators probe every instance frequently, and a burst of probes must not turn into a burst of
+database queries. The probe therefore runs its checks at most once per `cacheSeconds`: concurrent probes wait for the
+running check and later probes get the cached result. Each check runs in a worker thread with a timeout, so a hanging
+dependency makes the instance "not ready" instead of blocking the probe; a check that is still hanging is not started
+a second time.
+
+Usage example:
+
+    # Check the database, report diagnostics gathered without I/O
+    readiness_probe = ReadinessProbe({"database": ping_database}, collect_diagnostics, cacheSeconds=1.0, timeoutSeconds=1.0)
+
+    # In the endpoint
+    ready, body = await readiness_probe.check()
+"""
+
+import asyncio
+import time
+
+
+class ReadinessProbe:
+    """
+    Runs readiness checks with a timeout and caches the result.
+
+    Attributes:
+        checks (dict): The blocking check functions by name, raising on failure.
+        collectDiagnostics (callable): Returns a dict of diagnostics; must not do I/O.
+        cacheSeconds (float): Seconds a result is reused.
+        timeoutSeconds (float): Seconds a check may take before it counts as failed.
+    """
+
+    def __init__(self, checks: dict, collectDiagnostics=None, cacheSeconds: float = 1.0, timeoutSeconds: float = 1.0):
+        """
+        Initializes the ReadinessProbe.
+
+        Args:
+            checks (dict): The blocking check functions by name, raising on failure.
+            collectDiagnostics (callable, optional): Returns a dict of diagnostics; must not do I/O. Defaults to None.
+            cacheSeconds (float, optional): Seconds a result is reused. Defaults to 1.0.
+            timeoutSeconds (float, optional): Seconds a check may take before it counts as failed. Defaults to 1.0.
+        """
+        self.checks = checks
+        self.collectDiagnostics = collectDiagnostics
+        self.cacheSeconds = cacheSeconds
+        self.timeoutSeconds = timeoutSeconds
+        self.__cachedResult = None
+        self.__cachedAt = 0.0
+        self.__hangingChecks = {}
+        self.__lock = None
+
+    async def check(self) -> tuple:
+        """
+        Returns the readiness, running the checks only if the cached result expired.
+
+        Returns:
+            tuple: Whether all checks passed, and the response body with the check results and diagnostics.
+        """
+        if self.__lock is None:
+            self.__lock = asyncio.Lock()
+        async with self.__lock:
+            age = time.monotonic() - self.__cachedAt
+            if self.__cachedResult is None or age >= self.cacheSeconds:
+                self.__cachedResult = await self.__runChecks()
+                self.__cachedAt = time.monotonic()
+                age = 0.0
+
+        ready, body = self.__cachedResult
+        return ready, {**body, "ageSeconds": round(age, 3)}
+
+    async def __runChecks(self) -> tuple:
+        """
+        Private helper running all checks concurrently and collecting the diagnostics.
+
+        Returns:
+            tuple: Whether all checks passed, and the response body.
+        """
+        names = list(self.checks)
+        results = await asyncio.gather(*(self.__runCheck(name) for name in names))
+        checkResults = dict(zip(names, results))
+        ready = all(result["ok"] for result in checkResults.values())
+        body = {"status": "ready" if ready else "not ready", "checks": checkResults}
+        if self.collectDiagnostics is not None:
+            body["diagnostics"] = self.collectDiagnostics()
+        return ready, body
+
+    async def __runCheck(self, name: str) -> dict:
+        """
+        Private helper running one check in a worker thread with the timeout.
+
+        Args:
+            name (str): The name of the check.
+
+        Returns:
+            dict: Whether the check passed, its latency in milliseconds or its error.
+        """
+        hanging = self.__hangingChecks.get(name)
+        if hanging is not None and not hanging.done():
+            return {"ok": False, "error": f"previous check still running after {self.timeoutSeconds}s"}
+
+        startedAt = time.perf_counter()
+        task = asyncio.ensure_future(asyncio.to_thread(self.checks[name]))
+        # Retrieve the outcome of checks that finish after their timeout, so it is not reported as unhandled.
+        task.add_done_callback(lambda finished: finished.cancelled() or finished.exception())
+        try:
+            await asyncio.wait_for(asyncio.shield(task), self.timeoutSeconds)
+        except asyncio.TimeoutError:
+            self.__hangingChecks[name] = task
+            return {"ok": False, "error": f"timed out after {self.timeoutSeconds}s"}
+        except Exception as e:
+            return {"ok": False, "error": str(e)}
+        return {"ok": True, "latencyMs": round((time.perf_counter() - startedAt) * 1000, 2)}
@@ -4,7 +4,18 @@
 # may not be used, modified, or distributed without explicit permission from the author.
 # This code is provided for evaluation purposes only.
 
-import mysql.connector
+import calendar
+import datetime
+
+
+def _integrityError():
+    """
+    Returns the driver's IntegrityError. The driver is imported lazily, so importing the repositories stays cheap;
+    it is already loaded once a statement could fail.
+    """
+    import mysql.connector
+    return mysql.connector.IntegrityError
+
 
 class DayMealRepo:
     """
@@ -12,10 +23,20 @@ class DayMealRepo:
 
     This class provides methods to retrieve and create day meal entries associated with a user and specific days.
 
+    The date based methods (`...ByDate`) work with every schema version (`database.schemaVersion`):
+    v1 resolves the date through the days table within the same query, dual additionally writes `day_meals_v2`,
+    and v2 only uses `day_meals_v2`, which stores the date directly and needs no day lookup at all.
+    They also handle the fat and sugar levels in every mode of `database.inlineMealLevels`: stored in `meals` (off),
+    in both places (dual) or only in the day meal row itself (on), where no `meals` row is written or joined.
+    With `database.mealChangeLog` enabled, their writes record a change in the same transaction.
+
     Attributes:
         dbWrapper: The database wrapper that provides database connection and cursor.
     """
 
+    # The meal type masks of the day overview are 64 bit integers (BIT_OR), holding the meal types with IDs 1 to 64.
+    OVERVIEW_MAX_MEAL_TYPE_ID = 64
+
     def __init__(self, dbWrapper):
         """
         Initializes the DayMealRepo with a database wrapper.
@@ -45,8 +66,9 @@ class DayMealRepo:
                 WHERE fk_user_id=%s AND fk_day_id=%s AND fk_meal_type_id=%s
             """
             val = (userID, dayID, mealTypeID)
-            self.dbWrapper.dbCursor.execute(query, val)
-            myresult = self.dbWrapper.dbCursor.fetchone()
+            readCursor = self.dbWrapper.getShardReadCursor()
+            readCursor.execute(query, val)
+            myresult = readCursor.fetchone()
 
             if myresult:
                 return {
@@ -83,12 +105,14 @@ class DayMealRepo:
                 VALUES (%s, %s, %s, %s)
             """
             val = (userID, dayID, mealTypeID, mealID)
-            self.dbWrapper.dbCursor.execute(query, val)
-            self.dbWrapper.dbConnection.commit()
+            shardCursor = self.dbWrapper.getShardCursor()
+            shardCursor.execute(query, val)
+            self.dbWrapper.getShardConnection().commit()
+            self.dbWrapper.recordWrite()
 
             return self.getDayMeal(userID, dayID, mealTypeID)
 
-        except mysql.connector.IntegrityError:
+        except _integrityError():
             return None
 
         except Exception as e:
@@ -116,8 +140,9 @@ class DayMealRepo:
                 WHERE fk_user_id=%s AND fk_day_id=%s
             """
             val = (userID, dayID)
-            self.dbWrapper.dbCursor.execute(query, val)
-            myresults = self.dbWrapper.dbCursor.fetchall()
+            readCursor = self.dbWrapper.getShardReadCursor()
+            readCursor.execute(query, val)
+            myresults = readCursor.fetchall()
 
             dayMeals = [{'fk_meal_type_id': result[0], 'fk_meal_id': result[1]} for result in myresults]
             return dayMeals
@@ -127,3 +152,574 @@ class DayMealRepo:
                 return []
             self.dbWrapper.updateOwnClassVars()
             return self.getDayMealsByUserIDAndDayID(userID, dayID, True)
+
+    def getDayMealByDate(self, userID: int, year: int, month: int, day: int, mealTypeID: int, alreadyAttemptedToUpdateOwnClassVars: bool = False):
+        """
+        Retrieves a day meal including its levels for a given user, date, and meal type, without resolving the day first.
+
+        Days older than the archive horizon (`database.archiveHorizonMonths`) fall back to `day_meals_archive`.
+
+        Args:
+            userID (int): The ID of the user.
+            year (int): The year of the day.
+            month (int): The month of the day.
+            day (int): The day of the month.
+            mealTypeID (int): The ID of the meal type.
+            alreadyAttemptedToUpdateOwnClassVars (bool): Flag to prevent multiple updates in case of error.
+
+        Returns:
+            dict or None: A dictionary containing the day meal details if found, otherwise None.
+                          `fk_meal_id` is None for day meals written with inline levels only and for archived ones
+                          (`archived` True).
+        """
+        try:
+            readCursor = self.dbWrapper.getShardReadCursor()
+            myresult = self.__selectDayMealByDate(readCursor, userID, year, month, day, mealTypeID)
+            archived = False
+            if myresult is None and self.__isArchivedDate(year, month, day):
+                archivedLevels = self.__selectArchivedDayMeal(readCursor, userID, year, month, day, mealTypeID)
+                myresult = None if archivedLevels is None else (None, *archivedLevels)
+                archived = True
+            if myresult is None:
+                return None
+            return {
+                'fk_user_id': userID,
+                'year': year,
+                'month': month,
+                'day': day,
+                'fk_meal_type_id': mealTypeID,
+                'fk_meal_id': myresult[0],
+                'fat_level': myresult[1],
+                'sugar_level': myresult[2],
+                'archived': archived,
+            }
+
+        except Exception as e:
+            if alreadyAttemptedToUpdateOwnClassVars:
+                return None
+            self.dbWrapper.updateOwnClassVars()
+            return self.getDayMealByDate(userID, year, month, day, mealTypeID, True)
+
+    def createNewDayMealByDate(self, userID: int, year: int, month: int, day: int, mealTypeID: int, fatLevel: int, sugarLevel: int, alreadyAttemptedToUpdateOwnClassVars: bool = False):
+        """
+        Creates a new day meal (and its meal, unless the levels are stored inline only) for a date in one transaction.
+
+        Args:
+            userID (int): The ID of the user.
+            year (int): The year of the day.
+            month (int): The month of the day.
+            day (int): The day of the month.
+            mealTypeID (int): The ID of the meal type.
+            fatLevel (int): The fat level of the meal (0: Low, 1: Medium, 2: High).
+            sugarLevel (int): The sugar level of the meal (0: Low, 1: Medium, 2: High).
+            alreadyAttemptedToUpdateOwnClassVars (bool): Flag to prevent multiple updates in case of error.
+
+        Returns:
+            dict or None: A dictionary containing the created day meal details, or None if it fails or already exists
+                          (also in the archive).
+        """
+        try:
+            shardCursor = self.dbWrapper.getShardCursor()
+            if self.__isArchivedDate(year, month, day) and self.__selectArchivedDayMeal(shardCursor, userID, year, month, day, mealTypeID) is not None:
+                return None
+            self.__insertDayMealByDate(shardCursor, userID, year, month, day, mealTypeID, fatLevel, sugarLevel)
+            self.dbWrapper.getShardConnection().commit()
+            self.dbWrapper.recordWrite()
+
+            return self.getDayMealByDate(userID, year, month, day, mealTypeID)
+
+        except _integrityError():
+            self.__rollback()
+            return None
+
+        except Exception as e:
+            self.__rollback()
+            if alreadyAttemptedToUpdateOwnClassVars:
+                return None
+            self.dbWrapper.updateOwnClassVars()
+            return self.createNewDayMealByDate(userID, year, month, day, mealTypeID, fatLevel, sugarLevel, True)
+
+    def updateDayMealLevelsByDate(self, userID: int, year: int, month: int, day: int, mealTypeID: int, mealID: int or None, fatLevel: int, sugarLevel: int, alreadyAttemptedToUpdateOwnClassVars: bool = False) -> bool or None:
+        """
+        Updates the fat and sugar levels of an existing day meal in every place they are stored.
+
+        An archived day meal (without a day meal in the regular tables) is moved back to the regular tables with the
+        updated levels, so it is never kept in two places.
+
+        Args:
+            userID (int): The ID of the user.
+            year (int): The year of the day.
+            month (int): The month of the day.
+            day (int): The day of the month.
+            mealTypeID (int): The ID of the meal type.
+            mealID (int or None): The ID of the meal of the day meal (None if its levels are stored inline only).
+            fatLevel (int): The updated fat level of the meal (0: Low, 1: Medium, 2: High).
+            sugarLevel (int): The updated sugar level of the meal (0: Low, 1: Medium, 2: High).
+            alreadyAttemptedToUpdateOwnClassVars (bool): Flag to prevent multiple updates in case of error.
+
+        Returns:
+            bool or None: True if the update was successful, None if it failed.
+        """
+        try:
+            shardCursor = self.dbWrapper.getShardCursor()
+            if (
+                self.__isArchivedDate(year, month, day)
+                and self.__selectDayMealByDate(shardCursor, userID, year, month, day, mealTypeID, forUpdate=True) is None
+                and self.__deleteArchivedDayMeal(shardCursor, userID, year, month, day, mealTypeID)
+            ):
+                self.__insertDayMealByDate(shardCursor, userID, year, month, day, mealTypeID, fatLevel, sugarLevel, "update")
+            else:
+                self.__updateLevelsByDate(shardCursor, userID, year, month, day, mealTypeID, mealID, fatLevel, sugarLevel)
+            self.dbWrapper.getShardConnection().commit()
+            self.dbWrapper.recordWrite()
+            return True
+
+        except Exception as e:
+            self.__rollback()
+            if alreadyAttemptedToUpdateOwnClassVars:
+                return None
+            self.dbWrapper.updateOwnClassVars()
+            return self.updateDayMealLevelsByDate(userID, year, month, day, mealTypeID, mealID, fatLevel, sugarLevel, True)
+
+    def getDayMealsByUserIDAndDate(self, userID: int, year: int, month: int, day: int, alreadyAttemptedToUpdateOwnClassVars: bool = False):
+        """
+        Retrieves all day meals including their levels for a given user and date, without resolving the day first.
+
+        Days older than the archive horizon (`database.archiveHorizonMonths`) are also read from `day_meals_archive`.
+
+        Args:
+            userID (int): The ID of the user.
+            year (int): The year of the day.
+            month (int): The month of the day.
+            day (int): The day of the month.
+            alreadyAttemptedToUpdateOwnClassVars (bool): Flag to prevent multiple updates in case of error.
+
+        Returns:
+            list: A list of dictionaries containing meal type ID, meal ID and the levels for each day meal.
+        """
+        try:
+            queryAndValues = self.__buildDayMealsQuery(userID, year, month, day)
+            if queryAndValues is None:
+                return []
+            query, val = queryAndValues
+            readCursor = self.dbWrapper.getShardReadCursor()
+            readCursor.execute(query, val)
+            myresults = readCursor.fetchall()
+
+            dayMeals = [
+                {'fk_meal_type_id': result[0], 'fk_meal_id': result[1], 'fat_level': result[2], 'sugar_level': result[3]}
+                for result in myresults
+            ]
+            if self.__isArchivedDate(year, month, day):
+                dayMeals += self.__getArchivedDayMeals(readCursor, userID, year, month, day, dayMeals)
+            return dayMeals
+
+        except Exception as e:
+            if alreadyAttemptedToUpdateOwnClassVars:
+                return []
+            self.dbWrapper.updateOwnClassVars()
+            return self.getDayMealsByUserIDAndDate(userID, year, month, day, True)
+
+    def getDayOverview(self, userID: int, year: int, month: int = None, alreadyAttemptedToUpdateOwnClassVars: bool = False) -> list or None:
+        """
+        Retrieves per day the logged meal types and the highest levels of a user in a month or a year, aggregated in
+        one query.
+
+        Days older than the archive horizon (`database.archiveHorizonMonths`) include the archived day meals, unless a
+        day meal of the same meal type was added to the regular tables later.
+
+        Args:
+            userID (int): The ID of the user.
+            year (int): The year.
+            month (int, optional): The month, or None for the whole year. Defaults to None.
+            alreadyAttemptedToUpdateOwnClassVars (bool): Flag to prevent multiple updates in case of error.
+
+        Returns:
+            list or None: One dictionary per day with meals, holding the date, the meal type mask (bit
+                          `fk_meal_type_id - 1` set for every logged meal type up to `OVERVIEW_MAX_MEAL_TYPE_ID`,
+                          higher ones are left out) and the highest fat and sugar level, or None if the query fails.
+        """
+        try:
+            firstDay = datetime.date(year, month or 1, 1)
+            lastDay = datetime.date(year, month or 12, calendar.monthrange(year, month or 12)[1])
+            query, val = self.__buildDayOverviewQuery(userID, year, month, firstDay, lastDay)
+            readCursor = self.dbWrapper.getShardReadCursor()
+            # Shifting by 64 or more bits yields 0 in MySQL, so higher meal type IDs are excluded explicitly.
+            readCursor.execute(f"""
+                SELECT meal_year, meal_month, meal_day,
+                       BIT_OR(IF(fk_meal_type_id BETWEEN 1 AND %s, 1 << (fk_meal_type_id - 1), 0)),
+                       MAX(fat_level), MAX(sugar_level)
+                FROM ({query}) dm
+                GROUP BY meal_year, meal_month, meal_day
+            """, (self.OVERVIEW_MAX_MEAL_TYPE_ID, *val))
+            myresults = readCursor.fetchall()
+
+            # Schema v1 can hold days that do not exist in the calendar (e.g. February 31st), they are left out.
+            return [
+                {
+                    'year': result[0], 'month': result[1], 'day': result[2], 'mealTypeMask': int(result[3]),
+                    'maxFatLevel': result[4], 'maxSugarLevel': result[5]
+                }
+                for result in myresults
+                if self.__getMealDate(result[0], result[1], result[2]) is not None
+            ]
+
+        except Exception as e:
+            if alreadyAttemptedToUpdateOwnClassVars:
+                return None
+            self.dbWrapper.updateOwnClassVars()
+            return self.getDayOverview(userID, year, month, True)
+
+    def upsertDayMeals(self, dayMeals: list, alreadyAttemptedToUpdateOwnClassVars: bool = False):
+        """
+        Creates or updates several day meals (including their meals) in one transaction on the current shard.
+
+        Used to flush buffered writes. A day meal that already exists gets its levels updated, so applying the same
+        write twice (e.g. when replaying a journal) leaves the same result.
+
+        Args:
+            dayMeals (list): Dictionaries with userID, year, month, day, mealTypeID, fat_level and sugar_level.
+            alreadyAttemptedToUpdateOwnClassVars (bool): Flag to prevent multiple updates in case of error.
+
+        Returns:
+            bool or None: True if all day meals were written, None if the transaction failed.
+        """
+        try:
+            shardCursor = self.dbWrapper.getShardCursor()
+            for dayMeal in dayMeals:
+                date = (dayMeal["year"], dayMeal["month"], dayMeal["day"])
+                existing = self.__selectDayMealByDate(shardCursor, dayMeal["userID"], *date, dayMeal["mealTypeID"], forUpdate=True)
+                if existing is not None:
+                    self.__updateLevelsByDate(shardCursor, dayMeal["userID"], *date, dayMeal["mealTypeID"], existing[0], dayMeal["fat_level"], dayMeal["sugar_level"])
+                else:
+                    self.__insertDayMealByDate(shardCursor, dayMeal["userID"], *date, dayMeal["mealTypeID"], dayMeal["fat_level"], dayMeal["sugar_level"])
+
+            self.dbWrapper.getShardConnection().commit()
+            self.dbWrapper.recordWrite()
+            return True
+
+        except Exception as e:
+            self.__rollback()
+            if alreadyAttemptedToUpdateOwnClassVars:
+                return None
+            self.dbWrapper.updateOwnClassVars()
+            return self.upsertDayMeals(dayMeals, True)
+
+    def __buildDayMealsQuery(self, userID: int, year: int, month: int, day: int, mealTypeID: int = None) -> tuple or None:
+        """
+        Private helper building the query selecting meal type ID, meal ID and levels of the day meals of a date,
+        in the layout of the current schema version and inline level mode.
+
+        Args:
+            userID (int): The ID of the user.
+            year (int): The year of the day.
+            month (int): The month of the day.
+            day (int): The day of the month.
+            mealTypeID (int, optional): Restricts the query to one meal type. Defaults to None.
+
+        Returns:
+            tuple or None: The query and its values, or None if the date cannot exist in the current layout.
+        """
+        if self.dbWrapper.inlineMealLevels == "on":
+            levelColumns = "dm.fat_level, dm.sugar_level"
+        else:
+            levelColumns = "m.fat_level, m.sugar_level"
+
+        if self.dbWrapper.schemaVersion == "v2":
+            mealDate = self.__getMealDate(year, month, day)
+            if mealDate is None:
+                return None
+            query = f"SELECT dm.fk_meal_type_id, dm.fk_meal_id, {levelColumns} FROM day_meals_v2 dm"
+            where = " WHERE dm.fk_user_id=%s AND dm.meal_date=%s"
+            val = (userID, mealDate)
+        else:
+            query = f"SELECT dm.fk_meal_type_id, dm.fk_meal_id, {levelColumns} FROM day_meals dm JOIN days d ON d.ID = dm.fk_day_id"
+            where = " WHERE dm.fk_user_id=%s AND d.year=%s AND d.month=%s AND d.day=%s"
+            val = (userID, year, month, day)
+
+        if self.dbWrapper.inlineMealLevels != "on":
+            query += " JOIN meals m ON m.ID = dm.fk_meal_id"
+        if mealTypeID is not None:
+            where += " AND dm.fk_meal_type_id=%s"
+            val += (mealTypeID,)
+        return query + where, val
+
+    def __buildDayOverviewQuery(self, userID: int, year: int, month: int or None, firstDay: datetime.date, lastDay: datetime.date) -> tuple:
+        """
+        Private helper building the query selecting date, meal type and levels of every day meal of a user within a
+        month or a year, in the layout of the current schema version and inline level mode, and from the archive.
+
+        Args:
+            userID (int): The ID of the user.
+            year (int): The year.
+            month (int or None): The month, or None for the whole year.
+            firstDay (datetime.date): The first day of the period.
+            lastDay (datetime.date): The last day of the period.
+
+        Returns:
+            tuple: The query (columns meal_year, meal_month, meal_day, fk_meal_type_id, fat_level and sugar_level) and
+                   its values.
+        """
+        if self.dbWrapper.inlineMealLevels == "on":
+            levelColumns, mealsJoin = "dm.fat_level, dm.sugar_level", ""
+        else:
+            levelColumns, mealsJoin = "m.fat_level, m.sugar_level", " JOIN meals m ON m.ID = dm.fk_meal_id"
+
+        if self.dbWrapper.schemaVersion == "v2":
+            query = f"""
+                SELECT YEAR(dm.meal_date) AS meal_year, MONTH(dm.meal_date) AS meal_month, DAY(dm.meal_date) AS meal_day,
+                       dm.fk_meal_type_id, {levelColumns}
+                FROM day_meals_v2 dm{mealsJoin}
+                WHERE dm.fk_user_id=%s AND dm.meal_date BETWEEN %s AND %s
+            """
+            val = (userID, firstDay, lastDay)
+            currentDayMeal = """
+                SELECT 1 FROM day_meals_v2 c
+                WHERE c.fk_user_id = a.fk_user_id AND c.meal_date = a.meal_date AND c.fk_meal_type_id = a.fk_meal_type_id
+            """
+        else:
+            query = f"""
+                SELECT d.year AS meal_year, d.month AS meal_month, d.day AS meal_day, dm.fk_meal_type_id, {levelColumns}
+                FROM day_meals dm JOIN days d ON d.ID = dm.fk_day_id{mealsJoin}
+                WHERE dm.fk_user_id=%s AND d.year=%s
+            """
+            val = (userID, year)
+            if month is not None:
+                query += " AND d.month=%s"
+                val += (month,)
+            currentDayMeal = """
+                SELECT 1 FROM day_meals c JOIN days cd ON cd.ID = c.fk_day_id
+                WHERE c.fk_user_id = a.fk_user_id AND cd.year = YEAR(a.meal_date) AND cd.month = MONTH(a.meal_date)
+                    AND cd.day = DAY(a.meal_date) AND c.fk_meal_type_id = a.fk_meal_type_id
+            """
+
+        horizon = self.dbWrapper.getArchiveHorizonDate()
+        if horizon is not None and firstDay < horizon:
+            query += f"""
+                UNION ALL
+                SELECT YEAR(a.meal_date), MONTH(a.meal_date), DAY(a.meal_date), a.fk_meal_type_id, a.fat_level, a.sugar_level
+                FROM day_meals_archive a
+                WHERE a.fk_user_id=%s AND a.meal_date BETWEEN %s AND %s AND NOT EXISTS ({currentDayMeal})
+            """
+            val += (userID, firstDay, min(lastDay, horizon - datetime.timedelta(days=1)))
+        return query, val
+
+    def __selectDayMealByDate(self, cursor, userID: int, year: int, month: int, day: int, mealTypeID: int, forUpdate: bool = False) -> tuple or None:
+        """
+        Private helper selecting meal ID and levels of one day meal by its date.
+
+        Args:
+            cursor: The cursor to run the query on.
+            userID (int): The ID of the user.
+            year (int): The year of the day.
+            month (int): The month of the day.
+            day (int): The day of the month.
+            mealTypeID (int): The ID of the meal type.
+            forUpdate (bool, optional): Whether to lock the row for the running transaction. Defaults to False.
+
+        Returns:
+            tuple or None: The meal ID (None for inline only levels), fat level and sugar level, or None if there is
+                           no such day meal.
+        """
+        queryAndValues = self.__buildDayMealsQuery(userID, year, month, day, mealTypeID)
+        if queryAndValues is None:
+            return None
+        query, val = queryAndValues
+        cursor.execute(query + (" FOR UPDATE" if forUpdate else ""), val)
+        myresult = cursor.fetchone()
+        return myresult[1:] if myresult else None
+
+    def __insertDayMealByDate(self, cursor, userID: int, year: int, month: int, day: int, mealTypeID: int, fatLevel: int, sugarLevel: int, changeOperation: str = "insert") -> None:
+        """
+        Private helper inserting a day meal (and its meal) into the layouts of the current schema version and inline
+        level mode and recording the change, without committing.
+
+        Args:
+            cursor: The cursor of the current shard.
+            userID (int): The ID of the user.
+            year (int): The year of the day.
+            month (int): The month of the day.
+            day (int): The day of the month.
+            mealTypeID (int): The ID of the meal type.
+            fatLevel (int): The fat level of the meal (0: Low, 1: Medium, 2: High).
+            sugarLevel (int): The sugar level of the meal (0: Low, 1: Medium, 2: High).
+            changeOperation (str, optional): The operation recorded in the change log. Defaults to "insert".
+
+        Raises:
+            mysql.connector.IntegrityError: If the day meal already exists.
+        """
+        mealID = None
+        if self.dbWrapper.inlineMealLevels != "on":
+            cursor.execute("INSERT INTO meals (fat_level, sugar_level) VALUES (%s, %s)", (fatLevel, sugarLevel))
+            mealID = cursor.lastrowid
+
+        levelColumns, levelValues = "", ()
+        if self.dbWrapper.inlineMealLevels != "off":
+            levelColumns, levelValues = ", fat_level, sugar_level", (fatLevel, sugarLevel)
+        levelPlaceholders = ", %s" * len(levelValues)
+
+        if self.dbWrapper.schemaVersion in ("v1", "dual"):
+            dayID = self.dbWrapper.getDayRepo().getDayIDForWrite(year, month, day)
+            cursor.execute(f"""
+                INSERT INTO day_meals (fk_user_id, fk_day_id, fk_meal_type_id, fk_meal_id{levelColumns})
+                VALUES (%s, %s, %s, %s{levelPlaceholders})
+            """, (userID, dayID, mealTypeID, mealID) + levelValues)
+        if self.dbWrapper.schemaVersion in ("dual", "v2"):
+            cursor.execute(f"""
+                INSERT INTO day_meals_v2 (fk_user_id, meal_date, fk_meal_type_id, fk_meal_id{levelColumns})
+                VALUES (%s, %s, %s, %s{levelPlaceholders})
+            """, (userID, datetime.date(year, month, day), mealTypeID, mealID) + levelValues)
+
+        if self.dbWrapper.mealChangeLog:
+            self.dbWrapper.getMealChangeRepo().recordChange(cursor, userID, changeOperation, year, month, day, mealTypeID, fatLevel, sugarLevel)
+
+    def __updateLevelsByDate(self, cursor, userID: int, year: int, month: int, day: int, mealTypeID: int, mealID: int or None, fatLevel: int, sugarLevel: int) -> None:
+        """
+        Private helper updating the levels of a day meal in every place the current modes store them and recording the
+        change, without committing.
+
+        Args:
+            cursor: The cursor of the current shard.
+            userID (int): The ID of the user.
+            year (int): The year of the day.
+            month (int): The month of the day.
+            day (int): The day of the month.
+            mealTypeID (int): The ID of the meal type.
+            mealID (int or None): The ID of the meal (None if the levels are stored inline only).
+            fatLevel (int): The fat level of the meal (0: Low, 1: Medium, 2: High).
+            sugarLevel (int): The sugar level of the meal (0: Low, 1: Medium, 2: High).
+        """
+        if self.dbWrapper.inlineMealLevels != "on" and mealID is not None:
+            cursor.execute("UPDATE meals SET fat_level=%s, sugar_level=%s WHERE ID=%s", (fatLevel, sugarLevel, mealID))
+
+        if self.dbWrapper.inlineMealLevels != "off":
+            if self.dbWrapper.schemaVersion in ("v1", "dual"):
+                cursor.execute("""
+                    UPDATE day_meals dm
+                    JOIN days d ON d.ID = dm.fk_day_id
+                    SET dm.fat_level=%s, dm.sugar_level=%s
+                    WHERE dm.fk_user_id=%s AND d.year=%s AND d.month=%s AND d.day=%s AND dm.fk_meal_type_id=%s
+                """, (fatLevel, sugarLevel, userID, year, month, day, mealTypeID))
+            if self.dbWrapper.schemaVersion in ("dual", "v2"):
+                cursor.execute("""
+                    UPDATE day_meals_v2
+                    SET fat_level=%s, sugar_level=%s
+                    WHERE fk_user_id=%s AND meal_date=%s AND fk_meal_type_id=%s
+                """, (fatLevel, sugarLevel, userID, datetime.date(year, month, day), mealTypeID))
+
+        if self.dbWrapper.mealChangeLog:
+            self.dbWrapper.getMealChangeRepo().recordChange(cursor, userID, "update", year, month, day, mealTypeID, fatLevel, sugarLevel)
+
+    def __isArchivedDate(self, year: int, month: int, day: int) -> bool:
+        """
+        Private helper checking whether the day meals of a date may have been moved to the archive.
+
+        Args:
+            year (int): The year of the day.
+            month (int): The month of the day.
+            day (int): The day of the month.
+
+        Returns:
+            bool: True if archiving is enabled and the date lies before the archive horizon, False otherwise.
+        """
+        horizon = self.dbWrapper.getArchiveHorizonDate()
+        mealDate = self.__getMealDate(year, month, day)
+        return horizon is not None and mealDate is not None and mealDate < horizon
+
+    def __getArchivedDayMeals(self, cursor, userID: int, year: int, month: int, day: int, dayMeals: list) -> list:
+        """
+        Private helper reading the archived day meals of a date (the slower path, from the compressed archive).
+
+        Day meals written after the date was archived take precedence over archived ones of the same meal type.
+
+        Args:
+            cursor: The cursor to run the query on.
+            userID (int): The ID of the user.
+            year (int): The year of the day.
+            month (int): The month of the day.
+            day (int): The day of the month.
+            dayMeals (list): The day meals of the date read from the regular tables.
+
+        Returns:
+            list: The archived day meals whose meal type is not among `dayMeals`, without meal ID.
+        """
+        cursor.execute("""
+            SELECT fk_meal_type_id, fat_level, sugar_level
+            FROM day_meals_archive
+            WHERE fk_user_id=%s AND meal_date=%s
+        """, (userID, datetime.date(year, month, day)))
+        currentMealTypeIDs = {dayMeal['fk_meal_type_id'] for dayMeal in dayMeals}
+        return [
+            {'fk_meal_type_id': result[0], 'fk_meal_id': None, 'fat_level': result[1], 'sugar_level': result[2]}
+            for result in cursor.fetchall()
+            if result[0] not in currentMealTypeIDs
+        ]
+
+    def __selectArchivedDayMeal(self, cursor, userID: int, year: int, month: int, day: int, mealTypeID: int) -> tuple or None:
+        """
+        Private helper selecting the levels of one archived day meal.
+
+        Args:
+            cursor: The cursor to run the query on.
+            userID (int): The ID of the user.
+            year (int): The year of the day.
+            month (int): The month of the day.
+            day (int): The day of the month.
+            mealTypeID (int): The ID of the meal type.
+
+        Returns:
+            tuple or None: The fat level and sugar level, or None if there is no such archived day meal.
+        """
+        cursor.execute("""
+            SELECT fat_level, sugar_level
+            FROM day_meals_archive
+            WHERE fk_user_id=%s AND meal_date=%s AND fk_meal_type_id=%s
+        """, (userID, datetime.date(year, month, day), mealTypeID))
+        return cursor.fetchone()
+
+    def __deleteArchivedDayMeal(self, cursor, userID: int, year: int, month: int, day: int, mealTypeID: int) -> bool:
+        """
+        Private helper deleting one archived day meal, without committing.
+
+        Args:
+            cursor: The cursor of the current shard.
+            userID (int): The ID of the user.
+            year (int): The year of the day.
+            month (int): The month of the day.
+            day (int): The day of the month.
+            mealTypeID (int): The ID of the meal type.
+
+        Returns:
+            bool: True if an archived day meal was deleted, False if there was none.
+        """
+        cursor.execute("""
+            DELETE FROM day_meals_archive
+            WHERE fk_user_id=%s AND meal_date=%s AND fk_meal_type_id=%s
+        """, (userID, datetime.date(year, month, day), mealTypeID))
+        return cursor.rowcount > 0
+
+    def __getMealDate(self, year: int, month: int, day: int):
+        """
+        Private helper converting a date to the value stored in `day_meals_v2`.
+
+        Args:
+            year (int): The year of the day.
+            month (int): The month of the day.
+            day (int): The day of the month.
+
+        Returns:
+            datetime.date or None: The date, or None if it does not exist (such a date can never be stored).
+        """
+        try:
+            return datetime.date(year, month, day)
+        except ValueError:
+            return None
+
+    def __rollback(self) -> None:
+        """
+        Private helper rolling back the running transaction of the current shard, ignoring errors.
+        """
+        try:
+            self.dbWrapper.getShardConnection().rollback()
+        except Exception:
+            pass
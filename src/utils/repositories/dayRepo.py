@@ -37,8 +37,9 @@ class DayRepo:
         try:
             query = "SELECT ID, year, month, day FROM days WHERE ID=%s"
             val = (dayID,)
-            self.dbWrapper.dbCursor.execute(query, val)
-            myresult = self.dbWrapper.dbCursor.fetchone()
+            readCursor = self.dbWrapper.getShardReadCursor()
+            readCursor.execute(query, val)
+            myresult = readCursor.fetchone()
 
             if myresult:
                 day = {
@@ -72,8 +73,9 @@ class DayRepo:
         try:
             query = "SELECT ID FROM days WHERE year=%s AND month=%s AND day=%s"
             val = (year, month, day)
-            self.dbWrapper.dbCursor.execute(query, val)
-            myresult = self.dbWrapper.dbCursor.fetchone()
+            readCursor = self.dbWrapper.getShardReadCursor()
+            readCursor.execute(query, val)
+            myresult = readCursor.fetchone()
 
             if myresult:
                 return self.getDayByID(myresult[0])
@@ -105,13 +107,41 @@ class DayRepo:
 
             query = "INSERT INTO days (year, month, day) VALUES (%s, %s, %s)"
             val = (year, month, day)
-            self.dbWrapper.dbCursor.execute(query, val)
-            self.dbWrapper.dbConnection.commit()
+            shardCursor = self.dbWrapper.getShardCursor()
+            shardCursor.execute(query, val)
+            self.dbWrapper.getShardConnection().commit()
+            self.dbWrapper.recordWrite()
 
-            return self.getDayByID(self.dbWrapper.dbCursor.lastrowid)
+            return self.getDayByID(shardCursor.lastrowid)
 
         except Exception as e:
             if alreadyAttemptedToUpdateOwnClassVars:
                 return None
             self.dbWrapper.updateOwnClassVars()
             return self.createNewDay(year, month, day, True)
+
+    def getDayIDForWrite(self, year: int, month: int, day: int) -> int:
+        """
+        Returns the ID of a day on the current shard, inserting the day if needed, as part of the caller's transaction.
+
+        Only needed by schema v1 and dual (see `database.schemaVersion`), schema v2 stores the date directly.
+        Does not commit and does not retry, so the caller can commit or roll back the whole write at once.
+
+        Args:
+            year (int): The year of the day entry.
+            month (int): The month of the day entry.
+            day (int): The day of the day entry.
+
+        Raises:
+            mysql.connector.Error: If a query fails.
+
+        Returns:
+            int: The ID of the day entry.
+        """
+        shardCursor = self.dbWrapper.getShardCursor()
+        shardCursor.execute("SELECT ID FROM days WHERE year=%s AND month=%s AND day=%s", (year, month, day))
+        myresult = shardCursor.fetchone()
+        if myresult:
+            return myresult[0]
+        shardCursor.execute("INSERT INTO days (year, month, day) VALUES (%s, %s, %s)", (year, month, day))
+        return shardCursor.lastrowid
@@ -0,0 +1,164 @@
+# Copyright (C) 2024 Patrick Michiels
+# All rights reserved.
+# This source code is licensed under the Evaluation License Agreement and
+# may not be used, modified, or distributed without explicit permission from the author.
+# This code is provided for evaluation purposes only.
+
+class MealChangeRepo:
+    """
+    Repository class for the per-user meal change log (`database.mealChangeLog`).
+
+    Every meal write records a change with the next sequence number of its user, in the transaction of the write and
+    on the shard holding the user's meals. The sequence row (`meal_change_seqs`) is locked until the write commits,
+    so the changes of a user become visible in sequence order without gaps, and clients can ask for everything after
+    the last sequence number they saw.
+
+    Compaction removes changes superseded by a newer change of the same day meal (never needed, as clients only
+    need the latest state) and changes older than the retention period. The latter raises `compacted_seq`; clients
+    whose sequence number is below it have to re-read their data.
+
+    Attributes:
+        dbWrapper: The database wrapper that provides database connection and cursor.
+    """
+
+    OPERATIONS = ("insert", "update", "delete")
+
+    def __init__(self, dbWrapper):
+        """
+        Initializes the MealChangeRepo with a database wrapper.
+
+        Args:
+            dbWrapper: The database wrapper object used to interact with the database.
+        """
+        self.dbWrapper = dbWrapper
+
+    def recordChange(self, cursor, userID: int, operation: str, year: int, month: int, day: int, mealTypeID: int, fatLevel: int = None, sugarLevel: int = None) -> int:
+        """
+        Records a change of a day meal within the running transaction of the write, without committing.
+
+        Args:
+            cursor: The cursor of the current shard running the write.
+            userID (int): The ID of the user.
+            operation (str): "insert", "update" or "delete".
+            year (int): The year of the day.
+            month (int): The month of the day.
+            day (int): The day of the month.
+            mealTypeID (int): The ID of the meal type.
+            fatLevel (int, optional): The fat level after the change, None for deletes.
+            sugarLevel (int, optional): The sugar level after the change, None for deletes.
+
+        Raises:
+            ValueError: If the operation is unknown.
+
+        Returns:
+            int: The sequence number of the change.
+        """
+        if operation not in self.OPERATIONS:
+            raise ValueError(f"Unknown meal change operation {operation!r}")
+
+        # Takes the row lock of the user's sequence, held until the write commits.
+        cursor.execute("""
+            INSERT INTO meal_change_seqs (fk_user_id, last_seq) VALUES (%s, 1)
+            ON DUPLICATE KEY UPDATE last_seq = last_seq + 1
+        """, (userID,))
+        cursor.execute("SELECT last_seq FROM meal_change_seqs WHERE fk_user_id=%s", (userID,))
+        seq = cursor.fetchone()[0]
+        cursor.execute("""
+            INSERT INTO meal_changes (fk_user_id, seq, operation, year, month, day, fk_meal_type_id, fat_level, sugar_level)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """, (userID, seq, operation, year, month, day, mealTypeID, fatLevel, sugarLevel))
+        return seq
+
+    def getChangesSince(self, userID: int, sinceSeq: int, limit: int, alreadyAttemptedToUpdateOwnClassVars: bool = False) -> dict or None:
+        """
+        Retrieves the changes of a user after a sequence number, oldest first.
+
+        Args:
+            userID (int): The ID of the user.
+            sinceSeq (int): The last sequence number the client has seen (0 for all changes).
+            limit (int): The maximum number of changes returned.
+            alreadyAttemptedToUpdateOwnClassVars (bool): Flag to prevent multiple updates in case of error.
+
+        Returns:
+            dict or None: The changes (seq, operation, year, month, day, fk_meal_type_id, fat_level, sugar_level),
+                          whether more changes follow, the latest sequence number of the user and the sequence number
+                          up to which changes may have been compacted away, or None if the query fails.
+        """
+        try:
+            readCursor = self.dbWrapper.getShardReadCursor()
+            readCursor.execute("SELECT last_seq, compacted_seq FROM meal_change_seqs WHERE fk_user_id=%s", (userID,))
+            seqs = readCursor.fetchone() or (0, 0)
+
+            readCursor.execute("""
+                SELECT seq, operation, year, month, day, fk_meal_type_id, fat_level, sugar_level
+                FROM meal_changes
+                WHERE fk_user_id=%s AND seq > %s
+                ORDER BY seq
+                LIMIT %s
+            """, (userID, sinceSeq, limit + 1))
+            myresults = readCursor.fetchall()
+
+            changes = [
+                {
+                    'seq': result[0], 'operation': result[1], 'year': result[2], 'month': result[3], 'day': result[4],
+                    'fk_meal_type_id': result[5], 'fat_level': result[6], 'sugar_level': result[7]
+                }
+                for result in myresults[:limit]
+            ]
+            return {'changes': changes, 'hasMore': len(myresults) > limit, 'lastSeq': seqs[0], 'compactedSeq': seqs[1]}
+
+        except Exception as e:
+            if alreadyAttemptedToUpdateOwnClassVars:
+                return None
+            self.dbWrapper.updateOwnClassVars()
+            return self.getChangesSince(userID, sinceSeq, limit, True)
+
+    def compactChanges(self, userID: int, retentionDays: int, alreadyAttemptedToUpdateOwnClassVars: bool = False) -> dict or None:
+        """
+        Removes the superseded changes and the changes older than the retention period of a user.
+
+        Args:
+            userID (int): The ID of the user.
+            retentionDays (int): Changes older than this are removed even if they are the latest of their day meal.
+            alreadyAttemptedToUpdateOwnClassVars (bool): Flag to prevent multiple updates in case of error.
+
+        Returns:
+            dict or None: The number of superseded and expired changes removed, or None if the compaction fails.
+        """
+        try:
+            shardCursor = self.dbWrapper.getShardCursor()
+            shardCursor.execute("""
+                DELETE c FROM meal_changes c
+                JOIN meal_changes newer
+                    ON newer.fk_user_id = c.fk_user_id AND newer.year = c.year AND newer.month = c.month
+                    AND newer.day = c.day AND newer.fk_meal_type_id = c.fk_meal_type_id AND newer.seq > c.seq
+                WHERE c.fk_user_id = %s
+            """, (userID,))
+            superseded = shardCursor.rowcount
+
+            shardCursor.execute("""
+                SELECT MAX(seq) FROM meal_changes
+                WHERE fk_user_id = %s AND changed_at < NOW() - INTERVAL %s DAY
+            """, (userID, retentionDays))
+            expiredThroughSeq = shardCursor.fetchone()[0]
+            expired = 0
+            if expiredThroughSeq is not None:
+                shardCursor.execute("DELETE FROM meal_changes WHERE fk_user_id = %s AND seq <= %s", (userID, expiredThroughSeq))
+                expired = shardCursor.rowcount
+                shardCursor.execute(
+                    "UPDATE meal_change_seqs SET compacted_seq = GREATEST(compacted_seq, %s) WHERE fk_user_id = %s",
+                    (expiredThroughSeq, userID)
+                )
+
+            self.dbWrapper.getShardConnection().commit()
+            return {'superseded': superseded, 'expired': expired}
+
+        except Exception as e:
+            try:
+                self.dbWrapper.getShardConnection().rollback()
+            except Exception:
+                pass
+            if alreadyAttemptedToUpdateOwnClassVars:
+                return None
+            self.dbWrapper.updateOwnClassVars()
+            return self.compactChanges(userID, retentionDays, True)
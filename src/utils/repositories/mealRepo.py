@@ -4,6 +4,8 @@
 # may not be used, modified, or distributed without explicit permission from the author.
 # This code is provided for evaluation purposes only.
 
+import datetime
+
 class MealRepo:
     """
     Repository class for managing meal records in the database.
@@ -37,8 +39,9 @@ class MealRepo:
         try:
             query = "SELECT ID, fat_level, sugar_level FROM meals WHERE ID=%s"
             val = (mealID,)
-            self.dbWrapper.dbCursor.execute(query, val)
-            myresult = self.dbWrapper.dbCursor.fetchone()
+            readCursor = self.dbWrapper.getShardReadCursor()
+            readCursor.execute(query, val)
+            myresult = readCursor.fetchone()
 
             if myresult:
                 meal = {
@@ -70,10 +73,12 @@ class MealRepo:
         try:
             query = "INSERT INTO meals (fat_level, sugar_level) VALUES (%s, %s)"
             val = (fat_level, sugar_level)
-            self.dbWrapper.dbCursor.execute(query, val)
-            self.dbWrapper.dbConnection.commit()
+            shardCursor = self.dbWrapper.getShardCursor()
+            shardCursor.execute(query, val)
+            self.dbWrapper.getShardConnection().commit()
+            self.dbWrapper.recordWrite()
 
-            return self.getMealByID(self.dbWrapper.dbCursor.lastrowid)
+            return self.getMealByID(shardCursor.lastrowid)
 
         except Exception as e:
             if alreadyAttemptedToUpdateOwnClassVars:
@@ -101,8 +106,10 @@ class MealRepo:
             WHERE ID = %s
             """
             val = (fat_level, sugar_level, mealID)
-            self.dbWrapper.dbCursor.execute(query, val)
-            self.dbWrapper.dbConnection.commit()
+            shardCursor = self.dbWrapper.getShardCursor()
+            shardCursor.execute(query, val)
+            self.dbWrapper.getShardConnection().commit()
+            self.dbWrapper.recordWrite()
 
             return True
 
@@ -135,16 +142,18 @@ class MealRepo:
                 WHERE fk_user_id = %s AND fk_day_id = %s AND fk_meal_type_id = %s
             """
             val_day_meals = (userID, dayID, mealTypeID)
-            self.dbWrapper.dbCursor.execute(query_day_meals, val_day_meals)
+            shardCursor = self.dbWrapper.getShardCursor()
+            shardCursor.execute(query_day_meals, val_day_meals)
             
-            if self.dbWrapper.dbCursor.rowcount == 0:
+            if shardCursor.rowcount == 0:
                 return False  # day_meals entry not found
 
             # Now delete the meal from meals
             query_meal = "DELETE FROM meals WHERE ID = %s"
             val_meal = (mealID,)
-            self.dbWrapper.dbCursor.execute(query_meal, val_meal)
-            self.dbWrapper.dbConnection.commit()
+            shardCursor.execute(query_meal, val_meal)
+            self.dbWrapper.getShardConnection().commit()
+            self.dbWrapper.recordWrite()
 
             return True  # Deletion successful
 
@@ -153,3 +162,75 @@ class MealRepo:
                 return None
             self.dbWrapper.updateOwnClassVars()
             return self.deleteMeal(userID, dayID, mealTypeID, mealID, True)
+
+    def deleteMealByDate(self, userID: int, year: int, month: int, day: int, mealTypeID: int, mealID: int, alreadyAttemptedToUpdateOwnClassVars: bool = False) -> bool or None:
+        """
+        Deletes a meal and its day meal entry by date, in every layout of the current schema version (`database.schemaVersion`).
+
+        Days older than the archive horizon also delete the day meal from `day_meals_archive`, so an archived meal is
+        deleted as well and never shows up again once a newer one is deleted.
+
+        Args:
+            userID (int): The ID of the user.
+            year (int): The year of the day.
+            month (int): The month of the day.
+            day (int): The day of the month.
+            mealTypeID (int): The ID of the meal type entry.
+            mealID (int or None): The ID of the meal entry to be deleted (None if the levels are stored inline only).
+            alreadyAttemptedToUpdateOwnClassVars (bool): Flag to prevent multiple updates in case of error.
+
+        Returns:
+            bool or None: True if the meal and day meal entries were deleted successfully,
+                          False if the day meal entry was not found,
+                          None if the operation fails.
+        """
+        try:
+            shardCursor = self.dbWrapper.getShardCursor()
+            deletedDayMeals = 0
+            if self.dbWrapper.schemaVersion in ("v1", "dual"):
+                query_day_meals = """
+                    DELETE dm FROM day_meals dm
+                    JOIN days d ON d.ID = dm.fk_day_id
+                    WHERE dm.fk_user_id = %s AND d.year = %s AND d.month = %s AND d.day = %s AND dm.fk_meal_type_id = %s
+                """
+                shardCursor.execute(query_day_meals, (userID, year, month, day, mealTypeID))
+                deletedDayMeals += shardCursor.rowcount
+            if self.dbWrapper.schemaVersion in ("dual", "v2"):
+                query_day_meals_v2 = """
+                    DELETE FROM day_meals_v2
+                    WHERE fk_user_id = %s AND meal_date = %s AND fk_meal_type_id = %s
+                """
+                shardCursor.execute(query_day_meals_v2, (userID, datetime.date(year, month, day), mealTypeID))
+                deletedDayMeals += shardCursor.rowcount
+            horizon = self.dbWrapper.getArchiveHorizonDate()
+            if horizon is not None and datetime.date(year, month, day) < horizon:
+                query_day_meals_archive = """
+                    DELETE FROM day_meals_archive
+                    WHERE fk_user_id = %s AND meal_date = %s AND fk_meal_type_id = %s
+                """
+                shardCursor.execute(query_day_meals_archive, (userID, datetime.date(year, month, day), mealTypeID))
+                deletedDayMeals += shardCursor.rowcount
+
+            if deletedDayMeals == 0:
+                self.dbWrapper.getShardConnection().rollback()
+                return False  # day meal entry not found
+
+            # Now delete the meal from meals
+            if mealID is not None:
+                shardCursor.execute("DELETE FROM meals WHERE ID = %s", (mealID,))
+            if self.dbWrapper.mealChangeLog:
+                self.dbWrapper.getMealChangeRepo().recordChange(shardCursor, userID, "delete", year, month, day, mealTypeID)
+            self.dbWrapper.getShardConnection().commit()
+            self.dbWrapper.recordWrite()
+
+            return True  # Deletion successful
+
+        except Exception as e:
+            try:
+                self.dbWrapper.getShardConnection().rollback()
+            except Exception:
+                pass
+            if alreadyAttemptedToUpdateOwnClassVars:
+                return None
+            self.dbWrapper.updateOwnClassVars()
+            return self.deleteMealByDate(userID, year, month, day, mealTypeID, mealID, True)
@@ -38,8 +38,9 @@ class MealTypeRepo:
         try:
             query = "SELECT ID FROM meal_types WHERE name = %s"
             val = (mealTypeName,)
-            self.dbWrapper.dbCursor.execute(query, val)
-            myresult = self.dbWrapper.dbCursor.fetchone()
+            readCursor = self.dbWrapper.getReadCursor()
+            readCursor.execute(query, val)
+            myresult = readCursor.fetchone()
             
             if myresult:
                 return myresult[0]
@@ -65,8 +66,9 @@ class MealTypeRepo:
         try:
             query = "SELECT name FROM meal_types WHERE ID = %s"
             val = (mealTypeID,)
-            self.dbWrapper.dbCursor.execute(query, val)
-            myresult = self.dbWrapper.dbCursor.fetchone()
+            readCursor = self.dbWrapper.getReadCursor()
+            readCursor.execute(query, val)
+            myresult = readCursor.fetchone()
             
             if myresult:
                 return myresult[0]
@@ -87,8 +89,9 @@ class MealTypeRepo:
         """
         try:
             query = "SELECT ID, name FROM meal_types ORDER BY ID"
-            self.dbWrapper.dbCursor.execute(query)
-            myresults = self.dbWrapper.dbCursor.fetchall()
+            readCursor = self.dbWrapper.getReadCursor()
+            readCursor.execute(query)
+            myresults = readCursor.fetchall()
 
             mealTypes = [{'ID': result[0], 'name': result[1]} for result in myresults]
 
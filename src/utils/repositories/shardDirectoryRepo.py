@@ -0,0 +1,110 @@
+# Copyright (C) 2024 Patrick Michiels
+# All rights reserved.
+# This source code is licensed under the Evaluation License Agreement and
+# may not be used, modified, or distributed without explicit permission from the author.
+# This code is provided for evaluation purposes only.
+
+class ShardDirectoryRepo:
+    """
+    Repository class for managing the shard directory in the database.
+
+    The shard directory (table `user_shards`, stored on the primary next to the users) records on which shard the
+    meal data of each user is stored, and whether that data is currently being moved to another shard.
+
+    Attributes:
+        dbWrapper: The database wrapper that provides database connection and cursor.
+    """
+
+    def __init__(self, dbWrapper):
+        """
+        Initializes the ShardDirectoryRepo with a database wrapper.
+
+        Args:
+            dbWrapper: The database wrapper object used to interact with the database.
+        """
+        self.dbWrapper = dbWrapper
+
+    def getShardEntry(self, userID: int, alreadyAttemptedToUpdateOwnClassVars: bool = False) -> dict or None:
+        """
+        Retrieves the shard directory entry of a user from the primary.
+
+        Args:
+            userID (int): The ID of the user.
+            alreadyAttemptedToUpdateOwnClassVars (bool): Flag to prevent multiple updates in case of error.
+
+        Returns:
+            dict or None: A dictionary containing the shard index and moving state if found, otherwise None.
+        """
+        try:
+            query = "SELECT fk_user_id, shard_index, is_moving FROM user_shards WHERE fk_user_id=%s"
+            val = (userID,)
+            self.dbWrapper.dbCursor.execute(query, val)
+            myresult = self.dbWrapper.dbCursor.fetchone()
+
+            if myresult:
+                return {
+                    'fk_user_id': myresult[0],
+                    'shard_index': myresult[1],
+                    'is_moving': bool(myresult[2]),
+                }
+            return None
+
+        except Exception as e:
+            if alreadyAttemptedToUpdateOwnClassVars:
+                return None
+            self.dbWrapper.updateOwnClassVars()
+            return self.getShardEntry(userID, True)
+
+    def createShardEntry(self, userID: int, shardIndex: int, alreadyAttemptedToUpdateOwnClassVars: bool = False) -> bool or None:
+        """
+        Creates the shard directory entry of a user, keeping an already existing entry untouched.
+
+        Args:
+            userID (int): The ID of the user.
+            shardIndex (int): The index of the shard the user's meal data is stored on.
+            alreadyAttemptedToUpdateOwnClassVars (bool): Flag to prevent multiple updates in case of error.
+
+        Returns:
+            bool or None: True if the entry exists afterwards, None if the operation fails.
+        """
+        try:
+            query = "INSERT IGNORE INTO user_shards (fk_user_id, shard_index, is_moving) VALUES (%s, %s, 0)"
+            val = (userID, shardIndex)
+            self.dbWrapper.dbCursor.execute(query, val)
+            self.dbWrapper.dbConnection.commit()
+            return True
+
+        except Exception as e:
+            if alreadyAttemptedToUpdateOwnClassVars:
+                return None
+            self.dbWrapper.updateOwnClassVars()
+            return self.createShardEntry(userID, shardIndex, True)
+
+    def setMoving(self, userID: int, shardIndex: int, isMoving: bool, alreadyAttemptedToUpdateOwnClassVars: bool = False) -> bool or None:
+        """
+        Sets the shard of a user and whether their meal data is currently being moved.
+
+        Args:
+            userID (int): The ID of the user.
+            shardIndex (int): The index of the shard the user's meal data is read from.
+            isMoving (bool): Whether the meal data is being moved (writes of the user are rejected meanwhile).
+            alreadyAttemptedToUpdateOwnClassVars (bool): Flag to prevent multiple updates in case of error.
+
+        Returns:
+            bool or None: True if the entry was written, None if the operation fails.
+        """
+        try:
+            query = """
+                INSERT INTO user_shards (fk_user_id, shard_index, is_moving) VALUES (%s, %s, %s)
+                ON DUPLICATE KEY UPDATE shard_index = VALUES(shard_index), is_moving = VALUES(is_moving)
+            """
+            val = (userID, shardIndex, 1 if isMoving else 0)
+            self.dbWrapper.dbCursor.execute(query, val)
+            self.dbWrapper.dbConnection.commit()
+            return True
+
+        except Exception as e:
+            if alreadyAttemptedToUpdateOwnClassVars:
+                return None
+            self.dbWrapper.updateOwnClassVars()
+            return self.setMoving(userID, shardIndex, isMoving, True)
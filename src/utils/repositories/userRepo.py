@@ -4,12 +4,15 @@
 # may not be used, modified, or distributed without explicit permission from the author.
 # This code is provided for evaluation purposes only.
 
+import time
+
+
 class UserRepo:
     """
     Repository class for managing user-related interactions with the database.
 
     This class wraps direct interaction with the user part of the database, including validating user credentials,
-    retrieving user data by ID or name, and creating new users.
+    retrieving user data by ID or name, creating new users and purging them with all their data.
     
     Attributes:
         dbWrapper: The database wrapper that provides database connection and cursor.
@@ -24,12 +27,21 @@ class UserRepo:
         """
         self.dbWrapper = dbAnandaTrackerWrapper
 
-    def isUserPasswordCorrect(self, credentialsItem) -> bool or str or None:
+    def isUserPasswordCorrect(self, credentialsItem, passwordHasher=None) -> bool or str or None:
         """
         Validates the user's password.
 
+        With a password hasher the password is verified against the stored server-side hash, blocking the calling
+        thread while the hasher's process pool computes it. Legacy hashes (stored as sent by the client) and hashes
+        with outdated parameters are replaced by a current hash after a successful login.
+
         Args:
             credentialsItem: The credentialsItem object containing the user's token, username, and hashed password.
+            passwordHasher (PasswordHasher, optional): The server-side password hasher. Without one, the stored
+                value is compared directly (legacy behaviour).
+
+        Raises:
+            PasswordHasherBusyError: If the password hasher's queue is full.
 
         Returns:
             bool or str or None: 
@@ -45,9 +57,17 @@ class UserRepo:
         user = self.getUserByName(credentialsItem.userName)
         if user is None:
             return None
-        if user["hashedPassword"] == credentialsItem.hashedPassword:
-            return True
-        return "invalid password"
+        if passwordHasher is None:
+            if user["hashedPassword"] == credentialsItem.hashedPassword:
+                return True
+            return "invalid password"
+
+        matches, needsUpgrade = passwordHasher.verifyPasswordBlocking(credentialsItem.hashedPassword, user["hashedPassword"])
+        if not matches:
+            return "invalid password"
+        if needsUpgrade:
+            self.updateHashedPassword(user["ID"], user["hashedPassword"], passwordHasher.hashPasswordBlocking(credentialsItem.hashedPassword))
+        return True
 
     def getUserByID(self, userID: int, alreadyAttemptedToUpdateOwnClassVars: bool = False) -> dict or None:
         """
@@ -61,16 +81,18 @@ class UserRepo:
             dict or None: A dictionary containing the user details if found, otherwise None.
         """
         try:
-            query = """
+            decryptionKey, keyValues = self.__getDecryptionKeyExpression()
+            query = f"""
                 SELECT ID, 
-                       AES_DECRYPT(name_encr, %s) as name, 
+                       AES_DECRYPT(name_encr, {decryptionKey}) as name, 
                        hashedPassword 
                 FROM users 
                 WHERE ID=%s
             """
-            val = (str(self.dbWrapper.encryptionKey), userID)
-            self.dbWrapper.dbCursor.execute(query, val)
-            myresult = self.dbWrapper.dbCursor.fetchone()
+            val = (*keyValues, userID)
+            readCursor = self.dbWrapper.getReadCursor()
+            readCursor.execute(query, val)
+            myresult = readCursor.fetchone()
 
             if myresult:
                 return {
@@ -90,6 +112,10 @@ class UserRepo:
         """
         Retrieves a user by their name from the database.
 
+        The encrypted names cannot be indexed, so without the blind index (`authentication.name_blind_index`) every
+        name is decrypted and compared. With it, the user is found through the unique index on `name_bidx`; in "dual"
+        mode users without a blind index yet (not backfilled) are still found by decrypting their names.
+
         Args:
             userName (str): The name of the user.
             alreadyAttemptedToUpdateOwnClassVars (bool): Flag to prevent multiple updates in case of error.
@@ -98,14 +124,31 @@ class UserRepo:
             dict or None: A dictionary containing the user details if found, otherwise None.
         """
         try:
-            query = """
-                SELECT ID 
-                FROM users 
-                WHERE AES_DECRYPT(name_encr, %s) = %s
-            """
-            val = (str(self.dbWrapper.encryptionKey), userName)
-            self.dbWrapper.dbCursor.execute(query, val)
-            myresult = self.dbWrapper.dbCursor.fetchone()
+            decryptionKey, keyValues = self.__getDecryptionKeyExpression()
+            readCursor = self.dbWrapper.getReadCursor()
+            myresult = None
+            if self.dbWrapper.nameBlindIndex != "off":
+                # The name is compared as well, so a hash collision can never return another user.
+                query = f"""
+                    SELECT ID 
+                    FROM users 
+                    WHERE name_bidx = %s AND AES_DECRYPT(name_encr, {decryptionKey}) = %s
+                """
+                val = (self.dbWrapper.getNameBlindIndex(userName), *keyValues, userName)
+                readCursor.execute(query, val)
+                myresult = readCursor.fetchone()
+
+            if myresult is None and self.dbWrapper.nameBlindIndex != "on":
+                query = f"""
+                    SELECT ID 
+                    FROM users 
+                    WHERE AES_DECRYPT(name_encr, {decryptionKey}) = %s
+                """
+                if self.dbWrapper.nameBlindIndex == "dual":
+                    query += " AND name_bidx IS NULL"
+                val = (*keyValues, userName)
+                readCursor.execute(query, val)
+                myresult = readCursor.fetchone()
 
             if myresult:
                 return self.getUserByID(myresult[0])
@@ -146,6 +189,8 @@ class UserRepo:
         """
         Retrieves all user IDs from the database.
 
+        Holds every ID in memory at once; use `getUserIDsPage()` or `iterateUserIDs()` for large user bases.
+
         Args:
             alreadyAttemptedToUpdateOwnClassVars (bool): Flag to prevent multiple updates in case of error.
 
@@ -154,8 +199,9 @@ class UserRepo:
         """
         try:
             query = "SELECT ID FROM users"
-            self.dbWrapper.dbCursor.execute(query)
-            myresults = self.dbWrapper.dbCursor.fetchall()
+            readCursor = self.dbWrapper.getReadCursor()
+            readCursor.execute(query)
+            myresults = readCursor.fetchall()
 
             return [result[0] for result in myresults] if myresults else []
 
@@ -165,6 +211,74 @@ class UserRepo:
             self.dbWrapper.updateOwnClassVars()
             return self.dbWrapper.getUserRepo().getAllUserIDs(True)
 
+    def getUserIDsPage(self, afterID: int = 0, pageSize: int = 1000, alreadyAttemptedToUpdateOwnClassVars: bool = False) -> list or None:
+        """
+        Retrieves one page of user IDs in ascending order (keyset pagination).
+
+        The page starts right after `afterID` using the primary key, so every page costs the same no matter how far
+        into the table it is, and users created or deleted meanwhile never shift the following pages.
+
+        Args:
+            afterID (int, optional): The last ID of the previous page, 0 for the first page. Defaults to 0.
+            pageSize (int, optional): The maximum number of IDs to return. Defaults to 1000.
+            alreadyAttemptedToUpdateOwnClassVars (bool): Flag to prevent multiple updates in case of error.
+
+        Returns:
+            list or None: Up to `pageSize` user IDs (fewer on the last page), or None on error.
+        """
+        try:
+            query = """
+                SELECT ID 
+                FROM users 
+                WHERE ID > %s 
+                ORDER BY ID 
+                LIMIT %s
+            """
+            val = (afterID, pageSize)
+            readCursor = self.dbWrapper.getReadCursor()
+            readCursor.execute(query, val)
+            return [result[0] for result in readCursor.fetchall()]
+
+        except Exception as e:
+            if alreadyAttemptedToUpdateOwnClassVars:
+                return None
+            self.dbWrapper.updateOwnClassVars()
+            return self.dbWrapper.getUserRepo().getUserIDsPage(afterID, pageSize, True)
+
+    def iterateUserIDs(self, fetchSize: int = 1000):
+        """
+        Streams all user IDs in ascending order with constant memory.
+
+        The IDs are read with an unbuffered cursor on a dedicated connection (the read target's connections are shared
+        and buffered), so only `fetchSize` rows are held in memory at a time. The connection is closed when the
+        generator is exhausted or closed early.
+
+        Args:
+            fetchSize (int, optional): The number of rows fetched from the server at once. Defaults to 1000.
+
+        Raises:
+            mysql.connector.Error: If the connection cannot be established or is lost while streaming.
+
+        Yields:
+            int: The next user ID.
+        """
+        connection = self.dbWrapper.getReadTarget().openDedicatedConnection()
+        try:
+            cursor = connection.cursor(buffered=False)
+            cursor.execute("SELECT ID FROM users ORDER BY ID")
+            while True:
+                rows = cursor.fetchmany(fetchSize)
+                if not rows:
+                    break
+                for row in rows:
+                    yield row[0]
+        finally:
+            # Closing the connection also discards the rest of an unread result.
+            try:
+                connection.close()
+            except Exception as e:
+                print(f"UserRepo: could not close streaming connection: {e}")
+
     def createNewUser(self, name: str, hashedPassword: str, alreadyAttemptedToUpdateOwnClassVars: bool = False) -> dict or None:
         """
         Creates a new user in the database.
@@ -180,15 +294,30 @@ class UserRepo:
         try:
             user = self.getUserByName(name)
             if user is None:
-                query = """
-                    INSERT INTO users (name_encr, hashedPassword) 
-                    VALUES (AES_ENCRYPT(%s, %s), %s)
-                """
+                columns, placeholders = ["name_encr", "hashedPassword"], ["AES_ENCRYPT(%s, %s)", "%s"]
                 val = (name, str(self.dbWrapper.encryptionKey), hashedPassword)
+                if self.dbWrapper.usesEncryptionKeyVersions():
+                    columns.append("name_key_version")
+                    placeholders.append("%s")
+                    val += (self.dbWrapper.encryptionKeyVersion,)
+                if self.dbWrapper.nameBlindIndex != "off":
+                    # The unique index on name_bidx also rejects a concurrent registration of the same name.
+                    columns.append("name_bidx")
+                    placeholders.append("%s")
+                    val += (self.dbWrapper.getNameBlindIndex(name),)
+                query = f"""
+                    INSERT INTO users ({", ".join(columns)}) 
+                    VALUES ({", ".join(placeholders)})
+                """
                 self.dbWrapper.dbCursor.execute(query, val)
                 self.dbWrapper.dbConnection.commit()
+                self.dbWrapper.recordWrite()
+                newUserID = self.dbWrapper.dbCursor.lastrowid
+
+                # Place the meal data of the new user on its shard.
+                self.dbWrapper.assignShardOfNewUser(newUserID)
 
-                return self.getUserByID(self.dbWrapper.dbCursor.lastrowid)
+                return self.getUserByID(newUserID)
             return None
 
         except Exception as e:
@@ -197,6 +326,137 @@ class UserRepo:
             self.dbWrapper.updateOwnClassVars()
             return self.dbWrapper.getUserRepo().createNewUser(name, hashedPassword, True)
 
+    def updateHashedPassword(self, userID: int, previousHashedPassword: str, hashedPassword: str, alreadyAttemptedToUpdateOwnClassVars: bool = False) -> bool:
+        """
+        Replaces the stored password hash of a user, unless it was changed in the meantime.
+
+        Args:
+            userID (int): The ID of the user.
+            previousHashedPassword (str): The stored hash the new one was derived from.
+            hashedPassword (str): The new hash to store.
+            alreadyAttemptedToUpdateOwnClassVars (bool): Flag to prevent multiple updates in case of error.
+
+        Returns:
+            bool: True if the hash was replaced, False otherwise.
+        """
+        try:
+            query = """
+                UPDATE users 
+                SET hashedPassword = %s 
+                WHERE ID = %s AND hashedPassword = %s
+            """
+            val = (hashedPassword, userID, previousHashedPassword)
+            self.dbWrapper.dbCursor.execute(query, val)
+            self.dbWrapper.dbConnection.commit()
+            self.dbWrapper.recordWrite()
+            return self.dbWrapper.dbCursor.rowcount == 1
+
+        except Exception as e:
+            if alreadyAttemptedToUpdateOwnClassVars:
+                return False
+            self.dbWrapper.updateOwnClassVars()
+            return self.dbWrapper.getUserRepo().updateHashedPassword(userID, previousHashedPassword, hashedPassword, True)
+
+    def purgeUser(self, userID: int, batchSize: int = 500, pauseSeconds: float = 0.05, onBatch=None, alreadyAttemptedToUpdateOwnClassVars: bool = False) -> dict or None:
+        """
+        Deletes a user and all its meal data in small batches, so other users never wait for long held locks.
+
+        The user is locked out first (its password hash is cleared, which never verifies), so no meals are written
+        while the purge runs. The day meals and their meals are then deleted on the user's shard, `batchSize` rows per
+        transaction with a pause in between, followed by the archived day meals and the meal change log. The user row is deleted last. Every
+        step only deletes what is left, so an interrupted purge is resumed by calling it again for the same user.
+
+        Args:
+            userID (int): The ID of the user.
+            batchSize (int, optional): The number of rows deleted per transaction. Defaults to 500.
+            pauseSeconds (float, optional): Seconds to pause between two batches. Defaults to 0.05.
+            onBatch (callable, optional): Called with the progress report after every committed batch.
+            alreadyAttemptedToUpdateOwnClassVars (bool): Flag to prevent multiple updates in case of error.
+
+        Returns:
+            dict or None: The numbers of deleted day meals, archived day meals and changes and whether the user row was deleted,
+                          or None if the purge failed or the user's meal data is being moved to another shard.
+        """
+        try:
+            self.dbWrapper.dbCursor.execute("UPDATE users SET hashedPassword = NULL WHERE ID = %s", (userID,))
+            self.dbWrapper.dbConnection.commit()
+            if self.dbWrapper.useShardOfUser(userID)["is_moving"]:
+                return None
+
+            report = {"userID": userID, "dayMeals": 0, "archivedDayMeals": 0, "changes": 0, "userDeleted": False}
+            tables = ("day_meals",) if self.dbWrapper.schemaVersion == "v1" else ("day_meals", "day_meals_v2")
+            for table in tables:
+                self.__purgeDayMeals(table, userID, batchSize, pauseSeconds, onBatch, report)
+            if self.dbWrapper.archiveHorizonMonths > 0:
+                self.__purgeInBatches("day_meals_archive", "meal_date", "archivedDayMeals", userID, batchSize, pauseSeconds, onBatch, report)
+            if self.dbWrapper.mealChangeLog:
+                self.__purgeInBatches("meal_changes", "seq", "changes", userID, batchSize, pauseSeconds, onBatch, report)
+                self.dbWrapper.getShardCursor().execute("DELETE FROM meal_change_seqs WHERE fk_user_id = %s", (userID,))
+                self.dbWrapper.getShardConnection().commit()
+
+            # Removes the shard directory entry by cascade; the meal data it pointed to is gone by now.
+            self.dbWrapper.dbCursor.execute("DELETE FROM users WHERE ID = %s", (userID,))
+            self.dbWrapper.dbConnection.commit()
+            self.dbWrapper.recordWrite()
+            report["userDeleted"] = self.dbWrapper.dbCursor.rowcount == 1
+            return report
+
+        except Exception as e:
+            try:
+                self.dbWrapper.getShardConnection().rollback()
+            except Exception:
+                pass
+            if alreadyAttemptedToUpdateOwnClassVars:
+                return None
+            self.dbWrapper.updateOwnClassVars()
+            return self.dbWrapper.getUserRepo().purgeUser(userID, batchSize, pauseSeconds, onBatch, True)
+
+    def backfillNameBlindIndex(self, afterID: int = 0, batchSize: int = 1000, alreadyAttemptedToUpdateOwnClassVars: bool = False) -> dict or None:
+        """
+        Fills the blind index of one batch of users that have none yet, in one short transaction on the primary.
+
+        Names shared by several users (registered concurrently before the unique index existed) keep no blind index
+        after the first one and are reported as remaining.
+
+        Args:
+            afterID (int, optional): The last ID of the previous batch, 0 for the first batch. Defaults to 0.
+            batchSize (int, optional): The number of users read per batch. Defaults to 1000.
+            alreadyAttemptedToUpdateOwnClassVars (bool): Flag to prevent multiple updates in case of error.
+
+        Returns:
+            dict or None: The last ID of the batch (None once all users were visited) and the number of updated users,
+                          or None if the batch failed.
+        """
+        try:
+            decryptionKey, keyValues = self.__getDecryptionKeyExpression()
+            self.dbWrapper.dbCursor.execute(f"""
+                SELECT ID, AES_DECRYPT(name_encr, {decryptionKey})
+                FROM users
+                WHERE ID > %s
+                ORDER BY ID
+                LIMIT %s
+            """, (*keyValues, afterID, batchSize))
+            myresults = self.dbWrapper.dbCursor.fetchall()
+
+            # Names that cannot be decrypted (unknown key version) are left without a blind index.
+            values = [(self.dbWrapper.getNameBlindIndex(name.decode()), userID) for userID, name in myresults if name is not None]
+            updated = 0
+            if values:
+                self.dbWrapper.dbCursor.executemany("UPDATE IGNORE users SET name_bidx = %s WHERE ID = %s AND name_bidx IS NULL", values)
+                updated = max(self.dbWrapper.dbCursor.rowcount, 0)
+            self.dbWrapper.dbConnection.commit()
+            return {'lastID': myresults[-1][0] if len(myresults) == batchSize else None, 'updated': updated}
+
+        except Exception as e:
+            try:
+                self.dbWrapper.dbConnection.rollback()
+            except Exception:
+                pass
+            if alreadyAttemptedToUpdateOwnClassVars:
+                return None
+            self.dbWrapper.updateOwnClassVars()
+            return self.dbWrapper.getUserRepo().backfillNameBlindIndex(afterID, batchSize, True)
+
     def createNewUser_fromCredentialsItem(self, credentialsItem) -> dict or None:
         """
         Creates a new user in the database from a credentialsItem object.
@@ -208,3 +468,85 @@ class UserRepo:
             dict or None: A dictionary containing the newly created user details, or None if the user already exists.
         """
         return self.createNewUser(credentialsItem.userName, credentialsItem.hashedPassword)
+
+    def __getDecryptionKeyExpression(self) -> tuple:
+        """
+        Private helper building the SQL expression selecting the key a user name was encrypted with.
+
+        While a key rotation is running, names are encrypted with different keys, identified by `name_key_version`.
+
+        Returns:
+            tuple: The SQL expression and its parameter values.
+        """
+        if not self.dbWrapper.usesEncryptionKeyVersions():
+            return "%s", (str(self.dbWrapper.encryptionKey),)
+
+        cases = " ".join(["WHEN %s THEN %s"] * len(self.dbWrapper.encryptionKeys))
+        values = tuple(value for version, key in self.dbWrapper.encryptionKeys.items() for value in (version, str(key)))
+        return f"CASE name_key_version {cases} END", values
+
+    def __purgeDayMeals(self, table: str, userID: int, batchSize: int, pauseSeconds: float, onBatch, report: dict) -> None:
+        """
+        Private helper deleting the day meals of a user in one day meal table, and their meals, in batches.
+
+        Args:
+            table (str): The day meal table ("day_meals" or "day_meals_v2").
+            userID (int): The ID of the user.
+            batchSize (int): The number of day meals deleted per transaction.
+            pauseSeconds (float): Seconds to pause between two batches.
+            onBatch (callable or None): Called with the report after every committed batch.
+            report (dict): The progress report, whose `dayMeals` count is increased.
+        """
+        dateColumn = "fk_day_id" if table == "day_meals" else "meal_date"
+        shardCursor = self.dbWrapper.getShardCursor()
+        while True:
+            # A plain (non-locking) read; the deletes below only lock the rows of this batch by primary key.
+            shardCursor.execute(f"""
+                SELECT {dateColumn}, fk_meal_type_id, fk_meal_id FROM {table}
+                WHERE fk_user_id = %s
+                ORDER BY {dateColumn}, fk_meal_type_id
+                LIMIT %s
+            """, (userID, batchSize))
+            rows = shardCursor.fetchall()
+            if not rows:
+                return
+
+            shardCursor.executemany(
+                f"DELETE FROM {table} WHERE fk_user_id = %s AND {dateColumn} = %s AND fk_meal_type_id = %s",
+                [(userID, date, mealTypeID) for date, mealTypeID, _ in rows]
+            )
+            mealIDs = [mealID for _, _, mealID in rows if mealID is not None]
+            if mealIDs:
+                shardCursor.execute(f"DELETE FROM meals WHERE ID IN ({', '.join(['%s'] * len(mealIDs))})", mealIDs)
+            self.dbWrapper.getShardConnection().commit()
+
+            report["dayMeals"] += len(rows)
+            if onBatch is not None:
+                onBatch(report)
+            time.sleep(pauseSeconds)
+
+    def __purgeInBatches(self, table: str, orderColumn: str, reportKey: str, userID: int, batchSize: int, pauseSeconds: float, onBatch, report: dict) -> None:
+        """
+        Private helper deleting the rows of a user from a table without dependent rows in batches.
+
+        Args:
+            table (str): The table on the user's shard ("day_meals_archive" or "meal_changes").
+            orderColumn (str): The primary key column following `fk_user_id`, so each batch is a primary key range.
+            reportKey (str): The count of the report increased by the deleted rows.
+            userID (int): The ID of the user.
+            batchSize (int): The number of rows deleted per transaction.
+            pauseSeconds (float): Seconds to pause between two batches.
+            onBatch (callable or None): Called with the report after every committed batch.
+            report (dict): The progress report.
+        """
+        shardCursor = self.dbWrapper.getShardCursor()
+        while True:
+            shardCursor.execute(f"DELETE FROM {table} WHERE fk_user_id = %s ORDER BY {orderColumn} LIMIT %s", (userID, batchSize))
+            deleted = shardCursor.rowcount
+            self.dbWrapper.getShardConnection().commit()
+            report[reportKey] += deleted
+            if deleted < batchSize:
+                return
+            if onBatch is not None:
+                onBatch(report)
+            time.sleep(pauseSeconds)
@@ -0,0 +1,237 @@
+# Copyright (C) 2024 Patrick Michiels
+# All rights reserved.
+# This source code is licensed under the Evaluation License Agreement and
+# may not be used, modified, or distributed without explicit permission from the author.
+# This code is provided for evaluation purposes only.
+
+"""
+Minimal client for the Redis serialization protocol (RESP).
+
+The client talks to any Redis-protocol compatible server (Redis, Valkey, KeyDB, local stand-ins, ...) without
+requiring an additional pip dependency. It supports plain request/reply commands, which is all the shared stores of
+this API need, and subscribing a dedicated connection to pub/sub channels.
+
+Usage example:
+
+    # Connect lazily and run commands
+    client = RespClient("10.5.0.1", 6379)
+    client.execute("SET", "key", "value")
+    value = client.execute("GET", "key")  # b"value"
+
+    # Receive the messages of a channel on a dedicated client
+    subscriber = RespClient("10.5.0.1", 6379)
+    subscriber.subscribe("channel")
+    channel, message = subscriber.readMessage()
+"""
+
+import socket
+import threading
+
+
+class RespError(Exception):
+    """
+    Error reply returned by the server (e.g. "ERR unknown command").
+    """
+
+
+class RespClient:
+    """
+    Thread safe client running commands over a single RESP connection.
+
+    Attributes:
+        host (str): The host of the server.
+        port (int): The port of the server.
+        password (str): The password to authenticate with, or None.
+        db (int): The database index to select.
+        timeoutSeconds (float): The socket timeout for connecting and reading replies.
+    """
+
+    def __init__(self, host: str, port: int = 6379, password: str = None, db: int = 0, timeoutSeconds: float = 1.0):
+        """
+        Initializes the RespClient without connecting.
+
+        Args:
+            host (str): The host of the server.
+            port (int, optional): The port of the server. Defaults to 6379.
+            password (str, optional): The password to authenticate with. Defaults to None.
+            db (int, optional): The database index to select. Defaults to 0.
+            timeoutSeconds (float, optional): The socket timeout. Defaults to 1.0.
+        """
+        self.host = host
+        self.port = int(port)
+        self.password = password
+        self.db = int(db)
+        self.timeoutSeconds = timeoutSeconds
+        self.__socket = None
+        self.__reader = None
+        self.__lock = threading.Lock()
+
+    def execute(self, *args):
+        """
+        Runs a command and returns its reply, reconnecting once if the connection was lost.
+
+        Args:
+            *args: The command and its arguments (str, bytes, int or float).
+
+        Raises:
+            RespError: If the server answered with an error reply.
+            OSError: If the server cannot be reached.
+
+        Returns:
+            The reply: bytes for bulk strings, str for simple strings, int for integers, list for arrays, None for nil.
+        """
+        with self.__lock:
+            try:
+                return self.__executeLocked(args)
+            except (OSError, ConnectionError):
+                self.__closeLocked()
+                return self.__executeLocked(args)
+
+    def close(self) -> None:
+        """
+        Closes the connection. The next command reconnects.
+
+        A thread blocked in `readMessage()` is woken up and gets a ConnectionError.
+        """
+        if self.__socket is not None:
+            try:
+                self.__socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        with self.__lock:
+            self.__closeLocked()
+
+    def subscribe(self, *channels) -> None:
+        """
+        Connects and subscribes the connection to pub/sub channels.
+
+        Afterwards the connection only receives messages: use `readMessage()` instead of `execute()` until it is closed.
+
+        Args:
+            *channels: The channels to subscribe to.
+
+        Raises:
+            RespError: If the server answered with an error reply.
+            OSError: If the server cannot be reached.
+        """
+        with self.__lock:
+            self.__closeLocked()
+            self.__connectLocked()
+            self.__socket.sendall(self.__encodeCommand(("SUBSCRIBE", *channels)))
+            for _ in channels:
+                self.__readReply()
+            # Messages may take arbitrarily long to arrive.
+            self.__socket.settimeout(None)
+
+    def readMessage(self) -> tuple:
+        """
+        Blocks until the next message arrives on a subscribed connection.
+
+        Must only be called by one thread at a time; `close()` from another thread ends the wait.
+
+        Raises:
+            ConnectionError: If the connection was closed.
+            OSError: If the connection failed.
+
+        Returns:
+            tuple: The channel (str) and the message (bytes).
+        """
+        while True:
+            if self.__reader is None:
+                raise ConnectionError("RESP connection closed")
+            reply = self.__readReply()
+            if isinstance(reply, list) and len(reply) == 3 and reply[0] == b"message":
+                return reply[1].decode(), reply[2]
+
+    def __executeLocked(self, args):
+        """
+        Private helper sending a command and reading its reply. The caller must hold the lock.
+
+        Args:
+            args (tuple): The command and its arguments.
+
+        Returns:
+            The parsed reply.
+        """
+        if self.__socket is None:
+            self.__connectLocked()
+        self.__socket.sendall(self.__encodeCommand(args))
+        return self.__readReply()
+
+    def __connectLocked(self) -> None:
+        """
+        Private helper opening the connection, authenticating and selecting the database.
+        """
+        self.__socket = socket.create_connection((self.host, self.port), timeout=self.timeoutSeconds)
+        self.__reader = self.__socket.makefile("rb")
+        if self.password:
+            self.__socket.sendall(self.__encodeCommand(("AUTH", self.password)))
+            self.__readReply()
+        if self.db:
+            self.__socket.sendall(self.__encodeCommand(("SELECT", self.db)))
+            self.__readReply()
+
+    def __closeLocked(self) -> None:
+        """
+        Private helper closing the connection, ignoring errors.
+        """
+        for closable in (self.__reader, self.__socket):
+            try:
+                if closable is not None:
+                    closable.close()
+            except OSError:
+                pass
+        self.__socket = None
+        self.__reader = None
+
+    def __encodeCommand(self, args) -> bytes:
+        """
+        Private helper encoding a command as RESP array of bulk strings.
+
+        Args:
+            args (tuple): The command and its arguments.
+
+        Returns:
+            bytes: The encoded command.
+        """
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            argBytes = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(f"${len(argBytes)}\r\n".encode())
+            parts.append(argBytes + b"\r\n")
+        return b"".join(parts)
+
+    def __readReply(self):
+        """
+        Private helper reading and parsing one reply.
+
+        Raises:
+            RespError: If the server answered with an error reply.
+            ConnectionError: If the connection was closed.
+
+        Returns:
+            The parsed reply.
+        """
+        line = self.__reader.readline()
+        if not line:
+            raise ConnectionError("RESP connection closed by server")
+        prefix, payload = line[:1], line[1:-2]
+
+        if prefix == b"+":
+            return payload.decode()
+        if prefix == b"-":
+            raise RespError(payload.decode())
+        if prefix == b":":
+            return int(payload)
+        if prefix == b"$":
+            length = int(payload)
+            if length == -1:
+                return None
+            data = self.__reader.read(length + 2)
+            return data[:-2]
+        if prefix == b"*":
+            length = int(payload)
+            if length == -1:
+                return None
+            return [self.__readReply() for _ in range(length)]
+        raise ConnectionError(f"Unexpected RESP reply: {line!r}")
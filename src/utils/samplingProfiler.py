@@ -0,0 +1,274 @@
+# Copyright (C) 2024 Patrick Michiels
+# All rights reserved.
+# This source code is licensed under the Evaluation License Agreement and
+# may not be used, modified, or distributed without explicit permission from the author.
+# This code is provided for evaluation purposes only.
+
+"""
+On-demand sampling profiler for the live API.
+
+While a profiling session runs, a background thread periodically takes the stacks of all threads of the worker
+(`sys._current_frames()`) and counts identical stacks. Stacks cover everything that runs: the endpoints, the
+repositories, the MySQL driver and the server itself. Threads that are idle (waiting for a lock, a queue or the
+network selector) are skipped. The result is exported in the collapsed-stack format understood by flamegraph tools
+(`flamegraph.pl`, speedscope, ...): one line per distinct stack, frames separated by ";" followed by the sample count.
+
+Sessions run in one of two modes:
+    - "window": samples continuously for the given number of seconds.
+    - "requests": samples only while at least one request selected for profiling is in flight. A request is selected
+      if its path starts with the configured prefix and a random draw falls below the configured fraction.
+
+Without a running session no thread runs and `ProfilingMiddleware` only checks one attribute per request, so the
+overhead is near zero.
+
+Usage example:
+
+    # Profile 10 % of the /v1/getMeals requests for 60 seconds
+    profiler = SamplingProfiler()
+    profiler.start("requests", 60, fraction=0.1, pathPrefix="/v1/getMeals")
+
+    # Export for flamegraph.pl
+    collapsed = profiler.getCollapsedStacks()
+"""
+
+import os
+import random
+import sys
+import threading
+import time
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of all threads while a profiling session runs.
+
+    Attributes:
+        maxDistinctStacks (int): The maximum number of distinct stacks kept; further ones are counted as "[other]".
+        maxSeconds (float): The maximum length of a session.
+        active (bool): Whether a session is running.
+    """
+
+    MODES = ("window", "requests")
+
+    # Functions threads wait in while they are idle; stacks ending in them are not sampled.
+    IDLE_FUNCTIONS = {
+        ("threading.py", "wait"), ("threading.py", "_wait_for_tstate_lock"), ("queue.py", "get"), ("selectors.py", "select"),
+        ("thread.py", "_worker"), ("base_events.py", "_run_once"),
+    }
+
+    def __init__(self, maxDistinctStacks: int = 10000, maxSeconds: float = 600.0):
+        """
+        Initializes the SamplingProfiler without a running session.
+
+        Args:
+            maxDistinctStacks (int, optional): The maximum number of distinct stacks kept. Defaults to 10000.
+            maxSeconds (float, optional): The maximum length of a session. Defaults to 600.
+        """
+        self.maxDistinctStacks = maxDistinctStacks
+        self.maxSeconds = maxSeconds
+        self.active = False
+        self.__mode = None
+        self.__fraction = 1.0
+        self.__pathPrefix = ""
+        self.__intervalSeconds = 0.005
+        self.__startedAt = None
+        self.__endsAt = None
+        self.__activeRequests = 0
+        self.__profiledRequests = 0
+        self.__samples = 0
+        self.__counts = {}
+        self.__stop = threading.Event()
+        self.__thread = None
+        self.__lock = threading.Lock()
+
+    def start(self, mode: str, durationSeconds: float, fraction: float = 1.0, pathPrefix: str = "", intervalSeconds: float = 0.005) -> dict:
+        """
+        Starts a profiling session, discarding the samples of the previous one.
+
+        Args:
+            mode (str): "window" to sample continuously, "requests" to sample only during selected requests.
+            durationSeconds (float): The length of the session, at most `maxSeconds`.
+            fraction (float, optional): The share of matching requests profiled in "requests" mode. Defaults to 1.0.
+            pathPrefix (str, optional): Only requests whose path starts with it are profiled. Defaults to all.
+            intervalSeconds (float, optional): Seconds between two samples. Defaults to 0.005.
+
+        Raises:
+            ValueError: If a session is already running or the arguments are invalid.
+
+        Returns:
+            dict: The status of the new session.
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"mode must be one of {self.MODES}")
+        if not 0 < durationSeconds <= self.maxSeconds:
+            raise ValueError(f"durationSeconds must be between 0 and {self.maxSeconds}")
+        if not 0 < fraction <= 1 or not 0.001 <= intervalSeconds <= 1:
+            raise ValueError("fraction must be in (0, 1], intervalSeconds in [0.001, 1]")
+
+        with self.__lock:
+            if self.active:
+                raise ValueError("a profiling session is already running")
+            self.__mode = mode
+            self.__fraction = fraction
+            self.__pathPrefix = pathPrefix
+            self.__intervalSeconds = intervalSeconds
+            self.__startedAt = time.monotonic()
+            self.__endsAt = self.__startedAt + durationSeconds
+            self.__activeRequests = 0
+            self.__profiledRequests = 0
+            self.__samples = 0
+            self.__counts = {}
+            self.__stop.clear()
+            self.__thread = threading.Thread(target=self.__run, name="sampling-profiler", daemon=True)
+            self.active = True
+            self.__thread.start()
+        return self.getStatus()
+
+    def stop(self) -> dict:
+        """
+        Stops the running session (if any); its samples stay available for export.
+
+        Returns:
+            dict: The status of the stopped session.
+        """
+        self.__stop.set()
+        thread = self.__thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+        return self.getStatus()
+
+    def shouldProfileRequest(self, path: str) -> bool:
+        """
+        Decides whether a request is profiled in "requests" mode.
+
+        Args:
+            path (str): The path of the request.
+
+        Returns:
+            bool: True if the request matches the path prefix and was drawn, False otherwise.
+        """
+        return self.active and self.__mode == "requests" and path.startswith(self.__pathPrefix) and random.random() < self.__fraction
+
+    def beginRequest(self) -> None:
+        """
+        Marks the start of a profiled request, so samples are taken while it runs.
+        """
+        with self.__lock:
+            self.__activeRequests += 1
+            self.__profiledRequests += 1
+
+    def endRequest(self) -> None:
+        """
+        Marks the end of a profiled request.
+        """
+        with self.__lock:
+            self.__activeRequests -= 1
+
+    def getStatus(self) -> dict:
+        """
+        Returns the state of the current or last session.
+
+        Returns:
+            dict: The mode, whether it is active, the seconds left, the number of samples, profiled requests
+                  and distinct stacks.
+        """
+        with self.__lock:
+            return {
+                "active": self.active,
+                "mode": self.__mode,
+                "pathPrefix": self.__pathPrefix,
+                "fraction": self.__fraction,
+                "secondsLeft": max(0.0, round(self.__endsAt - time.monotonic(), 1)) if self.active else 0.0,
+                "samples": self.__samples,
+                "profiledRequests": self.__profiledRequests,
+                "distinctStacks": len(self.__counts),
+            }
+
+    def getCollapsedStacks(self) -> str:
+        """
+        Exports the samples in the collapsed-stack format.
+
+        Returns:
+            str: One line per distinct stack ("thread;outer frame;...;inner frame count"), most frequent first.
+        """
+        with self.__lock:
+            counts = sorted(self.__counts.items(), key=lambda item: item[1], reverse=True)
+        return "".join(f"{stack} {count}\n" for stack, count in counts)
+
+    def __run(self) -> None:
+        """
+        Private helper run by the sampling thread until the session ends.
+        """
+        ownThreadID = threading.get_ident()
+        try:
+            while not self.__stop.is_set() and time.monotonic() < self.__endsAt:
+                if self.__mode == "window" or self.__activeRequests > 0:
+                    self.__sample(ownThreadID)
+                self.__stop.wait(self.__intervalSeconds)
+        finally:
+            self.active = False
+
+    def __sample(self, ownThreadID: int) -> None:
+        """
+        Private helper taking one sample of the stacks of all busy threads.
+
+        Args:
+            ownThreadID (int): The ID of the sampling thread, which is skipped.
+        """
+        threadNames = {thread.ident: thread.name for thread in threading.enumerate()}
+        stacks = []
+        for threadID, frame in sys._current_frames().items():
+            if threadID == ownThreadID:
+                continue
+            leaf = (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name)
+            if leaf in self.IDLE_FUNCTIONS:
+                continue
+
+            frames = []
+            while frame is not None:
+                frames.append(f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}")
+                frame = frame.f_back
+            frames.append(threadNames.get(threadID, str(threadID)))
+            stacks.append(";".join(reversed(frames)))
+
+        with self.__lock:
+            self.__samples += 1
+            for stack in stacks:
+                if stack not in self.__counts and len(self.__counts) >= self.maxDistinctStacks:
+                    stack = "[other]"
+                self.__counts[stack] = self.__counts.get(stack, 0) + 1
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware marking the requests selected for profiling while a "requests" session runs.
+
+    Attributes:
+        app: The wrapped ASGI application.
+        profiler (SamplingProfiler): The profiler to mark requests with.
+    """
+
+    def __init__(self, app, profiler: SamplingProfiler):
+        """
+        Initializes the ProfilingMiddleware.
+
+        Args:
+            app: The wrapped ASGI application.
+            profiler (SamplingProfiler): The profiler to mark requests with.
+        """
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        """
+        Passes the request on, marking it as profiled if the running session selects it.
+        """
+        if not self.profiler.active or scope["type"] != "http" or not self.profiler.shouldProfileRequest(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        self.profiler.beginRequest()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.profiler.endRequest()
@@ -0,0 +1,451 @@
+# Copyright (C) 2024 Patrick Michiels
+# All rights reserved.
+# This source code is licensed under the Evaluation License Agreement and
+# may not be used, modified, or distributed without explicit permission from the author.
+# This code is provided for evaluation purposes only.
+
+"""
+Two-tier cache shared by all API nodes, with invalidation through pub/sub.
+
+Values are looked up in a small in-process tier (L1, a few seconds) first and then in a shared tier (L2) all nodes
+use, so a value read from the database by one node is a hit on every other node. Writes call `invalidate()`, which
+    - drops the entry from the own L1,
+    - replaces the L2 entry by a short-lived tombstone, so a read that started before the write cannot put its stale
+      result back (`set()` only fills absent keys),
+    - publishes the key, so every node drops it from its L1.
+A node that lost its subscription clears its whole L1 once it is subscribed again, as it may have missed messages.
+If the shared tier is unreachable, the cache reports misses and reads go to the database (fail open).
+
+The shared tier is a backend:
+    - InMemoryCacheBackend: Entries and pub/sub in process memory, for a single node and as local stand-in.
+    - RedisCacheBackend: Entries in a shared Redis-protocol server, invalidations over its pub/sub.
+Other shared stores can be plugged in by subclassing `CacheBackend`.
+
+Usage example:
+
+    # Create the cache from the config and start listening for invalidations
+    shared_cache = SharedCache.fromConfig(config_array)
+    shared_cache.start()
+
+    # Read through the cache
+    meals = shared_cache.get("meals:alice:2024-10-12")
+    if meals is None:
+        meals = read_meals_from_database()
+        shared_cache.set("meals:alice:2024-10-12", meals)
+
+    # After a write
+    shared_cache.invalidate("meals:alice:2024-10-12")
+"""
+
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+from src.utils.respClient import RespClient
+
+
+class CacheBackend(ABC):
+    """
+    Base class of the shared tiers.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> bytes or None:
+        """
+        Returns the value stored for a key.
+
+        Args:
+            key (str): The key.
+
+        Returns:
+            bytes or None: The value, None if the key is absent or expired.
+        """
+
+    @abstractmethod
+    def setIfAbsent(self, key: str, value: bytes, ttlSeconds: float) -> bool:
+        """
+        Stores a value unless the key exists (as value or tombstone).
+
+        Args:
+            key (str): The key.
+            value (bytes): The value.
+            ttlSeconds (float): Seconds until the entry expires.
+
+        Returns:
+            bool: True if the value was stored, False if the key existed.
+        """
+
+    @abstractmethod
+    def invalidate(self, key: str, value: bytes, ttlSeconds: float, channel: str) -> None:
+        """
+        Replaces the entry of a key by a tombstone and publishes the key on the invalidation channel.
+
+        Args:
+            key (str): The key.
+            value (bytes): The tombstone.
+            ttlSeconds (float): Seconds until the tombstone expires.
+            channel (str): The invalidation channel.
+        """
+
+    @abstractmethod
+    def listen(self, channel: str, onMessage, onSubscribed, stopEvent: threading.Event) -> None:
+        """
+        Receives the keys published on the invalidation channel until the stop event is set.
+
+        Args:
+            channel (str): The invalidation channel.
+            onMessage (callable): Called with every published key.
+            onSubscribed (callable): Called every time the subscription was (re-)established.
+            stopEvent (threading.Event): Ends listening once set.
+        """
+
+    def close(self) -> None:
+        """
+        Releases the resources of the backend (e.g. connections).
+        """
+
+
+class InMemoryCacheBackend(CacheBackend):
+    """
+    Backend keeping the entries in process memory and delivering invalidations to the listeners of this process.
+
+    Attributes:
+        maxKeys (int): The maximum number of entries; the least recently stored ones are evicted beyond it.
+    """
+
+    def __init__(self, maxKeys: int = 100000):
+        """
+        Initializes the InMemoryCacheBackend.
+
+        Args:
+            maxKeys (int, optional): The maximum number of entries. Defaults to 100000.
+        """
+        self.maxKeys = maxKeys
+        self.__entries = OrderedDict()
+        self.__listeners = []
+        self.__lock = threading.Lock()
+
+    def get(self, key: str) -> bytes or None:
+        """
+        Returns the value stored in memory for a key, None if it is absent or expired.
+        """
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None or entry[1] <= time.monotonic():
+                return None
+            return entry[0]
+
+    def setIfAbsent(self, key: str, value: bytes, ttlSeconds: float) -> bool:
+        """
+        Stores a value in memory unless the key exists.
+        """
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                return False
+            self.__storeLocked(key, value, ttlSeconds)
+            return True
+
+    def invalidate(self, key: str, value: bytes, ttlSeconds: float, channel: str) -> None:
+        """
+        Stores the tombstone and calls the listeners of the channel in this process.
+        """
+        with self.__lock:
+            self.__storeLocked(key, value, ttlSeconds)
+            listeners = [onMessage for listenerChannel, onMessage in self.__listeners if listenerChannel == channel]
+        for onMessage in listeners:
+            onMessage(key)
+
+    def listen(self, channel: str, onMessage, onSubscribed, stopEvent: threading.Event) -> None:
+        """
+        Registers the listener until the stop event is set; messages are delivered by `invalidate()`.
+        """
+        with self.__lock:
+            self.__listeners.append((channel, onMessage))
+        onSubscribed()
+        stopEvent.wait()
+        with self.__lock:
+            self.__listeners.remove((channel, onMessage))
+
+    def __storeLocked(self, key: str, value: bytes, ttlSeconds: float) -> None:
+        """
+        Private helper storing an entry and evicting the oldest ones beyond `maxKeys`. The caller must hold the lock.
+        """
+        self.__entries[key] = (value, time.monotonic() + ttlSeconds)
+        self.__entries.move_to_end(key)
+        while len(self.__entries) > self.maxKeys:
+            self.__entries.popitem(last=False)
+
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Backend keeping the entries in a shared Redis-protocol server and invalidating through its pub/sub.
+
+    Attributes:
+        client (RespClient): The client running the commands.
+        subscriber (RespClient): A dedicated client receiving the invalidations.
+        keyPrefix (str): The prefix of all cache keys.
+        reconnectSeconds (float): Seconds to wait before subscribing again after the subscription failed.
+    """
+
+    def __init__(self, client: RespClient, subscriber: RespClient, keyPrefix: str = "meal_tracker:cache:", reconnectSeconds: float = 1.0):
+        """
+        Initializes the RedisCacheBackend.
+
+        Args:
+            client (RespClient): The client running the commands.
+            subscriber (RespClient): A dedicated client receiving the invalidations.
+            keyPrefix (str, optional): The prefix of all cache keys. Defaults to "meal_tracker:cache:".
+            reconnectSeconds (float, optional): Seconds to wait before subscribing again. Defaults to 1.0.
+        """
+        self.client = client
+        self.subscriber = subscriber
+        self.keyPrefix = keyPrefix
+        self.reconnectSeconds = reconnectSeconds
+
+    def get(self, key: str) -> bytes or None:
+        """
+        Returns the value stored in the shared server for a key, None if it is absent.
+        """
+        return self.client.execute("GET", self.keyPrefix + key)
+
+    def setIfAbsent(self, key: str, value: bytes, ttlSeconds: float) -> bool:
+        """
+        Stores a value in the shared server unless the key exists (SET NX with expiry).
+        """
+        return self.client.execute("SET", self.keyPrefix + key, value, "PX", max(1, int(ttlSeconds * 1000)), "NX") is not None
+
+    def invalidate(self, key: str, value: bytes, ttlSeconds: float, channel: str) -> None:
+        """
+        Stores the tombstone in the shared server and publishes the key.
+        """
+        self.client.execute("SET", self.keyPrefix + key, value, "PX", max(1, int(ttlSeconds * 1000)))
+        self.client.execute("PUBLISH", self.keyPrefix + channel, key)
+
+    def listen(self, channel: str, onMessage, onSubscribed, stopEvent: threading.Event) -> None:
+        """
+        Receives the published keys on the subscriber connection, resubscribing after failures.
+        """
+        while not stopEvent.is_set():
+            try:
+                self.subscriber.subscribe(self.keyPrefix + channel)
+                onSubscribed()
+                while not stopEvent.is_set():
+                    onMessage(self.subscriber.readMessage()[1].decode())
+            except Exception as e:
+                if not stopEvent.is_set():
+                    print(f"Shared cache: invalidation subscription lost, resubscribing: {e}")
+                    stopEvent.wait(self.reconnectSeconds)
+
+    def close(self) -> None:
+        """
+        Closes both connections, which also ends listening.
+        """
+        self.subscriber.close()
+        self.client.close()
+
+
+class SharedCache:
+    """
+    Two-tier cache of JSON values: an in-process L1 in front of a shared backend (L2).
+
+    Attributes:
+        backend (CacheBackend): The shared tier.
+        l1Seconds (float): Seconds an entry is kept in the in-process tier.
+        l1MaxEntries (int): The maximum number of entries of the in-process tier.
+        l2Seconds (float): Seconds an entry is kept in the shared tier.
+        tombstoneSeconds (float): Seconds an invalidated key cannot be filled again; longer than any read takes.
+        channel (str): The pub/sub channel of the invalidations.
+    """
+
+    TOMBSTONE = b"__invalidated__"
+
+    def __init__(self, backend: CacheBackend, l1Seconds: float = 2.0, l1MaxEntries: int = 10000, l2Seconds: float = 60.0, tombstoneSeconds: float = 5.0, channel: str = "invalidations"):
+        """
+        Initializes the SharedCache; call `start()` to receive invalidations of other nodes.
+
+        Args:
+            backend (CacheBackend): The shared tier.
+            l1Seconds (float, optional): Seconds an entry is kept in process. Defaults to 2.0.
+            l1MaxEntries (int, optional): The maximum number of in-process entries. Defaults to 10000.
+            l2Seconds (float, optional): Seconds an entry is kept in the shared tier. Defaults to 60.0.
+            tombstoneSeconds (float, optional): Seconds an invalidated key cannot be filled again. Defaults to 5.0.
+            channel (str, optional): The pub/sub channel of the invalidations. Defaults to "invalidations".
+        """
+        self.backend = backend
+        self.l1Seconds = l1Seconds
+        self.l1MaxEntries = l1MaxEntries
+        self.l2Seconds = l2Seconds
+        self.tombstoneSeconds = tombstoneSeconds
+        self.channel = channel
+        self.__l1 = OrderedDict()
+        self.__counters = {"l1Hits": 0, "l2Hits": 0, "misses": 0, "invalidations": 0, "received": 0, "errors": 0}
+        self.__lock = threading.Lock()
+        self.__stop = threading.Event()
+        self.__listener = None
+
+    @classmethod
+    def fromConfig(cls, configArray: dict):
+        """
+        Creates the SharedCache configured in the `sharedCache` section of the config.
+
+        Args:
+            configArray (dict): The parsed `config.txt`.
+
+        Returns:
+            SharedCache or None: The cache, or None if it is disabled.
+        """
+        cacheConfig = configArray.get("sharedCache", {})
+        if not cacheConfig.get("enabled", False):
+            return None
+
+        if cacheConfig.get("backend", "memory") == "redis":
+            redisConfig = configArray["redis"]
+            clientArgs = (redisConfig["host"], redisConfig.get("port", 6379), redisConfig.get("password"), redisConfig.get("db", 0))
+            backend = RedisCacheBackend(RespClient(*clientArgs), RespClient(*clientArgs))
+        else:
+            backend = InMemoryCacheBackend(cacheConfig.get("maxKeys", 100000))
+        return cls(
+            backend,
+            cacheConfig.get("l1Seconds", 2.0),
+            cacheConfig.get("l1MaxEntries", 10000),
+            cacheConfig.get("l2Seconds", 60.0),
+            cacheConfig.get("tombstoneSeconds", 5.0)
+        )
+
+    def start(self) -> None:
+        """
+        Starts receiving the invalidations published by all nodes in a background thread.
+        """
+        self.__stop.clear()
+        self.__listener = threading.Thread(
+            target=self.backend.listen,
+            args=(self.channel, self.__dropFromL1, self.clearL1, self.__stop),
+            name="shared-cache-invalidations",
+            daemon=True
+        )
+        self.__listener.start()
+
+    def close(self) -> None:
+        """
+        Stops receiving invalidations and releases the backend.
+        """
+        self.__stop.set()
+        self.backend.close()
+
+    def get(self, key: str):
+        """
+        Returns the cached value of a key, looking in process first and in the shared tier second.
+
+        Args:
+            key (str): The key.
+
+        Returns:
+            The cached value, None on a miss (or if the shared tier is unreachable).
+        """
+        now = time.monotonic()
+        with self.__lock:
+            entry = self.__l1.get(key)
+            if entry is not None and entry[1] > now:
+                self.__counters["l1Hits"] += 1
+                return entry[0]
+
+        try:
+            storedValue = self.backend.get(key)
+        except Exception as e:
+            self.__countError("get", e)
+            return None
+        if storedValue is None or storedValue == self.TOMBSTONE:
+            self.__count("misses")
+            return None
+
+        value = json.loads(storedValue)
+        self.__storeInL1(key, value)
+        self.__count("l2Hits")
+        return value
+
+    def set(self, key: str, value) -> bool:
+        """
+        Caches a value read from the database, unless the key was invalidated meanwhile.
+
+        Args:
+            key (str): The key.
+            value: The JSON serializable value.
+
+        Returns:
+            bool: True if the value was cached, False if the key existed (or the shared tier is unreachable).
+        """
+        try:
+            stored = self.backend.setIfAbsent(key, json.dumps(value, separators=(",", ":")).encode(), self.l2Seconds)
+        except Exception as e:
+            self.__countError("set", e)
+            return False
+        if stored:
+            self.__storeInL1(key, value)
+        return stored
+
+    def invalidate(self, key: str) -> None:
+        """
+        Drops a key on all nodes after a write and keeps reads that started before from filling it again.
+
+        Args:
+            key (str): The key.
+        """
+        self.__dropFromL1(key, received=False)
+        self.__count("invalidations")
+        try:
+            self.backend.invalidate(key, self.TOMBSTONE, self.tombstoneSeconds, self.channel)
+        except Exception as e:
+            self.__countError("invalidate", e)
+
+    def clearL1(self) -> None:
+        """
+        Drops all entries of the in-process tier (e.g. after invalidations may have been missed).
+        """
+        with self.__lock:
+            self.__l1.clear()
+
+    def getStatistics(self) -> dict:
+        """
+        Returns the hit and invalidation counters.
+
+        Returns:
+            dict: The L1 and L2 hits, misses, sent and received invalidations, backend errors and L1 entries.
+        """
+        with self.__lock:
+            return {**self.__counters, "l1Entries": len(self.__l1)}
+
+    def __storeInL1(self, key: str, value) -> None:
+        """
+        Private helper storing a value in process, evicting the oldest entries beyond `l1MaxEntries`.
+        """
+        with self.__lock:
+            self.__l1[key] = (value, time.monotonic() + self.l1Seconds)
+            self.__l1.move_to_end(key)
+            while len(self.__l1) > self.l1MaxEntries:
+                self.__l1.popitem(last=False)
+
+    def __dropFromL1(self, key: str, received: bool = True) -> None:
+        """
+        Private helper dropping a key from the in-process tier, counting invalidations received from the channel.
+        """
+        with self.__lock:
+            self.__l1.pop(key, None)
+            if received:
+                self.__counters["received"] += 1
+
+    def __count(self, counter: str) -> None:
+        """
+        Private helper incrementing a counter.
+        """
+        with self.__lock:
+            self.__counters[counter] += 1
+
+    def __countError(self, operation: str, error: Exception) -> None:
+        """
+        Private helper counting and printing a failed backend operation.
+        """
+        self.__count("errors")
+        print(f"Shared cache: {operation} failed, falling back to the database: {error}")
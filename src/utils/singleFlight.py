@@ -0,0 +1,107 @@
+# Copyright (C) 2024 Patrick Michiels
+# All rights reserved.
+# This source code is licensed under the Evaluation License Agreement and
+# may not be used, modified, or distributed without explicit permission from the author.
+# This code is provided for evaluation purposes only.
+
+"""
+Single-flight coalescing of identical concurrent reads.
+
+While a read for a key is in flight, further callers asking for the same key do not start another run; they wait for
+the running one and share its result (or its exception). The read itself runs in a worker thread, so the event loop
+keeps serving other requests meanwhile and identical requests arriving in that time can actually join it.
+
+Only reads whose result is identical for every caller of a key may be coalesced, so the key has to contain everything
+the result depends on (e.g. the credentials and the requested day).
+
+Usage example:
+
+    # Create one instance per kind of read
+    meal_reads = SingleFlight()
+
+    # Identical concurrent calls share one execution of read_meals_of_day
+    result = await meal_reads.do(("getMeals", user_name, 2024, 10, 12), read_meals_of_day, get_meals_item)
+
+    # Inspect the counters
+    print(meal_reads.getStatistics())  # {"calls": 3, "executions": 1, "coalesced": 2, "inFlight": 0}
+"""
+
+import asyncio
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls into one execution per key.
+
+    Must only be used from the event loop thread.
+
+    Attributes:
+        calls (int): The number of calls made.
+        executions (int): The number of calls that actually executed the function.
+        coalesced (int): The number of calls that shared the result of an execution already in flight.
+    """
+
+    def __init__(self):
+        """
+        Initializes the SingleFlight without any call in flight.
+        """
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+        self.__inFlight = {}
+
+    async def do(self, key, function, *args):
+        """
+        Runs a function in a worker thread, or joins the run already in flight for the same key.
+
+        Args:
+            key: Any hashable key identifying the read (including everything its result depends on).
+            function: The blocking function to run.
+            *args: The arguments passed to the function.
+
+        Raises:
+            Exception: Whatever the function raised, for the caller that started it and all callers that joined.
+
+        Returns:
+            The result of the function.
+        """
+        self.calls += 1
+        inFlight = self.__inFlight.get(key)
+        if inFlight is not None:
+            self.coalesced += 1
+        else:
+            self.executions += 1
+            inFlight = asyncio.ensure_future(asyncio.to_thread(function, *args))
+            self.__inFlight[key] = inFlight
+            inFlight.add_done_callback(lambda finished: self.__onFinished(key, finished))
+
+        # Shielded, so a cancelled caller (e.g. client disconnect) does not cancel the run shared with the others.
+        return await asyncio.shield(inFlight)
+
+    def __onFinished(self, key, finished: asyncio.Future) -> None:
+        """
+        Private helper removing a finished run, so later calls for the key start a new one.
+
+        Args:
+            key: The key of the finished run.
+            finished (asyncio.Future): The finished run.
+        """
+        if self.__inFlight.get(key) is finished:
+            del self.__inFlight[key]
+        # Mark a failure as retrieved, in case every caller was cancelled meanwhile.
+        if not finished.cancelled():
+            finished.exception()
+
+    def getStatistics(self) -> dict:
+        """
+        Returns the counters of the single-flight layer.
+
+        Returns:
+            dict: The number of calls, executions, coalesced calls and reads currently in flight.
+        """
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "inFlight": len(self.__inFlight),
+        }
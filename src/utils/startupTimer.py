@@ -0,0 +1,103 @@
+# Copyright (C) 2024 Patrick Michiels
+# All rights reserved.
+# This source code is licensed under the Evaluation License Agreement and
+# may not be used, modified, or distributed without explicit permission from the author.
+# This code is provided for evaluation purposes only.
+
+"""
+Measures the phases of the cold start of a worker against a time budget.
+
+Every phase (import, config, logger, database, ...) is timed separately, so a slow start can be traced to its cause.
+The report is checked against the budget (`startup.budgetSeconds` in `config.txt`) once the worker is ready.
+
+Usage example:
+
+    # Start timing as early as possible
+    startup_timer = StartupTimer()
+
+    # Time the phases
+    with startup_timer.measure("config"):
+        config_array = loadConfig()
+    startup_timer.record("databaseConnect", 0.12)
+
+    # Report once ready
+    report = startup_timer.getReport()
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+
+class StartupTimer:
+    """
+    Collects the durations of the startup phases of a worker.
+
+    Attributes:
+        startedAt (float): The `time.perf_counter()` value the startup began at.
+        budgetSeconds (float or None): The startup time budget, None if there is none.
+    """
+
+    def __init__(self, startedAt: float = None, budgetSeconds: float = None):
+        """
+        Initializes the StartupTimer.
+
+        Args:
+            startedAt (float, optional): The `time.perf_counter()` value the startup began at. Defaults to now.
+            budgetSeconds (float, optional): The startup time budget. Defaults to None.
+        """
+        self.startedAt = time.perf_counter() if startedAt is None else startedAt
+        self.budgetSeconds = budgetSeconds
+        self.__phases = {}
+        self.__readyAt = None
+        self.__lock = threading.Lock()
+
+    @contextmanager
+    def measure(self, phase: str):
+        """
+        Times the enclosed block as a phase.
+
+        Args:
+            phase (str): The name of the phase.
+        """
+        phaseStartedAt = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(phase, time.perf_counter() - phaseStartedAt)
+
+    def record(self, phase: str, seconds: float) -> None:
+        """
+        Records the duration of a phase measured elsewhere.
+
+        Args:
+            phase (str): The name of the phase.
+            seconds (float): The duration of the phase.
+        """
+        with self.__lock:
+            self.__phases[phase] = seconds
+
+    def markReady(self) -> None:
+        """
+        Marks the end of the startup (the worker can serve every request).
+        """
+        with self.__lock:
+            if self.__readyAt is None:
+                self.__readyAt = time.perf_counter()
+
+    def getReport(self) -> dict:
+        """
+        Returns the durations of the phases and the total startup time.
+
+        Returns:
+            dict: The seconds per phase, the total seconds until ready (None while not ready), the budget and whether
+                  the total exceeded it.
+        """
+        with self.__lock:
+            totalSeconds = None if self.__readyAt is None else self.__readyAt - self.startedAt
+            return {
+                "phases": {phase: round(seconds, 4) for phase, seconds in self.__phases.items()},
+                "totalSeconds": None if totalSeconds is None else round(totalSeconds, 4),
+                "budgetSeconds": self.budgetSeconds,
+                "overBudget": totalSeconds is not None and self.budgetSeconds is not None and totalSeconds > self.budgetSeconds,
+            }
@@ -0,0 +1,567 @@
+# Copyright (C) 2024 Patrick Michiels
+# All rights reserved.
+# This source code is licensed under the Evaluation License Agreement and
+# may not be used, modified, or distributed without explicit permission from the author.
+# This code is provided for evaluation purposes only.
+
+"""
+Request tracing with nested spans, from the endpoint through the repositories down to every SQL statement.
+
+`TracingMiddleware` starts a trace per request (continuing the trace of an incoming W3C `traceparent` header) and
+returns the `traceparent` of the request span in the response. Within a trace, `span()` opens nested spans; the
+current span is kept in a context variable, so it follows the request into worker threads (`asyncio.to_thread`).
+Repositories returned by `traceRepository()` and cursors returned by `traceCursor()` open a span per call and per SQL
+execute, with timings and row counts. Statements are recorded without their parameters.
+
+Outside of a trace, `span()`, `traceRepository()` and `traceCursor()` only check the context variable and return
+the plain objects, so disabled or unsampled requests pay almost nothing.
+
+Finished traces are written by `JsonLinesSpanExporter` as OTLP/JSON (one `ExportTraceServiceRequest` per line), the
+format the `otlpjsonfile` receiver of the OpenTelemetry Collector reads.
+
+Usage example:
+
+    # Trace every request, writing the spans to traces/spans.jsonl
+    tracer = Tracer(JsonLinesSpanExporter("traces/spans.jsonl"))
+    app = FastAPI(middleware=[Middleware(TracingMiddleware, tracer=tracer)])
+
+    # Nested span in a request
+    with span("mealTypeResolution") as current_span:
+        ...
+        if current_span is not None:
+            current_span.setAttribute("mealTypes", 3)
+"""
+
+import contextvars
+import json
+import os
+import queue
+import random
+import re
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+
+
+_currentSpan = contextvars.ContextVar("currentSpan", default=None)
+
+# OTLP span kinds and status codes.
+SPAN_KINDS = {"internal": 1, "server": 2, "client": 3}
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+# Longest SQL statement recorded; longer ones are cut.
+MAX_STATEMENT_LENGTH = 500
+
+_traceparentPattern = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+
+class Span:
+    """
+    One timed operation of a trace.
+
+    Attributes:
+        name (str): The name of the operation.
+        traceID (str): The 32 hex digit ID of the trace.
+        spanID (str): The 16 hex digit ID of the span.
+        parentSpanID (str or None): The ID of the enclosing span, None for the root of a trace without parent.
+        kind (str): "server", "client" or "internal".
+        attributes (dict): The attributes recorded on the span.
+        error (str or None): The error the operation failed with.
+    """
+
+    def __init__(self, name: str, traceID: str, parentSpanID: str or None, kind: str, attributes: dict, traceSpans: list):
+        """
+        Initializes and starts the Span.
+
+        Args:
+            name (str): The name of the operation.
+            traceID (str): The ID of the trace.
+            parentSpanID (str or None): The ID of the enclosing span.
+            kind (str): "server", "client" or "internal".
+            attributes (dict): The initial attributes.
+            traceSpans (list): The finished spans of the trace, the span is appended once it ends.
+        """
+        self.name = name
+        self.traceID = traceID
+        self.spanID = secrets.token_hex(8)
+        self.parentSpanID = parentSpanID
+        self.kind = kind
+        self.attributes = attributes
+        self.error = None
+        self.traceSpans = traceSpans
+        self.startNs = time.time_ns()
+        self.endNs = None
+
+    def setAttribute(self, key: str, value) -> None:
+        """
+        Records an attribute on the span.
+
+        Args:
+            key (str): The name of the attribute.
+            value: A str, int, float or bool value.
+        """
+        self.attributes[key] = value
+
+    def end(self) -> None:
+        """
+        Ends the span and adds it to the finished spans of its trace.
+        """
+        self.endNs = time.time_ns()
+        self.traceSpans.append(self)
+
+    def getTraceparent(self) -> str:
+        """
+        Returns the W3C traceparent header value identifying this span as parent.
+
+        Returns:
+            str: The traceparent ("00-<trace ID>-<span ID>-01").
+        """
+        return f"00-{self.traceID}-{self.spanID}-01"
+
+    def toOtlp(self) -> dict:
+        """
+        Returns the span in the OTLP/JSON encoding.
+
+        Returns:
+            dict: The OTLP span.
+        """
+        otlpSpan = {
+            "traceId": self.traceID,
+            "spanId": self.spanID,
+            "name": self.name,
+            "kind": SPAN_KINDS[self.kind],
+            "startTimeUnixNano": str(self.startNs),
+            "endTimeUnixNano": str(self.endNs),
+            "attributes": _toOtlpAttributes(self.attributes),
+            "status": {"code": STATUS_ERROR, "message": self.error} if self.error is not None else {"code": STATUS_OK},
+        }
+        if self.parentSpanID is not None:
+            otlpSpan["parentSpanId"] = self.parentSpanID
+        return otlpSpan
+
+
+def getCurrentSpan() -> Span or None:
+    """
+    Returns the span of the current context.
+
+    Returns:
+        Span or None: The current span, None outside of a (sampled) trace.
+    """
+    return _currentSpan.get()
+
+
+@contextmanager
+def span(name: str, kind: str = "internal", **attributes):
+    """
+    Opens a span nested in the current one for the enclosed block; does nothing outside of a trace.
+
+    Exceptions raised in the block mark the span as failed and are re-raised.
+
+    Args:
+        name (str): The name of the operation.
+        kind (str, optional): "internal" or "client". Defaults to "internal".
+        **attributes: The initial attributes of the span.
+
+    Yields:
+        Span or None: The new span, None outside of a trace.
+    """
+    parent = _currentSpan.get()
+    if parent is None:
+        yield None
+        return
+
+    childSpan = Span(name, parent.traceID, parent.spanID, kind, attributes, parent.traceSpans)
+    token = _currentSpan.set(childSpan)
+    try:
+        yield childSpan
+    except Exception as e:
+        childSpan.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _currentSpan.reset(token)
+        childSpan.end()
+
+
+def traceCursor(cursor, targetName: str):
+    """
+    Returns the cursor wrapped so every execute opens a SQL span, or the cursor itself outside of a trace.
+
+    Args:
+        cursor: The MySQL cursor.
+        targetName (str): The name of the database server the cursor belongs to (e.g. "primary", "shard0").
+
+    Returns:
+        TracedCursor or the cursor.
+    """
+    if _currentSpan.get() is None:
+        return cursor
+    return TracedCursor(cursor, targetName)
+
+
+def traceRepository(repository):
+    """
+    Returns the repository wrapped so every public method call opens a span, or the repository outside of a trace.
+
+    Args:
+        repository: The repository instance.
+
+    Returns:
+        TracedRepository or the repository.
+    """
+    if _currentSpan.get() is None:
+        return repository
+    return TracedRepository(repository)
+
+
+class TracedCursor:
+    """
+    Cursor proxy opening a "client" span per execute, recording the statement, the target and the row count.
+
+    All other attributes (fetchone, rowcount, lastrowid, ...) are passed through to the wrapped cursor.
+    """
+
+    def __init__(self, cursor, targetName: str):
+        """
+        Initializes the TracedCursor.
+
+        Args:
+            cursor: The MySQL cursor to wrap.
+            targetName (str): The name of the database server the cursor belongs to.
+        """
+        self.__cursor = cursor
+        self.__targetName = targetName
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        """
+        Executes the statement on the wrapped cursor inside a SQL span.
+        """
+        with self.__sqlSpan(operation) as sqlSpan:
+            result = self.__cursor.execute(operation, params, *args, **kwargs)
+            sqlSpan.setAttribute("db.response.returned_rows", self.__cursor.rowcount)
+            return result
+
+    def executemany(self, operation, seqParams, *args, **kwargs):
+        """
+        Executes the statement for every parameter set on the wrapped cursor inside one SQL span.
+        """
+        with self.__sqlSpan(operation) as sqlSpan:
+            sqlSpan.setAttribute("db.operation.batch.size", len(seqParams))
+            result = self.__cursor.executemany(operation, seqParams, *args, **kwargs)
+            sqlSpan.setAttribute("db.response.returned_rows", self.__cursor.rowcount)
+            return result
+
+    def __getattr__(self, name):
+        """
+        Passes all other attributes through to the wrapped cursor.
+        """
+        return getattr(self.__cursor, name)
+
+    def __sqlSpan(self, operation):
+        """
+        Private helper opening the span of one statement.
+
+        Args:
+            operation (str): The SQL statement (without parameters).
+        """
+        statement = " ".join(str(operation).split())
+        return span(
+            f"SQL {statement.split(' ', 1)[0].upper()}",
+            "client",
+            **{"db.system": "mysql", "db.target": self.__targetName, "db.statement": statement[:MAX_STATEMENT_LENGTH]}
+        )
+
+
+class TracedRepository:
+    """
+    Repository proxy opening a span named "<Repository>.<method>" per public method call.
+
+    List results record their length as "result.count". Other attributes are passed through unchanged.
+    """
+
+    def __init__(self, repository):
+        """
+        Initializes the TracedRepository.
+
+        Args:
+            repository: The repository instance to wrap.
+        """
+        self.__repository = repository
+        self.__repositoryName = type(repository).__name__
+
+    def __getattr__(self, name):
+        """
+        Returns the attribute of the wrapped repository, wrapping public methods in a span.
+        """
+        attribute = getattr(self.__repository, name)
+        if name.startswith("_") or not callable(attribute):
+            return attribute
+
+        spanName = f"{self.__repositoryName}.{name}"
+
+        def tracedCall(*args, **kwargs):
+            with span(spanName) as repositorySpan:
+                result = attribute(*args, **kwargs)
+                if repositorySpan is not None and isinstance(result, list):
+                    repositorySpan.setAttribute("result.count", len(result))
+                return result
+
+        return tracedCall
+
+
+class Tracer:
+    """
+    Starts traces, samples them and hands finished traces to the exporter.
+
+    Attributes:
+        exporter (JsonLinesSpanExporter): The exporter of finished traces.
+        sampleRate (float): The share of requests without sampled parent that are traced.
+        serviceName (str): The service name recorded as resource attribute.
+    """
+
+    def __init__(self, exporter, sampleRate: float = 1.0, serviceName: str = "meal-tracker-api"):
+        """
+        Initializes the Tracer.
+
+        Args:
+            exporter (JsonLinesSpanExporter): The exporter of finished traces.
+            sampleRate (float, optional): The share of requests without sampled parent that are traced. Defaults to 1.0.
+            serviceName (str, optional): The service name. Defaults to "meal-tracker-api".
+        """
+        self.exporter = exporter
+        self.sampleRate = sampleRate
+        self.serviceName = serviceName
+
+    @classmethod
+    def fromConfig(cls, configArray: dict, defaultFilePath: str):
+        """
+        Creates the Tracer from the `tracing` section of the config.
+
+        Args:
+            configArray (dict): The parsed config.
+            defaultFilePath (str): The span file used if `tracing.filePath` is not set.
+
+        Returns:
+            Tracer or None: The Tracer, None if tracing is disabled.
+        """
+        tracingConfig = configArray.get("tracing", {})
+        if not tracingConfig.get("enabled", False):
+            return None
+        exporter = JsonLinesSpanExporter(tracingConfig.get("filePath") or defaultFilePath, tracingConfig.get("maxBacklog", 10000))
+        return cls(exporter, tracingConfig.get("sampleRate", 1.0), tracingConfig.get("serviceName", "meal-tracker-api"))
+
+    @contextmanager
+    def startTrace(self, name: str, traceparent: str = None, **attributes):
+        """
+        Opens the root span of a request for the enclosed block and exports the trace afterwards.
+
+        A valid incoming traceparent is continued (same trace ID, its span as parent) and decides the sampling;
+        otherwise a new trace is sampled with `sampleRate`.
+
+        Args:
+            name (str): The name of the request span.
+            traceparent (str, optional): The incoming W3C traceparent header. Defaults to None.
+            **attributes: The initial attributes of the request span.
+
+        Yields:
+            Span or None: The request span, None if the request is not sampled.
+        """
+        traceID, parentSpanID, sampled = None, None, random.random() < self.sampleRate
+        match = _traceparentPattern.match(traceparent.strip().lower()) if traceparent else None
+        if match is not None and match.group(1) != "0" * 32:
+            traceID, parentSpanID, sampled = match.group(1), match.group(2), int(match.group(3), 16) & 1 == 1
+        if not sampled:
+            yield None
+            return
+
+        rootSpan = Span(name, traceID or secrets.token_hex(16), parentSpanID, "server", attributes, [])
+        token = _currentSpan.set(rootSpan)
+        try:
+            yield rootSpan
+        except Exception as e:
+            rootSpan.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _currentSpan.reset(token)
+            rootSpan.end()
+            self.exporter.export(self.serviceName, rootSpan.traceSpans)
+
+    def close(self, timeoutSeconds: float = 5.0) -> bool:
+        """
+        Writes the traces still queued in the exporter.
+
+        Args:
+            timeoutSeconds (float, optional): The maximum number of seconds to wait. Defaults to 5.
+
+        Returns:
+            bool: True if all traces were written, False otherwise.
+        """
+        return self.exporter.close(timeoutSeconds)
+
+
+class JsonLinesSpanExporter:
+    """
+    Writes finished traces as OTLP/JSON lines to a file in a background thread.
+
+    Every trace is written with a single append, so several worker processes can share the file.
+
+    Attributes:
+        filePath (str): The file the traces are appended to.
+        maxBacklog (int): The maximum number of queued traces; further traces are dropped.
+        dropped (int): The number of traces dropped because the backlog was full.
+    """
+
+    def __init__(self, filePath: str, maxBacklog: int = 10000):
+        """
+        Initializes the JsonLinesSpanExporter; the writer thread starts with the first trace.
+
+        Args:
+            filePath (str): The file the traces are appended to.
+            maxBacklog (int, optional): The maximum number of queued traces. Defaults to 10000.
+        """
+        self.filePath = filePath
+        self.maxBacklog = maxBacklog
+        self.dropped = 0
+        self.__queue = queue.Queue()
+        self.__thread = None
+        self.__lock = threading.Lock()
+
+    def export(self, serviceName: str, spans: list) -> None:
+        """
+        Queues the spans of a finished trace for writing.
+
+        Args:
+            serviceName (str): The service name recorded as resource attribute.
+            spans (list): The finished spans of the trace.
+        """
+        if self.__queue.qsize() >= self.maxBacklog:
+            self.dropped += 1
+            return
+        if self.__thread is None:
+            with self.__lock:
+                if self.__thread is None:
+                    self.__thread = threading.Thread(target=self.__run, name="span-exporter", daemon=True)
+                    self.__thread.start()
+        self.__queue.put((serviceName, list(spans)))
+
+    def close(self, timeoutSeconds: float = 5.0) -> bool:
+        """
+        Waits until the queued traces are written.
+
+        Args:
+            timeoutSeconds (float, optional): The maximum number of seconds to wait. Defaults to 5.
+
+        Returns:
+            bool: True if all traces were written, False otherwise.
+        """
+        deadline = time.monotonic() + timeoutSeconds
+        while self.__queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return not self.__queue.unfinished_tasks
+
+    def __run(self) -> None:
+        """
+        Private helper run by the writer thread, appending one line per trace.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(self.filePath)), exist_ok=True)
+        fileDescriptor = os.open(self.filePath, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        while True:
+            serviceName, spans = self.__queue.get()
+            try:
+                line = json.dumps(self.__toExportRequest(serviceName, spans), separators=(",", ":")) + "\n"
+                os.write(fileDescriptor, line.encode())
+            except Exception as e:
+                print(f"JsonLinesSpanExporter: could not write trace: {e}")
+            finally:
+                self.__queue.task_done()
+
+    def __toExportRequest(self, serviceName: str, spans: list) -> dict:
+        """
+        Private helper building the OTLP/JSON ExportTraceServiceRequest of a trace.
+
+        Args:
+            serviceName (str): The service name recorded as resource attribute.
+            spans (list): The finished spans of the trace.
+
+        Returns:
+            dict: The export request.
+        """
+        return {"resourceSpans": [{
+            "resource": {"attributes": _toOtlpAttributes({"service.name": serviceName, "process.pid": os.getpid()})},
+            "scopeSpans": [{"scope": {"name": "src.utils.tracing"}, "spans": [finishedSpan.toOtlp() for finishedSpan in spans]}],
+        }]}
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware running every HTTP request in a trace and returning its traceparent.
+
+    Attributes:
+        app: The wrapped ASGI application.
+        tracer (Tracer): The tracer starting the traces.
+    """
+
+    def __init__(self, app, tracer: Tracer):
+        """
+        Initializes the TracingMiddleware.
+
+        Args:
+            app: The wrapped ASGI application.
+            tracer (Tracer): The tracer starting the traces.
+        """
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope, receive, send):
+        """
+        Serves the request inside a trace, recording the response status and adding the traceparent header.
+        """
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        traceparent = None
+        for headerName, headerValue in scope["headers"]:
+            if headerName == b"traceparent":
+                traceparent = headerValue.decode("latin-1")
+                break
+
+        with self.tracer.startTrace(f"{scope['method']} {scope['path']}", traceparent, **{"http.request.method": scope["method"], "url.path": scope["path"]}) as requestSpan:
+            if requestSpan is None:
+                await self.app(scope, receive, send)
+                return
+
+            async def sendWithTraceparent(message):
+                if message["type"] == "http.response.start":
+                    requestSpan.setAttribute("http.response.status_code", message["status"])
+                    if message["status"] >= 500:
+                        requestSpan.error = f"HTTP {message['status']}"
+                    message = {**message, "headers": [*message.get("headers", []), (b"traceparent", requestSpan.getTraceparent().encode())]}
+                await send(message)
+
+            await self.app(scope, receive, sendWithTraceparent)
+
+
+def _toOtlpAttributes(attributes: dict) -> list:
+    """
+    Private helper converting attributes into the OTLP/JSON key-value list.
+
+    Args:
+        attributes (dict): The attributes.
+
+    Returns:
+        list: The OTLP attributes.
+    """
+    otlpAttributes = []
+    for key, value in attributes.items():
+        if isinstance(value, bool):
+            otlpValue = {"boolValue": value}
+        elif isinstance(value, int):
+            otlpValue = {"intValue": str(value)}
+        elif isinstance(value, float):
+            otlpValue = {"doubleValue": value}
+        else:
+            otlpValue = {"stringValue": str(value)}
+        otlpAttributes.append({"key": key, "value": otlpValue})
+    return otlpAttributes
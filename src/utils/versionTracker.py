@@ -0,0 +1,173 @@
+# Copyright (C) 2024 Patrick Michiels
+# All rights reserved.
+# This source code is licensed under the Evaluation License Agreement and
+# may not be used, modified, or distributed without explicit permission from the author.
+# This code is provided for evaluation purposes only.
+
+"""
+In-memory version tracking used to build ETags for read endpoints.
+
+Every tracked key (for example a user/day combination) gets a version number that is bumped whenever the data behind
+the key changes. Read endpoints embed that version in an ETag, so a client sending the ETag back in an `If-None-Match`
+header can be answered with `304 Not Modified` after looking only at the version, without querying the database.
+
+Versions live in the memory of one process. With several worker processes a write on one worker does not bump the
+versions of the others, so the API only answers `304` with a single worker (see `main_api_startpoint`).
+
+Versions are drawn from one global, ever increasing counter. A key that is evicted from the bounded map and later seen
+again therefore gets a fresh version that can never collide with an ETag issued before the eviction. A random nonce
+created per tracker instance is part of every ETag, so ETags issued before a restart never match afterwards.
+
+Functions:
+    - getVersion: Returns the current version of a key, assigning a fresh one to unknown keys.
+    - bumpVersion: Marks the data behind a key as changed.
+    - evictKeysWithPrefix: Marks the data behind all keys starting with a prefix as changed (e.g. of a deleted user).
+    - buildETag: Builds a quoted ETag for a key, bound to a caller fingerprint.
+    - isETagCurrent: Checks an `If-None-Match` header value against the current ETag of a key.
+
+Usage example:
+
+    # Initialize the tracker
+    version_tracker = VersionTracker(maxEntries=100000)
+
+    # Bump the version after a write
+    version_tracker.bumpVersion(("meals", "john", 2024, 10, 12))
+
+    # Answer a conditional read
+    if version_tracker.isETagCurrent(key, fingerprint, request_if_none_match):
+        return Response(status_code=304)
+"""
+
+import hashlib
+import secrets
+import threading
+from collections import OrderedDict
+
+
+class VersionTracker:
+    """
+    Tracks a version number per key and builds ETags from it.
+
+    Attributes:
+        maxEntries (int): The maximum number of keys kept in memory before the least recently used ones are evicted.
+    """
+
+    def __init__(self, maxEntries: int = 100000):
+        """
+        Initializes the VersionTracker.
+
+        Args:
+            maxEntries (int, optional): The maximum number of keys kept in memory. Defaults to 100000.
+        """
+        self.maxEntries = maxEntries
+        self.__versions = OrderedDict()
+        self.__counter = 0
+        self.__nonce = secrets.token_hex(4)
+        self.__lock = threading.Lock()
+
+    def getEntryCount(self) -> int:
+        """
+        Returns the number of keys currently tracked (how warm the ETag cache is).
+
+        Returns:
+            int: The number of tracked keys, at most `maxEntries`.
+        """
+        return len(self.__versions)
+
+    def getVersion(self, key) -> int:
+        """
+        Returns the current version of a key, assigning a fresh version to keys that are not tracked yet.
+
+        Args:
+            key: Any hashable key identifying the tracked data.
+
+        Returns:
+            int: The current version of the key.
+        """
+        with self.__lock:
+            version = self.__versions.get(key)
+            if version is None:
+                return self.__assignNewVersion(key)
+            self.__versions.move_to_end(key)
+            return version
+
+    def bumpVersion(self, key) -> int:
+        """
+        Marks the data behind a key as changed by assigning it a new version.
+
+        Args:
+            key: Any hashable key identifying the tracked data.
+
+        Returns:
+            int: The new version of the key.
+        """
+        with self.__lock:
+            return self.__assignNewVersion(key)
+
+    def evictKeysWithPrefix(self, prefix: tuple) -> int:
+        """
+        Marks the data behind all tuple keys starting with a prefix as changed by evicting them, so they get a fresh
+        version when they are seen again.
+
+        Args:
+            prefix (tuple): The leading elements of the keys to evict (e.g. ("meals", "john")).
+
+        Returns:
+            int: The number of evicted keys.
+        """
+        with self.__lock:
+            evictedKeys = [key for key in self.__versions if isinstance(key, tuple) and key[:len(prefix)] == prefix]
+            for key in evictedKeys:
+                del self.__versions[key]
+            return len(evictedKeys)
+
+    def buildETag(self, key, fingerprint: str = "") -> str:
+        """
+        Builds a quoted ETag for the current version of a key.
+
+        Args:
+            key: Any hashable key identifying the tracked data.
+            fingerprint (str, optional): A caller specific value (e.g. derived from the credentials) the ETag is bound to,
+                                         so an ETag only matches for the caller it was issued to. Defaults to "".
+
+        Returns:
+            str: The quoted ETag.
+        """
+        version = self.getVersion(key)
+        fingerprintHash = hashlib.sha256(f"{key}|{fingerprint}".encode()).hexdigest()[:16]
+        return f'"{self.__nonce}-{version}-{fingerprintHash}"'
+
+    def isETagCurrent(self, key, fingerprint: str, ifNoneMatch: str or None) -> bool:
+        """
+        Checks whether the value of an `If-None-Match` header matches the current ETag of a key.
+
+        Args:
+            key: Any hashable key identifying the tracked data.
+            fingerprint (str): The caller specific value the ETag was bound to.
+            ifNoneMatch (str or None): The raw `If-None-Match` header value (may hold several comma separated ETags).
+
+        Returns:
+            bool: True if one of the passed ETags is the current one, False otherwise.
+        """
+        if not ifNoneMatch:
+            return False
+        currentETag = self.buildETag(key, fingerprint)
+        passedETags = [eTag.strip().removeprefix("W/") for eTag in ifNoneMatch.split(",")]
+        return currentETag in passedETags
+
+    def __assignNewVersion(self, key) -> int:
+        """
+        Private helper assigning the next global counter value to a key. The caller must hold the lock.
+
+        Args:
+            key: Any hashable key identifying the tracked data.
+
+        Returns:
+            int: The newly assigned version.
+        """
+        self.__counter += 1
+        self.__versions[key] = self.__counter
+        self.__versions.move_to_end(key)
+        while len(self.__versions) > self.maxEntries:
+            self.__versions.popitem(last=False)
+        return self.__counter
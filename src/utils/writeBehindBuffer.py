@@ -0,0 +1,380 @@
+# Copyright (C) 2024 Patrick Michiels
+# All rights reserved.
+# This source code is licensed under the Evaluation License Agreement and
+# may not be used, modified, or distributed without explicit permission from the author.
+# This code is provided for evaluation purposes only.
+
+"""
+Write-behind buffer for meal writes.
+
+Validated writes of `/v1/addMeal` and `/v1/editMeal` are appended to a durable local journal (JSON lines, fsynced
+before the request is acknowledged) instead of being committed to MySQL one by one. A background thread flushes the
+pending writes in batched transactions (one per shard), so bursts cost one commit per batch instead of one per write.
+
+Durability and recovery:
+    - Every process writes its own journal file and holds an exclusive lock (`flock`) on a matching lock file.
+    - Flushed writes are recorded by appending a marker line; the journal is truncated once nothing is pending.
+    - On startup, journals whose lock file is not held by a live process (i.e. left behind by a crash) are replayed:
+      their pending writes are adopted into the journal of the starting process and flushed like new writes.
+    - Flushing creates or updates the day meal, so replaying a write that was already committed is harmless.
+
+Reads merge the pending writes (`getPendingMeals()`), so users always see their own writes before they are flushed.
+
+Usage example:
+
+    # Create the buffer (replays crashed journals) and start flushing
+    write_behind_buffer = WriteBehindBuffer(db_wrapper, logger, "/code/journal")
+    write_behind_buffer.start()
+
+    # Acknowledge a write once it is journaled
+    write_behind_buffer.enqueue("add", user_id, 2024, 10, 12, meal_type_id, "lunch", 1, 2)
+
+    # Flush everything and stop on shutdown
+    write_behind_buffer.stop()
+"""
+
+import fcntl
+import glob
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class WriteBehindBuffer:
+    """
+    Durable journal of meal writes that are flushed to the database in batches.
+
+    Attributes:
+        dbWrapper: The database wrapper used to flush the writes.
+        logger: The logger to record flush results and errors with.
+        journalDirectory (str): The directory holding the journal and lock files of all processes.
+        flushIntervalSeconds (float): Seconds between two flushes of the background thread.
+        maxBatchSize (int): The maximum number of writes flushed in one transaction.
+    """
+
+    def __init__(self, dbWrapper, logger, journalDirectory: str, flushIntervalSeconds: float = 1.0, maxBatchSize: int = 200):
+        """
+        Initializes the WriteBehindBuffer, creating the own journal and replaying journals left behind by crashes.
+
+        Args:
+            dbWrapper: The database wrapper used to flush the writes.
+            logger: The logger to record flush results and errors with.
+            journalDirectory (str): The directory holding the journal and lock files of all processes.
+            flushIntervalSeconds (float, optional): Seconds between two flushes. Defaults to 1.0.
+            maxBatchSize (int, optional): The maximum number of writes per transaction. Defaults to 200.
+        """
+        self.dbWrapper = dbWrapper
+        self.logger = logger
+        self.journalDirectory = journalDirectory
+        self.flushIntervalSeconds = flushIntervalSeconds
+        self.maxBatchSize = maxBatchSize
+
+        self.__lock = threading.Lock()
+        self.__flushLock = threading.Lock()
+        self.__pending = OrderedDict()
+        self.__lastSeq = 0
+        self.__stopEvent = threading.Event()
+        self.__flushThread = None
+
+        # Lock the own lock file before it gets its final name, so no other process can mistake it for an orphan.
+        os.makedirs(journalDirectory, exist_ok=True)
+        journalName = f"journal-{os.getpid()}-{int(time.time() * 1000)}"
+        temporaryLockPath = os.path.join(journalDirectory, f".{journalName}.lock.tmp")
+        self.__lockFile = open(temporaryLockPath, "w")
+        fcntl.flock(self.__lockFile, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self.__lockPath = os.path.join(journalDirectory, f"{journalName}.lock")
+        os.rename(temporaryLockPath, self.__lockPath)
+        self.__journalPath = os.path.join(journalDirectory, f"{journalName}.jsonl")
+        self.__journal = open(self.__journalPath, "a")
+
+        self.__adoptOrphanedJournals()
+
+    def start(self) -> None:
+        """
+        Starts the background thread flushing the pending writes every `flushIntervalSeconds`.
+        """
+        if self.__flushThread is None:
+            self.__flushThread = threading.Thread(target=self.__flushLoop, name="write-behind-flush", daemon=True)
+            self.__flushThread.start()
+
+    def stop(self) -> int:
+        """
+        Stops the background thread and flushes all pending writes.
+
+        Returns:
+            int: The number of writes still pending (they stay in the journal and are replayed on the next start).
+        """
+        self.__stopEvent.set()
+        if self.__flushThread is not None:
+            self.__flushThread.join()
+            self.__flushThread = None
+        self.flushAll()
+
+        stillPending = self.getPendingCount()
+        if stillPending == 0:
+            # Nothing to replay, so the own journal and lock file can go.
+            with self.__lock:
+                self.__journal.close()
+                os.remove(self.__journalPath)
+                os.remove(self.__lockPath)
+                self.__lockFile.close()
+        return stillPending
+
+    def enqueue(self, operation: str, userID: int, year: int, month: int, day: int, mealTypeID: int, mealType: str, fatLevel: int, sugarLevel: int) -> int:
+        """
+        Appends a validated meal write to the journal and syncs it to disk.
+
+        Args:
+            operation (str): The operation ("add" or "edit").
+            userID (int): The ID of the user.
+            year (int): The year of the meal.
+            month (int): The month of the meal.
+            day (int): The day of the meal.
+            mealTypeID (int): The ID of the meal type.
+            mealType (str): The name of the meal type.
+            fatLevel (int): The fat level of the meal (0: Low, 1: Medium, 2: High).
+            sugarLevel (int): The sugar level of the meal (0: Low, 1: Medium, 2: High).
+
+        Returns:
+            int: The sequence number of the write in the journal.
+        """
+        entry = {
+            "op": operation,
+            "userID": userID,
+            "year": year,
+            "month": month,
+            "day": day,
+            "mealTypeID": mealTypeID,
+            "mealType": mealType,
+            "fat_level": fatLevel,
+            "sugar_level": sugarLevel,
+        }
+        with self.__lock:
+            return self.__appendEntryLocked(entry)
+
+    def getPendingMeals(self, userID: int, year: int, month: int, day: int) -> dict:
+        """
+        Returns the latest pending write per meal type of a user on a specific day.
+
+        Args:
+            userID (int): The ID of the user.
+            year (int): The year of the day.
+            month (int): The month of the day.
+            day (int): The day of the month.
+
+        Returns:
+            dict: The pending writes keyed by meal type name.
+        """
+        with self.__lock:
+            return {
+                entry["mealType"]: entry for entry in self.__pending.values()
+                if (entry["userID"], entry["year"], entry["month"], entry["day"]) == (userID, year, month, day)
+            }
+
+    def hasPendingMeal(self, userID: int, year: int, month: int, day: int, mealTypeID: int = None) -> bool:
+        """
+        Returns whether writes of a user on a specific day (and meal type) are pending.
+
+        Args:
+            userID (int): The ID of the user.
+            year (int): The year of the day.
+            month (int): The month of the day.
+            day (int): The day of the month.
+            mealTypeID (int, optional): The ID of the meal type, or None for any meal type. Defaults to None.
+
+        Returns:
+            bool: True if at least one matching write is pending.
+        """
+        with self.__lock:
+            for entry in self.__pending.values():
+                if (entry["userID"], entry["year"], entry["month"], entry["day"]) != (userID, year, month, day):
+                    continue
+                if mealTypeID is None or entry["mealTypeID"] == mealTypeID:
+                    return True
+            return False
+
+    def hasPendingMealsOfUser(self, userID: int) -> bool:
+        """
+        Returns whether writes of a user on any day are pending.
+
+        Args:
+            userID (int): The ID of the user.
+
+        Returns:
+            bool: True if at least one write of the user is pending.
+        """
+        with self.__lock:
+            return any(entry["userID"] == userID for entry in self.__pending.values())
+
+    def getPendingCount(self) -> int:
+        """
+        Returns the number of writes not flushed to the database yet.
+
+        Returns:
+            int: The number of pending writes.
+        """
+        with self.__lock:
+            return len(self.__pending)
+
+    def flushAll(self) -> int:
+        """
+        Flushes batches until nothing is pending or a batch makes no progress (e.g. the database is down).
+
+        Returns:
+            int: The number of flushed writes.
+        """
+        flushedTotal = 0
+        while True:
+            flushed = self.flushBatch()
+            flushedTotal += flushed
+            if flushed == 0 or self.getPendingCount() == 0:
+                return flushedTotal
+
+    def flushBatch(self) -> int:
+        """
+        Flushes up to `maxBatchSize` pending writes, using one transaction per shard.
+
+        Writes of users whose meal data is being moved to another shard stay pending, together with all later writes
+        of those users, so the order per user is kept.
+
+        Returns:
+            int: The number of flushed writes.
+        """
+        with self.__flushLock:
+            with self.__lock:
+                batch = list(self.__pending.values())[:self.maxBatchSize]
+            if not batch:
+                return 0
+
+            # Group the writes by shard, keeping their order.
+            entriesByShard = OrderedDict()
+            deferredUserIDs = set()
+            for entry in batch:
+                shardEntry = self.dbWrapper.getShardEntryOfUser(entry["userID"]) if self.dbWrapper.isShardingEnabled() else {"shard_index": None, "is_moving": False}
+                if entry["userID"] in deferredUserIDs or shardEntry["is_moving"]:
+                    deferredUserIDs.add(entry["userID"])
+                    continue
+                entriesByShard.setdefault(shardEntry["shard_index"], []).append(entry)
+
+            flushedSeqs = []
+            for shardIndex, entries in entriesByShard.items():
+                self.dbWrapper.useShardOfUser(entries[0]["userID"])
+                if self.dbWrapper.getDayMealRepo().upsertDayMeals(entries) is True:
+                    flushedSeqs.extend(entry["seq"] for entry in entries)
+                else:
+                    self.logger.logError(f"write-behind: failed to flush {len(entries)} writes to shard {shardIndex}")
+
+            if flushedSeqs:
+                with self.__lock:
+                    self.__markFlushedLocked(flushedSeqs)
+            return len(flushedSeqs)
+
+    def __flushLoop(self) -> None:
+        """
+        Private helper run by the background thread, flushing until `stop()` is called.
+        """
+        while not self.__stopEvent.wait(self.flushIntervalSeconds):
+            try:
+                self.flushAll()
+            except Exception as e:
+                self.logger.logError(f"write-behind: flush failed: {e}")
+
+    def __appendEntryLocked(self, entry: dict) -> int:
+        """
+        Private helper assigning the next sequence number to a write and appending it durably. The caller must hold the lock.
+
+        Args:
+            entry (dict): The write to append.
+
+        Returns:
+            int: The sequence number of the write.
+        """
+        self.__lastSeq += 1
+        entry = {**entry, "seq": self.__lastSeq}
+        self.__writeJournalLineLocked(entry)
+        self.__pending[entry["seq"]] = entry
+        return entry["seq"]
+
+    def __markFlushedLocked(self, flushedSeqs: list) -> None:
+        """
+        Private helper recording flushed writes in the journal and dropping them from the pending ones.
+        The caller must hold the lock.
+
+        Args:
+            flushedSeqs (list): The sequence numbers of the flushed writes.
+        """
+        for seq in flushedSeqs:
+            self.__pending.pop(seq, None)
+        if self.__pending:
+            self.__writeJournalLineLocked({"flushed": flushedSeqs})
+        else:
+            # Nothing pending anymore, so the whole journal can be dropped.
+            self.__journal.truncate(0)
+            self.__journal.flush()
+            os.fsync(self.__journal.fileno())
+
+    def __writeJournalLineLocked(self, line: dict) -> None:
+        """
+        Private helper appending one line to the own journal and syncing it to disk. The caller must hold the lock.
+
+        Args:
+            line (dict): The line to append.
+        """
+        self.__journal.write(json.dumps(line) + "\n")
+        self.__journal.flush()
+        os.fsync(self.__journal.fileno())
+
+    def __adoptOrphanedJournals(self) -> None:
+        """
+        Private helper replaying the journals of crashed processes by adopting their pending writes.
+        """
+        for lockPath in glob.glob(os.path.join(self.journalDirectory, "journal-*.lock")):
+            journalPath = lockPath[:-len(".lock")] + ".jsonl"
+            if journalPath == self.__journalPath:
+                continue
+
+            with open(lockPath, "a") as orphanLockFile:
+                try:
+                    fcntl.flock(orphanLockFile, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    continue  # Held by a live process.
+
+                pendingEntries = self.__readPendingEntries(journalPath)
+                with self.__lock:
+                    for entry in pendingEntries:
+                        self.__appendEntryLocked({key: value for key, value in entry.items() if key != "seq"})
+                if os.path.exists(journalPath):
+                    os.remove(journalPath)
+                os.remove(lockPath)
+
+            if pendingEntries:
+                self.logger.logWarning(f"write-behind: replayed {len(pendingEntries)} pending writes of crashed journal {journalPath}")
+
+    def __readPendingEntries(self, journalPath: str) -> list:
+        """
+        Private helper reading the writes of a journal that were not flushed yet.
+
+        Args:
+            journalPath (str): The path of the journal.
+
+        Returns:
+            list: The pending writes in journal order.
+        """
+        if not os.path.exists(journalPath):
+            return []
+
+        entries = OrderedDict()
+        with open(journalPath) as journal:
+            for line in journal:
+                try:
+                    parsedLine = json.loads(line)
+                except ValueError:
+                    continue  # Partially written last line of a crash; it was never acknowledged.
+                if "flushed" in parsedLine:
+                    for seq in parsedLine["flushed"]:
+                        entries.pop(seq, None)
+                else:
+                    entries[parsedLine["seq"]] = parsedLine
+        return list(entries.values())
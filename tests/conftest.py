@@ -0,0 +1,21 @@
+"""
+Shared setup of the unit tests.
+
+The tests import the API modules from the repository root, so they run from any working directory. The API reads
+`config.txt` when its modules are imported; the tests use the values of `config.txt.template` instead, so they run
+without a local configuration.
+"""
+
+import json
+import os
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from src.utils import configLoader  # noqa: E402
+
+with open(os.path.join(REPO_ROOT, "config.txt.template")) as config_file:
+    configLoader._cachedConfig = json.load(config_file)
@@ -0,0 +1,62 @@
+"""
+Unit tests of the per-thread connections of a database server.
+"""
+
+import threading
+
+from src.utils.connectionTarget import ConnectionTarget
+
+
+class FakeConnection:
+    """Connection remembering whether it was closed."""
+
+    def __init__(self):
+        self.closed = False
+
+    def cursor(self, buffered=False):
+        return object()
+
+    def close(self):
+        self.closed = True
+
+
+class FakeTarget(ConnectionTarget):
+    """Target handing out fake connections, keeping every one it opened."""
+
+    def __init__(self):
+        super().__init__("primary", {})
+        self.opened = []
+
+    def openDedicatedConnection(self):
+        self.opened.append(FakeConnection())
+        return self.opened[-1]
+
+
+def connect_in_thread(target: ConnectionTarget, closeAfterwards: bool = False) -> None:
+    """Connects the target from a short-lived thread."""
+    def run():
+        target.connect()
+        if closeAfterwards:
+            target.closeThreadConnection()
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join()
+
+
+def test_closed_thread_connection_is_released():
+    target = FakeTarget()
+    connect_in_thread(target, closeAfterwards=True)
+    assert target.opened[0].closed
+    assert target.getOpenConnectionCount() == 0
+    assert target.healthy
+
+
+def test_connections_of_exited_threads_are_closed_on_next_connect():
+    target = FakeTarget()
+    connect_in_thread(target)
+    assert target.getOpenConnectionCount() == 1
+
+    target.connect()
+    assert target.opened[0].closed
+    assert not target.opened[1].closed
+    assert target.getOpenConnectionCount() == 1
@@ -0,0 +1,93 @@
+"""
+Unit tests of the writes of archived day meals.
+"""
+
+import datetime
+
+from src.utils.repositories.dayMealRepo import DayMealRepo
+from src.utils.repositories.mealRepo import MealRepo
+
+
+class ScriptedCursor:
+    """Cursor recording its statements, answering SELECTs from a list and reporting a fixed row count."""
+
+    def __init__(self, rows: list, rowcount: int = 1):
+        self.statements = []
+        self.rowcount = rowcount
+        self.lastrowid = 99
+        self.__rows = list(rows)
+
+    def execute(self, statement: str, params: tuple = ()):
+        self.statements.append(" ".join(statement.split()))
+
+    def fetchone(self):
+        return self.__rows.pop(0)
+
+
+class FakeConnection:
+    """Connection counting commits."""
+
+    def __init__(self):
+        self.commits = 0
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        pass
+
+
+class FakeDbWrapper:
+    """Database wrapper in schema v2 with inline levels and archiving enabled."""
+
+    schemaVersion = "v2"
+    inlineMealLevels = "on"
+    mealChangeLog = False
+
+    def __init__(self, cursor: ScriptedCursor):
+        self.cursor = cursor
+        self.connection = FakeConnection()
+
+    def getShardCursor(self):
+        return self.cursor
+
+    def getShardReadCursor(self):
+        return self.cursor
+
+    def getShardConnection(self):
+        return self.connection
+
+    def getArchiveHorizonDate(self):
+        return datetime.date(2020, 1, 1)
+
+    def recordWrite(self):
+        pass
+
+
+def test_archived_day_meal_is_found():
+    db_wrapper = FakeDbWrapper(ScriptedCursor([None, (2, 1)]))
+    day_meal = DayMealRepo(db_wrapper).getDayMealByDate(7, 2019, 5, 1, 3)
+    assert day_meal["archived"] is True
+    assert (day_meal["fk_meal_id"], day_meal["fat_level"], day_meal["sugar_level"]) == (None, 2, 1)
+    assert "FROM day_meals_archive" in db_wrapper.cursor.statements[1]
+
+
+def test_adding_archived_meal_type_is_rejected():
+    db_wrapper = FakeDbWrapper(ScriptedCursor([(2, 1)]))
+    assert DayMealRepo(db_wrapper).createNewDayMealByDate(7, 2019, 5, 1, 3, 0, 0) is None
+    assert not any(statement.startswith("INSERT") for statement in db_wrapper.cursor.statements)
+
+
+def test_editing_archived_meal_moves_it_back():
+    db_wrapper = FakeDbWrapper(ScriptedCursor([None]))
+    assert DayMealRepo(db_wrapper).updateDayMealLevelsByDate(7, 2019, 5, 1, 3, None, 2, 2) is True
+    statements = db_wrapper.cursor.statements
+    assert statements[1].startswith("DELETE FROM day_meals_archive")
+    assert statements[2].startswith("INSERT INTO day_meals_v2")
+    assert db_wrapper.connection.commits == 1
+
+
+def test_deleting_archived_meal_deletes_archive_row():
+    db_wrapper = FakeDbWrapper(ScriptedCursor([]))
+    assert MealRepo(db_wrapper).deleteMealByDate(7, 2019, 5, 1, 3, None) is True
+    assert any(statement.startswith("DELETE FROM day_meals_archive") for statement in db_wrapper.cursor.statements)
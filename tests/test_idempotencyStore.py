@@ -0,0 +1,113 @@
+"""
+Unit tests of the replay of responses stored per idempotency key.
+"""
+
+import asyncio
+
+import pytest
+
+from src.utils.idempotencyStore import IdempotencyKeyConflictError, IdempotencyStore
+
+
+def make_request(responses, status_code=200):
+    """Returns a coroutine function counting its runs in `responses` and answering with the given status code."""
+    async def run():
+        responses.append(status_code)
+        await asyncio.sleep(0.01)
+        return status_code, {"content-type": "application/json"}, f'{{"run": {len(responses)}}}'.encode()
+    return run
+
+
+def test_repeated_request_is_replayed():
+    store = IdempotencyStore()
+    runs = []
+
+    async def scenario():
+        first = await store.execute(("/v1/addMeal", "user", "key"), "digest", make_request(runs))
+        second = await store.execute(("/v1/addMeal", "user", "key"), "digest", make_request(runs))
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert len(runs) == 1
+    assert first[:3] == second[:3]
+    assert (first[3], second[3]) == (False, True)
+    assert store.getStatistics()["replayed"] == 1
+
+
+def test_concurrent_duplicates_share_one_run():
+    store = IdempotencyStore()
+    runs = []
+
+    async def scenario():
+        return await asyncio.gather(*(store.execute(("/v1/addMeal", "user", "key"), "digest", make_request(runs)) for _ in range(4)))
+
+    results = asyncio.run(scenario())
+    assert len(runs) == 1
+    assert [result[3] for result in results] == [False, True, True, True]
+    assert store.getStatistics()["coalesced"] == 3
+
+
+def test_key_reused_for_other_request_conflicts():
+    store = IdempotencyStore()
+
+    async def scenario():
+        await store.execute(("/v1/addMeal", "user", "key"), "digest", make_request([]))
+        await store.execute(("/v1/addMeal", "user", "key"), "other digest", make_request([]))
+
+    with pytest.raises(IdempotencyKeyConflictError):
+        asyncio.run(scenario())
+
+
+def test_keys_are_scoped():
+    store = IdempotencyStore()
+    runs = []
+
+    async def scenario():
+        await store.execute(("/v1/addMeal", "alice", "key"), "digest", make_request(runs))
+        await store.execute(("/v1/addMeal", "bob", "key"), "digest", make_request(runs))
+
+    asyncio.run(scenario())
+    assert len(runs) == 2
+
+
+def test_server_errors_are_not_stored():
+    store = IdempotencyStore()
+    runs = []
+
+    async def scenario():
+        await store.execute(("/v1/addMeal", "user", "key"), "digest", make_request(runs, 503))
+        return await store.execute(("/v1/addMeal", "user", "key"), "digest", make_request(runs, 200))
+
+    assert asyncio.run(scenario())[0] == 200
+    assert runs == [503, 200]
+
+
+
+def test_expired_responses_run_again():
+    now = [1000.0]
+    store = IdempotencyStore(ttlSeconds=60, clock=lambda: now[0])
+    runs = []
+
+    async def scenario():
+        await store.execute(("/v1/addMeal", "user", "key"), "digest", make_request(runs))
+        now[0] += 59
+        replayed = await store.execute(("/v1/addMeal", "user", "key"), "digest", make_request(runs))
+        now[0] += 2
+        return replayed, await store.execute(("/v1/addMeal", "user", "key"), "digest", make_request(runs))
+
+    replayed, ran_again = asyncio.run(scenario())
+    assert (replayed[3], ran_again[3]) == (True, False)
+    assert len(runs) == 2
+
+
+def test_oldest_responses_are_dropped_beyond_max_entries():
+    store = IdempotencyStore(maxEntries=2)
+    runs = []
+
+    async def scenario():
+        for key in ("a", "b", "c", "a"):
+            await store.execute(("/v1/addMeal", "user", key), "digest", make_request(runs))
+
+    asyncio.run(scenario())
+    assert len(runs) == 4
+    assert store.getStatistics()["entries"] == 2
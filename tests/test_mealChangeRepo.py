@@ -0,0 +1,88 @@
+"""
+Unit tests of the compaction of the meal change log.
+"""
+
+from src.utils.repositories.mealChangeRepo import MealChangeRepo
+
+
+class FakeCursor:
+    """Cursor recording its statements and answering with scripted row counts and rows."""
+
+    def __init__(self, rowcounts: list, rows: list):
+        self.statements = []
+        self.rowcount = 0
+        self.__rowcounts = list(rowcounts)
+        self.__rows = list(rows)
+
+    def execute(self, statement: str, params: tuple = ()):
+        self.statements.append((" ".join(statement.split()), params))
+        self.rowcount = self.__rowcounts.pop(0) if self.__rowcounts else 0
+
+    def fetchone(self):
+        return self.__rows.pop(0)
+
+
+class FakeConnection:
+    """Connection counting commits and rollbacks."""
+
+    def __init__(self):
+        self.commits = 0
+        self.rollbacks = 0
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+class FakeDbWrapper:
+    """Database wrapper handing out the fake cursor and connection."""
+
+    def __init__(self, cursor: FakeCursor):
+        self.cursor = cursor
+        self.connection = FakeConnection()
+        self.updates = 0
+
+    def getShardCursor(self):
+        return self.cursor
+
+    def getShardConnection(self):
+        return self.connection
+
+    def updateOwnClassVars(self):
+        self.updates += 1
+
+
+def test_compaction_removes_superseded_and_expired_changes():
+    cursor = FakeCursor(rowcounts=[4, 1, 3, 1], rows=[(17,)])
+    db_wrapper = FakeDbWrapper(cursor)
+
+    assert MealChangeRepo(db_wrapper).compactChanges(7, 30) == {"superseded": 4, "expired": 3}
+    statements = [statement for statement, _ in cursor.statements]
+    assert statements[0].startswith("DELETE c FROM meal_changes c JOIN meal_changes newer")
+    assert cursor.statements[1][1] == (7, 30)
+    assert cursor.statements[2] == ("DELETE FROM meal_changes WHERE fk_user_id = %s AND seq <= %s", (7, 17))
+    # The compacted sequence number only moves forward, so clients behind it are told to resync.
+    assert "GREATEST(compacted_seq, %s)" in statements[3] and cursor.statements[3][1] == (17, 7)
+    assert db_wrapper.connection.commits == 1
+
+
+def test_compaction_without_expired_changes_keeps_compacted_seq():
+    cursor = FakeCursor(rowcounts=[2], rows=[(None,)])
+    db_wrapper = FakeDbWrapper(cursor)
+
+    assert MealChangeRepo(db_wrapper).compactChanges(7, 30) == {"superseded": 2, "expired": 0}
+    assert len(cursor.statements) == 2
+    assert db_wrapper.connection.commits == 1
+
+
+def test_compaction_rolls_back_and_gives_up_after_retry():
+    cursor = FakeCursor(rowcounts=[], rows=[])
+    db_wrapper = FakeDbWrapper(cursor)
+
+    # fetchone fails on both attempts, as there is no scripted row.
+    assert MealChangeRepo(db_wrapper).compactChanges(7, 30) is None
+    assert db_wrapper.connection.rollbacks == 2
+    assert db_wrapper.updates == 1
+    assert db_wrapper.connection.commits == 0
@@ -0,0 +1,68 @@
+"""
+Unit tests of the packing of the month overview.
+"""
+
+import base64
+
+from main_api_startpoint import pack_month_overview
+
+MEAL_TYPES = [{"ID": 1, "name": "breakfast"}, {"ID": 2, "name": "lunch"}, {"ID": 3, "name": "dinner"}]
+
+
+def overview_day(day: int, mask: int, fat: int = -1, sugar: int = -1, month: int = 2, year: int = 2024) -> dict:
+    """Returns one row of the day overview."""
+    return {"year": year, "month": month, "day": day, "mealTypeMask": mask, "maxFatLevel": fat, "maxSugarLevel": sugar}
+
+
+def test_month_masks_have_one_byte_per_day():
+    overview = pack_month_overview(2024, 2, [overview_day(1, 0b011), overview_day(29, 0b100)], MEAL_TYPES, False)
+    masks = base64.b64decode(overview["mealTypeMasks"])
+    assert overview["days"] == 29
+    assert overview["firstDay"] == "2024-02-01"
+    assert overview["mealTypes"] == ["breakfast", "lunch", "dinner"]
+    assert overview["mealTypeMaskBytes"] == 1
+    assert len(masks) == 29
+    assert masks[0] == 0b011 and masks[28] == 0b100
+    assert not any(masks[1:28])
+    assert "levels" not in overview
+
+
+def test_levels_pack_two_days_per_byte():
+    days = [overview_day(1, 1, 0, 2), overview_day(2, 1, 2, 1), overview_day(3, 1)]
+    levels = base64.b64decode(pack_month_overview(2024, 2, days, MEAL_TYPES, True)["levels"])
+    assert len(levels) == 15
+    # Day 1 in the high nibble, day 2 in the low nibble; each is (fat + 1) << 2 | (sugar + 1), 0 for no level.
+    assert levels[0] == (1 << 2 | 3) << 4 | (3 << 2 | 2)
+    assert levels[1] == 0
+
+
+def test_whole_year_for_month_zero():
+    overview = pack_month_overview(2024, 0, [overview_day(31, 1, month=12)], MEAL_TYPES, True)
+    masks = base64.b64decode(overview["mealTypeMasks"])
+    assert overview["days"] == 366
+    assert len(masks) == 366 and masks[365] == 1
+    assert len(base64.b64decode(overview["levels"])) == 183
+
+
+def test_more_than_eight_meal_types_use_several_bytes():
+    meal_types = [{"ID": meal_type_id, "name": f"type {meal_type_id}"} for meal_type_id in range(1, 11)]
+    overview = pack_month_overview(2023, 4, [overview_day(2, 1 << 9 | 1, month=4, year=2023)], meal_types, False)
+    masks = base64.b64decode(overview["mealTypeMasks"])
+    assert overview["mealTypeMaskBytes"] == 2
+    assert len(masks) == 60
+    assert int.from_bytes(masks[2:4], "little") == 1 << 9 | 1
+
+
+def test_meal_types_above_64_are_left_out():
+    meal_types = MEAL_TYPES + [{"ID": 64, "name": "last"}, {"ID": 65, "name": "too high"}, {"ID": 100000, "name": "far too high"}]
+    overview = pack_month_overview(2024, 2, [overview_day(1, 1 << 63 | 1)], meal_types, False)
+    masks = base64.b64decode(overview["mealTypeMasks"])
+    assert overview["mealTypeMaskBytes"] == 8
+    assert len(overview["mealTypes"]) == 64
+    assert overview["mealTypes"][63] == "last"
+    assert int.from_bytes(masks[0:8], "little") == 1 << 63 | 1
+
+
+def test_levels_outside_their_range_stay_within_their_day():
+    levels = base64.b64decode(pack_month_overview(2024, 2, [overview_day(1, 1, 7, None), overview_day(2, 1, -3, 1)], MEAL_TYPES, True)["levels"])
+    assert levels[0] == (3 << 2 | 0) << 4 | (0 << 2 | 2)
@@ -0,0 +1,57 @@
+"""
+Unit tests of the remembered password verifications.
+"""
+
+import pytest
+
+from src.utils.passwordHasher import PasswordHasher
+
+
+@pytest.fixture
+def hasher():
+    """Returns a hasher with cheap parameters and stops its worker process afterwards."""
+    password_hasher = PasswordHasher(maxWorkers=1, n=2 ** 4, r=1)
+    yield password_hasher
+    password_hasher.close()
+
+
+def test_successful_verification_is_remembered(hasher):
+    stored_hash = hasher.hashPasswordBlocking("secret")
+    assert hasher.verifyPasswordBlocking("secret", stored_hash) == (True, False)
+    assert hasher.verifyPasswordBlocking("secret", stored_hash) == (True, False)
+    assert hasher.getStatistics()["verifiedCacheHits"] == 1
+
+
+def test_failed_verification_is_not_remembered(hasher):
+    stored_hash = hasher.hashPasswordBlocking("secret")
+    assert hasher.verifyPasswordBlocking("wrong", stored_hash) == (False, False)
+    assert hasher.verifyPasswordBlocking("wrong", stored_hash) == (False, False)
+    assert hasher.getStatistics()["verifiedCacheHits"] == 0
+
+
+def test_changed_stored_hash_misses(hasher):
+    hasher.verifyPasswordBlocking("secret", hasher.hashPasswordBlocking("secret"))
+    assert hasher.verifyPasswordBlocking("secret", hasher.hashPasswordBlocking("other")) == (False, False)
+    assert hasher.getStatistics()["verifiedCacheHits"] == 0
+
+
+def test_outdated_hash_is_not_remembered(hasher):
+    outdated = PasswordHasher(maxWorkers=1, n=2 ** 5, r=1)
+    try:
+        stored_hash = outdated.hashPasswordBlocking("secret")
+    finally:
+        outdated.close()
+    assert hasher.verifyPasswordBlocking("secret", stored_hash) == (True, True)
+    assert hasher.verifyPasswordBlocking("secret", stored_hash) == (True, True)
+    assert hasher.getStatistics()["verifiedCacheEntries"] == 0
+
+
+def test_cache_can_be_disabled():
+    password_hasher = PasswordHasher(maxWorkers=1, n=2 ** 4, r=1, verifiedCacheSeconds=0)
+    try:
+        stored_hash = password_hasher.hashPasswordBlocking("secret")
+        password_hasher.verifyPasswordBlocking("secret", stored_hash)
+        password_hasher.verifyPasswordBlocking("secret", stored_hash)
+        assert password_hasher.getStatistics()["verifiedCacheHits"] == 0
+    finally:
+        password_hasher.close()
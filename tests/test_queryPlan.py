@@ -0,0 +1,58 @@
+"""
+Query plan check of the repository statements (`src/tools/queryPlanCheck.py`).
+
+The check writes a test user, so it only runs against a local database: set `QUERY_PLAN_CHECK_CONFIG` to the path of
+a `config.txt` pointing to one (seed it first with `python -m src.tools.queryPlanCheck --seed-users ...`). Without
+it, or if the database cannot be reached, the test is skipped. `QUERY_PLAN_CHECK_MAX_ROWS` overrides the threshold.
+"""
+
+import json
+import os
+
+import pytest
+
+from src.tools.queryPlanCheck import QueryPlanRecorder, checkQueryPlans
+from src.utils import configLoader
+
+
+def plan_row(table: str, access_type: str, rows: int, extra: str = "") -> dict:
+    """Returns one row of an EXPLAIN output."""
+    return {"table": table, "type": access_type, "key": None, "rows": rows, "Extra": extra}
+
+
+def test_full_scans_above_threshold_fail():
+    recorder = QueryPlanRecorder(100)
+    recorder.plans = {
+        "SELECT small": {"caller": "mealRepo.py:getMealByID", "rows": [plan_row("meals", "ALL", 100)], "error": None},
+        "SELECT large": {"caller": "dayRepo.py:getDayByDate", "rows": [plan_row("days", "ALL", 101)], "error": None},
+        "SELECT sorted": {"caller": "userRepo.py:getUserIDsPage", "rows": [plan_row("users", "range", 500, "Using filesort")], "error": None},
+    }
+    reasons = sorted(reason for statement, plan, reason in recorder.getFailures())
+    assert reasons == ["filesort on users (500 rows)", "full table scan of days (101 rows)"]
+
+
+def test_known_scans_are_reported_instead_of_failing():
+    recorder = QueryPlanRecorder(100)
+    recorder.knownScans = {("userRepo.py:getUserByName", "users"): "no blind index"}
+    recorder.plans = {
+        "SELECT by name": {"caller": "userRepo.py:getUserByName", "rows": [plan_row("users", "ALL", 5000)], "error": None},
+    }
+    assert recorder.getFailures() == []
+    assert [reason for statement, plan, reason in recorder.getKnownScans()] == ["no blind index"]
+
+
+def test_repository_statements_use_indexes(monkeypatch):
+    config_path = os.environ.get("QUERY_PLAN_CHECK_CONFIG")
+    if not config_path:
+        pytest.skip("QUERY_PLAN_CHECK_CONFIG does not point to the config of a local database")
+    mysql_connector = pytest.importorskip("mysql.connector")
+    with open(config_path) as config_file:
+        monkeypatch.setattr(configLoader, "_cachedConfig", json.load(config_file))
+
+    try:
+        recorder = checkQueryPlans(int(os.environ.get("QUERY_PLAN_CHECK_MAX_ROWS", 1000)))
+    except mysql_connector.Error as e:
+        pytest.skip(f"The local database cannot be reached: {e}")
+
+    failures = recorder.getFailures()
+    assert not failures, "\n".join(f"{plan['caller']}: {reason}\n    {statement}" for statement, plan, reason in failures)
@@ -0,0 +1,106 @@
+"""
+Unit tests of the token bucket math of the rate limiter.
+"""
+
+from unittest import mock
+
+import pytest
+
+from src.utils.rateLimiter import InMemoryRateLimitStore, RateLimiter, RedisRateLimitStore
+
+
+@pytest.fixture
+def clock():
+    """Replaces the monotonic clock of the rate limiter by a controllable one."""
+    now = [1000.0]
+    with mock.patch("src.utils.rateLimiter.time.monotonic", side_effect=lambda: now[0]):
+        yield now
+
+
+def test_bucket_allows_burst_up_to_capacity(clock):
+    store = InMemoryRateLimitStore()
+    assert [store.consume("key", 3, 1) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert store.consume("key", 3, 1) == pytest.approx(1.0)
+
+
+def test_bucket_refills_over_time(clock):
+    store = InMemoryRateLimitStore()
+    for _ in range(2):
+        store.consume("key", 2, 0.5)
+    clock[0] += 1
+    # Half a token was refilled, so the next token is one more second away.
+    assert store.consume("key", 2, 0.5) == pytest.approx(1.0)
+    clock[0] += 1
+    assert store.consume("key", 2, 0.5) == 0.0
+
+
+def test_bucket_never_exceeds_capacity(clock):
+    store = InMemoryRateLimitStore()
+    store.consume("key", 2, 1)
+    clock[0] += 3600
+    assert [store.consume("key", 2, 1) for _ in range(2)] == [0.0, 0.0]
+    assert store.consume("key", 2, 1) > 0
+
+
+def test_least_recently_used_buckets_are_dropped(clock):
+    store = InMemoryRateLimitStore(maxKeys=2)
+    store.consume("a", 1, 1)
+    store.consume("b", 1, 1)
+    store.consume("c", 1, 1)
+    # The bucket of "a" was dropped and starts full again, "c" is still empty.
+    assert store.consume("a", 1, 1) == 0.0
+    assert store.consume("c", 1, 1) > 0
+
+
+def test_limiter_checks_user_and_token_buckets(clock):
+    limiter = RateLimiter(InMemoryRateLimitStore(), {
+        "default": {"user": {"capacity": 1, "refillPerSecond": 1}, "token": {"capacity": 2, "refillPerSecond": 1}},
+    })
+    assert limiter.check("/v1/addMeal", "alice", "secret", "alice password") == 0.0
+    # The user bucket is empty, the token bucket still has a token.
+    assert limiter.check("/v1/addMeal", "alice", "secret", "alice password") > 0
+    assert limiter.check("/v1/addMeal", "bob", "secret", "bob password") == 0.0
+    assert limiter.check("/v1/addMeal", "carol", "secret", "carol password") > 0
+
+
+def test_user_bucket_cannot_be_drained_without_password(clock):
+    limiter = RateLimiter(InMemoryRateLimitStore(), {"default": {"user": {"capacity": 1, "refillPerSecond": 1}}})
+    for guess in range(5):
+        limiter.check("/v1/login", "alice", "secret", f"guess {guess}")
+    assert limiter.check("/v1/login", "alice", "secret") == 0.0
+    assert limiter.check("/v1/login", "alice", "secret", "alice password") == 0.0
+
+
+@pytest.mark.parametrize("bucket", [
+    {"capacity": 1, "refillPerSecond": 0}, {"capacity": 0, "refillPerSecond": 1}, {"capacity": 1}, {"capacity": "x", "refillPerSecond": 1},
+])
+def test_invalid_buckets_are_rejected(bucket):
+    with pytest.raises(ValueError):
+        RateLimiter.fromConfig({"rateLimiting": {"enabled": True, "routes": {"default": {"user": bucket}}}})
+
+
+class FailingClient:
+    """Client whose server is unreachable, counting the attempts."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def execute(self, *args):
+        self.calls += 1
+        raise ConnectionError("connection refused")
+
+
+def test_unreachable_shared_store_fails_open_and_is_skipped(clock):
+    client = FailingClient()
+    store = RedisRateLimitStore(client, failureCooldownSeconds=5)
+    assert [store.consume("key", 1, 1) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert client.calls == 1
+    clock[0] += 5
+    store.consume("key", 1, 1)
+    assert client.calls == 2
+
+
+def test_limiter_allows_routes_without_budget(clock):
+    limiter = RateLimiter(InMemoryRateLimitStore(), {"/v1/addMeal": {"user": {"capacity": 1, "refillPerSecond": 1}}})
+    for _ in range(5):
+        assert limiter.check("/v1/getMeals", "alice", "secret") == 0.0
@@ -0,0 +1,71 @@
+"""
+Unit tests of the stack collapsing of the sampling profiler.
+"""
+
+import threading
+
+from src.utils.samplingProfiler import SamplingProfiler
+
+
+def busy_leaf(stop: threading.Event) -> None:
+    """Keeps a thread busy until stopped, so it is sampled."""
+    while not stop.is_set():
+        sum(range(100))
+
+
+def busy_root(stop: threading.Event) -> None:
+    """Calls the busy leaf, so the sampled stack has a known shape."""
+    busy_leaf(stop)
+
+
+def parse_collapsed(collapsed: str) -> dict:
+    """Parses collapsed stacks into a dict of stack and count."""
+    stacks = {}
+    for line in collapsed.splitlines():
+        stack, count = line.rsplit(" ", 1)
+        stacks[stack] = int(count)
+    return stacks
+
+
+def sample_busy_thread(profiler: SamplingProfiler) -> dict:
+    """Samples a busy thread named "busy-worker" for a short window and returns the collapsed stacks."""
+    stop = threading.Event()
+    worker = threading.Thread(target=busy_root, args=(stop,), name="busy-worker", daemon=True)
+    worker.start()
+    try:
+        profiler.start("window", 0.3, intervalSeconds=0.005)
+        profiler._SamplingProfiler__thread.join()
+    finally:
+        stop.set()
+        worker.join()
+    return parse_collapsed(profiler.getCollapsedStacks())
+
+
+def test_stacks_are_collapsed_from_thread_to_leaf():
+    stacks = sample_busy_thread(SamplingProfiler())
+    busy = [stack for stack in stacks if stack.startswith("busy-worker;")]
+    assert busy
+    for stack in busy:
+        frames = stack.split(";")
+        assert "test_samplingProfiler.py:busy_root" in frames
+        assert frames.index("test_samplingProfiler.py:busy_root") < frames.index("test_samplingProfiler.py:busy_leaf")
+
+
+def test_idle_threads_are_skipped():
+    stacks = sample_busy_thread(SamplingProfiler())
+    # The test thread waits in Thread.join while sampling, so it never shows up.
+    assert not any(stack.split(";")[-1] == "threading.py:_wait_for_tstate_lock" for stack in stacks)
+    assert not any("sampling-profiler" in stack for stack in stacks)
+
+
+def test_output_is_sorted_by_count():
+    stacks = sample_busy_thread(SamplingProfiler())
+    counts = list(stacks.values())
+    assert counts == sorted(counts, reverse=True)
+    assert sum(counts) >= 1
+
+
+def test_distinct_stacks_beyond_limit_are_counted_as_other():
+    stacks = sample_busy_thread(SamplingProfiler(maxDistinctStacks=1))
+    assert set(stacks) - {"[other]"}
+    assert len(stacks) <= 2
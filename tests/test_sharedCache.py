@@ -0,0 +1,30 @@
+"""
+Unit tests of the two-tier shared cache with the in-memory backend.
+"""
+
+import pytest
+
+from src.utils.sharedCache import CacheBackend, InMemoryCacheBackend, SharedCache
+
+
+def test_backend_base_class_is_abstract():
+    with pytest.raises(TypeError):
+        CacheBackend()
+
+
+def test_values_are_read_through_both_tiers():
+    cache = SharedCache(InMemoryCacheBackend())
+    assert cache.get("meals:alice") is None
+    assert cache.set("meals:alice", [{"mealType": "breakfast"}])
+    assert cache.get("meals:alice") == [{"mealType": "breakfast"}]
+    assert cache.getStatistics()["l1Hits"] == 1
+
+
+def test_invalidated_key_cannot_be_filled_by_racing_read():
+    cache = SharedCache(InMemoryCacheBackend(), tombstoneSeconds=60)
+    cache.set("meals:alice", ["old"])
+    cache.invalidate("meals:alice")
+    assert cache.get("meals:alice") is None
+    # A read that started before the write must not put its stale result back.
+    assert not cache.set("meals:alice", ["old"])
+    assert cache.get("meals:alice") is None
@@ -0,0 +1,84 @@
+"""
+Unit tests of the coalescing of identical concurrent reads.
+"""
+
+import asyncio
+import threading
+
+import pytest
+
+from src.utils.singleFlight import SingleFlight
+
+
+def test_concurrent_calls_for_one_key_run_once():
+    single_flight = SingleFlight()
+    release = threading.Event()
+    runs = []
+
+    def read(value):
+        runs.append(value)
+        release.wait(5)
+        return value * 2
+
+    async def scenario():
+        calls = [asyncio.ensure_future(single_flight.do("key", read, 21)) for _ in range(5)]
+        await asyncio.sleep(0.05)
+        release.set()
+        return await asyncio.gather(*calls)
+
+    assert asyncio.run(scenario()) == [42] * 5
+    assert runs == [21]
+    assert single_flight.getStatistics() == {"calls": 5, "executions": 1, "coalesced": 4, "inFlight": 0}
+
+
+def test_different_keys_and_later_calls_run_again():
+    single_flight = SingleFlight()
+
+    async def scenario():
+        first = await asyncio.gather(single_flight.do("a", lambda: "a"), single_flight.do("b", lambda: "b"))
+        second = await single_flight.do("a", lambda: "a again")
+        return first, second
+
+    assert asyncio.run(scenario()) == (["a", "b"], "a again")
+    assert single_flight.getStatistics()["executions"] == 3
+
+
+def test_failure_is_shared_and_not_cached():
+    single_flight = SingleFlight()
+    release = threading.Event()
+
+    def failing_read():
+        release.wait(5)
+        raise RuntimeError("database gone")
+
+    async def scenario():
+        calls = [asyncio.ensure_future(single_flight.do("key", failing_read)) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        release.set()
+        results = await asyncio.gather(*calls, return_exceptions=True)
+        return results, await single_flight.do("key", lambda: "recovered")
+
+    results, recovered = asyncio.run(scenario())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert recovered == "recovered"
+
+
+def test_cancelled_caller_does_not_cancel_shared_read():
+    single_flight = SingleFlight()
+    release = threading.Event()
+
+    def read():
+        release.wait(5)
+        return "done"
+
+    async def scenario():
+        cancelled = asyncio.ensure_future(single_flight.do("key", read))
+        joined = asyncio.ensure_future(single_flight.do("key", read))
+        await asyncio.sleep(0.05)
+        cancelled.cancel()
+        release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+        return await joined
+
+    assert asyncio.run(scenario()) == "done"
@@ -0,0 +1,25 @@
+"""
+Unit tests of the versions behind the ETags.
+"""
+
+from src.utils.versionTracker import VersionTracker
+
+
+def test_bumped_version_invalidates_etag():
+    tracker = VersionTracker()
+    etag = tracker.buildETag(("meals", "alice", 2024, 5, 1), "fingerprint")
+    assert tracker.isETagCurrent(("meals", "alice", 2024, 5, 1), "fingerprint", etag)
+    assert not tracker.isETagCurrent(("meals", "alice", 2024, 5, 1), "other fingerprint", etag)
+    tracker.bumpVersion(("meals", "alice", 2024, 5, 1))
+    assert not tracker.isETagCurrent(("meals", "alice", 2024, 5, 1), "fingerprint", etag)
+
+
+def test_evicted_keys_never_match_old_etags():
+    tracker = VersionTracker()
+    alice = [tracker.buildETag(("meals", "alice", 2024, 5, day)) for day in (1, 2)]
+    bob = tracker.buildETag(("meals", "bob", 2024, 5, 1))
+
+    assert tracker.evictKeysWithPrefix(("meals", "alice")) == 2
+    assert not tracker.isETagCurrent(("meals", "alice", 2024, 5, 1), "", alice[0])
+    assert not tracker.isETagCurrent(("meals", "alice", 2024, 5, 2), "", alice[1])
+    assert tracker.isETagCurrent(("meals", "bob", 2024, 5, 1), "", bob)